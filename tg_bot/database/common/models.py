@@ -1,7 +1,10 @@
 from datetime import datetime
 import peewee as pw
+from playhouse.sqlite_ext import FTS5Model, RowIDField, SearchField
 from typing import List, Type
 
+from database.common.payload import PayloadField
+
 db = pw.SqliteDatabase('diploma.db')
 
 class _BaseModel(pw.Model):
@@ -20,7 +23,8 @@ class _Tables(_BaseModel):
     Attributes:
         id_history (int): Код из таблицы History
         data_key (VarChar): Ключ из API сайта
-        data_json (TEXT): Данные ответа на запрос
+        data_json (PAYLOAD): Данные ответа на запрос (разобранный JSON,
+            в БД хранится сжатым, см. database.common.payload)
     """
 
     # Связь с таблицей истории запросов, на случай если потребуется
@@ -30,8 +34,8 @@ class _Tables(_BaseModel):
     # Код (ключ) записи из API сайта (на всякий случай разрешить пустые)
     data_key = pw.CharField(null=True)
 
-    # Структурированная запись сведений (JSON)
-    data_json = pw.TextField(null=True)
+    # Структурированная запись сведений (JSON, в БД - сжатый)
+    data_json = PayloadField(null=True)
 
 class History(_BaseModel):
     """
@@ -56,6 +60,11 @@ class History(_BaseModel):
 
     class Meta:
         db_table = 'History'
+        # Поиск истории пользователя за дату и по типу запроса
+        indexes = (
+            (('id_users', 'created_at'), False),
+            (('id_users', 'query_string'), False),
+        )
 
 
 class _Actors(_Tables):
@@ -75,6 +84,10 @@ class ActorFilms(_Actors):
 
     class Meta:
         db_table = 'ActorFilms'
+        # Одна запись на персону с сайта
+        indexes = (
+            (('data_key',), True),
+        )
 
 
 class ActorNews(_Actors):
@@ -120,6 +133,26 @@ class FilmNews(_Tables):
 class FilmInfo(_Tables):
     """
     Класс таблица - кэш ответов информации по фильмам.
+
+    Разделы ответа, которые выводятся отдельными кнопками, хранятся ещё и
+    в своих колонках (раздел в сжатом виде, как и весь ответ), чтобы экран
+    читал и разбирал только свой раздел, а не весь ответ (см.
+    database.utils.film_store).
+
+    Attributes:
+        film_type (varchar): Тип фильма
+        film_name (varchar): Название фильма
+        rating, votes (PayloadField): Рейтинги и количество голосов по
+            источникам
+        genres, countries (PayloadField): Жанры и страны
+        persons (PayloadField): Персоны фильма
+        facts (PayloadField): Факты о фильме
+        videos (PayloadField): Трейлеры и тизеры
+        similar_movies (PayloadField): Похожие фильмы
+        production_companies (PayloadField): Компании, снявшие фильм
+        year, rating_kp, rating_imdb, age_rating: Год премьеры, рейтинги
+            Кинопоиска и IMDB, возрастной рейтинг (для поиска по фильтру,
+            см. database.utils.film_query)
     """
     # Тип фильма (кино, сериал и т.п.)
     film_type = pw.CharField(null=False)
@@ -127,8 +160,36 @@ class FilmInfo(_Tables):
     # Название фильма
     film_name = pw.CharField(null=False)
 
+    # Разделы ответа сайта (в сжатом виде, как data_json; пусто - раздела
+    # нет в ответе)
+    rating = PayloadField(null=True)
+    votes = PayloadField(null=True)
+    genres = PayloadField(null=True)
+    countries = PayloadField(null=True)
+    persons = PayloadField(null=True)
+    facts = PayloadField(null=True)
+    videos = PayloadField(null=True)
+    similar_movies = PayloadField(null=True)
+    production_companies = PayloadField(null=True)
+
+    # Поля фильтра поиска фильмов (пусто - нет в ответе сайта)
+    year = pw.IntegerField(null=True)
+    rating_kp = pw.FloatField(null=True)
+    rating_imdb = pw.FloatField(null=True)
+    age_rating = pw.IntegerField(null=True)
+
     class Meta():
         db_table = 'FilmInfo'
+        # Одна запись на фильм с сайта, поиск фильмов по записи истории и
+        # по фильтру
+        indexes = (
+            (('data_key',), True),
+            (('id_history',), False),
+            (('year',), False),
+            (('rating_kp',), False),
+            (('rating_imdb',), False),
+            (('age_rating',), False),
+        )
 
 class UserList(_BaseModel):
     """
@@ -173,22 +234,156 @@ class FilesForBot(_BaseModel):
     # Тип файла (image, video, document, ...)
     file_type = pw.CharField(null=False, max_length=10)
 
-    # Имя файла (URL источника для точной идентификации)
+    # Имя файла (URL источника, как его прислал сайт)
     file_name = pw.TextField(null=False)
 
+    # Ключ ссылки (хеш нормализованного URL, см. crud.file_url_key): один
+    # файл, сколько бы ни было вариантов написания его ссылки
+    url_key = pw.CharField(null=True, unique=True, max_length=32)
+
     # Код файла в телеграм-боте
     file_code = pw.TextField(null=False)
 
     class Meta:
         db_table = 'files_for_bot'
 
+class HistoryCounters(_BaseModel):
+    """
+    Счётчики действий пользователей по дням (для статистики без подсчёта
+    по всей истории запросов). Обновляются при записи истории.
+
+    Attributes:
+        id_users (int): Код пользователя (как в таблице History)
+        day (varchar): Дата в виде ГГГГ-ММ-ДД или "*" (за всё время)
+        action (varchar): Вид действия (см. database.utils.statistics)
+        quantity (int): Количество действий
+    """
+    id_users = pw.IntegerField(null=False)
+    day = pw.CharField(null=False, max_length=10)
+    action = pw.CharField(null=False, max_length=20)
+    quantity = pw.IntegerField(null=False, default=0)
+
+    class Meta:
+        db_table = 'history_counters'
+        indexes = (
+            (('id_users', 'day', 'action'), True),
+        )
+
+class FilmGenre(_BaseModel):
+    """
+    Жанры фильмов из FilmInfo (для поиска фильмов по жанру).
+
+    Attributes:
+        film_key (varchar): Код (ключ) фильма из API сайта
+        genre (varchar): Жанр (в нижнем регистре)
+    """
+    film_key = pw.CharField(null=False)
+    genre = pw.CharField(null=False)
+
+    class Meta:
+        db_table = 'film_genres'
+        indexes = (
+            (('genre', 'film_key'), True),
+            (('film_key',), False),
+        )
+
+
+class FilterCoverage(_BaseModel):
+    """
+    Запросы фильмов по фильтру, выполненные на сайте: сколько фильмов
+    нашлось и все ли они записаны в FilmInfo (тогда такой фильтр и более
+    узкие выполняются по БД без запроса к сайту).
+
+    Attributes:
+        signature (TEXT): Условия фильтра (JSON, по нему ищется запись)
+        total (int): Сколько фильмов нашлось на сайте
+        fetched (int): Сколько фильмов получено с сайта и записано
+        complete (bool): Все найденные фильмы есть в БД
+        updated_at (DateTimeField): Время последнего запроса к сайту
+    """
+    signature = pw.TextField(null=False, unique=True)
+    total = pw.IntegerField(null=False, default=0)
+    fetched = pw.IntegerField(null=False, default=0)
+    complete = pw.BooleanField(null=False, default=False)
+    updated_at = pw.DateTimeField(null=False, default=datetime.now)
+
+    class Meta:
+        db_table = 'filter_coverage'
+        indexes = (
+            (('complete', 'updated_at'), False),
+        )
+
+
+class CrawlerState(_BaseModel):
+    """
+    Курсоры фонового обхода каталога сайта (см.
+    site_API.utils.catalog_crawler): обход продолжается с них после
+    перезапуска бота.
+
+    Attributes:
+        kind (varchar): Вид записей каталога ("film" или "person")
+        cursor (int): Код последней записанной записи сайта
+        items (int): Сколько записей записано обходом (всего)
+        finished_at (DateTimeField): Время окончания последнего полного
+            обхода (пусто - обход не закончен)
+        updated_at (DateTimeField): Время записи последней страницы
+        quota_day (DateField): День расхода суточной квоты обходчика
+        quota_used (int): Запросов обходчика за этот день (квота общая
+            для всех видов записей)
+    """
+    kind = pw.CharField(null=False, unique=True, max_length=10)
+    cursor = pw.BigIntegerField(null=False, default=0)
+    items = pw.IntegerField(null=False, default=0)
+    finished_at = pw.DateTimeField(null=True)
+    updated_at = pw.DateTimeField(null=False, default=datetime.now)
+    quota_day = pw.DateField(null=True)
+    quota_used = pw.IntegerField(null=False, default=0)
+
+    class Meta:
+        db_table = 'crawler_state'
+
+
+class CatalogSearch(FTS5Model):
+    """
+    Полнотекстовый индекс (FTS5, триграммы) названий фильмов из FilmInfo
+    и имён персон из ActorFilms, включая альтернативные названия и имена
+    из ответов сайта (см. database.utils.search_index). Требуется SQLite
+    3.34 и новее.
+
+    Attributes:
+        rowid (int): Код сайта * 2 (фильм) или код сайта * 2 + 1 (персона)
+        names (TEXT): Названия (имена) в нижнем регистре, по строке на
+            вариант
+        kind (TEXT): "film" или "person"
+        data_key (TEXT): Код (ключ) записи из API сайта
+        title (TEXT): Название (имя) для вывода пользователю
+        year (TEXT): Год выхода фильма (для персоны пусто)
+    """
+    rowid = RowIDField()
+    names = SearchField()
+    kind = SearchField(unindexed=True)
+    data_key = SearchField(unindexed=True)
+    title = SearchField(unindexed=True)
+    year = SearchField(unindexed=True)
+
+    class Meta:
+        database = db
+        table_name = 'catalog_search'
+        options = {'tokenize': 'trigram'}
+
+
 # Список таблиц для более удобного их создания (через цикл)
 tables_list: List[Type] = [
     UserList,
     History,
     FilmInfo,
     ActorFilms,
-    FilesForBot
+    FilesForBot,
+    HistoryCounters,
+    CatalogSearch,
+    FilmGenre,
+    FilterCoverage,
+    CrawlerState
 ]
 
 if __name__ == "__main__":
@@ -0,0 +1,310 @@
+"""
+Модуль хранения ответов сайта (JSON) в сжатом виде.
+
+Ответ сайта записывается в поле PayloadField кодеком, выбранным в
+настройках (DB_PAYLOAD_CODEC): "zlib" - JSON без отступов, сжатый zlib,
+"msgpack" - msgpack, сжатый zlib, "zstd" - JSON, сжатый zstd, "json" -
+JSON без отступов и без сжатия. Кодеки msgpack и zstd доступны, если
+установлены пакеты msgpack и zstandard соответственно. Сжатое значение
+начинается с байта-признака кодека, поэтому при чтении кодек определяется
+по самому значению, а старые записи (текст JSON) читаются как раньше.
+
+Сравнить размер и время чтения ответов из БД разными кодеками:
+    python -m database.common.payload
+
+
+:Functions
+    register_codec - Добавить кодек.
+
+    get_codec - Кодек по имени.
+
+    encode_payload - Записать ответ кодеком.
+
+    decode_payload - Прочитать ответ (кодек определяется по значению).
+
+    benchmark - Размер и время чтения ответов разными кодеками.
+
+
+:Classes
+    PayloadCodec - Кодек ответов сайта.
+
+    PayloadField - Поле таблицы с ответом сайта.
+
+
+:var
+    CODECS - Доступные кодеки {имя: кодек}.
+"""
+
+from settings import logger, DatabaseSettings
+import json
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Tuple
+
+import peewee as pw
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _json_bytes(data: Any) -> bytes:
+    """
+    JSON без отступов и пробелов.
+
+    :param data: Данные
+    :type data: Any
+
+    :return: Текст JSON в UTF-8
+    :rtype: bytes
+    """
+    return json.dumps(data, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+class PayloadCodec:
+    """
+    Кодек ответов сайта.
+
+    Attributes:
+        name (str): Имя кодека (как в настройке DB_PAYLOAD_CODEC)
+        tag (bytes): Байт-признак кодека в начале значения (пусто - значение
+            хранится текстом JSON)
+        __dumps (Callable): Преобразование данных в байты (без признака)
+        __loads (Callable): Обратное преобразование
+    """
+
+    def __init__(self, name: str, tag: bytes,
+                 dumps: Callable[[Any], bytes],
+                 loads: Callable[[bytes], Any]) -> None:
+        self.name: str = name
+        self.tag: bytes = tag
+        self.__dumps: Callable[[Any], bytes] = dumps
+        self.__loads: Callable[[bytes], Any] = loads
+
+    def encode(self, data: Any) -> bytes | str:
+        """
+        Записать данные кодеком.
+
+        :param data: Данные
+        :type data: Any
+
+        :return: Значение для записи в БД (текст для кодека без признака)
+        :rtype: bytes | str
+        """
+        if not self.tag:
+            return self.__dumps(data).decode('utf-8')
+        return self.tag + self.__dumps(data)
+
+    def decode(self, value: bytes) -> Any:
+        """
+        Прочитать данные (значение без байта-признака).
+
+        :param value: Значение без признака кодека
+        :type value: bytes
+
+        :return: Данные
+        :rtype: Any
+        """
+        return self.__loads(value)
+
+
+# Доступные кодеки: по имени и по байту-признаку
+CODECS: Dict[str, PayloadCodec] = dict()
+_CODECS_BY_TAG: Dict[bytes, PayloadCodec] = dict()
+
+
+def register_codec(codec: PayloadCodec) -> None:
+    """
+    Добавить кодек.
+
+    :param codec: Кодек
+    :type codec: PayloadCodec
+
+    :return: None
+
+    :exception ValueError: Если признак кодека уже занят другим кодеком
+    """
+    if codec.tag:
+        other = _CODECS_BY_TAG.get(codec.tag)
+        if other is not None and other.name != codec.name:
+            raise ValueError('Признак {!r} уже занят кодеком {}'.
+                             format(codec.tag, other.name))
+        _CODECS_BY_TAG[codec.tag] = codec
+    CODECS[codec.name] = codec
+
+
+register_codec(PayloadCodec('json', b'', _json_bytes, json.loads))
+register_codec(PayloadCodec(
+    'zlib', b'\x01',
+    lambda data: zlib.compress(_json_bytes(data), 6),
+    lambda value: json.loads(zlib.decompress(value))
+))
+if msgpack is not None:
+    register_codec(PayloadCodec(
+        'msgpack', b'\x02',
+        lambda data: zlib.compress(msgpack.packb(data, use_bin_type=True), 6),
+        lambda value: msgpack.unpackb(zlib.decompress(value), raw=False)
+    ))
+if zstandard is not None:
+    register_codec(PayloadCodec(
+        'zstd', b'\x03',
+        lambda data: zstandard.ZstdCompressor(level=9).compress(
+            _json_bytes(data)
+        ),
+        lambda value: json.loads(
+            zstandard.ZstdDecompressor().decompress(value)
+        )
+    ))
+
+
+def get_codec(name: str = None) -> PayloadCodec:
+    """
+    Кодек по имени. Если кодек недоступен (не установлен пакет), то
+    используется "zlib".
+
+    :param name: Имя кодека (по умолчанию из настроек)
+    :type name: str
+
+    :return: Кодек
+    :rtype: PayloadCodec
+    """
+    name = name or DatabaseSettings().payload_codec
+    codec = CODECS.get(name)
+    if codec is None:
+        log.warning('Кодек {} недоступен, используется zlib'.format(name))
+        codec = CODECS['zlib']
+    return codec
+
+
+def encode_payload(data: Any, codec: PayloadCodec = None) -> bytes | str:
+    """
+    Записать ответ сайта кодеком.
+
+    :param data: Ответ сайта
+    :type data: Any
+    :param codec: Кодек (по умолчанию из настроек)
+    :type codec: PayloadCodec
+
+    :return: Значение для записи в БД
+    :rtype: bytes | str
+    """
+    return (codec or _default_codec).encode(data)
+
+
+def decode_payload(value: bytes | str | None) -> Any:
+    """
+    Прочитать ответ сайта. Кодек определяется по байту-признаку, значение
+    без признака (в том числе старые записи с отступами) читается как JSON.
+
+    :param value: Значение из БД
+    :type value: bytes | str | None
+
+    :return: Ответ сайта (None, если значения нет)
+    :rtype: Any
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return json.loads(value)
+    value = bytes(value)
+    codec = _CODECS_BY_TAG.get(value[:1])
+    if codec is None:
+        return json.loads(value)
+    return codec.decode(value[1:])
+
+
+class PayloadField(pw.Field):
+    """
+    Поле таблицы с ответом сайта: при записи данные кодируются кодеком из
+    настроек, при чтении возвращаются уже разобранными. Колонка остаётся
+    TEXT (SQLite хранит сжатые значения в ней как BLOB).
+    """
+    field_type = 'TEXT'
+
+    def db_value(self, value: Any) -> Any:
+        """
+        Значение для записи в БД. Готовый текст или байты (например,
+        значение из другой записи) записываются без изменений.
+
+        :param value: Ответ сайта
+        :type value: Any
+
+        :return: Значение для записи в БД
+        :rtype: Any
+        """
+        if value is None or isinstance(value, (str, bytes)):
+            return value
+        return encode_payload(value)
+
+    def python_value(self, value: Any) -> Any:
+        """
+        Разобранный ответ сайта из значения в БД.
+
+        :param value: Значение из БД
+        :type value: Any
+
+        :return: Ответ сайта
+        :rtype: Any
+        """
+        return decode_payload(value)
+
+
+def benchmark(payloads: List[Any],
+              repeat: int = 5) -> Dict[str, Tuple[int, float]]:
+    """
+    Размер и время чтения ответов разными кодеками (и прежним способом
+    записи - JSON с отступами, "legacy").
+
+    :param payloads: Ответы сайта
+    :type payloads: List[Any]
+    :param repeat: Сколько раз прочитать все ответы
+    :type repeat: int
+
+    :return: {кодек: (общий размер в байтах, среднее время чтения одного
+        ответа в мкс)}
+    :rtype: Dict[str, Tuple[int, float]]
+    """
+    result = dict()
+    variants = [('legacy', lambda data: json.dumps(data, ensure_ascii=False,
+                                                   indent=4))]
+    variants += [(i_name, i_codec.encode) for i_name, i_codec in
+                 CODECS.items()]
+    for i_name, i_encode in variants:
+        values = [i_encode(i_data) for i_data in payloads]
+        size = sum(len(i_value.encode('utf-8') if isinstance(i_value, str)
+                       else i_value) for i_value in values)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for i_value in values:
+                decode_payload(i_value)
+        elapsed = time.perf_counter() - start
+        count = max(1, len(values) * repeat)
+        result[i_name] = (size, elapsed / count * 1e6)
+    return result
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+# Кодек для записи новых значений
+_default_codec: PayloadCodec = get_codec()
+
+
+if __name__ == "__main__":
+    from database.common.models import db, FilmInfo, ActorFilms
+
+    db.connect(reuse_if_open=True)
+    data_list = [i_data for i_model in (FilmInfo, ActorFilms)
+                 for (i_data,) in i_model.select(i_model.data_json).
+                 where(i_model.data_json.is_null(False)).tuples()]
+    print('Ответов сайта:', len(data_list))
+    print('{:<10}{:>12}{:>14}'.format('Кодек', 'Байт', 'Чтение, мкс'))
+    for name, (size, decode_time) in benchmark(data_list).items():
+        print('{:<10}{:>12}{:>14.1f}'.format(name, size, decode_time))
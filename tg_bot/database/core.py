@@ -1,21 +1,71 @@
-from settings import logger
+from settings import logger, DatabaseSettings
 
 from database.utils.crud import CRUDInterface
-from database.common.models import db, tables_list
+from database.utils.write_behind import WriteBehind
+from database.utils.statistics import update_counters
+from database.utils.file_registry import FileIdRegistry
+from database.common.models import db, tables_list, History, FilesForBot
+from database.migrations import migrate
 
 
 db.connect()
-db.create_tables(tables_list)
+# Создать таблицы и обновить схему существующей БД
+migrate(db, tables_list)
 
 crud = CRUDInterface()
 
+# История запросов пользователей пишется отложенно (пачками в фоне)
+history_writer = WriteBehind(History,
+                             DatabaseSettings().history_flush_size,
+                             DatabaseSettings().history_flush_interval)
+# Счётчики статистики обновляются вместе с записью истории
+history_writer.register_flush(update_counters)
+
+# ID файлов в телеграм ищутся в памяти, новые записываются отложенно
+file_writer = WriteBehind(FilesForBot, upsert=True)
+file_registry = FileIdRegistry(file_writer,
+                               DatabaseSettings().file_registry_size)
+
+
+def open_connection() -> None:
+    """
+    Открыть соединение с БД для текущего потока (у каждого потока своё
+    соединение), если оно ещё не открыто.
+
+    :return: None
+    """
+    db.connect(reuse_if_open=True)
+
+
+def set_shard(index: int, shards: int) -> None:
+    """
+    Настроить запись в БД для процесса-обработчика (шарда), когда в одну
+    базу данных пишут несколько процессов: коды новых записей не
+    пересекаются, ID файлов при промахе ищутся в БД, чтение не ждёт
+    записи (журнал WAL).
+
+    :param index: Номер шарда
+    :type index: int
+    :param shards: Количество шардов
+    :type shards: int
+
+    :return: None
+    """
+    history_writer.set_stride(index, shards)
+    file_writer.set_stride(index, shards)
+    file_registry.share()
+    db.execute_sql('PRAGMA journal_mode=WAL')
+
 
 def close_database() -> None:
     """
-    Закрыть базу данных, если она ещё не закрыта.
+    Записать отложенные записи и закрыть базу данных, если она ещё
+    не закрыта.
 
     :return: None
     """
+    history_writer.stop()
+    file_writer.stop()
     if not db.is_closed():
         db.close()
     return
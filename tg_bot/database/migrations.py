@@ -0,0 +1,491 @@
+"""
+Модуль миграций схемы базы данных (версии схемы).
+
+Версия схемы хранится в самой базе данных (PRAGMA user_version). При
+запуске (migrate) выполняются все миграции с номером больше текущей версии,
+каждая в своей транзакции вместе с записью нового номера версии. Новая
+(пустая) база данных создаётся сразу по описанию моделей с последней
+версией схемы. Индексы, которые создают миграции, объявлены и в моделях
+(с теми же именами), поэтому схема одинакова для новых и обновлённых БД.
+После миграций, которые переписывают сохранённые записи (VACUUM_AFTER),
+файл базы данных сжимается (VACUUM), иначе место старых записей остаётся
+в файле свободными страницами.
+
+Проверить, что поиск по таблицам идёт через индексы:
+    python -m database.migrations
+
+
+:Functions
+    get_version - Текущая версия схемы базы данных.
+
+    migrate - Создать таблицы и обновить схему до последней версии.
+
+    explain - План выполнения запроса (EXPLAIN QUERY PLAN).
+
+    report_query_plans - Планы выполнения типовых запросов бота.
+
+
+:var
+    MIGRATIONS - Список миграций (номер, описание, функция).
+
+    VACUUM_AFTER - Миграции, после которых файл базы данных сжимается.
+"""
+
+from settings import logger
+from typing import Callable, Dict, List, Tuple, Type
+
+import peewee as pw
+
+from database.common.models import db, tables_list, HistoryCounters, \
+    CatalogSearch, FilmGenre, FilterCoverage, CrawlerState
+from database.utils.statistics import backfill_counters
+from database.utils.film_store import FILM_COLUMNS, backfill_film_sections, \
+    encode_film_sections
+from database.common.payload import encode_payload, decode_payload
+from database.utils.search_index import rebuild_index
+from database.utils.film_query import backfill_film_filters
+from database.utils.crud import file_url_key
+
+
+def _remove_duplicates(database: pw.Database, table: str,
+                       column: str) -> None:
+    """
+    Удалить повторы значений в колонке (остаётся последняя запись), чтобы
+    можно было создать уникальный индекс.
+
+    :param database: База данных
+    :type database: pw.Database
+    :param table: Имя таблицы
+    :type table: str
+    :param column: Имя колонки
+    :type column: str
+
+    :return: None
+    """
+    cursor = database.execute_sql(
+        f'DELETE FROM "{table}" WHERE "{column}" IS NOT NULL AND id NOT IN '
+        f'(SELECT MAX(id) FROM "{table}" WHERE "{column}" IS NOT NULL '
+        f'GROUP BY "{column}")'
+    )
+    if cursor.rowcount:
+        log.info('Удалено повторов в таблице {} по полю {}: {}'.
+                 format(table, column, cursor.rowcount))
+
+
+def _add_lookup_indexes(database: pw.Database) -> None:
+    """
+    Миграция 1. Индексы для поиска истории по пользователю, кешей по коду
+    сайта и файлов по адресу (URL).
+
+    :param database: База данных
+    :type database: pw.Database
+
+    :return: None
+    """
+    indexes = (
+        # (имя индекса, таблица, колонки, уникальный)
+        ('history_id_users_created_at', 'History',
+         ('id_users', 'created_at'), False),
+        ('history_id_users_query_string', 'History',
+         ('id_users', 'query_string'), False),
+        ('filminfo_data_key', 'FilmInfo', ('data_key',), True),
+        ('filminfo_id_history', 'FilmInfo', ('id_history',), False),
+        ('actorfilms_data_key', 'ActorFilms', ('data_key',), True),
+        ('filesforbot_file_name', 'files_for_bot', ('file_name',), True),
+    )
+    for i_name, i_table, i_columns, i_unique in indexes:
+        if not database.table_exists(i_table):
+            continue  # Таблица будет создана по модели вместе с индексами
+        if i_unique:
+            _remove_duplicates(database, i_table, i_columns[0])
+        columns = ', '.join(f'"{i_column}"' for i_column in i_columns)
+        database.execute_sql(
+            f'CREATE {"UNIQUE " if i_unique else ""}INDEX IF NOT EXISTS '
+            f'"{i_name}" ON "{i_table}" ({columns})'
+        )
+
+
+def _add_history_counters(database: pw.Database) -> None:
+    """
+    Миграция 2. Таблица счётчиков статистики, заполненная по имеющейся
+    истории запросов.
+
+    :param database: База данных
+    :type database: pw.Database
+
+    :return: None
+    """
+    database.create_tables([HistoryCounters])
+    backfill_counters(database)
+
+
+def _add_film_sections(database: pw.Database) -> None:
+    """
+    Миграция 3. Колонки разделов сведений о фильме (рейтинг, персоны,
+    факты и т.д.), заполненные по сохранённым ответам сайта.
+
+    :param database: База данных
+    :type database: pw.Database
+
+    :return: None
+    """
+    if not database.table_exists('FilmInfo'):
+        return  # Таблица будет создана по модели вместе с колонками
+    existing = {i_column.name for i_column in database.get_columns('FilmInfo')}
+    for i_column in FILM_COLUMNS.values():
+        if i_column not in existing:
+            database.execute_sql(
+                f'ALTER TABLE "FilmInfo" ADD COLUMN "{i_column}" TEXT'
+            )
+    backfill_film_sections(database)
+
+
+def _encode_payloads(database: pw.Database) -> None:
+    """
+    Миграция 4. Ответы сайта (текст JSON с отступами) переписываются
+    кодеком из настроек (по умолчанию сжатый JSON).
+
+    :param database: База данных
+    :type database: pw.Database
+
+    :return: None
+    """
+    for i_table in ('FilmInfo', 'ActorFilms'):
+        if not database.table_exists(i_table):
+            continue
+        rows = database.execute_sql(
+            f'SELECT id, data_json FROM "{i_table}" '
+            f'WHERE data_json IS NOT NULL'
+        ).fetchall()
+        data = []
+        for i_id, i_value in rows:
+            try:
+                data.append((encode_payload(decode_payload(i_value)), i_id))
+            except ValueError:
+                log.warning('Запись {} таблицы {} не разобрана, оставлена '
+                            'без изменений'.format(i_id, i_table))
+        database.cursor().executemany(
+            f'UPDATE "{i_table}" SET data_json = ? WHERE id = ?', data
+        )
+        log.info('Переписано ответов в таблице {}: {}'.format(i_table,
+                                                              len(data)))
+
+
+def _add_catalog_search(database: pw.Database) -> None:
+    """
+    Миграция 5. Полнотекстовый индекс названий фильмов и имён персон,
+    заполненный по сохранённым фильмам и персонам.
+
+    :param database: База данных
+    :type database: pw.Database
+
+    :return: None
+    """
+    database.create_tables([CatalogSearch])
+    rebuild_index(database)
+
+
+def _add_film_filters(database: pw.Database) -> None:
+    """
+    Миграция 6. Колонки фильтра фильмов (год, рейтинги, возрастной
+    рейтинг) с индексами, жанры фильмов и учёт запросов к сайту по фильтру,
+    заполненные по сохранённым ответам сайта.
+
+    :param database: База данных
+    :type database: pw.Database
+
+    :return: None
+    """
+    if database.table_exists('FilmInfo'):
+        existing = {i_column.name
+                    for i_column in database.get_columns('FilmInfo')}
+        for i_column, i_type in (('year', 'INTEGER'), ('rating_kp', 'REAL'),
+                                 ('rating_imdb', 'REAL'),
+                                 ('age_rating', 'INTEGER')):
+            if i_column not in existing:
+                database.execute_sql(
+                    f'ALTER TABLE "FilmInfo" ADD COLUMN "{i_column}" {i_type}'
+                )
+            database.execute_sql(
+                f'CREATE INDEX IF NOT EXISTS "filminfo_{i_column}" '
+                f'ON "FilmInfo" ("{i_column}")'
+            )
+    database.create_tables([FilmGenre, FilterCoverage])
+    backfill_film_filters(database)
+
+
+def _add_crawler_state(database: pw.Database) -> None:
+    """
+    Миграция 7. Курсоры фонового обхода каталога сайта.
+
+    :param database: База данных
+    :type database: pw.Database
+
+    :return: None
+    """
+    database.create_tables([CrawlerState])
+
+
+def _add_file_url_keys(database: pw.Database) -> None:
+    """
+    Миграция 8. Уникальный ключ ссылки на файл (хеш нормализованного URL):
+    разные написания одной ссылки - одна запись. Повторы удаляются по
+    ключу (остаётся последняя запись), уникальность по самой ссылке больше
+    не нужна.
+
+    :param database: База данных
+    :type database: pw.Database
+
+    :return: None
+    """
+    if not database.table_exists('files_for_bot'):
+        return  # Таблица будет создана по модели вместе с колонкой
+    existing = {i_column.name for i_column in
+                database.get_columns('files_for_bot')}
+    if 'url_key' not in existing:
+        database.execute_sql(
+            'ALTER TABLE "files_for_bot" ADD COLUMN "url_key" VARCHAR(32)'
+        )
+    rows = database.execute_sql(
+        'SELECT id, file_name FROM "files_for_bot"'
+    ).fetchall()
+    for i_id, i_url in rows:
+        database.execute_sql(
+            'UPDATE "files_for_bot" SET url_key = ? WHERE id = ?',
+            (file_url_key(i_url or ''), i_id)
+        )
+    _remove_duplicates(database, 'files_for_bot', 'url_key')
+    database.execute_sql('DROP INDEX IF EXISTS "filesforbot_file_name"')
+    database.execute_sql(
+        'CREATE UNIQUE INDEX IF NOT EXISTS "filesforbot_url_key" '
+        'ON "files_for_bot" ("url_key")'
+    )
+
+
+def _add_crawler_quota(database: pw.Database) -> None:
+    """
+    Миграция 9. Расход суточной квоты обходчика каталога рядом с курсорами
+    обхода.
+
+    :param database: База данных
+    :type database: pw.Database
+
+    :return: None
+    """
+    if not database.table_exists('crawler_state'):
+        return  # Таблица будет создана по модели вместе с колонками
+    existing = {i_column.name for i_column in
+                database.get_columns('crawler_state')}
+    for i_column, i_type in (('quota_day', 'DATE'),
+                             ('quota_used', 'INTEGER NOT NULL DEFAULT 0')):
+        if i_column not in existing:
+            database.execute_sql(
+                f'ALTER TABLE "crawler_state" ADD COLUMN "{i_column}" '
+                f'{i_type}'
+            )
+
+
+def _encode_film_sections(database: pw.Database) -> None:
+    """
+    Миграция 10. Колонки разделов сведений о фильме (текст JSON)
+    переписываются кодеком из настроек, как и ответы сайта (миграция 4).
+
+    :param database: База данных
+    :type database: pw.Database
+
+    :return: None
+    """
+    if database.table_exists('FilmInfo'):
+        encode_film_sections(database)
+
+
+# Миграции по возрастанию номера. Номер последней миграции - версия схемы,
+# которую создают модели. Выполненные миграции не меняются, изменения
+# схемы добавляются новой миграцией в конец списка.
+MIGRATIONS: List[Tuple[int, str, Callable[[pw.Database], None]]] = [
+    (1, 'Индексы для поиска по пользователю, коду и адресу файла',
+     _add_lookup_indexes),
+    (2, 'Счётчики статистики действий пользователей', _add_history_counters),
+    (3, 'Разделы сведений о фильме в отдельных колонках', _add_film_sections),
+    (4, 'Сжатое хранение ответов сайта', _encode_payloads),
+    (5, 'Поиск по названиям фильмов и именам персон', _add_catalog_search),
+    (6, 'Поиск фильмов по фильтру в БД', _add_film_filters),
+    (7, 'Курсоры обхода каталога сайта', _add_crawler_state),
+    (8, 'Уникальный ключ ссылки на файл', _add_file_url_keys),
+    (9, 'Расход квоты обходчика каталога', _add_crawler_quota),
+    (10, 'Сжатое хранение разделов сведений о фильме',
+     _encode_film_sections),
+]
+
+# Миграции, которые переписывают сохранённые записи: после них файл базы
+# данных сжимается
+VACUUM_AFTER = {4, 10}
+
+
+def get_version(database: pw.Database = db) -> int:
+    """
+    Текущая версия схемы базы данных.
+
+    :param database: База данных
+    :type database: pw.Database
+
+    :return: Номер последней выполненной миграции (0 - не выполнялись)
+    :rtype: int
+    """
+    return database.execute_sql('PRAGMA user_version').fetchone()[0]
+
+
+def _set_version(database: pw.Database, version: int) -> None:
+    """
+    Записать версию схемы базы данных.
+
+    :param database: База данных
+    :type database: pw.Database
+    :param version: Номер версии
+    :type version: int
+
+    :return: None
+    """
+    database.execute_sql(f'PRAGMA user_version = {int(version)}')
+
+
+def migrate(database: pw.Database = db,
+            tables: List[Type[pw.Model]] = None) -> int:
+    """
+    Создать таблицы и обновить схему базы данных до последней версии.
+
+    :param database: База данных
+    :type database: pw.Database
+    :param tables: Модели таблиц (по умолчанию все таблицы бота)
+    :type tables: List[Type[pw.Model]]
+
+    :return: Версия схемы после обновления
+    :rtype: int
+    """
+    tables = tables_list if tables is None else tables
+    latest = MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+    existing = set(database.get_tables())
+    if not any(i_table._meta.table_name in existing for i_table in tables):
+        # Новая база данных - схема сразу последней версии
+        with database.atomic():
+            database.create_tables(tables)
+            _set_version(database, latest)
+        log.info('Создана база данных, версия схемы {}'.format(latest))
+        return latest
+
+    version = get_version(database)
+    vacuum = False
+    for i_number, i_description, i_func in MIGRATIONS:
+        if i_number <= version:
+            continue
+        log.info('Миграция базы данных {}: {}'.format(i_number,
+                                                       i_description))
+        with database.atomic():
+            i_func(database)
+            _set_version(database, i_number)
+        version = i_number
+        vacuum = vacuum or i_number in VACUUM_AFTER
+
+    if vacuum:
+        # VACUUM нельзя выполнить внутри транзакции
+        log.info('Сжатие файла базы данных после миграций')
+        database.execute_sql('VACUUM')
+
+    # Таблицы, которых ещё нет в базе данных, создаются по моделям
+    database.create_tables(tables)
+    return version
+
+
+def explain(sql: str, params: Tuple = (),
+            database: pw.Database = db) -> List[str]:
+    """
+    План выполнения запроса.
+
+    :param sql: Текст запроса
+    :type sql: str
+    :param params: Параметры запроса
+    :type params: Tuple
+    :param database: База данных
+    :type database: pw.Database
+
+    :return: Строки плана (SCAN - полный просмотр таблицы, SEARCH ... USING
+        INDEX - поиск по индексу)
+    :rtype: List[str]
+    """
+    cursor = database.execute_sql('EXPLAIN QUERY PLAN ' + sql, params)
+    return [i_row[-1] for i_row in cursor.fetchall()]
+
+
+# Типовые запросы бота для проверки планов выполнения
+_TYPICAL_QUERIES: Dict[str, Tuple[str, Tuple]] = {
+    'История за дату': (
+        'SELECT id, query_string FROM History WHERE id_users = ? AND '
+        'created_at >= ? AND created_at < ?', (1, '2023-01-01', '2023-01-02')
+    ),
+    'Даты истории': (
+        'SELECT DISTINCT substr(created_at, 1, 10) FROM History '
+        'WHERE id_users = ?', (1,)
+    ),
+    'Статистика запросов': (
+        'SELECT action, quantity FROM history_counters WHERE id_users = ? '
+        'AND day IN (?, ?)', (1, '*', '2023-01-01')
+    ),
+    'Фильм по коду': (
+        'SELECT * FROM FilmInfo WHERE data_key = ?', ('1',)
+    ),
+    'Раздел фильма': (
+        'SELECT film_name, rating, votes FROM FilmInfo WHERE data_key = ?',
+        ('1',)
+    ),
+    'Фильмы по истории': (
+        'SELECT * FROM FilmInfo WHERE id_history = ?', (1,)
+    ),
+    'Фильмы по фильтру': (
+        'SELECT data_json FROM FilmInfo WHERE year BETWEEN ? AND ? '
+        'ORDER BY year DESC', (2020, 2023)
+    ),
+    'Фильмы по жанру': (
+        'SELECT film_key FROM film_genres WHERE genre = ?', ('драма',)
+    ),
+    'Персона по коду': (
+        'SELECT * FROM ActorFilms WHERE data_key = ?', ('1',)
+    ),
+    'Файл по адресу': (
+        'SELECT * FROM files_for_bot WHERE url_key = ?', ('0' * 32,)
+    ),
+}
+
+
+def report_query_plans(database: pw.Database = db) -> Dict[str, List[str]]:
+    """
+    Планы выполнения типовых запросов бота. Запросы с полным просмотром
+    таблицы (SCAN) отмечаются в протоколе предупреждением.
+
+    :param database: База данных
+    :type database: pw.Database
+
+    :return: Планы запросов {название: строки плана}
+    :rtype: Dict[str, List[str]]
+    """
+    result = dict()
+    for i_name, (i_sql, i_params) in _TYPICAL_QUERIES.items():
+        plan = explain(i_sql, i_params, database)
+        result[i_name] = plan
+        if any(i_line.startswith('SCAN') for i_line in plan):
+            log.warning('{}: полный просмотр таблицы ({})'.
+                        format(i_name, '; '.join(plan)))
+        else:
+            log.debug('{}: {}'.format(i_name, '; '.join(plan)))
+    return result
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    db.connect(reuse_if_open=True)
+    print('Версия схемы:', migrate())
+    for name, lines in report_query_plans().items():
+        print(name + ':', *lines, sep='\n    ')
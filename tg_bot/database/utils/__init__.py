@@ -2,4 +2,16 @@
 Общие модули для работы с таблицами базы данных.
 
 Модуль 'crud' - содержит классы для создания, чтения, и др. операций с БД
+
+Модуль 'write_behind' - отложенная запись в таблицу (пачками в фоне)
+
+Модуль 'statistics' - счётчики действий пользователей для статистики
+
+Модуль 'history_report' - чтение истории запросов для отчёта
+
+Модуль 'file_registry' - реестр ID файлов телеграм в памяти
+
+Модуль 'search_index' - полнотекстовый поиск фильмов и персон в БД
+
+Модуль 'film_query' - поиск фильмов по фильтру в БД до запроса к сайту
 """
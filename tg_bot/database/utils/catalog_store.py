@@ -0,0 +1,249 @@
+"""
+Модуль записи каталога сайта (фильмы и персоны), который обходит фоновый
+обходчик (site_API.utils.catalog_crawler).
+
+Страница каталога записывается одной вставкой (insert_many) в таблицу
+FilmInfo или ActorFilms в одной транзакции с поисковым индексом, жанрами
+фильмов и курсором обхода (таблица crawler_state). Поэтому после
+перезапуска бота обход продолжается со следующей страницы: записанное не
+теряется и не запрашивается повторно. Вместе с курсором записывается
+расход суточной квоты обходчика (за какой день и сколько запросов), чтобы
+после перезапуска в тот же день квота не начиналась заново. Имеющиеся
+записи не перезаписываются: страница каталога заполняет только пустые
+колонки (ответ сайта о фильме, записанный при запросе пользователя, может
+быть полнее страницы каталога).
+
+
+:Functions
+    save_films - Записать фильмы в таблицу FilmInfo.
+
+    save_persons - Записать персоны в таблицу ActorFilms.
+
+    save_catalog_page - Записать страницу каталога и курсор обхода.
+
+    load_catalog_cursors - Курсоры обхода каталога.
+
+    load_crawler_quota - Расход суточной квоты обходчика.
+
+
+:var
+    CHUNK - Сколько записей вставлять одним запросом.
+"""
+
+from settings import logger
+from datetime import date, datetime
+from typing import Dict, List, Tuple
+
+import peewee as pw
+
+from database.common.models import db, FilmInfo, ActorFilms, CrawlerState
+from database.utils.film_store import film_columns
+from database.utils.search_index import index_films, index_persons
+from database.utils.film_query import index_film_genres
+
+
+# Не больше 32766 параметров в запросе SQLite (около 20 колонок на фильм)
+CHUNK: int = 500
+
+
+def _film_row(data: Dict) -> Dict:
+    """
+    Запись таблицы FilmInfo по ответу сайта о фильме.
+
+    :param data: Ответ сайта о фильме
+    :type data: Dict
+
+    :return: Значения колонок (без id_history)
+    :rtype: Dict
+    """
+    return {
+        'data_key': str(data.get('id')),
+        'data_json': data,
+        'film_type': data.get('type') or '',
+        'film_name': data.get('name') or data.get('alternativeName') or
+        data.get('enName') or '',
+        # Разделы для экранов рейтинга, персон, фактов и т.д.
+        **film_columns(data)
+    }
+
+
+def _person_row(data: Dict) -> Dict:
+    """
+    Запись таблицы ActorFilms по ответу сайта о персоне.
+
+    :param data: Ответ сайта о персоне
+    :type data: Dict
+
+    :return: Значения колонок (без id_history)
+    :rtype: Dict
+    """
+    return {
+        'data_key': str(data.get('id')),
+        'data_json': data,
+        'actor_name': data.get('name') or data.get('enName') or 'None!'
+    }
+
+
+def _upsert(model, rows: List[Dict]) -> None:
+    """
+    Вставить записи, а у записей с тем же кодом сайта (data_key) заполнить
+    только пустые (NULL) колонки.
+
+    :param model: Таблица (FilmInfo или ActorFilms)
+    :param rows: Значения колонок записей (у всех записей одни колонки)
+    :type rows: List[Dict]
+
+    :return: None
+    """
+    if not rows:
+        return
+    update = {
+        getattr(model, i_column): pw.fn.COALESCE(
+            getattr(model, i_column), getattr(pw.EXCLUDED, i_column)
+        ) for i_column in rows[0] if i_column != 'data_key'
+    }
+    for i_start in range(0, len(rows), CHUNK):
+        model.insert_many(rows[i_start:i_start + CHUNK]).on_conflict(
+            conflict_target=[model.data_key], update=update
+        ).execute()
+
+
+def _valid(docs: List[Dict]) -> List[Dict]:
+    """
+    Ответы сайта с кодом записи (остальные не записываются).
+
+    :param docs: Записи страницы каталога
+    :type docs: List[Dict]
+
+    :return: Записи с кодом
+    :rtype: List[Dict]
+    """
+    return [i_doc for i_doc in docs
+            if isinstance(i_doc, dict) and i_doc.get('id')]
+
+
+def save_films(films: List[Dict]) -> int:
+    """
+    Записать фильмы (заполнить пустые колонки имеющихся) в таблицу
+    FilmInfo, поисковый индекс и жанры фильмов.
+
+    :param films: Ответы сайта о фильмах
+    :type films: List[Dict]
+
+    :return: Записано фильмов
+    :rtype: int
+    """
+    films = _valid(films)
+    with db.atomic():
+        _upsert(FilmInfo, [_film_row(i_film) for i_film in films])
+        index_films(films)
+        index_film_genres(films)
+    return len(films)
+
+
+def save_persons(persons: List[Dict]) -> int:
+    """
+    Записать персоны (заполнить пустые колонки имеющихся) в таблицу
+    ActorFilms и поисковый индекс.
+
+    :param persons: Ответы сайта о персонах
+    :type persons: List[Dict]
+
+    :return: Записано персон
+    :rtype: int
+    """
+    persons = _valid(persons)
+    with db.atomic():
+        _upsert(ActorFilms, [_person_row(i_person) for i_person in persons])
+        index_persons(persons)
+    return len(persons)
+
+
+# Вид записей каталога: функция записи
+_SAVERS = {
+    'film': save_films,
+    'person': save_persons,
+}
+
+
+def save_catalog_page(kind: str, docs: List[Dict], cursor: int,
+                      finished: bool, quota_day: date = None,
+                      quota_used: int = 0) -> None:
+    """
+    Записать страницу каталога, курсор обхода и расход суточной квоты
+    обходчика (одной транзакцией).
+
+    :param kind: Вид записей ("film" или "person")
+    :type kind: str
+    :param docs: Записи страницы (ответы сайта)
+    :type docs: List[Dict]
+    :param cursor: Код последней записи страницы
+    :type cursor: int
+    :param finished: Страница последняя (обход каталога закончен)
+    :type finished: bool
+    :param quota_day: День расхода квоты (None - квоту не записывать)
+    :type quota_day: date
+    :param quota_used: Запросов обходчика за этот день
+    :type quota_used: int
+
+    :return: None
+    """
+    now = datetime.now()
+    with db.atomic():
+        saved = _SAVERS[kind](docs)
+        CrawlerState.insert(
+            kind=kind, cursor=cursor, items=saved,
+            finished_at=now if finished else None, updated_at=now
+        ).on_conflict(
+            conflict_target=[CrawlerState.kind],
+            update={CrawlerState.cursor: cursor,
+                    CrawlerState.items: CrawlerState.items + saved,
+                    CrawlerState.finished_at: now if finished else None,
+                    CrawlerState.updated_at: now}
+        ).execute()
+        if quota_day is not None:
+            # Квота общая для всех видов записей
+            CrawlerState.update(quota_day=quota_day,
+                                quota_used=quota_used).execute()
+    log.debug('Каталог {}: записано {}, курсор {}'.format(kind, saved,
+                                                         cursor))
+
+
+def load_catalog_cursors() -> Dict[str, Tuple[int, datetime | None]]:
+    """
+    Курсоры обхода каталога.
+
+    :return: {вид записей: (код последней записанной записи, время
+        окончания полного обхода или None)}
+    :rtype: Dict[str, Tuple[int, datetime | None]]
+    """
+    return {i_state.kind: (i_state.cursor, i_state.finished_at)
+            for i_state in CrawlerState.select()}
+
+
+def load_crawler_quota() -> Tuple[date | None, int]:
+    """
+    Расход суточной квоты обходчика, записанный с последней страницей.
+
+    :return: (день, запросов за день) или (None, 0), если не записан
+    :rtype: Tuple[date | None, int]
+    """
+    state = CrawlerState.select(CrawlerState.quota_day,
+                                CrawlerState.quota_used).\
+        where(CrawlerState.quota_day.is_null(False)).\
+        order_by(CrawlerState.quota_day.desc(),
+                 CrawlerState.quota_used.desc()).first()
+    return (None, 0) if state is None else \
+        (state.quota_day, state.quota_used)
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    save_films()
+    save_persons()
+    save_catalog_page()
+    load_catalog_cursors()
+    load_crawler_quota()
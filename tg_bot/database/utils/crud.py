@@ -1,11 +1,13 @@
 from settings import logger
 
-import json
+import hashlib
 import peewee as pw
 from typing import Dict, List, TypeVar, Any, Tuple
+from urllib.parse import urlsplit, urlunsplit
 
 import database.common.models as models
 from database.common.models import db, UserList, History, ActorFilms
+from database.utils.search_index import index_persons
 
 T = TypeVar("T")
 
@@ -14,18 +16,24 @@ class CRUDInterface:
     Интерфейс для создания и чтения данных в БД
     """
     @classmethod
-    def create(cls, model: T, *data: List[Dict]) -> None:
+    def create(cls, model: T, *data: List[Dict],
+               ignore: bool = False) -> None:
         """
         Записать данные в БД
 
         :param model: Таблица
         :param data: Набор данных для записи
+        :param ignore: Пропустить записи, нарушающие уникальность
+            (например, уже записанный фильм)
 
         :return: None
         """
         # Исключил параметр "param_db: db"
         with db.atomic():
-            model.insert_many(*data).execute()
+            query = model.insert_many(*data)
+            if ignore:
+                query = query.on_conflict_ignore()
+            query.execute()
 
         log.debug('Добавление в таблицу {} записей в количестве {} шт.'.
                   format(model.__name__, len(*data)))
@@ -214,7 +222,6 @@ class TGUsersInterface:
             return
 
         # Мы тут, значит надо записать данные
-        actor_json = json.dumps(actor_info, ensure_ascii=False, indent=4)
         with db.atomic():
             # Получить имя актёра (если нет русского варианта, взять альтернативный)
             actor_name = actor_info.get('name', '')
@@ -224,9 +231,11 @@ class TGUsersInterface:
             # Добавить актёра в БД
             ActorFilms.insert({'id_history': history_id,
                                'data_key': actor_id,
-                               'data_json': actor_json,
+                               'data_json': actor_info,
                                'actor_name': actor_name
-                               }).execute()
+                               }).on_conflict_ignore().execute()
+            # Имя персоны - в поисковый индекс
+            index_persons([actor_info])
         return
 
     @classmethod
@@ -238,6 +247,25 @@ class TGUsersInterface:
         return
 
 
+def file_url_key(file_url: str) -> str:
+    """
+    Ключ ссылки на файл: хеш ссылки без учёта регистра схемы и хоста,
+    пробелов по краям и фрагмента (#...). По ключу ищутся и записываются
+    ID файлов (уникальная колонка FilesForBot.url_key).
+
+    :param file_url: Ссылка на файл
+    :type file_url: str
+
+    :return: Хеш нормализованной ссылки (32 шестнадцатеричные цифры)
+    :rtype: str
+    """
+    parts = urlsplit(file_url.strip())
+    normalized = urlunsplit((parts.scheme.lower(), parts.netloc.lower(),
+                             parts.path, parts.query, ''))
+    return hashlib.blake2b(normalized.encode('utf-8'),
+                           digest_size=16).hexdigest()
+
+
 def get_file_id(file_url: str) -> str:
     """
     Получить ID файла из базы данных.
@@ -248,15 +276,53 @@ def get_file_id(file_url: str) -> str:
     :return: ID файла
     :rtype: str
     """
-    result = ''
-    if file_url:
-        data = models.FilesForBot.get_or_none(
-            models.FilesForBot.file_name == file_url
-        )
-        if data:
-            result = data.file_code
+    return get_file_ids([file_url]).get(file_url, '')
 
-    return result
+
+def get_file_ids(file_urls: List[str]) -> Dict[str, str]:
+    """
+    Получить ID файлов из базы данных одним запросом.
+
+    :param file_urls: Ссылки на файлы
+    :type file_urls: List[str]
+
+    :return: {ссылка: ID файла} для найденных ссылок
+    :rtype: Dict[str, str]
+    """
+    keys: Dict[str, List[str]] = dict()
+    for i_url in file_urls:
+        if i_url:
+            keys.setdefault(file_url_key(i_url), []).append(i_url)
+    if not keys:
+        return dict()
+
+    query = models.FilesForBot.select(models.FilesForBot.url_key,
+                                      models.FilesForBot.file_code).\
+        where(models.FilesForBot.url_key.in_(list(keys))).tuples()
+    with db.atomic():
+        found = list(query)
+    return {i_url: i_file_id for i_key, i_file_id in found
+            for i_url in keys[i_key]}
+
+
+def get_file_type(file_url: str) -> str:
+    """
+    Определить тип файла по URL.
+
+    :param file_url: Ссылка на файл
+    :type file_url: str
+
+    :return: Тип файла (image, video, document, unknown)
+    :rtype: str
+    """
+    if file_url.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.tif')):
+        return 'image'
+    if file_url.lower().endswith(('.avi', '.mpg', '.mpeg', '.mp4', '.mkv')):
+        return 'video'
+    if file_url.lower().endswith(('.doc', '.docx', '.xls', '.xlsx',
+                                  '.rar', '.zip', '.7z', '.ppt')):
+        return 'document'
+    return 'unknown'
 
 
 def save_file_id(file_url: str, file_id: str) -> None:
@@ -270,30 +336,34 @@ def save_file_id(file_url: str, file_id: str) -> None:
 
     :return: None
     """
-    if (not file_url) or (not file_id):
+    save_file_ids({file_url: file_id})
+
+
+def save_file_ids(files: Dict[str, str]) -> None:
+    """
+    Сохранить ID файлов в базу данных одной вставкой.
+
+    :param files: {ссылка на файл: ID файла}
+    :type files: Dict[str, str]
+
+    :return: None
+    """
+    # Готовим структуру для записи в БД (пустые ссылки и ID пропускаем)
+    files_info = {file_url_key(i_url): {'file_type': get_file_type(i_url),
+                                        'file_name': i_url,
+                                        'url_key': file_url_key(i_url),
+                                        'file_code': i_id}
+                  for i_url, i_id in files.items() if i_url and i_id}
+    files_info = list(files_info.values())
+    if not files_info:
         return
 
-    # Определим тип файла по URL
-    if file_url.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.tif')):
-        file_type = 'image'
-    elif file_url.lower().endswith(('.avi', '.mpg', '.mpeg', '.mp4', '.mkv')):
-        file_type = 'video'
-    elif file_url.lower().endswith(('.doc', '.docx', '.xls', '.xlsx',
-                                    '.rar', '.zip', '.7z', '.ppt')):
-        file_type = 'document'
-    else:
-        file_type = 'unknown'
-
-    # Готовим структуру для записи в БД и создаём запись
-    file_info = {
-        'file_type': file_type,
-        'file_name': file_url,
-        'file_code': file_id
-    }
+    # Для уже известной ссылки (в любом написании) запоминаем новый ID
     with db.atomic():
-        models.FilesForBot.insert(file_info).execute()
+        models.FilesForBot.insert_many(files_info).\
+            on_conflict_replace().execute()
+    log.debug('Сохранено ID файлов: {}'.format(len(files_info)))
 
-    return
 
 # Начинаем работу с определения логирования и сообщение в протокол
 log = logger.getLogger(__name__)
@@ -301,5 +371,8 @@ log = logger.getLogger(__name__)
 if __name__ == "__main__":
     CRUDInterface()
     TGUsersInterface()
+    file_url_key()
     get_file_id()
+    get_file_ids()
     save_file_id()
+    save_file_ids()
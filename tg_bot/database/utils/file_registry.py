@@ -0,0 +1,206 @@
+"""
+Модуль реестра ID файлов, загруженных в телеграм (таблица FilesForBot).
+
+Реестр держит в памяти соответствие "ссылка - ID файла" (LRU с ключом
+в виде хеша нормализованной ссылки) и заполняется из таблицы при запуске
+бота. Поиск ID файла - обращение к словарю в памяти. Если таблица не
+поместилась в память целиком, то при промахе ID ищется в базе данных.
+Новые ID записываются в таблицу отложенно (WriteBehind с заменой записи
+с тем же ключом ссылки). Ключ ссылки (crud.file_url_key) один и тот же в
+памяти, в уникальной колонке таблицы и в миграции, которая удаляла
+повторы. Если таблицу пополняют и другие процессы (share), то
+при промахе ID всегда ищется в базе данных.
+
+
+:Classes
+    FileIdRegistry - Реестр ID файлов в памяти.
+"""
+
+from settings import logger
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+
+from database.common.models import db, FilesForBot
+from database.utils.crud import get_file_ids, get_file_type, file_url_key
+from database.utils.write_behind import WriteBehind
+
+
+class FileIdRegistry:
+    """
+    Реестр ID файлов: LRU в памяти и таблица FilesForBot.
+
+    Attributes:
+        __max_size (int): Максимальное количество записей в памяти
+        __writer (WriteBehind): Отложенная запись в таблицу
+        __items (OrderedDict): {ключ ссылки: ID файла}
+        __complete (bool): В памяти вся таблица (промах = нет в БД)
+        __shared (bool): Таблицу пополняют и другие процессы
+        hits, misses, db_hits (int): Счётчики попаданий в память,
+            промахов и найденных в БД
+    """
+
+    def __init__(self, writer: WriteBehind, max_size: int = 10000) -> None:
+        self.__writer: WriteBehind = writer
+        self.__max_size: int = max(1, max_size)
+        self.__items: OrderedDict = OrderedDict()
+        self.__complete: bool = False
+        self.__shared: bool = False
+        self.__lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.db_hits: int = 0
+
+    def share(self) -> None:
+        """
+        Таблицу пополняют и другие процессы: промах в памяти не значит,
+        что ID нет в БД.
+
+        :return: None
+        """
+        with self.__lock:
+            self.__shared = True
+            self.__complete = False
+
+    def load(self) -> None:
+        """
+        Заполнить реестр последними записями таблицы (не больше max_size).
+
+        :return: None
+        """
+        query = FilesForBot.select(FilesForBot.url_key,
+                                   FilesForBot.file_code).\
+            order_by(FilesForBot.id.desc()).limit(self.__max_size + 1).\
+            tuples()
+        with db.atomic():
+            rows = list(query)
+
+        with self.__lock:
+            self.__items.clear()
+            # Последние записи - самые свежие в LRU
+            for i_key, i_file_id in reversed(rows[:self.__max_size]):
+                self.__items[i_key] = i_file_id
+            self.__complete = len(rows) <= self.__max_size and \
+                not self.__shared
+        log.info('Загружено ID файлов: {}{}'.format(
+            len(self.__items), '' if self.__complete else ' (не все)'
+        ))
+
+    def __remember(self, key: str, file_id: str) -> None:
+        """
+        Запомнить ID файла в памяти (блокировка уже взята).
+
+        :param key: Ключ ссылки
+        :type key: str
+        :param file_id: ID файла
+        :type file_id: str
+
+        :return: None
+        """
+        self.__items[key] = file_id
+        self.__items.move_to_end(key)
+        if len(self.__items) > self.__max_size:
+            self.__items.popitem(last=False)
+            # Вытесненные записи остаются только в БД
+            self.__complete = False
+
+    def get_many(self, file_urls: List[str]) -> Dict[str, str]:
+        """
+        Получить ID файлов по ссылкам.
+
+        :param file_urls: Ссылки на файлы
+        :type file_urls: List[str]
+
+        :return: {ссылка: ID файла} для найденных ссылок
+        :rtype: Dict[str, str]
+        """
+        result: Dict[str, str] = dict()
+        absent: List[str] = []
+        with self.__lock:
+            for i_url in file_urls:
+                if not i_url:
+                    continue
+                key = file_url_key(i_url)
+                file_id = self.__items.get(key)
+                if file_id:
+                    self.__items.move_to_end(key)
+                    result[i_url] = file_id
+                    self.hits += 1
+                else:
+                    absent.append(i_url)
+                    self.misses += 1
+            complete = self.__complete
+
+        if absent and not complete:
+            found = get_file_ids(absent)
+            with self.__lock:
+                for i_url, i_file_id in found.items():
+                    self.__remember(file_url_key(i_url), i_file_id)
+                    self.db_hits += 1
+            result.update(found)
+        return result
+
+    def get(self, file_url: str) -> str:
+        """
+        Получить ID файла по ссылке.
+
+        :param file_url: Ссылка на файл
+        :type file_url: str
+
+        :return: ID файла (пустая строка, если файла нет)
+        :rtype: str
+        """
+        return self.get_many([file_url]).get(file_url, '')
+
+    def put_many(self, files: Dict[str, str]) -> None:
+        """
+        Запомнить ID файлов и поставить их в очередь на запись в БД.
+
+        :param files: {ссылка на файл: ID файла}
+        :type files: Dict[str, str]
+
+        :return: None
+        """
+        for i_url, i_file_id in files.items():
+            if not i_url or not i_file_id:
+                continue
+            with self.__lock:
+                key = file_url_key(i_url)
+                if self.__items.get(key) == i_file_id:
+                    continue  # Уже записан
+                self.__remember(key, i_file_id)
+            self.__writer.add({'file_type': get_file_type(i_url),
+                               'file_name': i_url,
+                               'url_key': key,
+                               'file_code': i_file_id})
+
+    def put(self, file_url: str, file_id: str) -> None:
+        """
+        Запомнить ID файла и поставить его в очередь на запись в БД.
+
+        :param file_url: Ссылка на файл
+        :type file_url: str
+        :param file_id: ID файла
+        :type file_id: str
+
+        :return: None
+        """
+        self.put_many({file_url: file_id})
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Вернуть счётчики реестра.
+
+        :return: Размер, попадания в память, промахи, найдено в БД
+        :rtype: Dict[str, int]
+        """
+        return {'size': len(self.__items), 'hits': self.hits,
+                'misses': self.misses, 'db_hits': self.db_hits}
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    FileIdRegistry()
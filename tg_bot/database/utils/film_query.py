@@ -0,0 +1,475 @@
+"""
+Модуль поиска фильмов по фильтру в БД (каталоге бота) до запроса к сайту.
+
+Фильтр поиска фильмов (название, тип, год, рейтинги, возрастной рейтинг,
+жанры - как в запросе к сайту) разбирается в список условий, которые
+выполняются по колонкам таблицы FilmInfo с индексами, таблице жанров
+film_genres и поисковому индексу названий. Запросы к сайту по фильтру
+учитываются в таблице filter_coverage: если сайт вернул все найденные
+фильмы (они записываются в БД при выводе), то этот фильтр и любой более
+узкий (например, с меньшим интервалом лет) выполняются только по БД.
+Иначе к сайту уходит уменьшенный запрос - без фильмов, уже найденных в
+БД (даже если их хватает: в БД может не быть фильмов, которые сайт
+покажет первыми), а результат собирается из обоих списков в порядке
+сайта. Фильтр, который не удалось разобрать (например, неизвестное
+поле), выполняется на сайте как раньше.
+
+
+:Functions
+    parse_filter - Разобрать фильтр в список условий.
+
+    select_films - Найти фильмы по условиям в БД.
+
+    is_covered - Все фильмы по условиям уже есть в БД.
+
+    plan_film_filter - Решить, что искать в БД, а что запросить с сайта.
+
+    merge_film_results - Объединить фильмы из БД и с сайта.
+
+    index_film_genres - Записать жанры фильмов.
+
+    backfill_film_filters - Заполнить колонки фильтра и жанры по
+        сохранённым ответам сайта.
+
+    film_query_stats - Счётчики поиска по фильтру.
+
+
+:Classes
+    FilterPlan - План выполнения фильтра.
+"""
+
+from settings import logger, DatabaseSettings
+import json
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+import peewee as pw
+
+from database.common.models import db, FilmInfo, FilmGenre, \
+    FilterCoverage, CatalogSearch
+from database.common.payload import decode_payload
+from database.utils.film_store import filter_values
+from database.utils.search_index import normalize_text, MIN_QUERY, \
+    fts_phrase
+
+
+# Условие фильтра: (поле фильтра, вид условия, значение)
+Condition = Tuple[str, str, Tuple]
+
+# Поле фильтра с интервалом значений: (колонка FilmInfo, тип значения)
+_RANGE_FIELDS: Dict[str, Tuple[str, type]] = {
+    'year': ('year', int),
+    'rating.kp': ('rating_kp', float),
+    'rating.imdb': ('rating_imdb', float),
+    'ageRating': ('age_rating', int),
+}
+
+# Поля фильтра по названию (ищутся по всем названиям фильма)
+_NAME_FIELDS: Tuple[str, ...] = ('name', 'enName')
+
+# Значение или интервал значений: "2020", "2020-2023", "7,5-10"
+_range = re.compile(r'^\s*(\d+(?:[.,]\d+)?)\s*(?:-\s*(\d+(?:[.,]\d+)?))?\s*$')
+
+_stats: Dict[str, int] = {'covered': 0, 'reduced': 0, 'merged': 0,
+                          'upstream': 0}
+
+
+class FilterPlan(NamedTuple):
+    """
+    План выполнения фильтра.
+
+    Attributes:
+        conditions (List[Condition] | None): Условия фильтра (None - фильтр
+            не разобран и выполняется только на сайте)
+        local (List[Dict]): Фильмы, найденные в БД (ответы сайта)
+        upstream_filter (Dict): Фильтр для запроса к сайту
+        upstream_limit (int): Сколько фильмов запросить с сайта (0 - запрос
+            не нужен)
+        limit (int): Сколько фильмов нужно всего
+    """
+    conditions: List[Condition] | None
+    local: List[Dict]
+    upstream_filter: Dict
+    upstream_limit: int
+    limit: int
+
+
+def _parse_range(value: str, value_type: type) -> Tuple | None:
+    """
+    Разобрать значение или интервал значений.
+
+    :param value: Значение ("2020") или интервал ("2020-2023")
+    :type value: str
+    :param value_type: Тип значений (int или float)
+    :type value_type: type
+
+    :return: (от, до) или None, если значение не разобрано
+    :rtype: Tuple | None
+    """
+    match = _range.match(value)
+    if match is None:
+        return None
+    low = float(match.group(1).replace(',', '.'))
+    high = float((match.group(2) or match.group(1)).replace(',', '.'))
+    low, high = min(low, high), max(low, high)
+    return value_type(low), value_type(high)
+
+
+def parse_filter(param_filter: Dict[str, str | List]) \
+        -> List[Condition] | None:
+    """
+    Разобрать фильтр поиска фильмов (как в запросе к сайту) в список
+    условий. Жанр со знаком "+" обязателен, со знаком "!" исключается,
+    из жанров без знака нужен любой.
+
+    :param param_filter: Фильтр {поле: значение или список значений}
+    :type param_filter: Dict[str, str | List]
+
+    :return: Условия, упорядоченные по полю, или None, если фильтр нельзя
+        выполнить по БД
+    :rtype: List[Condition] | None
+    """
+    conditions = []
+    for i_field, i_value in param_filter.items():
+        values = i_value if isinstance(i_value, list) else [i_value]
+        values = [str(i_item).strip() for i_item in values
+                  if i_item and str(i_item).strip()]
+        if not values:
+            continue  # Пустые значения не попадают и в запрос к сайту
+
+        if i_field in _RANGE_FIELDS:
+            value_range = _parse_range(values[0], _RANGE_FIELDS[i_field][1])
+            if len(values) > 1 or value_range is None:
+                return None
+            conditions.append((i_field, 'range', value_range))
+        elif i_field == 'type':
+            if any(i_item[0] in '!+' for i_item in values):
+                return None
+            conditions.append((i_field, 'in', tuple(sorted(
+                {i_item.lower() for i_item in values}
+            ))))
+        elif i_field in _NAME_FIELDS:
+            name = normalize_text(values[0])
+            if len(values) > 1 or len(name) < MIN_QUERY:
+                return None
+            conditions.append((i_field, 'name', (name,)))
+        elif i_field == 'genres.name':
+            genres = {'any': set(), 'all': set(), 'none': set()}
+            for i_item in values:
+                kind = {'+': 'all', '!': 'none'}.get(i_item[0], 'any')
+                genre = i_item.lstrip('+!').strip().lower()
+                if genre:
+                    genres[kind].add(genre)
+            conditions += [(i_field, i_kind, tuple(sorted(i_genres)))
+                           for i_kind, i_genres in genres.items() if i_genres]
+        else:
+            return None
+    return sorted(conditions)
+
+
+def _signature(conditions: List[Condition]) -> str:
+    """
+    Условия фильтра в виде текста (ключ записи filter_coverage).
+
+    :param conditions: Условия фильтра
+    :type conditions: List[Condition]
+
+    :return: JSON условий
+    :rtype: str
+    """
+    return json.dumps(conditions, ensure_ascii=False, separators=(',', ':'))
+
+
+def _narrower(condition: Condition, other: Condition) -> bool:
+    """
+    Условие не шире другого условия на то же поле (всё, что ему
+    удовлетворяет, удовлетворяет и другому условию).
+
+    :param condition: Условие
+    :type condition: Condition
+    :param other: Другое условие
+    :type other: Condition
+
+    :return: Истина, если условие не шире
+    :rtype: bool
+    """
+    if condition[:2] != other[:2]:
+        return False
+    kind, value, other_value = condition[1], condition[2], other[2]
+    if kind == 'range':
+        return other_value[0] <= value[0] and value[1] <= other_value[1]
+    if kind in ('in', 'any'):
+        return set(value) <= set(other_value)
+    if kind in ('all', 'none'):
+        return set(value) >= set(other_value)
+    return tuple(value) == tuple(other_value)
+
+
+def is_covered(conditions: List[Condition]) -> bool:
+    """
+    Все фильмы по условиям уже есть в БД: есть недавний запрос к сайту, по
+    которому получены все найденные фильмы, с условиями не уже данных.
+
+    :param conditions: Условия фильтра
+    :type conditions: List[Condition]
+
+    :return: Истина, если фильтр можно выполнить только по БД
+    :rtype: bool
+    """
+    fresh = datetime.now() - timedelta(seconds=_coverage_ttl)
+    with db.atomic():
+        signatures = [i_row[0] for i_row in FilterCoverage.
+                      select(FilterCoverage.signature).
+                      where(FilterCoverage.complete,
+                            FilterCoverage.updated_at >= fresh).tuples()]
+    for i_signature in signatures:
+        covered = [tuple(i_item[:2]) + (tuple(i_item[2]),)
+                   for i_item in json.loads(i_signature)]
+        if all(any(_narrower(i_condition, i_covered)
+                   for i_condition in conditions)
+               for i_covered in covered):
+            return True
+    return False
+
+
+def select_films(conditions: List[Condition], limit: int) -> List[Dict]:
+    """
+    Найти фильмы по условиям в БД. Порядок - как у сайта: сначала новые,
+    затем по рейтингу Кинопоиска, затем по названию.
+
+    :param conditions: Условия фильтра
+    :type conditions: List[Condition]
+    :param limit: Сколько фильмов вернуть
+    :type limit: int
+
+    :return: Ответы сайта о найденных фильмах
+    :rtype: List[Dict]
+    """
+    query = FilmInfo.select(FilmInfo.data_json).\
+        where(FilmInfo.data_json.is_null(False))
+    for i_field, i_kind, i_value in conditions:
+        if i_kind == 'range':
+            column = getattr(FilmInfo, _RANGE_FIELDS[i_field][0])
+            query = query.where(column.between(*i_value))
+        elif i_kind == 'in':
+            query = query.where(FilmInfo.film_type.in_(list(i_value)))
+        elif i_kind == 'name':
+            query = query.where(FilmInfo.data_key.in_(
+                CatalogSearch.select(CatalogSearch.data_key).
+                where(CatalogSearch.match(fts_phrase(i_value[0])),
+                      CatalogSearch.kind == 'film')
+            ))
+        elif i_kind == 'any':
+            query = query.where(FilmInfo.data_key.in_(
+                FilmGenre.select(FilmGenre.film_key).
+                where(FilmGenre.genre.in_(list(i_value)))
+            ))
+        elif i_kind == 'all':
+            for i_genre in i_value:
+                query = query.where(FilmInfo.data_key.in_(
+                    FilmGenre.select(FilmGenre.film_key).
+                    where(FilmGenre.genre == i_genre)
+                ))
+        elif i_kind == 'none':
+            query = query.where(FilmInfo.data_key.not_in(
+                FilmGenre.select(FilmGenre.film_key).
+                where(FilmGenre.genre.in_(list(i_value)))
+            ))
+    query = query.order_by(FilmInfo.year.desc(), FilmInfo.rating_kp.desc(),
+                           FilmInfo.film_name).limit(limit)
+    with db.atomic():
+        return [i_data for (i_data,) in query.tuples()
+                if isinstance(i_data, dict)]
+
+
+def plan_film_filter(param_filter: Dict[str, str | List],
+                     limit: int) -> FilterPlan:
+    """
+    Решить, что искать в БД, а что запросить с сайта. Запрос к сайту не
+    нужен, только если в БД есть все фильмы по фильтру (is_covered).
+    Иначе фильмы из БД исключаются из запроса к сайту: сайт вернёт limit
+    лучших из остальных, и вместе с фильмами из БД получатся limit
+    лучших фильмов по фильтру.
+
+    :param param_filter: Фильтр поиска фильмов (как в запросе к сайту)
+    :type param_filter: Dict[str, str | List]
+    :param limit: Сколько фильмов нужно
+    :type limit: int
+
+    :return: План выполнения фильтра
+    :rtype: FilterPlan
+    """
+    conditions = parse_filter(param_filter)
+    if conditions is None:
+        _stats['upstream'] += 1
+        return FilterPlan(None, [], dict(param_filter), limit, limit)
+
+    local = select_films(conditions, limit)
+    if is_covered(conditions):
+        _stats['covered'] += 1
+        return FilterPlan(conditions, local, dict(), 0, limit)
+
+    # С сайта - без фильмов, найденных в БД (фильмы из БД могут быть не
+    # лучшими по фильтру, поэтому запрос нужен, даже если их хватает)
+    _stats['reduced'] += 1
+    upstream_filter = dict(param_filter)
+    excluded = [f'!{i_data["id"]}' for i_data in local if i_data.get('id')]
+    if excluded:
+        upstream_filter['id'] = excluded
+    return FilterPlan(conditions, local, upstream_filter, limit, limit)
+
+
+def _site_order(data: Dict) -> Tuple:
+    """
+    Ключ сортировки фильмов как у сайта (год и рейтинг Кинопоиска по
+    убыванию, название по возрастанию).
+
+    :param data: Ответ сайта о фильме
+    :type data: Dict
+
+    :return: Ключ сортировки
+    :rtype: Tuple
+    """
+    values = filter_values(data)
+    return (-(values['year'] or 0), -(values['rating_kp'] or 0),
+            str(data.get('name') or ''))
+
+
+def merge_film_results(plan: FilterPlan, docs: List[Dict],
+                       total: Any = None) -> List[Dict]:
+    """
+    Объединить фильмы из БД с фильмами, полученными с сайта по плану, и
+    учесть запрос к сайту. Если сайт вернул все найденные фильмы, то
+    фильтр считается выполнимым по БД (фильмы с сайта записываются в БД
+    при выводе).
+
+    :param plan: План выполнения фильтра
+    :type plan: FilterPlan
+    :param docs: Фильмы с сайта (поле docs ответа)
+    :type docs: List[Dict]
+    :param total: Сколько фильмов нашлось на сайте (поле total ответа)
+    :type total: Any
+
+    :return: Фильмы в порядке сайта (не больше, чем нужно по плану)
+    :rtype: List[Dict]
+    """
+    seen = {str(i_data.get('id')) for i_data in plan.local}
+    docs = [i_data for i_data in docs if isinstance(i_data, dict) and
+            str(i_data.get('id')) not in seen]
+
+    if plan.conditions is not None and isinstance(total, (int, float)):
+        with db.atomic():
+            FilterCoverage.insert(
+                signature=_signature(plan.conditions),
+                total=len(plan.local) + int(total),
+                fetched=len(plan.local) + len(docs),
+                complete=int(total) <= len(docs),
+                updated_at=datetime.now()
+            ).on_conflict_replace().execute()
+    if plan.conditions is not None:
+        _stats['merged'] += 1
+
+    return sorted(plan.local + docs, key=_site_order)[:plan.limit]
+
+
+def index_film_genres(films: Iterable[Dict]) -> int:
+    """
+    Записать жанры фильмов (вместе с записью в таблицу FilmInfo).
+
+    :param films: Ответы сайта о фильмах
+    :type films: Iterable[Dict]
+
+    :return: Записано жанров
+    :rtype: int
+    """
+    rows = [{'film_key': str(i_film.get('id')),
+             'genre': str(i_genre.get('name')).lower()}
+            for i_film in films if isinstance(i_film, dict) and
+            i_film.get('id')
+            for i_genre in i_film.get('genres') or []
+            if isinstance(i_genre, dict) and i_genre.get('name')]
+    if rows:
+        with db.atomic():
+            FilmGenre.insert_many(rows).on_conflict_ignore().execute()
+    return len(rows)
+
+
+def backfill_film_filters(database: pw.Database = db,
+                          chunk: int = 500) -> None:
+    """
+    Заполнить колонки фильтра и жанры фильмов по сохранённым ответам
+    сайта (при миграции). Ответы читаются частями.
+
+    :param database: База данных
+    :type database: pw.Database
+    :param chunk: Сколько записей читать за раз
+    :type chunk: int
+
+    :return: None
+    """
+    if not database.table_exists('FilmInfo'):
+        return
+    columns = list(filter_values(dict()))
+    assignments = ', '.join(f'"{i_column}" = ?' for i_column in columns)
+    now = datetime.now()
+    last_id = 0
+    updated = 0
+    while True:
+        records = database.execute_sql(
+            'SELECT id, data_key, data_json FROM "FilmInfo" '
+            'WHERE id > ? ORDER BY id LIMIT ?', (last_id, chunk)
+        ).fetchall()
+        if not records:
+            break
+        values, genres = [], []
+        for i_id, i_key, i_value in records:
+            try:
+                data = decode_payload(i_value)
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                continue
+            values.append(tuple(filter_values(data).values()) + (i_id,))
+            genres += [(now, str(i_key), str(i_genre.get('name')).lower())
+                       for i_genre in data.get('genres') or []
+                       if isinstance(i_genre, dict) and i_genre.get('name')]
+        database.cursor().executemany(
+            f'UPDATE "FilmInfo" SET {assignments} WHERE id = ?', values
+        )
+        database.cursor().executemany(
+            'INSERT OR IGNORE INTO film_genres (created_at, film_key, genre) '
+            'VALUES (?, ?, ?)', genres
+        )
+        updated += len(values)
+        last_id = records[-1][0]
+    log.info('Заполнены колонки фильтра фильмов: {}'.format(updated))
+
+
+def film_query_stats() -> Dict[str, int]:
+    """
+    Вернуть счётчики поиска по фильтру.
+
+    :return: Выполнено по БД (все фильмы в БД), с уменьшенным запросом к
+        сайту, объединено с ответом сайта, только на сайте
+    :rtype: Dict[str, int]
+    """
+    return dict(_stats)
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+# Сколько времени (сек) запрос к сайту по фильтру считается актуальным
+_coverage_ttl: float = DatabaseSettings().filter_coverage_ttl
+
+
+if __name__ == "__main__":
+    parse_filter()
+    select_films()
+    is_covered()
+    plan_film_filter()
+    merge_film_results()
+    index_film_genres()
+    backfill_film_filters()
+    film_query_stats()
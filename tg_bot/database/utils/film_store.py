@@ -0,0 +1,231 @@
+"""
+Модуль хранения сведений о фильмах по разделам.
+
+Ответ сайта о фильме хранится целиком (FilmInfo.data_json) для экрана
+с описанием фильма, а разделы, которые выводятся отдельными кнопками
+(рейтинг, персоны, факты, трейлеры, похожие фильмы, компании), - ещё и
+в своих колонках (тем же кодеком, что и весь ответ, см.
+database.common.payload). Экран раздела читает из БД только название
+фильма и колонки своего раздела, без разбора всего ответа. Поля, по
+которым ищут фильмы по фильтру (год, рейтинги, возрастной рейтинг), тоже
+хранятся в своих колонках (с индексами).
+
+
+:Functions
+    film_columns - Значения колонок разделов для записи фильма.
+
+    filter_values - Значения колонок фильтра для записи фильма.
+
+    load_film_section - Прочитать из БД раздел сведений о фильме.
+
+    backfill_film_sections - Заполнить колонки разделов по сохранённым
+        ответам сайта.
+
+    encode_film_sections - Переписать колонки разделов кодеком ответов.
+
+
+:var
+    FILM_COLUMNS - Поле ответа сайта: колонка таблицы FilmInfo.
+
+    FILM_SECTIONS - Раздел (экран бота): поля ответа сайта.
+
+    FILTER_COLUMNS - Колонка фильтра таблицы FilmInfo: путь к полю ответа
+        сайта и тип значения.
+"""
+
+from settings import logger
+from typing import Any, Callable, Dict, Tuple
+
+import peewee as pw
+
+from database.common.models import db, FilmInfo
+from database.common.payload import encode_payload, decode_payload
+
+
+# Поле ответа сайта: колонка таблицы FilmInfo
+FILM_COLUMNS: Dict[str, str] = {
+    'rating': 'rating',
+    'votes': 'votes',
+    'genres': 'genres',
+    'countries': 'countries',
+    'persons': 'persons',
+    'facts': 'facts',
+    'videos': 'videos',
+    'similarMovies': 'similar_movies',
+    'productionCompanies': 'production_companies',
+}
+
+# Раздел (экран бота): поля ответа сайта, которые нужны этому экрану
+FILM_SECTIONS: Dict[str, Tuple[str, ...]] = {
+    'rating': ('rating', 'votes'),
+    'companies': ('productionCompanies',),
+    'persons': ('persons',),
+    'facts': ('facts',),
+    'trailers': ('videos',),
+    'similar': ('similarMovies',),
+}
+
+# Колонка фильтра таблицы FilmInfo: (путь к полю ответа сайта, тип)
+FILTER_COLUMNS: Dict[str, Tuple[Tuple[str, ...], Callable]] = {
+    'year': (('year',), int),
+    'rating_kp': (('rating', 'kp'), float),
+    'rating_imdb': (('rating', 'imdb'), float),
+    'age_rating': (('ageRating',), int),
+}
+
+
+def filter_values(data: Dict) -> Dict[str, int | float | None]:
+    """
+    Значения колонок фильтра для записи фильма в таблицу FilmInfo.
+
+    :param data: Ответ сайта о фильме
+    :type data: Dict
+
+    :return: {колонка: значение или None, если поля нет в ответе}
+    :rtype: Dict[str, int | float | None]
+    """
+    result = dict()
+    for i_column, (i_path, i_type) in FILTER_COLUMNS.items():
+        value = data
+        for i_key in i_path:
+            value = value.get(i_key) if isinstance(value, dict) else None
+        try:
+            result[i_column] = None if value is None else i_type(value)
+        except (TypeError, ValueError):
+            result[i_column] = None
+    return result
+
+
+def film_columns(data: Dict) -> Dict[str, Any]:
+    """
+    Значения колонок разделов и фильтра для записи фильма в таблицу
+    FilmInfo.
+
+    :param data: Ответ сайта о фильме
+    :type data: Dict
+
+    :return: {колонка: раздел (значение поля фильтра) или None, если
+        раздела (поля) нет}
+    :rtype: Dict[str, Any]
+    """
+    result = {i_column: data.get(i_field)
+              for i_field, i_column in FILM_COLUMNS.items()}
+    result.update(filter_values(data))
+    return result
+
+
+def load_film_section(film_key: str, section: str) -> Dict | None:
+    """
+    Прочитать из БД раздел сведений о фильме (только нужные колонки).
+
+    :param film_key: Код (ID) фильма на сайте
+    :type film_key: str
+    :param section: Раздел (ключ FILM_SECTIONS)
+    :type section: str
+
+    :return: Сведения в виде ответа сайта, но только с названием фильма
+        и полями раздела, или None, если фильма нет в БД
+    :rtype: Dict | None
+
+    :exception KeyError: Если раздел неизвестен
+    """
+    fields = FILM_SECTIONS[section]
+    columns = [getattr(FilmInfo, FILM_COLUMNS[i_field]) for i_field in fields]
+    with db.atomic():
+        row = FilmInfo.select(FilmInfo.film_name, *columns).\
+            where(FilmInfo.data_key == film_key).tuples().first()
+    if row is None:
+        return None
+
+    result = {'name': row[0]}
+    for i_field, i_value in zip(fields, row[1:]):
+        if i_value is not None:
+            result[i_field] = i_value
+    return result
+
+
+def backfill_film_sections(database: pw.Database = db) -> None:
+    """
+    Заполнить колонки разделов по сохранённым ответам сайта (при миграции).
+    Разбор JSON выполняется самой SQLite (json_extract), а сохранённые
+    ответы о фильмах и персонах переписываются без отступов (json).
+
+    :param database: База данных
+    :type database: pw.Database
+
+    :return: None
+    """
+    columns = ', '.join(
+        f'"{i_column}" = json_extract(data_json, \'$.{i_field}\')'
+        for i_field, i_column in FILM_COLUMNS.items()
+    )
+    cursor = database.execute_sql(
+        f'UPDATE FilmInfo SET {columns}, data_json = json(data_json) '
+        f'WHERE json_valid(data_json)'
+    )
+    log.info('Заполнены разделы фильмов: {}'.format(cursor.rowcount))
+    if database.table_exists('ActorFilms'):
+        database.execute_sql(
+            'UPDATE ActorFilms SET data_json = json(data_json) '
+            'WHERE json_valid(data_json)'
+        )
+
+
+def encode_film_sections(database: pw.Database = db,
+                         chunk: int = 500) -> int:
+    """
+    Переписать колонки разделов (текст JSON) кодеком ответов сайта (при
+    миграции). Уже записанные кодеком значения не меняются.
+
+    :param database: База данных
+    :type database: pw.Database
+    :param chunk: Сколько фильмов переписывать за один запрос
+    :type chunk: int
+
+    :return: Переписано фильмов
+    :rtype: int
+    """
+    columns = list(FILM_COLUMNS.values())
+    names = ', '.join(f'"{i_column}"' for i_column in columns)
+    assignments = ', '.join(f'"{i_column}" = ?' for i_column in columns)
+    updated = 0
+    last_id = 0
+    while True:
+        rows = database.execute_sql(
+            f'SELECT id, {names} FROM "FilmInfo" WHERE id > ? '
+            f'ORDER BY id LIMIT ?', (last_id, chunk)
+        ).fetchall()
+        if not rows:
+            break
+        values = []
+        for i_row in rows:
+            if not any(isinstance(i_value, str) for i_value in i_row[1:]):
+                continue
+            try:
+                values.append(tuple(
+                    encode_payload(decode_payload(i_value))
+                    if isinstance(i_value, str) else i_value
+                    for i_value in i_row[1:]
+                ) + (i_row[0],))
+            except ValueError:
+                log.warning('Разделы фильма {} не разобраны, оставлены без '
+                            'изменений'.format(i_row[0]))
+        database.cursor().executemany(
+            f'UPDATE "FilmInfo" SET {assignments} WHERE id = ?', values
+        )
+        updated += len(values)
+        last_id = rows[-1][0]
+    log.info('Переписаны разделы фильмов: {}'.format(updated))
+    return updated
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    filter_values()
+    film_columns()
+    load_film_section()
+    backfill_film_sections()
+    encode_film_sections()
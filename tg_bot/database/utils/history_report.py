@@ -0,0 +1,195 @@
+"""
+Модуль чтения истории запросов пользователя для отчёта.
+
+История читается страницами (за день, после заданного кода записи), а
+названия фильмов и имена персон для всех записей страницы получаются
+одним запросом IN (...) на каждую таблицу, а не запросом на каждую запись.
+
+
+:Functions
+    get_history_page - Страница истории пользователя за день.
+
+    get_history_days - Последние дни, за которые есть история пользователя.
+
+    get_film_names_by_history - Названия фильмов по кодам записей истории.
+
+    get_film_names_by_keys - Названия фильмов по кодам сайта.
+
+    get_actor_names_by_keys - Имена персон по кодам сайта.
+"""
+
+from settings import logger
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+import peewee as pw
+
+from database.common.models import db, History, FilmInfo, ActorFilms
+
+
+def _next_day(day: str) -> str:
+    """
+    Следующий день для даты ГГГГ-ММ-ДД.
+
+    :param day: Дата
+    :type day: str
+
+    :return: Дата следующего дня
+    :rtype: str
+
+    :exception ValueError: Если дата указана неверно
+    """
+    return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+
+def get_history_page(user_id: int | str, day: str, after_id: int = 0,
+                     limit: int = 30) \
+        -> Tuple[List[Tuple[int, str, str]], int | None]:
+    """
+    Страница истории пользователя за день (по возрастанию кода записи).
+
+    :param user_id: ID пользователя в телеграм
+    :type user_id: int | str
+    :param day: Дата ГГГГ-ММ-ДД
+    :type day: str
+    :param after_id: Код записи, после которой начинается страница
+    :type after_id: int
+    :param limit: Количество записей на странице
+    :type limit: int
+
+    :return: Записи (код, время ЧЧ:ММ:СС, строка запроса) и код последней
+        записи страницы, если есть следующая страница (иначе None)
+    :rtype: Tuple[List[Tuple[int, str, str]], int | None]
+
+    :exception ValueError: Если дата указана неверно
+    """
+    query = History.select(
+        History.id, pw.fn.substr(History.created_at, 12, 8),
+        History.query_string
+    ).where(
+        (History.id_users == int(user_id)) &
+        (History.created_at >= day) &
+        (History.created_at < _next_day(day)) &
+        (History.id > after_id)
+    ).order_by(History.id).limit(limit + 1).tuples()
+
+    with db.atomic():
+        records = list(query)
+    if len(records) > limit:
+        records = records[:limit]
+        return records, records[-1][0]
+    return records, None
+
+
+def get_history_days(user_id: int | str, limit: int = 16) -> List[str]:
+    """
+    Последние дни (по убыванию), за которые есть история пользователя.
+    Каждый день находится одним поиском по индексу (id_users, created_at),
+    без просмотра всей истории пользователя.
+
+    :param user_id: ID пользователя в телеграм
+    :type user_id: int | str
+    :param limit: Сколько дней вернуть
+    :type limit: int
+
+    :return: Даты ГГГГ-ММ-ДД
+    :rtype: List[str]
+    """
+    result = []
+    # Дата, а не число: иначе при сравнении с колонкой дат (числовой тип
+    # колонки) строка будет преобразована в число
+    before = '9999-12-31'
+    with db.atomic():
+        while len(result) < limit:
+            last = History.select(pw.fn.MAX(History.created_at)).where(
+                (History.id_users == int(user_id)) &
+                (History.created_at < before)
+            ).scalar()
+            if not last:
+                break
+            before = str(last)[:10]
+            result.append(before)
+    return result
+
+
+def _names(query: pw.ModelSelect) -> Dict[str, List[str]]:
+    """
+    Сгруппировать пары (ключ, имя) по ключу.
+
+    :param query: Запрос, возвращающий пары (ключ, имя)
+    :type query: pw.ModelSelect
+
+    :return: {ключ: [имена]}
+    :rtype: Dict[str, List[str]]
+    """
+    result: Dict[str, List[str]] = dict()
+    with db.atomic():
+        for i_key, i_name in query.tuples():
+            result.setdefault(str(i_key), []).append(i_name)
+    return result
+
+
+def get_film_names_by_history(history_ids: Iterable[int]) \
+        -> Dict[str, List[str]]:
+    """
+    Названия фильмов, полученных по записям истории.
+
+    :param history_ids: Коды записей истории
+    :type history_ids: Iterable[int]
+
+    :return: {код записи истории: [названия фильмов]}
+    :rtype: Dict[str, List[str]]
+    """
+    history_ids = list(set(history_ids))
+    if not history_ids:
+        return dict()
+    return _names(FilmInfo.select(FilmInfo.id_history, FilmInfo.film_name).
+                  where(FilmInfo.id_history.in_(history_ids)))
+
+
+def get_film_names_by_keys(film_keys: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    Названия фильмов по кодам фильмов на сайте.
+
+    :param film_keys: Коды фильмов
+    :type film_keys: Iterable[str]
+
+    :return: {код фильма: [название фильма]}
+    :rtype: Dict[str, List[str]]
+    """
+    film_keys = list(set(film_keys))
+    if not film_keys:
+        return dict()
+    return _names(FilmInfo.select(FilmInfo.data_key, FilmInfo.film_name).
+                  where(FilmInfo.data_key.in_(film_keys)))
+
+
+def get_actor_names_by_keys(actor_keys: Iterable[str]) \
+        -> Dict[str, List[str]]:
+    """
+    Имена персон по кодам персон на сайте.
+
+    :param actor_keys: Коды персон
+    :type actor_keys: Iterable[str]
+
+    :return: {код персоны: [имя персоны]}
+    :rtype: Dict[str, List[str]]
+    """
+    actor_keys = list(set(actor_keys))
+    if not actor_keys:
+        return dict()
+    return _names(ActorFilms.select(ActorFilms.data_key,
+                                    ActorFilms.actor_name).
+                  where(ActorFilms.data_key.in_(actor_keys)))
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    get_history_page()
+    get_history_days()
+    get_film_names_by_history()
+    get_film_names_by_keys()
+    get_actor_names_by_keys()
@@ -0,0 +1,414 @@
+"""
+Модуль полнотекстового поиска по каталогу бота (фильмы и персоны,
+сохранённые в БД).
+
+Названия фильмов (FilmInfo.film_name и альтернативные названия из ответа
+сайта) и имена персон (ActorFilms.actor_name и имя на английском)
+записываются в индекс FTS5 с триграммами (таблица catalog_search) вместе с
+записью фильма или персоны. Поиск выполняется в два шага: сначала по
+вхождению строки запроса (в том числе начало названия), затем, если
+найдено мало, по общим триграммам - так находятся названия с опечатками.
+Найденные варианты упорядочиваются по похожести на запрос: точное
+совпадение, совпадение с частью названия из того же числа слов, и т.д.
+
+Проверить поиск по текущей БД:
+    python -m database.utils.search_index "матрица"
+
+
+:Functions
+    normalize_text - Текст для индекса и запроса.
+
+    fts_phrase - Строка запроса FTS5 в кавычках.
+
+    index_films - Записать фильмы в индекс.
+
+    index_persons - Записать персоны в индекс.
+
+    rebuild_index - Заполнить индекс по таблицам FilmInfo и ActorFilms.
+
+    search_catalog - Найти фильмы и персоны по тексту.
+
+    search_stats - Счётчики поиска.
+
+
+:Classes
+    SearchHit - Найденный фильм или персона.
+
+
+:var
+    MIN_QUERY, MAX_QUERY - Наименьшая и наибольшая длина запроса
+        (символов, запрос длиннее наибольшей длины обрезается).
+
+    MIN_SCORE - Наименьшая похожесть названия на запрос.
+
+    CANDIDATES - Сколько вариантов из индекса сравнивать с запросом.
+"""
+
+from settings import logger
+import re
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+import peewee as pw
+
+from database.common.models import db, CatalogSearch
+from database.common.payload import decode_payload
+
+
+MIN_QUERY: int = 3
+MAX_QUERY: int = 64
+MIN_SCORE: float = 0.75
+CANDIDATES: int = 100
+
+# Вид записи: добавка к коду строки индекса (код сайта * 2 + добавка)
+_KINDS: Dict[str, int] = {'film': 0, 'person': 1}
+
+_not_word = re.compile(r'[\W_]+')
+
+_stats: Dict[str, int] = {'searches': 0, 'found': 0, 'missed': 0,
+                          'indexed': 0}
+
+
+class SearchHit(NamedTuple):
+    """
+    Найденный фильм или персона.
+
+    Attributes:
+        kind (str): "film" или "person"
+        data_key (str): Код (ключ) записи из API сайта
+        title (str): Название (имя) для вывода
+        year (str): Год выхода фильма (для персоны пусто)
+        score (float): Похожесть на запрос (1.0 - точное совпадение)
+    """
+    kind: str
+    data_key: str
+    title: str
+    year: str
+    score: float
+
+
+def normalize_text(text: str) -> str:
+    """
+    Текст для индекса и запроса: нижний регистр, "ё" как "е", знаки
+    препинания - пробелы.
+
+    :param text: Текст
+    :type text: str
+
+    :return: Нормализованный текст
+    :rtype: str
+    """
+    text = _not_word.sub(' ', str(text).lower().replace('ё', 'е'))
+    return ' '.join(text.split())
+
+
+def _row(kind: str, data_key: str, title: str, names: Iterable[str],
+         year: str = '') -> Tuple | None:
+    """
+    Строка индекса.
+
+    :param kind: "film" или "person"
+    :type kind: str
+    :param data_key: Код (ключ) записи из API сайта
+    :type data_key: str
+    :param title: Название (имя) для вывода
+    :type title: str
+    :param names: Все названия (имена)
+    :type names: Iterable[str]
+    :param year: Год выхода фильма
+    :type year: str
+
+    :return: (код строки, названия, вид, код сайта, название, год) или
+        None, если код сайта не число или нет названий
+    :rtype: Tuple | None
+    """
+    data_key = str(data_key or '')
+    if not data_key.isdigit():
+        return None
+    unique = dict.fromkeys(i_name for i_name in map(normalize_text, names)
+                           if i_name)
+    if not unique:
+        return None
+    return (int(data_key) * 2 + _KINDS[kind], '\n'.join(unique), kind,
+            data_key, title or next(iter(unique)), str(year or ''))
+
+
+def _film_row(data: Dict, film_name: str = '') -> Tuple | None:
+    """
+    Строка индекса для фильма.
+
+    :param data: Ответ сайта о фильме
+    :type data: Dict
+    :param film_name: Название фильма из таблицы FilmInfo
+    :type film_name: str
+
+    :return: Строка индекса или None
+    :rtype: Tuple | None
+    """
+    names = [film_name, data.get('name'), data.get('enName'),
+             data.get('alternativeName')]
+    names += [i_item.get('name') for i_item in data.get('names') or []
+              if isinstance(i_item, dict)]
+    names = [i_name for i_name in names if isinstance(i_name, str) and
+             i_name.strip()]
+    title = next(iter(names), '')
+    return _row('film', data.get('id'), title, names, data.get('year'))
+
+
+def _person_row(data: Dict, actor_name: str = '') -> Tuple | None:
+    """
+    Строка индекса для персоны.
+
+    :param data: Ответ сайта о персоне
+    :type data: Dict
+    :param actor_name: Имя из таблицы ActorFilms
+    :type actor_name: str
+
+    :return: Строка индекса или None
+    :rtype: Tuple | None
+    """
+    names = [i_name for i_name in (actor_name, data.get('name'),
+                                   data.get('enName'))
+             if isinstance(i_name, str) and i_name.strip()]
+    title = next(iter(names), '')
+    return _row('person', data.get('id', data.get('actor_id')), title, names)
+
+
+def _write(rows: List[Tuple], database: pw.Database = db) -> int:
+    """
+    Записать строки в индекс (строка с тем же кодом заменяется).
+
+    :param rows: Строки индекса (None пропускаются)
+    :type rows: List[Tuple]
+    :param database: База данных
+    :type database: pw.Database
+
+    :return: Записано строк
+    :rtype: int
+    """
+    rows = [i_row for i_row in rows if i_row is not None]
+    if not rows:
+        return 0
+    with database.atomic():
+        database.cursor().executemany(
+            'INSERT OR REPLACE INTO catalog_search '
+            '(rowid, names, kind, data_key, title, year) '
+            'VALUES (?, ?, ?, ?, ?, ?)', rows
+        )
+    _stats['indexed'] += len(rows)
+    return len(rows)
+
+
+def index_films(films: Iterable[Dict]) -> int:
+    """
+    Записать фильмы в индекс (вместе с записью в таблицу FilmInfo).
+
+    :param films: Ответы сайта о фильмах
+    :type films: Iterable[Dict]
+
+    :return: Записано строк
+    :rtype: int
+    """
+    return _write([_film_row(i_film) for i_film in films
+                   if isinstance(i_film, dict)])
+
+
+def index_persons(persons: Iterable[Dict]) -> int:
+    """
+    Записать персоны в индекс (вместе с записью в таблицу ActorFilms).
+
+    :param persons: Ответы сайта о персонах
+    :type persons: Iterable[Dict]
+
+    :return: Записано строк
+    :rtype: int
+    """
+    return _write([_person_row(i_person) for i_person in persons
+                   if isinstance(i_person, dict)])
+
+
+def rebuild_index(database: pw.Database = db, chunk: int = 500) -> int:
+    """
+    Заполнить индекс по таблицам FilmInfo и ActorFilms (при миграции).
+    Ответы сайта читаются и записываются в индекс частями.
+
+    :param database: База данных
+    :type database: pw.Database
+    :param chunk: Сколько записей читать за раз
+    :type chunk: int
+
+    :return: Записано строк
+    :rtype: int
+    """
+    sources = (('FilmInfo', 'film_name', _film_row),
+               ('ActorFilms', 'actor_name', _person_row))
+    total = 0
+    for i_table, i_column, i_make_row in sources:
+        if not database.table_exists(i_table):
+            continue
+        last_id = 0
+        while True:
+            records = database.execute_sql(
+                f'SELECT id, data_key, "{i_column}", data_json '
+                f'FROM "{i_table}" WHERE id > ? ORDER BY id LIMIT ?',
+                (last_id, chunk)
+            ).fetchall()
+            if not records:
+                break
+            rows = []
+            for i_id, i_key, i_name, i_value in records:
+                try:
+                    data = decode_payload(i_value) or dict()
+                except ValueError:
+                    data = dict()
+                if not isinstance(data, dict):
+                    data = dict()
+                data.setdefault('id', i_key)
+                rows.append(i_make_row(data, i_name or ''))
+            total += _write(rows, database)
+            last_id = records[-1][0]
+    log.info('Записано в поисковый индекс: {}'.format(total))
+    return total
+
+
+def fts_phrase(text: str) -> str:
+    """
+    Строка запроса FTS5 в кавычках (без разбора операторов).
+
+    :param text: Текст
+    :type text: str
+
+    :return: Строка в кавычках
+    :rtype: str
+    """
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _score(query: str, names: str) -> float:
+    """
+    Похожесть названий записи на запрос: лучшая из похожести на название
+    целиком и на часть названия из того же числа слов, что и запрос.
+    Часть названия, которая начинается с запроса, считается похожей не
+    меньше чем на 0.9.
+
+    :param query: Нормализованный запрос
+    :type query: str
+    :param names: Названия записи (по строке на вариант)
+    :type names: str
+
+    :return: Похожесть от 0 до 1 (1.0 - точное совпадение)
+    :rtype: float
+    """
+    words = len(query.split())
+    best = 0.0
+    matcher = SequenceMatcher(autojunk=False)
+    matcher.set_seq2(query)
+    for i_name in names.split('\n'):
+        if i_name == query:
+            return 1.0
+        name_words = i_name.split()
+        variants = [(i_name, 1.0)] + [
+            (' '.join(name_words[i_start:i_start + words]),
+             # Совпадение с началом названия - выше, чем с серединой
+             0.98 if i_start == 0 else 0.95)
+            for i_start in range(len(name_words) - words + 1)
+        ]
+        for i_part, i_weight in variants:
+            if i_part.startswith(query):
+                best = max(best, i_weight * max(
+                    0.9, 2 * len(query) / (len(query) + len(i_part))
+                ))
+                continue
+            # Оценки сверху отсекают заведомо непохожие варианты
+            matcher.set_seq1(i_part)
+            if matcher.real_quick_ratio() * i_weight <= best or \
+                    matcher.quick_ratio() * i_weight <= best:
+                continue
+            best = max(best, matcher.ratio() * i_weight)
+    return best
+
+
+def search_catalog(text: str, kind: str = None,
+                   limit: int = 10) -> List[SearchHit]:
+    """
+    Найти фильмы и персоны по тексту (названию, его началу или части, в
+    том числе с опечатками).
+
+    :param text: Текст запроса
+    :type text: str
+    :param kind: "film" или "person" (по умолчанию - все)
+    :type kind: str
+    :param limit: Сколько вариантов вернуть
+    :type limit: int
+
+    :return: Найденные варианты, самые похожие первыми
+    :rtype: List[SearchHit]
+    """
+    _stats['searches'] += 1
+    query = normalize_text(text)[:MAX_QUERY].strip()
+    if len(query) < MIN_QUERY:
+        _stats['missed'] += 1
+        return []
+
+    where = '' if kind is None else ' AND kind = ?'
+    params = () if kind is None else (kind,)
+    sql = ('SELECT rowid, names, kind, data_key, title, year '
+           'FROM catalog_search WHERE catalog_search MATCH ?' + where +
+           ' ORDER BY rank LIMIT ?')
+
+    # Вхождение запроса в название
+    candidates = {i_row[0]: i_row for i_row in db.execute_sql(
+        sql, (fts_phrase(query),) + params + (CANDIDATES,)
+    )}
+    if len(candidates) < limit:
+        # Общие триграммы (опечатки)
+        trigrams = dict.fromkeys(query[i:i + 3]
+                                 for i in range(len(query) - 2))
+        fuzzy = ' OR '.join(fts_phrase(i_trigram) for i_trigram in trigrams)
+        for i_row in db.execute_sql(sql, (fuzzy,) + params + (CANDIDATES,)):
+            candidates.setdefault(i_row[0], i_row)
+
+    hits = []
+    for i_rowid, i_names, i_kind, i_key, i_title, i_year in \
+            candidates.values():
+        score = _score(query, i_names)
+        if score >= MIN_SCORE:
+            hits.append(SearchHit(i_kind, i_key, i_title, i_year or '',
+                                  round(score, 3)))
+    hits.sort(key=lambda i_hit: (-i_hit.score, len(i_hit.title)))
+
+    _stats['found' if hits else 'missed'] += 1
+    return hits[:limit]
+
+
+def search_stats() -> Dict[str, int]:
+    """
+    Вернуть счётчики поиска.
+
+    :return: Поисков, найдено в каталоге, не найдено, записано в индекс,
+        записей в индексе
+    :rtype: Dict[str, int]
+    """
+    size = CatalogSearch.select().count()
+    return {**_stats, 'size': size}
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    db.connect(reuse_if_open=True)
+    for query_text in sys.argv[1:] or ['матрица']:
+        start = time.perf_counter()
+        found = search_catalog(query_text)
+        elapsed = (time.perf_counter() - start) * 1000
+        print('{} ({:.1f} мс):'.format(query_text, elapsed))
+        for hit in found:
+            print('    {:.3f} {:<6} {:>8} {} {}'.format(
+                hit.score, hit.kind, hit.data_key, hit.title, hit.year
+            ))
+    print(search_stats())
@@ -0,0 +1,196 @@
+"""
+Модуль статистики действий пользователей.
+
+Действия (нажатия кнопок) считаются при записи истории запросов в таблицу
+счётчиков HistoryCounters: по пользователю, дню и виду действия, а также
+итог за всё время (день "*"). Поэтому статистика пользователя читается
+одним запросом из нескольких строк, сколько бы записей ни было в истории.
+
+
+:Functions
+    classify_action - Вид действия по строке запроса.
+
+    update_counters - Учесть записанные строки истории в счётчиках.
+
+    backfill_counters - Пересчитать счётчики по всей таблице истории.
+
+    get_user_statistics - Счётчики пользователя за всё время и за сегодня.
+
+
+:var
+    STAT_ACTIONS - Виды действий и шаблоны строки запроса (как в LIKE).
+"""
+
+from settings import logger
+import re
+from collections import Counter
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Tuple
+
+import peewee as pw
+
+from database.common.models import db, HistoryCounters
+
+
+# Вид действия: шаблон строки запроса (синтаксис SQL LIKE)
+STAT_ACTIONS: Dict[str, str] = {
+    'films': '___want_film%',  # Предложен случайный фильм
+    'search_films': 'bf_doit%',  # Запущен поиск фильмов
+    'persons': '___persons.%',  # Запрошены персоны фильма
+    'search_persons': 'bp_doit%',  # Запущен поиск персон
+}
+
+# Итог за всё время хранится как день "*"
+ALL_DAYS: str = '*'
+
+
+def _like_to_regex(pattern: str) -> re.Pattern:
+    """
+    Преобразовать шаблон LIKE в регулярное выражение (с теми же правилами:
+    "_" - один символ, "%" - любые символы, без учёта регистра).
+
+    :param pattern: Шаблон LIKE
+    :type pattern: str
+
+    :return: Скомпилированное регулярное выражение
+    :rtype: re.Pattern
+    """
+    parts = ('.' if i_char == '_' else '.*' if i_char == '%'
+             else re.escape(i_char) for i_char in pattern)
+    return re.compile(''.join(parts) + r'\Z', re.IGNORECASE | re.DOTALL)
+
+
+_ACTION_PATTERNS: Tuple[Tuple[str, re.Pattern], ...] = tuple(
+    (i_action, _like_to_regex(i_pattern))
+    for i_action, i_pattern in STAT_ACTIONS.items()
+)
+
+
+def classify_action(query_string: str | None) -> str | None:
+    """
+    Вид действия по строке запроса.
+
+    :param query_string: Строка запроса из истории
+    :type query_string: str | None
+
+    :return: Вид действия или None, если действие не учитывается
+    :rtype: str | None
+    """
+    if not query_string:
+        return None
+    for i_action, i_pattern in _ACTION_PATTERNS:
+        if i_pattern.match(query_string):
+            return i_action
+    return None
+
+
+def _day_of(created_at: datetime | str) -> str:
+    """
+    День записи истории в виде ГГГГ-ММ-ДД.
+
+    :param created_at: Время создания записи
+    :type created_at: datetime | str
+
+    :return: Дата записи
+    :rtype: str
+    """
+    if isinstance(created_at, datetime):
+        return created_at.strftime('%Y-%m-%d')
+    return str(created_at)[:10]
+
+
+def update_counters(rows: Iterable[Dict[str, Any]]) -> None:
+    """
+    Учесть записанные строки истории в счётчиках. Вызывается в той же
+    транзакции, что и запись истории.
+
+    :param rows: Строки таблицы History (id_users, query_string, created_at)
+    :type rows: Iterable[Dict[str, Any]]
+
+    :return: None
+    """
+    counts = Counter()
+    for i_row in rows:
+        action = classify_action(i_row.get('query_string'))
+        if action is None:
+            continue
+        user_id = i_row['id_users']
+        counts[(user_id, _day_of(i_row['created_at']), action)] += 1
+        counts[(user_id, ALL_DAYS, action)] += 1
+    if not counts:
+        return
+
+    data = [{'id_users': i_user, 'day': i_day, 'action': i_action,
+             'quantity': i_quantity, 'created_at': datetime.now()}
+            for (i_user, i_day, i_action), i_quantity in counts.items()]
+    HistoryCounters.insert_many(data).on_conflict(
+        conflict_target=[HistoryCounters.id_users, HistoryCounters.day,
+                         HistoryCounters.action],
+        update={HistoryCounters.quantity:
+                HistoryCounters.quantity + pw.EXCLUDED.quantity}
+    ).execute()
+
+
+def backfill_counters(database: pw.Database = db) -> None:
+    """
+    Пересчитать счётчики по всей таблице истории (при миграции).
+
+    :param database: База данных
+    :type database: pw.Database
+
+    :return: None
+    """
+    database.execute_sql('DELETE FROM history_counters')
+    for i_action, i_pattern in STAT_ACTIONS.items():
+        for i_day in ('substr(created_at, 1, 10)', f"'{ALL_DAYS}'"):
+            database.execute_sql(
+                'INSERT INTO history_counters (created_at, id_users, day, '
+                f'action, quantity) SELECT datetime(\'now\', \'localtime\'), '
+                f'id_users, {i_day}, ?, count(*) FROM History '
+                f'WHERE query_string LIKE ? GROUP BY id_users, {i_day}',
+                (i_action, i_pattern)
+            )
+
+
+def get_user_statistics(user_id: int | str,
+                        today: str = None) -> Dict[str, Tuple[int, int]]:
+    """
+    Счётчики действий пользователя за всё время и за сегодня (один запрос).
+
+    :param user_id: ID пользователя в телеграм
+    :type user_id: int | str
+    :param today: Дата ГГГГ-ММ-ДД (по умолчанию сегодня)
+    :type today: str
+
+    :return: {вид действия: (всего, сегодня)} для всех видов действий
+    :rtype: Dict[str, Tuple[int, int]]
+    """
+    today = today or date.today().isoformat()
+    result = {i_action: (0, 0) for i_action in STAT_ACTIONS}
+
+    query = HistoryCounters.select(
+        HistoryCounters.action,
+        pw.fn.SUM(pw.Case(None, ((HistoryCounters.day == ALL_DAYS,
+                                  HistoryCounters.quantity),), 0)),
+        pw.fn.SUM(pw.Case(None, ((HistoryCounters.day == today,
+                                  HistoryCounters.quantity),), 0))
+    ).where(
+        (HistoryCounters.id_users == int(user_id)) &
+        (HistoryCounters.day.in_([ALL_DAYS, today]))
+    ).group_by(HistoryCounters.action).tuples()
+
+    for i_action, i_total, i_today in query:
+        if i_action in result:
+            result[i_action] = (i_total or 0, i_today or 0)
+    return result
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    classify_action()
+    update_counters()
+    backfill_counters()
+    get_user_statistics()
@@ -0,0 +1,330 @@
+"""
+Модуль отложенной записи в базу данных (write-behind).
+
+Записи копятся в памяти и записываются одной вставкой (insert_many) в
+фоновом потоке: по таймеру или при накоплении заданного количества
+записей. Код (id) новой записи выдаётся сразу, без чтения из базы данных:
+коды выделяются счётчиком в памяти начиная с максимального кода таблицы.
+Если в таблицу пишут несколько процессов, каждый выделяет коды со своим
+остатком от деления на количество процессов (set_stride).
+Зависимые данные (например, счётчики статистики) обновляются функциями
+register_flush в той же транзакции, что и вставка записей.
+Если вставка пачки нарушает ограничение таблицы (IntegrityError), записи
+пачки записываются по одной: записи с ошибкой отбрасываются (в протокол и
+dead_letters), остальные записываются. При других ошибках БД (например,
+база данных заблокирована) пачка возвращается в буфер, но не больше
+max_attempts раз, после чего её записи тоже отбрасываются.
+Перед чтением таблицы нужно вызвать flush, при завершении работы - stop.
+
+
+:Classes
+    WriteBehind - Буфер отложенной записи в одну таблицу.
+"""
+
+from settings import logger
+import atexit
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Type
+
+import peewee as pw
+
+from database.common.models import db
+
+
+class WriteBehind:
+    """
+    Буфер отложенной записи в таблицу.
+
+    Attributes:
+        __model (Type[pw.Model]): Таблица для записи
+        __flush_size (int): Сколько записей накопить до внеочередной записи
+        __flush_interval (float): Период записи буфера (сек)
+        __upsert (bool): Запись, нарушающая уникальность, заменяет
+            имеющуюся
+        __max_attempts (int): Сколько раз пробовать записать запись при
+            ошибках БД
+        written (int): Количество записанных в БД строк
+        flushes (int): Количество выполненных вставок
+        dropped (int): Количество отброшенных записей
+        dead_letters (Deque[Dict[str, Any]]): Последние отброшенные записи
+    """
+
+    def __init__(self, model: Type[pw.Model], flush_size: int = 100,
+                 flush_interval: float = 1.0, upsert: bool = False,
+                 max_attempts: int = 5, dead_letters: int = 100) -> None:
+        self.__model: Type[pw.Model] = model
+        self.__flush_size: int = max(1, flush_size)
+        self.__flush_interval: float = flush_interval
+        self.__upsert: bool = upsert
+        self.__max_attempts: int = max(1, max_attempts)
+        # Неудачных попыток записи по коду записи
+        self.__attempts: Dict[int, int] = dict()
+
+        self.__buffer: List[Dict[str, Any]] = []
+        self.__on_flush: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self.__last_id: int | None = None
+        # Коды вида k * __step + __offset (несколько процессов)
+        self.__offset: int = 0
+        self.__step: int = 1
+        # Блокировка буфера и счётчика кодов
+        self.__lock = threading.Lock()
+        # Записи в БД выполняются строго по очереди
+        self.__flush_lock = threading.Lock()
+
+        self.__wakeup = threading.Event()
+        self.__stopping: bool = False
+        self.__thread: threading.Thread | None = None
+
+        self.written: int = 0
+        self.flushes: int = 0
+        self.dropped: int = 0
+        self.dead_letters: Deque[Dict[str, Any]] = deque(maxlen=dead_letters)
+
+    def register_flush(self,
+                       func: Callable[[List[Dict[str, Any]]], None]) -> None:
+        """
+        Регистрируем функцию, которая получает записанные строки (в той же
+        транзакции, что и их вставка).
+
+        :param func: Функция со списком записанных строк в параметре
+        :type func: Callable[[List[Dict[str, Any]]], None]
+
+        :return: None
+        """
+        self.__on_flush.append(func)
+
+    def set_stride(self, offset: int, step: int) -> None:
+        """
+        Выделять коды с остатком offset от деления на step (у каждого из
+        step процессов, пишущих в таблицу, свой остаток). Вызывается до
+        start.
+
+        :param offset: Остаток кода (номер процесса)
+        :type offset: int
+        :param step: Шаг кодов (количество процессов)
+        :type step: int
+
+        :return: None
+        """
+        with self.__lock:
+            self.__step = max(1, step)
+            self.__offset = offset % self.__step
+
+    def start(self) -> None:
+        """
+        Прочитать максимальный код таблицы и запустить фоновый поток записи
+        (если ещё не запущен).
+
+        :return: None
+        """
+        with self.__lock:
+            if self.__thread is not None:
+                return
+            if self.__last_id is None:
+                last_id = self.__model.select(
+                    pw.fn.MAX(self.__model.id)
+                ).scalar() or 0
+                # Ближайший не больший код со своим остатком
+                self.__last_id = last_id - \
+                    (last_id - self.__offset) % self.__step
+            self.__stopping = False
+            self.__thread = threading.Thread(
+                target=self.__run, daemon=True,
+                name='write-behind-' + self.__model.__name__
+            )
+            self.__thread.start()
+        atexit.register(self.stop)
+        log.debug('Отложенная запись в таблицу {} запущена (код с {})'.
+                  format(self.__model.__name__,
+                         self.__last_id + self.__step))
+
+    def add(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Поставить запись в очередь на запись в таблицу.
+
+        :param data: Значения полей записи (без id и created_at)
+        :type data: Dict[str, Any]
+
+        :return: Запись с выделенным кодом (id) и временем создания
+        :rtype: Dict[str, Any]
+        """
+        if self.__thread is None:
+            self.start()
+
+        with self.__lock:
+            self.__last_id += self.__step
+            row = dict(data, id=self.__last_id, created_at=datetime.now())
+            self.__buffer.append(row)
+            if len(self.__buffer) >= self.__flush_size:
+                self.__wakeup.set()
+        return row
+
+    def __insert(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Вставить записи и обновить зависимые данные (одной транзакцией).
+
+        :param rows: Записи
+        :type rows: List[Dict[str, Any]]
+
+        :return: None
+        """
+        with db.atomic():
+            query = self.__model.insert_many(rows)
+            if self.__upsert:
+                query = query.on_conflict_replace()
+            query.execute()
+            for i_func in self.__on_flush:
+                i_func(rows)
+
+    def __drop(self, row: Dict[str, Any], err: Exception) -> None:
+        """
+        Отбросить запись, которую не удалось записать.
+
+        :param row: Запись
+        :type row: Dict[str, Any]
+        :param err: Ошибка записи
+        :type err: Exception
+
+        :return: None
+        """
+        self.__attempts.pop(row.get('id'), None)
+        self.dropped += 1
+        self.dead_letters.append(row)
+        log.error('Запись в таблицу {} отброшена ({}): {}'.
+                  format(self.__model.__name__, err, row))
+
+    def __retry_later(self, rows: List[Dict[str, Any]],
+                      err: Exception) -> None:
+        """
+        Вернуть записи в начало буфера, кроме записей, у которых кончились
+        попытки (они отбрасываются).
+
+        :param rows: Записи
+        :type rows: List[Dict[str, Any]]
+        :param err: Ошибка записи
+        :type err: Exception
+
+        :return: None
+        """
+        retry = []
+        for i_row in rows:
+            attempts = self.__attempts.get(i_row.get('id'), 0) + 1
+            if attempts >= self.__max_attempts:
+                self.__drop(i_row, err)
+            else:
+                self.__attempts[i_row.get('id')] = attempts
+                retry.append(i_row)
+        with self.__lock:
+            self.__buffer[:0] = retry
+
+    def __insert_each(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Записать записи по одной (после ошибки вставки всей пачки).
+
+        :param rows: Записи
+        :type rows: List[Dict[str, Any]]
+
+        :return: Записано строк
+        :rtype: int
+        """
+        written = 0
+        for i_num, i_row in enumerate(rows):
+            try:
+                self.__insert([i_row])
+            except pw.IntegrityError as err:
+                # Запись нарушает ограничение таблицы - повтор не поможет
+                self.__drop(i_row, err)
+                continue
+            except pw.PeeweeException as err:
+                log.exception('Ошибка записи в таблицу {}: {}'.
+                              format(self.__model.__name__, err),
+                              exc_info=True)
+                self.__retry_later(rows[i_num:], err)
+                break
+            self.__attempts.pop(i_row.get('id'), None)
+            written += 1
+        return written
+
+    def flush(self) -> None:
+        """
+        Записать в таблицу все накопленные записи.
+
+        :return: None
+        """
+        with self.__flush_lock:
+            with self.__lock:
+                rows, self.__buffer = self.__buffer, []
+            if not rows:
+                return
+            try:
+                self.__insert(rows)
+                written = len(rows)
+                for i_row in rows:
+                    self.__attempts.pop(i_row.get('id'), None)
+            except pw.IntegrityError as err:
+                log.warning('Ошибка записи в таблицу {} ({} записей): {}, '
+                            'записи пишутся по одной'.
+                            format(self.__model.__name__, len(rows), err))
+                written = self.__insert_each(rows)
+            except pw.PeeweeException as err:
+                # Записи вернём в начало буфера и попробуем позже
+                log.exception('Ошибка записи в таблицу {} ({} записей): {}'.
+                              format(self.__model.__name__, len(rows), err),
+                              exc_info=True)
+                self.__retry_later(rows, err)
+                return
+            self.written += written
+            self.flushes += 1
+        log.debug('Записано в таблицу {} записей: {}'.
+                  format(self.__model.__name__, written))
+
+    def stop(self) -> None:
+        """
+        Остановить фоновый поток и записать остаток буфера.
+
+        :return: None
+        """
+        thread = self.__thread
+        if thread is not None:
+            self.__stopping = True
+            self.__wakeup.set()
+            thread.join()
+            self.__thread = None
+        self.flush()
+
+    def __run(self) -> None:
+        """
+        Фоновый поток: запись буфера по таймеру или по заполнению.
+        У потока своё соединение с БД.
+
+        :return: None
+        """
+        db.connect(reuse_if_open=True)
+        try:
+            while not self.__stopping:
+                self.__wakeup.wait(self.__flush_interval)
+                self.__wakeup.clear()
+                self.flush()
+        finally:
+            self.flush()
+            db.close()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Вернуть счётчики отложенной записи.
+
+        :return: Записано строк, вставок, ожидает записи и отброшено
+        :rtype: Dict[str, int]
+        """
+        return {'written': self.written, 'flushes': self.flushes,
+                'pending': len(self.__buffer), 'dropped': self.dropped}
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    WriteBehind()
@@ -10,10 +10,16 @@ from settings import logger
 from tg_API import tg_api, on_event
 import tg_API.utils.tg_api_handler as tg_commands
 
-from site_API.core import site_api
+from site_API.core import site_api, site_api_async, film_cache, \
+    catalog_crawler
 
-import database.utils.crud
-from database.core import crud, close_database
+from database.core import crud, close_database, history_writer, \
+    file_writer, file_registry, open_connection, set_shard
+from database.utils.film_store import load_film_section
+from database.utils.catalog_store import save_catalog_page, \
+    load_catalog_cursors, load_crawler_quota
+from database.utils.search_index import search_catalog
+from database.utils.film_query import plan_film_filter, merge_film_results
 
 import users_data
 
@@ -21,7 +27,43 @@ import users_data
 # db_write = crud.create
 # db_read = crud.retrieve
 
-# Регистрируем обработчики задач
+# Пул соединений с сайтом открыт только пока работает телеграм-бот
+tg_api.register_startup(site_api_async.open)
+tg_api.register_shutdown(site_api_async.close)
+
+# Вторым уровнем кеша фильмов служит таблица FilmInfo
+film_cache.register_storage(users_data.load_film_from_db)
+# Экраны разделов (рейтинг, персоны и т.п.) читают из БД только свой раздел
+film_cache.register_section_storage(load_film_section)
+tg_api.register_shutdown(film_cache.log_stats)
+# Время выполнения событий по кнопкам - в протокол при завершении работы
+tg_api.register_shutdown(on_event.log_event_stats)
+
+# История запросов пишется в БД в фоне, остаток - при завершении работы
+tg_api.register_startup(history_writer.start)
+tg_api.register_shutdown(history_writer.stop)
+
+# В процессах-обработчиках (TG_SHARDS > 1) коды новых записей в БД не
+# пересекаются с другими процессами
+tg_api.register_shard_init(set_shard)
+
+# ID файлов в телеграм загружаются в память при запуске
+tg_api.register_startup(file_registry.load)
+tg_api.register_startup(file_writer.start)
+tg_api.register_shutdown(file_writer.stop)
+
+# Каталог сайта обходится в фоне (только основным процессом), страницы
+# записываются в БД вместе с курсором обхода и расходом квоты
+catalog_crawler.register_storage(save_catalog_page, load_catalog_cursors,
+                                 load_crawler_quota)
+tg_api.register_shard_init(catalog_crawler.set_shard)
+tg_api.register_startup(catalog_crawler.start)
+tg_api.register_shutdown(catalog_crawler.close)
+
+# Регистрируем обработчики задач. Из обработчиков телеграм действия
+# выполняются в пуле потоков (у каждого потока своё соединение с БД), кроме
+# действий, которые работают только с памятью (inline=True)
+on_event.register_worker_init(open_connection)
 
 # Функции для получения данных из ресурсов в сети
 on_event.register_action('film_by_name', site_api.get_film_by_name)
@@ -29,17 +71,39 @@ on_event.register_action('film_by_name', site_api.get_film_by_name)
 on_event.register_action('check_admin_rights',
                          users_data.check_admin_rights_in_db)
 # Получение ID файла и сохранение файла (с ID) в базе данных
-on_event.register_action('func_get_id', database.utils.crud.get_file_id)
-on_event.register_action('func_save_id', database.utils.crud.save_file_id)
+on_event.register_action('func_get_id', file_registry.get)
+on_event.register_action('func_save_id', file_registry.put, inline=True)
+on_event.register_action('func_get_ids', file_registry.get_many)
+on_event.register_action('func_save_ids', file_registry.put_many,
+                         inline=True)
 # Статистика и история запросов пользователя
-on_event.register_action('calculation_of_statistical_data',
-                         users_data.calculation_of_statistical_data)
+on_event.register_action('get_statistic_data',
+                         users_data.get_statistic_data)
 on_event.register_action('get_history_info', users_data.get_history_info)
 # Регистрация действий пользователя
+# (история пишется отложенно, поэтому запись - только в память)
 on_event.register_action('register_user_action_query',
-                         users_data.register_user_action_query)
+                         users_data.register_user_action_query, inline=True)
+# Поиск фильмов и персон по тексту (сначала в каталоге бота в БД)
+on_event.register_action('search_text', users_data.search_text)
+on_event.register_action('search_catalog', search_catalog)
+# Поиск фильмов по фильтру в БД и учёт запросов к сайту по фильтру
+on_event.register_action('plan_film_filter', plan_film_filter)
+on_event.register_action('merge_film_results', merge_film_results)
+# История запросов пользователя для отчёта
+on_event.register_action('load_history_report',
+                         users_data.load_history_report)
+# Сведения о фильмах (кеш и БД) и запись фильмов и персон в БД
+on_event.register_action('film_info', film_cache.get)
+on_event.register_action('film_section', film_cache.get_section)
+on_event.register_action('save_film_info', users_data.save_film_info)
+on_event.register_action('save_actors', users_data.save_actors)
+on_event.register_action('load_person', users_data.load_person)
+on_event.register_action('save_person', users_data.save_person)
 # Получить список пользователей
 on_event.register_action('retrieve_users', users_data.retrieve_users)
+on_event.register_action('retrieve_users_batch',
+                         users_data.retrieve_users_batch)
 
 # По команде /help
 on_event.register_event('mm_help_me', tg_commands.process_help_command)
@@ -8,6 +8,8 @@
 
 SiteSettings() - класс доступа к настройкам API сайта
 TelegramSettings() - класс доступа к настройкам API телеграм
+DatabaseSettings() - класс доступа к настройкам базы данных
+MockServerSettings() - класс доступа к настройкам тестового сервера API сайта
 logger - экземпляр менеджера логирования
 """
 
@@ -27,6 +29,36 @@ class SiteSettings(BaseSettings):
     api_key: SecretStr = os.getenv("SITE_API", None)
     host_api: StrictStr = os.getenv("HOST_API", None)
 
+    # Время ожидания ответа (сек) и размер пула соединений с сайтом
+    timeout: int = int(os.getenv("SITE_TIMEOUT", 5))
+    pool_size: int = int(os.getenv("SITE_POOL_SIZE", 10))
+
+    # Размер кеша фильмов в памяти (записей) и время жизни записи (сек)
+    cache_size: int = int(os.getenv("SITE_CACHE_SIZE", 256))
+    cache_ttl: int = int(os.getenv("SITE_CACHE_TTL", 3600))
+
+    # Квота ключа API: запросов в секунду и в сутки (0 - без ограничения)
+    rate_per_second: float = float(os.getenv("SITE_RATE_PER_SECOND", 3))
+    daily_quota: int = int(os.getenv("SITE_DAILY_QUOTA", 200))
+
+    # Повторы при ошибках сайта и размыкатель после серии ошибок. Бюджет
+    # ожидания повторов одного запроса (сек, 0 - без ограничения): если
+    # сайт просит подождать (Retry-After) дольше, запрос не повторяется
+    max_retries: int = int(os.getenv("SITE_MAX_RETRIES", 3))
+    backoff_base: float = float(os.getenv("SITE_BACKOFF_BASE", 0.5))
+    backoff_max: float = float(os.getenv("SITE_BACKOFF_MAX", 30))
+    retry_budget: float = float(os.getenv("SITE_RETRY_BUDGET", 120))
+    breaker_threshold: int = int(os.getenv("SITE_BREAKER_THRESHOLD", 5))
+    breaker_timeout: float = float(os.getenv("SITE_BREAKER_TIMEOUT", 60))
+
+    # Фоновый обход каталога сайта: доля квоты и частоты запросов ключа
+    # API (0 - обход выключен), записей на странице и пауза между полными
+    # обходами каталога (сек)
+    crawler_share: float = float(os.getenv("SITE_CRAWLER_SHARE", 0))
+    crawler_page_size: int = int(os.getenv("SITE_CRAWLER_PAGE_SIZE", 250))
+    crawler_pause: float = float(os.getenv("SITE_CRAWLER_PAUSE",
+                                           7 * 24 * 3600))
+
 # Настройка для телеграм-бота
 class TelegramSettings(BaseSettings):
     """
@@ -35,6 +67,119 @@ class TelegramSettings(BaseSettings):
     api_key: StrictStr = os.getenv("TG_TOKEN", '')
     host_api: StrictStr = os.getenv("TG_HOST", '')
 
+    # Ограничения телеграм: сообщений в секунду для бота и для одного чата
+    global_rate: float = float(os.getenv("TG_GLOBAL_RATE", 30))
+    chat_rate: float = float(os.getenv("TG_CHAT_RATE", 1))
+
+    # Массовая рассылка: одновременных отправок, размер порции пользователей
+    # из БД, файл прогресса и предельная длительность рассылки при
+    # завершении работы (сек)
+    broadcast_concurrency: int = int(os.getenv("TG_BROADCAST_CONCURRENCY",
+                                               10))
+    broadcast_batch: int = int(os.getenv("TG_BROADCAST_BATCH", 500))
+    broadcast_state: StrictStr = os.getenv("TG_BROADCAST_STATE",
+                                           'broadcast.json')
+    broadcast_timeout: float = float(os.getenv("TG_BROADCAST_TIMEOUT", 30))
+
+    # Картинки для альбомов: одновременных загрузок и время ожидания (сек)
+    media_workers: int = int(os.getenv("TG_MEDIA_WORKERS", 5))
+    media_timeout: float = float(os.getenv("TG_MEDIA_TIMEOUT", 10))
+
+    # Действия с БД из обработчиков: потоков и очередь ожидающих действий
+    action_workers: int = int(os.getenv("TG_ACTION_WORKERS", 4))
+    action_queue: int = int(os.getenv("TG_ACTION_QUEUE", 100))
+
+    # Состояния FSM (фильтры поиска): файл, время жизни брошенного
+    # состояния (сек) и период записи изменений в файл (сек)
+    fsm_file: StrictStr = os.getenv("TG_FSM_FILE", 'fsm.db')
+    fsm_ttl: float = float(os.getenv("TG_FSM_TTL", 86400))
+    fsm_flush_interval: float = float(os.getenv("TG_FSM_FLUSH_INTERVAL", 1))
+
+    # Адрес сервера API телеграм (пусто - api.telegram.org), например,
+    # локальный тестовый сервер
+    api_server: StrictStr = os.getenv("TG_API_SERVER", '')
+
+    # Режим получения обновлений: polling (опрос) или webhook (телеграм
+    # сам присылает обновления на адрес TG_WEBHOOK_URL + TG_WEBHOOK_PATH)
+    update_mode: StrictStr = os.getenv("TG_MODE", 'polling')
+
+    # Вебхук: внешний адрес бота, путь, адрес и порт встроенного сервера,
+    # секретный токен (пусто - новый при каждом запуске)
+    webhook_url: StrictStr = os.getenv("TG_WEBHOOK_URL", '')
+    webhook_path: StrictStr = os.getenv("TG_WEBHOOK_PATH", '/webhook')
+    webhook_host: StrictStr = os.getenv("TG_WEBHOOK_HOST", '0.0.0.0')
+    webhook_port: int = int(os.getenv("TG_WEBHOOK_PORT", 8080))
+    webhook_secret: StrictStr = os.getenv("TG_WEBHOOK_SECRET", '')
+
+    # Обработка обновлений (вебхук и шарды): обработчиков, размер очереди
+    # обновлений и предельное время обработки очереди при завершении
+    # работы (сек)
+    update_workers: int = int(os.getenv("TG_UPDATE_WORKERS", 8))
+    update_queue: int = int(os.getenv("TG_UPDATE_QUEUE", 1000))
+    drain_timeout: float = float(os.getenv("TG_DRAIN_TIMEOUT", 10))
+
+    # Сколько клавиатур (наборов кнопок) держать в кеше
+    keyboard_cache: int = int(os.getenv("TG_KEYBOARD_CACHE", 512))
+
+    # Процессов-обработчиков обновлений (шардов, 1 - всё в одном процессе)
+    # и сколько обновлений может ждать передачи одному шарду
+    shards: int = int(os.getenv("TG_SHARDS", 1))
+    shard_queue: int = int(os.getenv("TG_SHARD_QUEUE", 1000))
+
+
+# Настройка базы данных
+class DatabaseSettings(BaseSettings):
+    """
+    Класс настроек базы данных.
+    """
+    # Отложенная запись истории: сколько записей копить до записи в БД и
+    # как часто записывать (сек)
+    history_flush_size: int = int(os.getenv("DB_HISTORY_FLUSH_SIZE", 100))
+    history_flush_interval: float = float(
+        os.getenv("DB_HISTORY_FLUSH_INTERVAL", 1)
+    )
+
+    # Сколько ID файлов телеграм держать в памяти
+    file_registry_size: int = int(os.getenv("DB_FILE_REGISTRY_SIZE", 10000))
+
+    # Кодек ответов сайта в БД: zlib, msgpack, zstd или json (без сжатия)
+    payload_codec: StrictStr = os.getenv("DB_PAYLOAD_CODEC", 'zlib')
+
+    # Сколько времени (сек) фильтр, по которому сайт вернул все фильмы,
+    # выполняется только по БД
+    filter_coverage_ttl: float = float(
+        os.getenv("DB_FILTER_COVERAGE_TTL", 7 * 24 * 3600)
+    )
+
+# Настройка тестового сервера вместо API сайта
+class MockServerSettings(BaseSettings):
+    """
+    Класс настроек тестового сервера API сайта (site_API.mock_server).
+    """
+    # Адрес и порт сервера, ключ API (пусто - подходит любой ключ)
+    mock_host: StrictStr = os.getenv("MOCK_HOST", '127.0.0.1')
+    mock_port: int = int(os.getenv("MOCK_PORT", 8000))
+    mock_api_key: StrictStr = os.getenv("MOCK_API_KEY", '')
+
+    # Каталог: начальное значение генератора, количество фильмов и персон
+    mock_seed: int = int(os.getenv("MOCK_SEED", 0))
+    mock_films: int = int(os.getenv("MOCK_FILMS", 1000))
+    mock_persons: int = int(os.getenv("MOCK_PERSONS", 1000))
+
+    # Задержка ответа и её разброс (сек), доля ответов с ошибкой 5xx
+    mock_latency: float = float(os.getenv("MOCK_LATENCY", 0.05))
+    mock_jitter: float = float(os.getenv("MOCK_JITTER", 0.02))
+    mock_error_rate: float = float(os.getenv("MOCK_ERROR_RATE", 0))
+
+    # Ответ 429: запросов в секунду по ключу (0 - без ограничения), доля
+    # случайных ответов 429, значение Retry-After (сек, меньше 0 - без
+    # заголовка) и суточная квота ключа (0 - без ограничения, сверх
+    # квоты - ответ 403, как у сайта)
+    mock_rate_limit: float = float(os.getenv("MOCK_RATE_LIMIT", 0))
+    mock_throttle_rate: float = float(os.getenv("MOCK_THROTTLE_RATE", 0))
+    mock_retry_after: float = float(os.getenv("MOCK_RETRY_AFTER", 1))
+    mock_daily_quota: int = int(os.getenv("MOCK_DAILY_QUOTA", 0))
+
 # Создать каталог для хранения протоколов
 path_logs = os.path.abspath('logs')
 if not os.path.exists(path_logs):
@@ -53,3 +198,5 @@ log = logger.getLogger(__name__)
 if __name__ == "__main__":
     SiteSettings()
     TelegramSettings()
+    DatabaseSettings()
+    MockServerSettings()
@@ -4,6 +4,10 @@
 
 from settings import logger, SiteSettings
 from site_API.utils.site_api_handler import SiteApiInterface
+from site_API.utils.site_api_async_handler import AsyncSiteApiInterface
+from site_API.utils.film_cache import FilmCache
+from site_API.utils.throttling import RequestGuard
+from site_API.utils.catalog_crawler import CatalogCrawler
 
 
 site = SiteSettings()
@@ -15,7 +19,27 @@ headers = {
 
 url = site.host_api
 
-site_api = SiteApiInterface(site.host_api, headers)
+# Ограничения запросов по ключу API (общие для обоих интерфейсов)
+guard = RequestGuard(site.rate_per_second, site.daily_quota,
+                     site.max_retries, site.backoff_base, site.backoff_max,
+                     site.breaker_threshold, site.breaker_timeout,
+                     site.retry_budget)
+
+# Синхронный интерфейс (запасной вариант)
+site_api = SiteApiInterface(site.host_api, headers, guard, site.timeout)
+
+# Асинхронный интерфейс с пулом соединений (основной для обработчиков)
+site_api_async = AsyncSiteApiInterface(site.host_api, headers,
+                                       site.timeout, site.pool_size, guard)
+
+# Кеш разобранных сведений о фильмах (хранилище назначается при запуске)
+film_cache = FilmCache(site.cache_size, site.cache_ttl)
+
+# Фоновый обход каталога сайта (доля квоты ключа API, функции записи
+# назначаются при запуске)
+catalog_crawler = CatalogCrawler(site_api, site.crawler_share,
+                                 site.rate_per_second, site.daily_quota,
+                                 site.crawler_page_size, site.crawler_pause)
 
 
 # Начинаем работу с определения логирования и сообщение в протокол
@@ -0,0 +1,1135 @@
+"""
+Тестовый сервер вместо API сайта (кинопоиска) для работы без сети и без
+ключа API: проверка кеширования, повторов запросов и пропускной
+способности бота с воспроизводимыми результатами.
+
+Сервер отвечает на все GET-запросы из описания API сайта
+(documentation.json): ответы строятся по схемам ответов из описания.
+Фильмы и персоны - синтетический каталог (MockCatalog): запись с одним и
+тем же кодом при одном и том же начальном значении генератора всегда
+одинакова. Для фильмов и персон работают фильтры по полям (в том числе
+интервалы "2000-2010", "!значение", "+значение", "!null"), сортировка,
+страницы и selectFields, поэтому бот получает осмысленные ответы. Как и
+сайт, списки фильмов и персон без selectFields содержат только поля по
+умолчанию (краткие схемы MeiliMovieEntity и MeiliPersonEntity описания),
+остальные поля - только если они указаны в selectFields.
+
+Поведение сайта задаётся настройками (MockServerSettings): задержка
+ответа, доля ответов с ошибкой 5xx, ответ 429 при превышении частоты
+запросов ключа (и случайные ответы 429) с заголовком Retry-After,
+суточная квота ключа (сверх квоты - ответ 403, как у сайта).
+
+Запуск (бот - с HOST_API=http://127.0.0.1:8000):
+    python -m site_API.mock_server
+
+
+:Functions
+    create_server - Тестовый сервер с каталогом по настройкам.
+
+
+:Classes
+    SchemaFaker - Синтетические значения по схемам описания API.
+
+    MockCatalog - Синтетический каталог фильмов и персон.
+
+    MockServer - Тестовый сервер API сайта.
+
+
+:var
+    SPEC_FILE - Описание API сайта (OpenAPI).
+
+    MAX_LIMIT - Наибольшее количество записей на странице.
+"""
+
+from settings import logger, MockServerSettings
+import asyncio
+import functools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from http import HTTPStatus
+from os import path
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from aiohttp import web
+
+
+SPEC_FILE: str = path.join(path.dirname(path.abspath(__file__)),
+                           'documentation.json')
+
+MAX_LIMIT: int = 250
+
+# Параметры запроса, которые не являются фильтром
+_SERVICE_PARAMS = ('page', 'limit', 'selectFields', 'sortField', 'sortType')
+
+# Схемы описания API с полями записей списка по умолчанию (без selectFields)
+_DEFAULT_SCHEMAS: Dict[str, str] = {
+    'film': 'MeiliMovieEntity',
+    'person': 'MeiliPersonEntity',
+}
+
+# Поля названий и имён: фильтр ищет вхождение строки, а не равенство
+_TEXT_FIELDS = ('name', 'enName', 'alternativeName', 'names.name')
+
+# Слоги названий и имён (русский, латиница)
+_SYLLABLES: Tuple[Tuple[str, str], ...] = (
+    ('ка', 'ka'), ('ро', 'ro'), ('ми', 'mi'), ('ла', 'la'), ('ти', 'ti'),
+    ('ен', 'en'), ('ор', 'or'), ('ва', 'va'), ('не', 'ne'), ('са', 'sa'),
+    ('ди', 'di'), ('ру', 'ru'), ('то', 'to'), ('ле', 'le'), ('мо', 'mo'),
+)
+
+_FILM_TYPES: Tuple[str, ...] = ('movie', 'tv-series', 'cartoon', 'anime',
+                                'animated-series', 'tv-show')
+
+_GENRES: Tuple[str, ...] = ('драма', 'комедия', 'боевик', 'триллер',
+                            'фантастика', 'мелодрама', 'детектив', 'ужасы',
+                            'приключения', 'мультфильм', 'фэнтези',
+                            'криминал', 'военный', 'семейный')
+
+_COUNTRIES: Tuple[str, ...] = ('США', 'Россия', 'Франция', 'Германия',
+                               'Великобритания', 'Япония', 'Италия',
+                               'Испания', 'Канада', 'Корея Южная')
+
+_AGE_RATINGS: Tuple[int, ...] = (0, 6, 12, 16, 18)
+
+_PROFESSIONS: Tuple[Tuple[str, str], ...] = (
+    ('актеры', 'actor'), ('режиссеры', 'director'),
+    ('продюсеры', 'producer'), ('композиторы', 'composer'),
+    ('операторы', 'operator'),
+)
+
+
+def _word(rng: random.Random, syllables: int) -> Tuple[str, str]:
+    """
+    Синтетическое слово.
+
+    :param rng: Генератор случайных чисел записи
+    :type rng: random.Random
+    :param syllables: Количество слогов
+    :type syllables: int
+
+    :return: Слово по-русски и латиницей (с заглавной буквы)
+    :rtype: Tuple[str, str]
+    """
+    parts = [rng.choice(_SYLLABLES) for _ in range(syllables)]
+    return (''.join(i_ru for i_ru, _ in parts).capitalize(),
+            ''.join(i_en for _, i_en in parts).capitalize())
+
+
+def _phrase(rng: random.Random, words: int) -> Tuple[str, str]:
+    """
+    Синтетическое название (имя) из нескольких слов.
+
+    :param rng: Генератор случайных чисел записи
+    :type rng: random.Random
+    :param words: Количество слов
+    :type words: int
+
+    :return: Название по-русски и латиницей
+    :rtype: Tuple[str, str]
+    """
+    parts = [_word(rng, rng.randint(2, 4)) for _ in range(words)]
+    return (' '.join(i_ru for i_ru, _ in parts),
+            ' '.join(i_en for _, i_en in parts))
+
+
+class SchemaFaker:
+    """
+    Синтетические значения по схемам описания API (OpenAPI): объекты,
+    массивы, ссылки на схемы ($ref), перечисления и примеры значений.
+
+    Attributes:
+        __schemas (Dict[str, Dict]): Схемы описания по имени
+        __max_depth (int): Глубина вложенности, после которой массивы
+            пустые, а объекты - без полей
+        __max_items (int): Наибольшая длина массива
+    """
+
+    def __init__(self, spec: Dict, max_depth: int = 4,
+                 max_items: int = 3) -> None:
+        self.__schemas: Dict[str, Dict] = \
+            spec.get('components', dict()).get('schemas', dict())
+        self.__max_depth: int = max_depth
+        self.__max_items: int = max_items
+
+    def resolve(self, schema: Dict | None) -> Dict:
+        """
+        Схема по ссылке ($ref) или сама схема.
+
+        :param schema: Схема или ссылка на схему
+        :type schema: Dict | None
+
+        :return: Схема (пустая, если ссылки нет в описании)
+        :rtype: Dict
+        """
+        schema = schema or dict()
+        ref = schema.get('$ref')
+        if ref:
+            return self.__schemas.get(ref.rsplit('/', 1)[-1], dict())
+        return schema
+
+    def schema(self, name: str) -> Dict:
+        """
+        Схема по имени.
+
+        :param name: Имя схемы (например, "MovieDtoV1_3")
+        :type name: str
+
+        :return: Схема (пустая, если схемы нет в описании)
+        :rtype: Dict
+        """
+        return self.__schemas.get(name, dict())
+
+    def make(self, schema: Dict | None, rng: random.Random,
+             name: str = '', depth: int = 0) -> Any:
+        """
+        Синтетическое значение по схеме.
+
+        :param schema: Схема или ссылка на схему
+        :type schema: Dict | None
+        :param rng: Генератор случайных чисел записи
+        :type rng: random.Random
+        :param name: Имя поля (подсказка для строк: адреса, даты)
+        :type name: str
+        :param depth: Глубина вложенности
+        :type depth: int
+
+        :return: Значение
+        :rtype: Any
+        """
+        schema = self.resolve(schema)
+        if 'enum' in schema:
+            return rng.choice(schema['enum'])
+        example = schema.get('example')
+        value_type = schema.get('type')
+        if value_type == 'object' or 'properties' in schema:
+            if depth >= self.__max_depth:
+                return dict()
+            return {i_name: self.make(i_schema, rng, i_name, depth + 1)
+                    for i_name, i_schema in
+                    schema.get('properties', dict()).items()}
+        if value_type == 'array':
+            if depth >= self.__max_depth:
+                return []
+            return [self.make(schema.get('items'), rng, name, depth + 1)
+                    for _ in range(rng.randint(0, self.__max_items))]
+        if value_type == 'boolean':
+            return rng.random() < 0.5
+        if isinstance(example, bool):
+            return example
+        if isinstance(example, int):
+            return rng.randint(0, max(1, example * 2))
+        if isinstance(example, float):
+            return round(rng.uniform(0, example * 2), 1)
+        if value_type in ('number', 'integer'):
+            return rng.randint(0, 100)
+        if schema.get('format') == 'date-time':
+            day = date(1970, 1, 1) + timedelta(days=rng.randint(0, 20000))
+            return day.isoformat() + 'T00:00:00.000Z'
+        if any(i_hint in name.lower()
+               for i_hint in ('url', 'photo', 'poster', 'logo')):
+            return 'https://mock.local/{}/{}.jpg'.format(
+                name, rng.randint(1, 10 ** 6)
+            )
+        if isinstance(example, str) and rng.random() < 0.5:
+            return example
+        return _phrase(rng, rng.randint(1, 3))[0]
+
+
+class MockCatalog:
+    """
+    Синтетический каталог фильмов и персон. Запись строится по схеме
+    описания API (MovieDtoV1_3, Person), а поля, по которым бот ищет и
+    связывает записи (названия, тип, год, рейтинги, жанры, персоны
+    фильма, фильмы персоны), заполняются согласованными значениями.
+    Коды фильмов - от 1 до films, персон - от 1 до persons.
+
+    Attributes:
+        __faker (SchemaFaker): Значения по схемам описания
+        __films, __persons (int): Количество фильмов и персон
+        __seed (int): Начальное значение генератора
+        film, person (Callable[[int], Dict | None]): Полная запись по коду
+            (с кешем)
+    """
+
+    def __init__(self, faker: SchemaFaker, films: int = 1000,
+                 persons: int = 1000, seed: int = 0,
+                 cache_size: int = 4096) -> None:
+        self.__faker: SchemaFaker = faker
+        self.__films: int = max(0, films)
+        self.__persons: int = max(0, persons)
+        self.__seed: int = seed
+        self.__film_cores: Dict[int, Dict] = dict()
+        self.__person_cores: Dict[int, Dict] = dict()
+        self.__names: Dict[Tuple[str, int], Tuple[str, str, str]] = dict()
+        self.film: Callable[[int], Dict | None] = \
+            functools.lru_cache(cache_size)(self.__make_film)
+        self.person: Callable[[int], Dict | None] = \
+            functools.lru_cache(cache_size)(self.__make_person)
+
+    def __rng(self, kind: str, record_id: int) -> random.Random:
+        """
+        Генератор случайных чисел записи (один и тот же для кода записи).
+
+        :param kind: Вид записи ("film" или "person")
+        :type kind: str
+        :param record_id: Код записи
+        :type record_id: int
+
+        :return: Генератор
+        :rtype: random.Random
+        """
+        return random.Random('{}:{}:{}'.format(self.__seed, kind, record_id))
+
+    def __name(self, kind: str, record_id: int) -> Tuple[str, str, str]:
+        """
+        Название фильма (имя персоны) для записи и для ссылок на неё из
+        других записей.
+
+        :param kind: Вид записи ("film" или "person")
+        :type kind: str
+        :param record_id: Код записи
+        :type record_id: int
+
+        :return: Название по-русски, латиницей и тип фильма (для персоны
+            пусто)
+        :rtype: Tuple[str, str, str]
+        """
+        name = self.__names.get((kind, record_id))
+        if name is None:
+            rng = self.__rng(kind + '-name', record_id)
+            if kind == 'film':
+                name = _phrase(rng, rng.randint(1, 3)) + \
+                    (rng.choice(_FILM_TYPES),)
+            else:
+                first, en_first = _word(rng, rng.randint(2, 3))
+                last, en_last = _word(rng, rng.randint(2, 4))
+                name = ('{} {}'.format(first, last),
+                        '{} {}'.format(en_first, en_last), '')
+            self.__names[(kind, record_id)] = name
+        return name
+
+    def ids(self, kind: str) -> range:
+        """
+        Коды записей каталога.
+
+        :param kind: Вид записей ("film" или "person")
+        :type kind: str
+
+        :return: Коды записей по возрастанию
+        :rtype: range
+        """
+        return range(1, (self.__films if kind == 'film'
+                         else self.__persons) + 1)
+
+    def film_core(self, film_id: int) -> Dict | None:
+        """
+        Основные поля фильма (без построения всей записи по схеме).
+
+        :param film_id: Код фильма
+        :type film_id: int
+
+        :return: Поля фильма или None, если фильма нет
+        :rtype: Dict | None
+        """
+        if film_id not in self.ids('film'):
+            return None
+        core = self.__film_cores.get(film_id)
+        if core is not None:
+            return core
+
+        rng = self.__rng('film', film_id)
+        name, en_name, film_type = self.__name('film', film_id)
+        person_ids = sorted(rng.sample(self.ids('person'),
+                                       min(self.__persons, 5)))
+        similar_ids = sorted(rng.sample(self.ids('film'),
+                                        min(self.__films, 3)))
+        core = {
+            'id': film_id,
+            'name': name,
+            'alternativeName': en_name,
+            'enName': en_name,
+            'names': [{'name': name, 'language': 'RU', 'type': None},
+                      {'name': en_name, 'language': 'US', 'type': None}],
+            'type': film_type,
+            'typeNumber': _FILM_TYPES.index(film_type) + 1,
+            'year': rng.randint(1960, 2024),
+            'rating': {'kp': round(rng.uniform(1, 10), 1),
+                       'imdb': round(rng.uniform(1, 10), 1),
+                       'tmdb': round(rng.uniform(1, 10), 1),
+                       'filmCritics': round(rng.uniform(1, 10), 1),
+                       'russianFilmCritics': round(rng.uniform(1, 100), 1),
+                       'await': None},
+            'votes': {'kp': rng.randint(10, 10 ** 6),
+                      'imdb': rng.randint(10, 10 ** 6),
+                      'tmdb': rng.randint(10, 10 ** 5),
+                      'filmCritics': rng.randint(0, 500),
+                      'russianFilmCritics': rng.randint(0, 50),
+                      'await': 0},
+            'movieLength': rng.randint(60, 200),
+            'ageRating': rng.choice(_AGE_RATINGS),
+            'genres': [{'name': i_genre}
+                       for i_genre in rng.sample(_GENRES, rng.randint(1, 3))],
+            'countries': [{'name': i_country} for i_country in
+                          rng.sample(_COUNTRIES, rng.randint(1, 2))],
+            'persons': [dict(self.__person_link(i_id, rng), description=None)
+                        for i_id in person_ids],
+            'similarMovies': [self.__film_link(i_id) for i_id in similar_ids
+                              if i_id != film_id],
+        }
+        self.__film_cores[film_id] = core
+        return core
+
+    def person_core(self, person_id: int) -> Dict | None:
+        """
+        Основные поля персоны (без построения всей записи по схеме).
+
+        :param person_id: Код персоны
+        :type person_id: int
+
+        :return: Поля персоны или None, если персоны нет
+        :rtype: Dict | None
+        """
+        if person_id not in self.ids('person'):
+            return None
+        core = self.__person_cores.get(person_id)
+        if core is not None:
+            return core
+
+        rng = self.__rng('person', person_id)
+        name, en_name, _ = self.__name('person', person_id)
+        birthday = date(1930, 1, 1) + timedelta(days=rng.randint(0, 27000))
+        film_ids = sorted(rng.sample(self.ids('film'),
+                                     min(self.__films, 5)))
+        core = {
+            'id': person_id,
+            'name': name,
+            'enName': en_name,
+            'photo': 'https://mock.local/photo/{}.jpg'.format(person_id),
+            'sex': rng.choice(('Мужской', 'Женский')),
+            'growth': rng.randint(150, 200),
+            'birthday': birthday.isoformat() + 'T00:00:00.000Z',
+            'death': None,
+            'age': (date(2024, 1, 1) - birthday).days // 365,
+            'profession': [{'value': i_ru} for i_ru, _ in
+                           rng.sample(_PROFESSIONS, rng.randint(1, 2))],
+            'movies': [{'id': i_id,
+                        'name': self.__name('film', i_id)[0],
+                        'alternativeName': self.__name('film', i_id)[1],
+                        'rating': round(rng.uniform(1, 10), 1),
+                        'general': rng.random() < 0.5,
+                        'description': None,
+                        'enProfession': rng.choice(_PROFESSIONS)[1]}
+                       for i_id in film_ids],
+        }
+        self.__person_cores[person_id] = core
+        return core
+
+    def warm(self) -> None:
+        """
+        Построить основные поля всех записей заранее (иначе первый поиск
+        по фильтру отвечает заметно дольше остальных).
+
+        :return: None
+        """
+        for i_id in self.ids('film'):
+            self.film_core(i_id)
+        for i_id in self.ids('person'):
+            self.person_core(i_id)
+
+    def __person_link(self, person_id: int, rng: random.Random) -> Dict:
+        """
+        Персона в записи фильма (PersonInMovie).
+
+        :param person_id: Код персоны
+        :type person_id: int
+        :param rng: Генератор случайных чисел фильма
+        :type rng: random.Random
+
+        :return: Персона фильма
+        :rtype: Dict
+        """
+        name, en_name, _ = self.__name('person', person_id)
+        profession, en_profession = rng.choice(_PROFESSIONS)
+        return {'id': person_id,
+                'photo': 'https://mock.local/photo/{}.jpg'.format(person_id),
+                'name': name, 'enName': en_name,
+                'profession': profession, 'enProfession': en_profession}
+
+    def __film_link(self, film_id: int) -> Dict:
+        """
+        Фильм в записи другого фильма (LinkedMovie).
+
+        :param film_id: Код фильма
+        :type film_id: int
+
+        :return: Связанный фильм
+        :rtype: Dict
+        """
+        name, en_name, film_type = self.__name('film', film_id)
+        return {'id': film_id, 'name': name, 'enName': en_name,
+                'alternativeName': en_name, 'type': film_type,
+                'poster': {
+                    'url': 'https://mock.local/poster/{}.jpg'.format(film_id),
+                    'previewUrl': 'https://mock.local/poster/{}_s.jpg'.
+                    format(film_id)
+                }}
+
+    def __make_film(self, film_id: int) -> Dict | None:
+        """
+        Полная запись фильма: схема MovieDtoV1_3 и основные поля.
+
+        :param film_id: Код фильма
+        :type film_id: int
+
+        :return: Запись фильма или None, если фильма нет
+        :rtype: Dict | None
+        """
+        core = self.film_core(film_id)
+        if core is None:
+            return None
+        rng = self.__rng('film-doc', film_id)
+        data = self.__faker.make(self.__faker.schema('MovieDtoV1_3'), rng)
+        data.update(core)
+        data['poster'] = self.__film_link(film_id)['poster']
+        return data
+
+    def __make_person(self, person_id: int) -> Dict | None:
+        """
+        Полная запись персоны: схема Person и основные поля.
+
+        :param person_id: Код персоны
+        :type person_id: int
+
+        :return: Запись персоны или None, если персоны нет
+        :rtype: Dict | None
+        """
+        core = self.person_core(person_id)
+        if core is None:
+            return None
+        rng = self.__rng('person-doc', person_id)
+        data = self.__faker.make(self.__faker.schema('Person'), rng)
+        data.update(core)
+        data['deathPlace'] = []
+        return data
+
+
+def _values(data: Any, field: str) -> List[Any]:
+    """
+    Значения поля записи по пути через точку (в массивах - все значения).
+
+    :param data: Запись
+    :type data: Any
+    :param field: Путь к полю ("rating.kp", "genres.name")
+    :type field: str
+
+    :return: Значения поля (без пустых)
+    :rtype: List[Any]
+    """
+    values = [data]
+    for i_key in field.split('.'):
+        found = []
+        for i_value in values:
+            items = i_value if isinstance(i_value, list) else [i_value]
+            found += [i_item.get(i_key) for i_item in items
+                      if isinstance(i_item, dict)]
+        values = found
+    result = []
+    for i_value in values:
+        if isinstance(i_value, list):
+            result += i_value
+        elif i_value is not None:
+            result.append(i_value)
+    return result
+
+
+def _match(values: List[Any], expected: str, contains: bool) -> bool:
+    """
+    Подходит ли значение поля под значение фильтра: "!null" - значение
+    есть, "a-b" - число в интервале, иначе - значение равно значению
+    фильтра (строки - без учёта регистра).
+
+    :param values: Значения поля записи
+    :type values: List[Any]
+    :param expected: Значение фильтра (без знаков "+" и "!")
+    :type expected: str
+    :param contains: Строка должна только содержать значение фильтра
+    :type contains: bool
+
+    :return: Истина, если подходит хотя бы одно значение
+    :rtype: bool
+    """
+    if expected == '!null':
+        return bool(values)
+    low, sep, high = expected.partition('-')
+    for i_value in values:
+        if isinstance(i_value, (int, float)) and \
+                not isinstance(i_value, bool):
+            try:
+                if sep and low:
+                    if float(low) <= i_value <= float(high):
+                        return True
+                elif float(expected) == i_value:
+                    return True
+            except ValueError:
+                continue
+        elif contains and expected.lower() in str(i_value).lower():
+            return True
+        elif expected.lower() == str(i_value).lower():
+            return True
+    return False
+
+
+def _passes(data: Dict, conditions: List[Tuple[str, List[str]]]) -> bool:
+    """
+    Подходит ли запись под фильтр. Из значений поля без знака нужно
+    любое, значения со знаком "+" - все, со знаком "!" - ни одного.
+
+    :param data: Запись
+    :type data: Dict
+    :param conditions: Фильтр [(поле, значения)]
+    :type conditions: List[Tuple[str, List[str]]]
+
+    :return: Истина, если запись подходит
+    :rtype: bool
+    """
+    for i_field, i_expected in conditions:
+        values = _values(data, i_field)
+        contains = i_field in _TEXT_FIELDS
+        plain = [i_item for i_item in i_expected
+                 if i_item == '!null' or i_item[:1] not in '+!']
+        if plain and not any(_match(values, i_item, contains)
+                             for i_item in plain):
+            return False
+        for i_item in i_expected:
+            if i_item[:1] == '+' and \
+                    not _match(values, i_item[1:], contains):
+                return False
+            if i_item[:1] == '!' and i_item != '!null' and \
+                    _match(values, i_item[1:], contains):
+                return False
+    return True
+
+
+def _sort(records: List[Dict], fields: List[str],
+          types: List[str]) -> List[Dict]:
+    """
+    Упорядочить записи по полям (записи без значения поля - в конце).
+
+    :param records: Записи
+    :type records: List[Dict]
+    :param fields: Поля сортировки
+    :type fields: List[str]
+    :param types: Порядок по каждому полю: "1" - по возрастанию, "-1" -
+        по убыванию
+    :type types: List[str]
+
+    :return: Упорядоченные записи
+    :rtype: List[Dict]
+    """
+    for i_index in reversed(range(len(fields))):
+        field = fields[i_index]
+        descending = i_index < len(types) and types[i_index] == '-1'
+        present = [i_record for i_record in records
+                   if _values(i_record, field)]
+        absent = [i_record for i_record in records
+                  if not _values(i_record, field)]
+        present.sort(key=lambda i_record: _values(i_record, field)[0],
+                     reverse=descending)
+        records = present + absent
+    return records
+
+
+def _split(values: Iterable[str]) -> List[str]:
+    """
+    Значения параметра запроса, разделённые пробелами (selectFields,
+    sortField, sortType) или повторами параметра.
+
+    :param values: Значения параметра
+    :type values: Iterable[str]
+
+    :return: Значения по отдельности
+    :rtype: List[str]
+    """
+    return [i_part for i_value in values for i_part in i_value.split()]
+
+
+class MockServer:
+    """
+    Тестовый сервер API сайта.
+
+    Attributes:
+        __spec (Dict): Описание API сайта
+        __faker (SchemaFaker): Значения по схемам описания
+        __catalog (MockCatalog): Каталог фильмов и персон
+        __api_key (str): Ключ API (пусто - подходит любой ключ)
+        __latency, __jitter (float): Задержка ответа и её разброс (сек)
+        __error_rate (float): Доля ответов с ошибкой 5xx
+        __rate_limit (float): Запросов в секунду по ключу (0 - без
+            ограничения)
+        __throttle_rate (float): Доля случайных ответов 429
+        __retry_after (float): Значение Retry-After (меньше 0 - без
+            заголовка)
+        __daily_quota (int): Суточная квота ключа (0 - без ограничения)
+        __default_fields (Dict[str, Tuple[str, ...]]): Поля записей списка
+            по умолчанию (без selectFields) по виду записей
+        __rng (random.Random): Генератор поведения сервера (задержки,
+            ошибки), один на все запросы
+        statuses (Counter): Количество ответов по кодам
+    """
+
+    def __init__(self, catalog: MockCatalog = None, spec: Dict = None,
+                 api_key: str = '', latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit: float = 0.0, throttle_rate: float = 0.0,
+                 retry_after: float = 1.0, daily_quota: int = 0,
+                 seed: int = 0) -> None:
+        if spec is None:
+            with open(SPEC_FILE, 'rt', encoding='utf-8') as text:
+                spec = json.load(text)
+        self.__spec: Dict = spec
+        self.__faker: SchemaFaker = SchemaFaker(spec)
+        self.__catalog: MockCatalog = catalog or \
+            MockCatalog(self.__faker, seed=seed)
+        self.__api_key: str = api_key
+        self.__latency: float = latency
+        self.__jitter: float = jitter
+        self.__error_rate: float = error_rate
+        self.__rate_limit: float = rate_limit
+        self.__throttle_rate: float = throttle_rate
+        self.__retry_after: float = retry_after
+        self.__daily_quota: int = daily_quota
+        self.__default_fields: Dict[str, Tuple[str, ...]] = {
+            i_kind: tuple(self.__faker.schema(i_schema).get('properties',
+                                                            dict()))
+            for i_kind, i_schema in _DEFAULT_SCHEMAS.items()
+        }
+        self.__rng = random.Random(seed)
+        # Запросы по ключу: за текущую секунду и за текущие сутки
+        self.__window: Dict[str, Tuple[int, int]] = dict()
+        self.__used: Dict[str, Tuple[date, int]] = dict()
+        self.__runner: web.AppRunner | None = None
+        self.__thread: threading.Thread | None = None
+        self.__loop: asyncio.AbstractEventLoop | None = None
+        self.statuses: Counter = Counter()
+
+    @property
+    def catalog(self) -> MockCatalog:
+        """
+        Каталог фильмов и персон сервера.
+
+        :return: Каталог
+        :rtype: MockCatalog
+        """
+        return self.__catalog
+
+    def __error(self, status: int, message: str, **headers) \
+            -> web.Response:
+        """
+        Ответ с ошибкой (ErrorResponseDto).
+
+        :param status: Код ответа
+        :type status: int
+        :param message: Сообщение об ошибке
+        :type message: str
+        :param headers: Заголовки ответа
+        :type headers: str
+
+        :return: Ответ
+        :rtype: web.Response
+        """
+        return web.json_response(
+            {'statusCode': status, 'message': message,
+             'error': HTTPStatus(status).phrase},
+            status=status, headers=headers
+        )
+
+    def __example(self, schema: str, default: str) -> str:
+        """
+        Сообщение об ошибке из примера схемы ответа в описании API.
+
+        :param schema: Имя схемы ответа с ошибкой
+        :type schema: str
+        :param default: Сообщение, если примера нет
+        :type default: str
+
+        :return: Сообщение
+        :rtype: str
+        """
+        message = self.__faker.schema(schema).get('properties', dict()).\
+            get('message', dict()).get('example')
+        return message or default
+
+    def __throttled(self, key: str) -> web.Response | None:
+        """
+        Проверить квоту и частоту запросов ключа API.
+
+        :param key: Ключ API
+        :type key: str
+
+        :return: Ответ 403 (квота исчерпана), 429 (превышена частота) или
+            None, если запрос можно выполнить
+        :rtype: web.Response | None
+        """
+        today = date.today()
+        day, used = self.__used.get(key, (today, 0))
+        used = used + 1 if day == today else 1
+        self.__used[key] = (today, used)
+        if self.__daily_quota and used > self.__daily_quota:
+            return self.__error(403, self.__example(
+                'ForbiddenErrorResponseDto', 'Превышен дневной лимит!'
+            ))
+
+        headers = dict()
+        if self.__retry_after >= 0:
+            headers['Retry-After'] = '{:g}'.format(self.__retry_after)
+        second = int(time.monotonic())
+        window, count = self.__window.get(key, (second, 0))
+        count = count + 1 if window == second else 1
+        self.__window[key] = (second, count)
+        if self.__rate_limit and count > self.__rate_limit:
+            return self.__error(429, 'Too Many Requests', **headers)
+        if self.__throttle_rate and self.__rng.random() < self.__throttle_rate:
+            return self.__error(429, 'Too Many Requests', **headers)
+        return None
+
+    @web.middleware
+    async def __behaviour(self, request: web.Request,
+                          handler: Callable) -> web.StreamResponse:
+        """
+        Поведение сайта: ключ API, квота и частота запросов, задержка и
+        ответы с ошибкой.
+
+        :param request: Запрос
+        :type request: web.Request
+        :param handler: Обработчик запроса
+        :type handler: Callable
+
+        :return: Ответ
+        :rtype: web.StreamResponse
+        """
+        delay = max(0.0, self.__rng.gauss(self.__latency, self.__jitter)) \
+            if self.__jitter else self.__latency
+        failed = self.__error_rate and self.__rng.random() < self.__error_rate
+        if delay:
+            await asyncio.sleep(delay)
+
+        key = request.headers.get('X-API-KEY', '')
+        if not key or (self.__api_key and key != self.__api_key):
+            response = self.__error(401, self.__example(
+                'UnauthorizedErrorResponseDto', 'В запросе не указан токен!'
+            ))
+        else:
+            response = self.__throttled(key)
+        if response is None and failed:
+            status = self.__rng.choice((500, 502, 503))
+            response = self.__error(status, 'Mock server error')
+        if response is None:
+            try:
+                response = await handler(request)
+            except web.HTTPException as err:
+                response = self.__error(err.status, err.reason)
+        self.statuses[response.status] += 1
+        return response
+
+    def __page(self, request: web.Request, kind: str) -> web.Response:
+        """
+        Страница записей каталога по фильтру (поиск фильмов или персон).
+        Поля записей - из selectFields, без него - поля по умолчанию.
+
+        :param request: Запрос
+        :type request: web.Request
+        :param kind: Вид записей ("film" или "person")
+        :type kind: str
+
+        :return: Ответ: docs, total, limit, page, pages
+        :rtype: web.Response
+        """
+        query = request.query
+        try:
+            page = max(1, int(query.get('page', 1)))
+            limit = min(max(1, int(query.get('limit', 10))), MAX_LIMIT)
+        except ValueError:
+            return self.__error(400, 'page и limit должны быть числами')
+        conditions = [(i_field, query.getall(i_field))
+                      for i_field in dict.fromkeys(query.keys())
+                      if i_field not in _SERVICE_PARAMS]
+        sort_fields = _split(query.getall('sortField', []))
+        sort_types = _split(query.getall('sortType', []))
+
+        # Основных полей достаточно, если фильтр и сортировка только по ним
+        core = self.__catalog.film_core if kind == 'film' \
+            else self.__catalog.person_core
+        full = self.__catalog.film if kind == 'film' \
+            else self.__catalog.person
+        used = {i_field.split('.')[0] for i_field, _ in conditions} | \
+            {i_field.split('.')[0] for i_field in sort_fields}
+        ids = self.__catalog.ids(kind)
+        source = core if not ids or used <= set(core(ids[0])) else full
+
+        records = [i_record for i_record in map(source, ids)
+                   if _passes(i_record, conditions)]
+        if sort_fields:
+            records = _sort(records, sort_fields, sort_types)
+        total = len(records)
+        docs = [full(i_record['id']) for i_record in
+                records[(page - 1) * limit:page * limit]]
+
+        fields = _split(query.getall('selectFields', [])) or \
+            self.__default_fields[kind]
+        docs = [{i_field: i_doc.get(i_field) for i_field in fields
+                 if i_field in i_doc} for i_doc in docs]
+        return web.json_response(
+            {'docs': docs, 'total': total, 'limit': limit, 'page': page,
+             'pages': (total + limit - 1) // limit},
+            dumps=lambda i_data: json.dumps(i_data, ensure_ascii=False)
+        )
+
+    def __one(self, request: web.Request, kind: str) -> web.Response:
+        """
+        Запись каталога по коду.
+
+        :param request: Запрос
+        :type request: web.Request
+        :param kind: Вид записей ("film" или "person")
+        :type kind: str
+
+        :return: Ответ с записью или 404
+        :rtype: web.Response
+        """
+        get = self.__catalog.film if kind == 'film' else self.__catalog.person
+        data = get(int(request.match_info['id']))
+        if data is None:
+            return self.__error(404, 'Не найдено')
+        return web.json_response(
+            data, dumps=lambda i_data: json.dumps(i_data, ensure_ascii=False)
+        )
+
+    def __random(self, request: web.Request) -> web.Response:
+        """
+        Случайный фильм.
+
+        :param request: Запрос
+        :type request: web.Request
+
+        :return: Ответ с фильмом или 404, если каталог пуст
+        :rtype: web.Response
+        """
+        ids = self.__catalog.ids('film')
+        if not ids:
+            return self.__error(404, 'Не найдено')
+        return web.json_response(
+            self.__catalog.film(self.__rng.choice(ids)),
+            dumps=lambda i_data: json.dumps(i_data, ensure_ascii=False)
+        )
+
+    def __generic(self, operation: Dict) -> Callable:
+        """
+        Обработчик пути описания API без каталога: ответ строится по схеме
+        ответа (одна и та же запись для одного и того же запроса).
+
+        :param operation: Описание запроса (GET) из описания API
+        :type operation: Dict
+
+        :return: Обработчик запроса
+        :rtype: Callable
+        """
+        responses = operation.get('responses', dict())
+        schema = dict()
+        for i_code in ('200', 'default'):
+            content = (responses.get(i_code) or dict()).get('content', dict())
+            schema = self.__faker.resolve(
+                content.get('application/json', dict()).get('schema')
+            )
+            if schema.get('properties') or schema.get('items'):
+                break
+
+        async def handler(request: web.Request) -> web.Response:
+            rng = random.Random(request.path_qs)
+            data = self.__faker.make(schema, rng)
+            if isinstance(data, dict) and 'docs' in data:
+                limit = min(max(1, int(request.query.get('limit', 10))),
+                            MAX_LIMIT)
+                page = max(1, int(request.query.get('page', 1)))
+                items = self.__faker.resolve(
+                    schema['properties']['docs'].get('items')
+                )
+                data.update(docs=[self.__faker.make(items, rng)
+                                  for _ in range(limit)],
+                            total=limit * 10, limit=limit, page=page,
+                            pages=10)
+            return web.json_response(
+                data, dumps=lambda i_data: json.dumps(i_data,
+                                                      ensure_ascii=False)
+            )
+
+        return handler
+
+    def make_app(self) -> web.Application:
+        """
+        Приложение aiohttp со всеми GET-запросами из описания API.
+
+        :return: Приложение
+        :rtype: web.Application
+        """
+        special = {
+            '/v1.3/movie': lambda i_request: self.__page(i_request, 'film'),
+            '/v1/movie': lambda i_request: self.__page(i_request, 'film'),
+            '/v1/person': lambda i_request: self.__page(i_request, 'person'),
+            '/v1.3/movie/{id}': lambda i_request: self.__one(i_request,
+                                                             'film'),
+            '/v1/movie/{id}': lambda i_request: self.__one(i_request, 'film'),
+            '/v1/person/{id}': lambda i_request: self.__one(i_request,
+                                                            'person'),
+            '/v1.3/movie/random': self.__random,
+            '/v1/movie/random': self.__random,
+        }
+        app = web.Application(middlewares=[self.__behaviour])
+        # Пути без параметров - раньше (иначе "random" займёт путь "{id}")
+        paths = sorted(self.__spec.get('paths', dict()).items(),
+                       key=lambda i_item: '{' in i_item[0])
+        for i_path, i_methods in paths:
+            if 'get' not in i_methods:
+                continue
+            handler = special.get(i_path)
+            if handler is None:
+                handler = self.__generic(i_methods['get'])
+            else:
+                handler = self.__async(handler)
+            app.router.add_get(i_path.replace('{id}', r'{id:\d+}'), handler)
+        return app
+
+    @classmethod
+    def __async(cls, func: Callable[[web.Request], web.Response]) \
+            -> Callable:
+        """
+        Асинхронный обработчик из обычной функции.
+
+        :param func: Функция: запрос - ответ
+        :type func: Callable[[web.Request], web.Response]
+
+        :return: Обработчик запроса
+        :rtype: Callable
+        """
+        async def handler(request: web.Request) -> web.Response:
+            return func(request)
+
+        return handler
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """
+        Запустить сервер в текущем цикле событий.
+
+        :param host: Адрес сервера
+        :type host: str
+        :param port: Порт сервера (0 - любой свободный)
+        :type port: int
+
+        :return: Адрес сервера для HOST_API (http://адрес:порт)
+        :rtype: str
+        """
+        self.__catalog.warm()
+        self.__runner = web.AppRunner(self.make_app(), access_log=None)
+        await self.__runner.setup()
+        await web.TCPSite(self.__runner, host, port).start()
+        host, port = self.__runner.addresses[0][:2]
+        log.info('Тестовый сервер API сайта запущен на {}:{}'.
+                 format(host, port))
+        return 'http://{}:{}'.format(host, port)
+
+    async def stop(self) -> None:
+        """
+        Остановить сервер.
+
+        :return: None
+        """
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+            self.__runner = None
+            log.info('Тестовый сервер API сайта остановлен {}'.
+                     format(self.stats()))
+
+    def start_thread(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """
+        Запустить сервер в фоновом потоке (для проверки синхронного
+        интерфейса и обходчика каталога).
+
+        :param host: Адрес сервера
+        :type host: str
+        :param port: Порт сервера (0 - любой свободный)
+        :type port: int
+
+        :return: Адрес сервера для HOST_API (http://адрес:порт)
+        :rtype: str
+        """
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=self.__loop.run_forever,
+                                         daemon=True, name='mock-server')
+        self.__thread.start()
+        return asyncio.run_coroutine_threadsafe(
+            self.start(host, port), self.__loop
+        ).result()
+
+    def stop_thread(self) -> None:
+        """
+        Остановить сервер, запущенный в фоновом потоке.
+
+        :return: None
+        """
+        if self.__thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), self.__loop).result()
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__loop.close()
+        self.__thread = None
+        self.__loop = None
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Вернуть счётчики ответов сервера.
+
+        :return: Всего ответов и ответов по кодам
+        :rtype: Dict[str, int]
+        """
+        return {'requests': sum(self.statuses.values()),
+                **{str(i_status): i_count
+                   for i_status, i_count in sorted(self.statuses.items())}}
+
+
+def create_server(settings: MockServerSettings = None) -> MockServer:
+    """
+    Тестовый сервер с каталогом по настройкам.
+
+    :param settings: Настройки (по умолчанию - из переменных окружения)
+    :type settings: MockServerSettings
+
+    :return: Сервер (ещё не запущен)
+    :rtype: MockServer
+    """
+    settings = settings or MockServerSettings()
+    with open(SPEC_FILE, 'rt', encoding='utf-8') as text:
+        spec = json.load(text)
+    catalog = MockCatalog(SchemaFaker(spec), settings.mock_films,
+                          settings.mock_persons, settings.mock_seed)
+    return MockServer(catalog, spec, settings.mock_api_key,
+                      settings.mock_latency, settings.mock_jitter,
+                      settings.mock_error_rate, settings.mock_rate_limit,
+                      settings.mock_throttle_rate, settings.mock_retry_after,
+                      settings.mock_daily_quota, settings.mock_seed)
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    mock_settings = MockServerSettings()
+    mock_server = create_server(mock_settings)
+    mock_server.catalog.warm()
+    web.run_app(mock_server.make_app(),
+                host=mock_settings.mock_host, port=mock_settings.mock_port,
+                access_log=None)
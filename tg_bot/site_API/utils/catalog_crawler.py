@@ -0,0 +1,378 @@
+"""
+Модуль фонового обхода каталога сайта (фильмы и персоны) для заполнения
+кеша бота в БД до первых запросов пользователей.
+
+Обходчик в фоновом потоке запрашивает страницы /v1.3/movie и /v1/person
+по возрастанию кода записи (тем же интерфейсом SiteApiInterface, с теми же
+заголовками и общими ограничениями запросов ключа API) и передаёт их
+функции записи (register_storage). Следующая страница запрашивается с
+кода последней записанной записи (курсор), а не по номеру страницы,
+поэтому новые записи сайта не сдвигают страницы, а после перезапуска обход
+продолжается с записанного курсора.
+
+Обходчик расходует не больше заданной доли (share) суточной квоты и
+частоты запросов ключа API: остальное остаётся запросам пользователей.
+Когда доля суточной квоты исчерпана, обход ждёт следующих суток. После
+полного обхода каталога следующий обход начинается через pause секунд.
+Расход доли суточной квоты записывается вместе с каждой страницей и
+курсором, поэтому перезапуск бота не начинает квоту дня заново.
+
+Ожидания обходчика (квоты, частоты запросов, повторов после ошибок
+сайта) прерываются остановкой, поэтому завершение работы бота ждёт
+остановки обхода не дольше одного запроса к сайту (и не больше
+STOP_TIMEOUT секунд).
+
+Обход можно проверить на локальном сервере вместо сайта: интерфейс
+SiteApiInterface с адресом этого сервера и crawl(max_pages) без потока.
+
+
+:Classes
+    CatalogCrawler - Фоновый обход каталога сайта.
+
+
+:var
+    CATALOG_KINDS - Виды записей каталога в порядке обхода.
+
+    ERROR_PAUSE - Пауза после ошибки сайта (сек).
+
+    IDLE_INTERVAL - Как часто проверять, не пора ли начать новый обход
+        (сек).
+
+    STOP_TIMEOUT - Сколько ждать остановки потока обхода (сек).
+"""
+
+from settings import logger
+import asyncio
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+from site_API.utils.site_api_handler import SiteApiInterface
+from site_API.utils.throttling import TokenBucket, DailyQuota
+
+
+CATALOG_KINDS: Tuple[str, ...] = ('film', 'person')
+
+ERROR_PAUSE: float = 60.0
+IDLE_INTERVAL: float = 600.0
+STOP_TIMEOUT: float = 10.0
+
+
+def _seconds_to_midnight() -> float:
+    """
+    Сколько секунд до начала следующих суток (сброс суточной квоты).
+
+    :return: Секунд до полуночи
+    :rtype: float
+    """
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1),
+                                datetime.min.time())
+    return (midnight - now).total_seconds()
+
+
+class CatalogCrawler:
+    """
+    Фоновый обход каталога сайта.
+
+    Attributes:
+        __api (SiteApiInterface): Интерфейс API сайта
+        __page_size (int): Записей на странице
+        __pause (float): Пауза между полными обходами каталога (сек)
+        __bucket (TokenBucket): Доля частоты запросов ключа API
+        __quota (DailyQuota | None): Доля суточной квоты (None - доли
+            квоты не хватает даже на один запрос)
+        __store (Callable): Записать страницу каталога (вид записей,
+            записи, курсор, обход закончен, день и расход квоты)
+        __load (Callable): Курсоры обхода {вид: (курсор, время окончания
+            полного обхода или None)}
+        __load_quota (Callable): Записанный расход квоты (день, запросов)
+        pages, items, errors (int): Получено страниц, записей, ошибок сайта
+    """
+
+    def __init__(self, api: SiteApiInterface, share: float = 0,
+                 per_second: float = 0, daily_quota: int = 0,
+                 page_size: int = 250, pause: float = 7 * 24 * 3600,
+                 error_pause: float = ERROR_PAUSE) -> None:
+        self.__api: SiteApiInterface = api
+        self.__share: float = min(max(share, 0.0), 1.0)
+        self.__page_size: int = min(max(page_size, 1), 250)
+        self.__pause: float = pause
+        self.__error_pause: float = error_pause
+        self.__bucket = TokenBucket(per_second * self.__share)
+        # Квота 0 - без ограничения, поэтому доля квоты меньше одного
+        # запроса означает, что обходить каталог нельзя
+        quota = int(daily_quota * self.__share)
+        self.__quota: DailyQuota | None = \
+            DailyQuota(quota) if quota or not daily_quota else None
+        self.__store: Callable[..., None] | None = None
+        self.__load: Callable[[], Dict[str, Tuple[int, Any]]] | None = None
+        self.__load_quota: Callable[[], Tuple[date | None, int]] | None = \
+            None
+        self.__disabled: bool = False
+
+        self.__stop_event = threading.Event()
+        self.__thread: threading.Thread | None = None
+        self.pages: int = 0
+        self.items: int = 0
+        self.errors: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Обход каталога включён: задана доля квоты, её хватает на запросы и
+        назначены функции записи.
+
+        :return: Истина, если каталог можно обходить
+        :rtype: bool
+        """
+        return not self.__disabled and self.__share > 0 and \
+            self.__quota is not None and self.__store is not None
+
+    def register_storage(
+            self, store: Callable[..., None],
+            load: Callable[[], Dict[str, Tuple[int, Any]]],
+            load_quota: Callable[[], Tuple[date | None, int]] = None) \
+            -> None:
+        """
+        Назначить функции записи страниц каталога и чтения курсоров и
+        расхода квоты.
+
+        :param store: Записать страницу (вид записей, записи, код последней
+            записи, обход закончен, день расхода квоты, запросов за день)
+            вместе с курсором и расходом квоты
+        :type store: Callable[..., None]
+        :param load: Курсоры {вид записей: (код последней записанной
+            записи, время окончания полного обхода или None)}
+        :type load: Callable[[], Dict[str, Tuple[int, Any]]]
+        :param load_quota: Записанный расход квоты (день или None,
+            запросов за день)
+        :type load_quota: Callable[[], Tuple[date | None, int]]
+
+        :return: None
+        """
+        self.__store = store
+        self.__load = load
+        self.__load_quota = load_quota
+
+    def set_shard(self, index: int, shards: int) -> None:
+        """
+        В процессах-обработчиках (шардах) каталог не обходится: его обходит
+        основной процесс.
+
+        :param index: Номер шарда
+        :type index: int
+        :param shards: Количество шардов
+        :type shards: int
+
+        :return: None
+        """
+        self.__disabled = True
+
+    def __acquire(self) -> bool:
+        """
+        Дождаться места в доле квоты и частоты запросов обходчика.
+
+        :return: Истина - можно запросить страницу, Ложь - обход остановлен
+        :rtype: bool
+        """
+        while not self.__quota.try_acquire():
+            log.info('Обход каталога: доля суточной квоты исчерпана')
+            if self.__stop_event.wait(_seconds_to_midnight() + 1):
+                return False
+        delay = self.__bucket.reserve()
+        if delay and self.__stop_event.wait(delay):
+            return False
+        return not self.__stop_event.is_set()
+
+    def fetch_page(self, kind: str, cursor: int) -> List[Dict] | None:
+        """
+        Запросить страницу каталога после курсора.
+
+        :param kind: Вид записей ("film" или "person")
+        :type kind: str
+        :param cursor: Код последней полученной записи
+        :type cursor: int
+
+        :return: Записи страницы или None при ошибке сайта
+        :rtype: List[Dict] | None
+        """
+        response = self.__api.get_catalog_page(kind, cursor,
+                                               self.__page_size,
+                                               self.__stop_event)
+        if isinstance(response, int):
+            log.warning('Обход каталога {}: сайт вернул код {}'.
+                        format(kind, response))
+            return None
+        try:
+            docs = response.json().get('docs')
+        except (ValueError, AttributeError) as err:
+            log.warning('Обход каталога {}: ответ не разобран: {}'.
+                        format(kind, err))
+            return None
+        if not isinstance(docs, list):
+            return None
+        return docs
+
+    def __crawl_kind(self, kind: str, cursor: int,
+                     max_pages: int | None) -> int:
+        """
+        Обойти каталог одного вида записей с курсора до конца каталога,
+        остановки или max_pages страниц.
+
+        :param kind: Вид записей ("film" или "person")
+        :type kind: str
+        :param cursor: Код последней записанной записи
+        :type cursor: int
+        :param max_pages: Сколько страниц получить (None - без ограничения)
+        :type max_pages: int | None
+
+        :return: Получено страниц
+        :rtype: int
+        """
+        pages = 0
+        while max_pages is None or pages < max_pages:
+            if not self.__acquire():
+                break
+            docs = self.fetch_page(kind, cursor)
+            if docs is None:
+                self.errors += 1
+                if self.__stop_event.wait(self.__error_pause):
+                    break
+                continue
+
+            ids = [i_doc['id'] for i_doc in docs if isinstance(i_doc, dict)
+                   and isinstance(i_doc.get('id'), int)]
+            last = max(ids, default=cursor)
+            # Неполная страница (или страница без новых кодов) - последняя
+            finished = len(docs) < self.__page_size or last <= cursor
+            self.__store(kind, docs, max(last, cursor), finished,
+                         self.__quota.day, self.__quota.used)
+            pages += 1
+            self.pages += 1
+            self.items += len(ids)
+            cursor = last
+            if finished:
+                log.info('Обход каталога {} закончен: код {}'.
+                         format(kind, cursor))
+                break
+        return pages
+
+    def crawl(self, max_pages: int = None) -> int:
+        """
+        Обойти каталог (фильмы, затем персоны) с записанных курсоров до
+        конца, остановки или max_pages страниц. Каталог, обход которого
+        закончен меньше pause секунд назад, пропускается, иначе обход
+        начинается заново.
+
+        :param max_pages: Сколько страниц получить (None - без ограничения)
+        :type max_pages: int
+
+        :return: Получено страниц
+        :rtype: int
+        """
+        if not self.enabled:
+            return 0
+        cursors = self.__load()
+        if self.__load_quota is not None:
+            self.__quota.restore(*self.__load_quota())
+        pages = 0
+        for i_kind in CATALOG_KINDS:
+            if self.__stop_event.is_set():
+                break
+            cursor, finished_at = cursors.get(i_kind, (0, None))
+            if finished_at is not None:
+                if (datetime.now() - finished_at).total_seconds() < \
+                        self.__pause:
+                    continue
+                cursor = 0
+            pages += self.__crawl_kind(
+                i_kind, cursor, None if max_pages is None
+                else max_pages - pages
+            )
+            if max_pages is not None and pages >= max_pages:
+                break
+        return pages
+
+    def start(self) -> None:
+        """
+        Запустить обход каталога в фоновом потоке (если обход включён и ещё
+        не запущен).
+
+        :return: None
+        """
+        if not self.enabled:
+            log.info('Обход каталога сайта выключен')
+            return
+        if self.__thread is not None:
+            return
+        self.__stop_event.clear()
+        self.__thread = threading.Thread(target=self.__run, daemon=True,
+                                         name='catalog-crawler')
+        self.__thread.start()
+        log.info('Обход каталога сайта запущен (доля квоты {:.0%})'.
+                 format(self.__share))
+
+    def stop(self, timeout: float = STOP_TIMEOUT) -> None:
+        """
+        Остановить обход каталога (записанная страница не теряется).
+
+        :param timeout: Сколько ждать остановки потока (сек)
+        :type timeout: float
+
+        :return: None
+        """
+        thread = self.__thread
+        if thread is None:
+            return
+        self.__stop_event.set()
+        thread.join(timeout)
+        if thread.is_alive():
+            log.warning('Обход каталога сайта не остановлен за {} сек'.
+                        format(timeout))
+            return
+        self.__thread = None
+        log.info('Обход каталога сайта остановлен {}'.format(self.stats()))
+
+    async def close(self) -> None:
+        """
+        Остановить обход каталога при завершении работы бота, не
+        останавливая цикл событий (поток ждёт в пуле потоков).
+
+        :return: None
+        """
+        await asyncio.to_thread(self.stop)
+
+    def __run(self) -> None:
+        """
+        Фоновый поток: обход каталога и ожидание следующего обхода.
+        У потока своё соединение с БД (открывается при первом запросе).
+
+        :return: None
+        """
+        while not self.__stop_event.is_set():
+            try:
+                self.crawl()
+            except Exception as err:
+                self.errors += 1
+                log.exception('Ошибка обхода каталога: {}'.format(err),
+                              exc_info=True)
+            self.__stop_event.wait(IDLE_INTERVAL)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Вернуть счётчики обхода каталога.
+
+        :return: Получено страниц, записей и ошибок сайта
+        :rtype: Dict[str, int]
+        """
+        return {'pages': self.pages, 'items': self.items,
+                'errors': self.errors}
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    CatalogCrawler()
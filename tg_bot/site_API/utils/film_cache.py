@@ -0,0 +1,232 @@
+"""
+Модуль кеширования сведений о фильмах (сквозное чтение).
+
+Первый уровень - словарь в памяти процесса (LRU) с уже разобранными
+сведениями о фильмах и временем жизни каждой записи. Второй уровень -
+хранилище (функция загрузки, например из таблицы FilmInfo), к которому
+обращаемся только при промахе первого уровня.
+
+Экранам, которым нужен только раздел сведений (рейтинг, персоны и т.п.),
+сведения выдаются методом get_section: если полных сведений нет в памяти,
+из хранилища читается только раздел (функция register_section_storage),
+и он хранится в памяти отдельно от полных сведений.
+"""
+
+from settings import logger
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+
+class FilmCache:
+    """
+    Кеш сведений о фильмах: LRU в памяти и хранилище вторым уровнем.
+
+    Attributes:
+        __max_size (int): Максимальное количество записей в памяти
+        __ttl (float): Время жизни записи в памяти (сек)
+        __storage (Callable): Функция загрузки из хранилища по ключу,
+            возвращает словарь или None
+        __section_storage (Callable): Функция загрузки раздела из
+            хранилища по ключу и разделу, возвращает словарь или None
+        __items (OrderedDict): Записи кеша {ключ: (срок годности, данные)},
+            разделы сведений хранятся с ключом (ключ, раздел)
+        hits, misses, storage_hits (int): Счётчики попаданий в память,
+            промахов и попаданий во второй уровень
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 3600,
+                 storage: Callable[[str], Dict | None] = None) -> None:
+        self.__max_size: int = max(1, max_size)
+        self.__ttl: float = ttl
+        self.__storage: Callable[[str], Dict | None] | None = storage
+        self.__section_storage: \
+            Callable[[str, str], Dict | None] | None = None
+        self.__items: OrderedDict = OrderedDict()
+        self.__lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.storage_hits: int = 0
+
+    def register_storage(self, func: Callable[[str], Dict | None]) -> None:
+        """
+        Назначить функцию загрузки из хранилища (второй уровень).
+
+        :param func: Функция, принимающая ключ и возвращающая словарь
+            со сведениями или None, если сведений нет.
+        :type func: Callable
+
+        :return: None
+        """
+        self.__storage = func
+
+    def register_section_storage(
+            self, func: Callable[[str, str], Dict | None]) -> None:
+        """
+        Назначить функцию загрузки раздела сведений из хранилища.
+
+        :param func: Функция, принимающая ключ и раздел и возвращающая
+            словарь с полями раздела или None, если сведений нет.
+        :type func: Callable
+
+        :return: None
+        """
+        self.__section_storage = func
+
+    def __lookup(self, key: str | tuple) -> Dict | None:
+        """
+        Найти запись в памяти (блокировка уже взята).
+
+        :param key: Ключ записи
+        :type key: str | tuple
+
+        :return: Сведения или None, если записи нет или она устарела
+        :rtype: Dict | None
+        """
+        item = self.__items.get(key)
+        if item is None:
+            return None
+        if item[0] > time.monotonic():
+            self.__items.move_to_end(key)
+            return item[1]
+        # Запись устарела
+        del self.__items[key]
+        return None
+
+    def get(self, key: str | int) -> Dict | None:
+        """
+        Получить сведения по ключу: из памяти, а при промахе из хранилища.
+
+        :param key: Ключ (ID фильма на сайте)
+        :type key: str | int
+
+        :return: Сведения о фильме или None, если их нет
+        :rtype: Dict | None
+        """
+        key = str(key)
+        with self.__lock:
+            data = self.__lookup(key)
+            if data is not None:
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        data = None
+        if self.__storage and key:
+            data = self.__storage(key)
+            if data is not None:
+                self.storage_hits += 1
+                self.put(key, data)
+        return data
+
+    def get_section(self, key: str | int, section: str) -> Dict | None:
+        """
+        Получить раздел сведений по ключу: полные сведения из памяти, если
+        они там есть, иначе раздел из памяти или из хранилища разделов.
+
+        :param key: Ключ (ID фильма на сайте)
+        :type key: str | int
+        :param section: Раздел сведений
+        :type section: str
+
+        :return: Сведения, в которых есть поля раздела, или None
+        :rtype: Dict | None
+        """
+        key = str(key)
+        if self.__section_storage is None:
+            return self.get(key)
+
+        with self.__lock:
+            data = self.__lookup(key)
+            if data is None:
+                data = self.__lookup((key, section))
+            if data is not None:
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        if not key:
+            return None
+        data = self.__section_storage(key, section)
+        if data is not None:
+            self.storage_hits += 1
+            self.__store((key, section), data)
+        return data
+
+    def __store(self, key: str | tuple, data: Dict) -> None:
+        """
+        Записать сведения в память (вытесняя самую старую запись).
+
+        :param key: Ключ записи
+        :type key: str | tuple
+        :param data: Сведения
+        :type data: Dict
+
+        :return: None
+        """
+        with self.__lock:
+            self.__items[key] = (time.monotonic() + self.__ttl, data)
+            self.__items.move_to_end(key)
+            while len(self.__items) > self.__max_size:
+                self.__items.popitem(last=False)
+
+    def put(self, key: str | int, data: Dict) -> None:
+        """
+        Записать сведения в память (вытесняя самую старую запись).
+
+        :param key: Ключ (ID фильма на сайте)
+        :type key: str | int
+        :param data: Разобранные сведения о фильме
+        :type data: Dict
+
+        :return: None
+        """
+        self.__store(str(key), data)
+
+    def invalidate(self, key: str | int) -> None:
+        """
+        Удалить запись из памяти (вместе с разделами).
+
+        :param key: Ключ (ID фильма на сайте)
+        :type key: str | int
+
+        :return: None
+        """
+        key = str(key)
+        with self.__lock:
+            self.__items.pop(key, None)
+            for i_key in [i_item for i_item in self.__items
+                          if isinstance(i_item, tuple) and i_item[0] == key]:
+                del self.__items[i_key]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Вернуть счётчики работы кеша.
+
+        :return: Размер, попадания, промахи и попадания в хранилище
+        :rtype: Dict[str, Any]
+        """
+        return {
+            'size': len(self.__items),
+            'max_size': self.__max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'storage_hits': self.storage_hits
+        }
+
+    def log_stats(self) -> None:
+        """
+        Записать счётчики работы кеша в протокол.
+
+        :return: None
+        """
+        log.info('Кеш фильмов: {}'.format(self.stats()))
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    FilmCache()
@@ -0,0 +1,108 @@
+"""
+Модуль объединения одинаковых одновременных запросов (single-flight).
+
+Пока выполняется запрос с некоторым ключом, все остальные вызовы с тем же
+ключом не делают своих запросов, а ждут и получают результат первого.
+Запрос выполняется отдельной задачей, поэтому отмена одного из ожидающих
+(в том числе того, кто начал запрос) не прерывает запрос для остальных.
+Запрос отменяется, только когда его результата больше никто не ждёт.
+
+
+:Classes
+    SingleFlight - Объединение одновременных вызовов с одинаковым ключом.
+"""
+
+from settings import logger
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    """
+    Выполняемый вызов: общая задача и количество ожидающих её результата.
+    """
+
+    def __init__(self, task: asyncio.Future) -> None:
+        self.task: asyncio.Future = task
+        self.waiters: int = 0
+
+
+class SingleFlight:
+    """
+    Объединение одновременных вызовов с одинаковым ключом.
+
+    Attributes:
+        __calls (Dict): Выполняемые сейчас вызовы {ключ: _Call}
+        calls (int): Количество выполненных вызовов
+        shared (int): Количество вызовов, получивших чужой результат
+    """
+
+    def __init__(self) -> None:
+        self.__calls: Dict[Hashable, _Call] = dict()
+        self.calls: int = 0
+        self.shared: int = 0
+
+    def __forget(self, key: Hashable, call: _Call) -> None:
+        """
+        Убрать вызов из выполняемых (новые вызовы с тем же ключом начнут
+        свой запрос).
+
+        :param key: Ключ вызова
+        :type key: Hashable
+        :param call: Вызов
+        :type call: _Call
+        """
+        if self.__calls.get(key) is call:
+            del self.__calls[key]
+
+    async def do(self, key: Hashable,
+                 func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Выполнить функцию или дождаться результата уже выполняемого
+        вызова с тем же ключом.
+
+        :param key: Ключ вызова (например, адрес и параметры запроса)
+        :type key: Hashable
+        :param func: Асинхронная функция без параметров
+        :type func: Callable[[], Awaitable[Any]]
+
+        :return: Результат функции (общий для всех ожидающих)
+        :rtype: Any
+        """
+        call = self.__calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self.__calls[key] = call
+            self.calls += 1
+
+            def done(task: asyncio.Future) -> None:
+                self.__forget(key, call)
+                # Исключение забираем сами, даже если его никто не ждёт
+                task.cancelled() or task.exception()
+
+            call.task.add_done_callback(done)
+        else:
+            self.shared += 1
+            log.debug('Ожидание результата выполняемого запроса {}'.
+                      format(key))
+
+        call.waiters += 1
+        try:
+            # Отмена ожидающего не должна отменять общий запрос
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # Результата больше никто не ждёт
+                self.__forget(key, call)
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    SingleFlight()
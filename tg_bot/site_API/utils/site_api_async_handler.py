@@ -0,0 +1,275 @@
+"""
+Модуль для асинхронного получения информации с сайта (связующая часть).
+
+Все запросы идут через одну сессию aiohttp с пулом соединений (keep-alive),
+которая открывается и закрывается вместе с телеграм-ботом. Если сессия
+не открыта, то запрос выполняется через синхронный модуль (requests) в
+отдельном потоке, чтобы не блокировать цикл событий.
+"""
+
+from settings import logger
+import asyncio
+import aiohttp
+import requests
+from typing import Any, Dict, List, NamedTuple, Tuple
+from yarl import URL
+
+from site_API.utils.site_api_handler import _make_response, \
+    make_filter_query, FILM_FILTER_PATH, FILM_FILTER_LIMIT, \
+    PERSON_FILTER_PATH
+from site_API.utils.single_flight import SingleFlight
+from site_API.utils.throttling import RequestGuard, parse_retry_after
+
+
+class SiteResponse(NamedTuple):
+    """
+    Ответ сайта, прочитанный из асинхронной сессии. Атрибуты совпадают
+    с requests.Response, поэтому обработка ответа одинаковая.
+
+    Attributes:
+        status_code (int): Код ответа сервера
+        text (str): Текст ответа сервера
+    """
+    status_code: int
+    text: str
+
+
+class AsyncSiteApiInterface:
+    """
+    Асинхронный интерфейс для работы с API сайта.
+    """
+
+    def __init__(self, param_url: str, param_headers: Dict,
+                 timeout: int = 5, pool_size: int = 10,
+                 guard: RequestGuard = None) -> None:
+        self.__base_url: str = param_url
+        self.__headers: Dict = param_headers
+        self.__timeout: int = timeout
+        self.__pool_size: int = pool_size
+
+        # Ограничения частоты и квоты запросов, повторы при ошибках
+        self.__guard: RequestGuard = guard or RequestGuard()
+        self.__session: aiohttp.ClientSession | None = None
+
+        # Одинаковые одновременные запросы выполняются один раз
+        self.__flight = SingleFlight()
+
+    async def open(self) -> None:
+        """
+        Открыть сессию с пулом соединений к сайту (если ещё не открыта).
+
+        :return: None
+        """
+        if self.__session and not self.__session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(limit=self.__pool_size,
+                                         ttl_dns_cache=300)
+        self.__session = aiohttp.ClientSession(
+            headers=self.__headers,
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.__timeout)
+        )
+        log.debug('Открыта сессия к сайту (пул соединений {})'.
+                  format(self.__pool_size))
+
+    async def close(self) -> None:
+        """
+        Закрыть сессию с сайтом.
+
+        :return: None
+        """
+        if self.__session and not self.__session.closed:
+            await self.__session.close()
+            log.debug('Сессия к сайту закрыта')
+        self.__session = None
+
+    async def _request(self, url: str, params: Dict,
+                       shared: bool = True) -> int | SiteResponse:
+        """
+        Получение ответа от сайта с информацией. Одновременные запросы с
+        одинаковыми адресом и параметрами ждут один общий ответ.
+
+        :param url: Адрес на сайте, где информация лежит.
+        :type url: str
+        :param params: Параметры запроса.
+        :type params: Dict
+        :param shared: Ложь, если каждый вызов должен получить свой ответ
+            (например, случайный фильм)
+        :type shared: bool
+
+        :return: Код ошибки (если код <> OK) или ответ от сервера
+        :rtype: int | SiteResponse
+        """
+        if not shared:
+            return await self.__fetch(url, params)
+
+        key = (url, tuple(sorted(params.items())))
+        return await self.__flight.do(key,
+                                      lambda: self.__fetch(url, params))
+
+    async def __fetch(self, url: str, params: Dict) \
+            -> int | SiteResponse:
+        """
+        Получение ответа от сайта с учётом частоты и квоты запросов.
+        При ошибках сайта (429, 5xx, сеть) запрос повторяется с задержкой.
+
+        :param url: Адрес на сайте, где информация лежит.
+        :type url: str
+        :param params: Параметры запроса.
+        :type params: Dict
+
+        :return: Код ошибки (если код <> OK) или ответ от сервера
+        :rtype: int | SiteResponse
+        """
+        attempt = 0
+        waited = 0.0
+        # Пробный запрос размыкателя освобождается, если результат не учтён
+        # (например, запрос отменён во время ожидания или отправки)
+        owner = object()
+        while True:
+            status_code = self.__guard.check(owner)
+            if status_code:
+                return status_code
+            try:
+                await asyncio.sleep(self.__guard.wait_time())
+
+                response, retry_after = await self.__send(url, params)
+                status_code = response if isinstance(response, int) \
+                    else response.status_code
+
+                delay = self.__guard.retry_delay(attempt, status_code,
+                                                 retry_after, waited)
+            finally:
+                self.__guard.release(owner)
+            if delay is None:
+                return response
+            await asyncio.sleep(delay)
+            waited += delay
+            attempt += 1
+
+    async def __send(self, url: str, params: Dict) \
+            -> Tuple[int | SiteResponse, float | None]:
+        """
+        Один запрос к сайту.
+
+        :param url: Адрес на сайте, где информация лежит.
+        :type url: str
+        :param params: Параметры запроса.
+        :type params: Dict
+
+        :return: Код ошибки (0 - сетевая ошибка) или ответ от сервера, а
+            также задержка из заголовка Retry-After (если есть)
+        :rtype: Tuple[int | SiteResponse, float | None]
+        """
+        success: int = 200
+
+        if not self.__session or self.__session.closed:
+            # Сессия не открыта - запасной (синхронный) вариант
+            try:
+                response = await asyncio.to_thread(
+                    _make_response, url, self.__headers, params,
+                    timeout=self.__timeout
+                )
+            except requests.RequestException as err:
+                log.exception('Ошибка запроса к сайту {}: {}'.
+                              format(url, err), exc_info=True)
+                return 0, None
+            return response, None
+
+        try:
+            # Адрес уже содержит закодированные параметры фильтра
+            async with self.__session.get(URL(url, encoded=True),
+                                          params=params) as response:
+                if response.status == success:
+                    return SiteResponse(response.status,
+                                        await response.text()), None
+                return response.status, parse_retry_after(
+                    response.headers.get('Retry-After')
+                )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            log.exception('Ошибка запроса к сайту {}: {}'.format(url, err),
+                          exc_info=True)
+        return 0, None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Вернуть счётчики запросов к сайту.
+
+        :return: Квота, состояние размыкателя, объединённые запросы
+        :rtype: Dict[str, Any]
+        """
+        result = self.__guard.stats()
+        result['calls'] = self.__flight.calls
+        result['shared'] = self.__flight.shared
+        return result
+
+    async def get_person_by_id(self, param_id: str) -> int | SiteResponse:
+        """
+        Получить информацию об актёре с сайта по id
+
+        :param param_id: ID актёра (персоны)
+
+        :return: response
+        """
+        url: str = "/".join((self.__base_url, 'v1', 'person', param_id))
+        return await self._request(url, {})
+
+    async def get_random_films(self) -> int | SiteResponse:
+        """
+        Получить данные по рандомному фильму.
+
+        :return: response
+        """
+        url: str = "/".join((self.__base_url, 'v1.3', 'movie', 'random'))
+        return await self._request(url, {}, shared=False)
+
+    async def get_one_film(self, param_id: str | int) -> int | SiteResponse:
+        """
+        Получить фильм по ID с сайта.
+
+        :param param_id: ID искомого файла
+
+        :return: response
+        """
+        url: str = "/".join((self.__base_url, 'v1.3', 'movie',
+                             str(param_id)))
+        return await self._request(url, {})
+
+    async def get_film_by_filter(self, param_filter: Dict[str, str | List],
+                                 limit: int = FILM_FILTER_LIMIT) \
+            -> int | SiteResponse:
+        """
+        Получить фильм по фильтру.
+
+        :param param_filter: Словарь для фильтрации значений.
+        :param limit: Сколько фильмов запросить.
+
+        :return: response
+        """
+        url: str = "/".join((self.__base_url, 'v1.3',
+                             FILM_FILTER_PATH.format(limit=int(limit)))) + \
+            make_filter_query(param_filter)
+        return await self._request(url, {})
+
+    async def get_person_by_filter(self,
+                                   param_filter: Dict[str, str | List]) \
+            -> int | SiteResponse:
+        """
+        Получить сведения о персонах по фильтру.
+
+        :param param_filter: Словарь с элементами фильтра.
+
+        :return: response
+        """
+        url: str = "/".join((self.__base_url, 'v1', PERSON_FILTER_PATH)) + \
+            make_filter_query(param_filter)
+        return await self._request(url, {})
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    AsyncSiteApiInterface()
@@ -3,15 +3,89 @@
 """
 
 from settings import logger
+import threading
+import time
 import requests
-from typing import Dict, Callable, List
+from typing import Dict, Callable, List, Tuple
 from urllib.parse import quote
 
+from site_API.utils.throttling import RequestGuard, parse_retry_after
 
-def _make_response(url: str, headers: Dict, params: Dict) -> \
+
+# Сколько фильмов по фильтру запрашивать по умолчанию
+FILM_FILTER_LIMIT: int = 10
+
+# Поля фильма в ответе сайта на запрос фильмов по фильтру (и при обходе
+# каталога фильмов - чтобы записи в БД были одного вида)
+FILM_SELECT_FIELDS: Tuple[str, ...] = (
+    'id', 'type', 'name', 'shortDescription', 'description', 'distributors',
+    'premiere', 'year', 'rating', 'votes', 'movieLength', 'images',
+    'productionCompanies', 'budget', 'poster', 'facts', 'genres',
+    'countries', 'videos', 'persons', 'enName', 'ageRating', 'logo', 'names'
+)
+
+# Путь и постоянная часть запроса фильмов по фильтру ({limit} - сколько
+# фильмов запросить)
+FILM_FILTER_PATH: str = 'movie?page=1&limit={limit}&selectFields=' + \
+                        '%20'.join(FILM_SELECT_FIELDS) + \
+                        '&sortField=year%20rating.kp%20name&' \
+                        'sortType=-1%20-1%201&'
+
+# Путь и постоянная часть запроса персон по фильтру
+PERSON_FILTER_PATH: str = 'person?page=1&limit=50&'
+
+# Разделы каталога сайта для обхода: вид записей - версия API и путь
+CATALOG_PATHS: Dict[str, Tuple[str, str]] = {
+    'film': ('v1.3', 'movie'),
+    'person': ('v1', 'person'),
+}
+
+# Поля записей в ответе сайта при обходе каталога (вида записей нет - все
+# поля)
+CATALOG_FIELDS: Dict[str, Tuple[str, ...]] = {
+    'film': FILM_SELECT_FIELDS,
+}
+
+# Наибольший код записи сайта (верхняя граница интервала кодов)
+CATALOG_MAX_ID: int = 2 ** 31 - 1
+
+
+def make_filter_query(param_filter: Dict[str, str | List]) -> str:
+    """
+    Сформировать строку параметров запроса по фильтру.
+
+    :param param_filter: Словарь для фильтрации значений.
+    :type param_filter: Dict[str, str | List]
+
+    :return: Параметры запроса вида "ключ=значение&ключ=значение"
+    :rtype: str
+    """
+    query_filter: List = []
+    for i_key in param_filter:
+        value = param_filter.get(i_key, None)
+        if value:
+            if isinstance(value, list):
+                for i_value in value:
+                    i_value = quote(i_value)
+                    query_filter.append(f'{i_key}={i_value}')
+            else:
+                value = quote(value)
+                query_filter.append(f'{i_key}={value}')
+
+    return "&".join(query_filter)
+
+
+def _make_response(url: str, headers: Dict, params: Dict,
+                   guard: RequestGuard = None, timeout: int = 5,
+                   stop: threading.Event = None) -> \
         int | requests.Response:
     """
-    Получение ответа от сайта с информацией.
+    Получение ответа от сайта с информацией. Если указаны ограничения
+    запросов (guard), то учитываются частота и квота запросов, а при
+    ошибках сайта (429, 5xx, сеть) запрос повторяется с задержкой.
+    Ожидание перед запросом и перед повтором прерывается событием
+    остановки (stop), тогда возвращается код последнего ответа (0 - ответа
+    не было).
 
     :param url: Адрес сайте, где информация лежит.
     :type url: str
@@ -19,24 +93,74 @@ def _make_response(url: str, headers: Dict, params: Dict) -> \
     :type headers: Dict
     :param params: Параметры запроса.
     :type params: Dict
+    :param guard: Ограничения запросов к сайту.
+    :type guard: RequestGuard
+    :param timeout: Время ожидания ответа (сек).
+    :type timeout: int
+    :param stop: Событие остановки (для фоновых потоков).
+    :type stop: threading.Event
 
     :return: Код ошибки (если код <> OK) или ответ от сервера
     :rtype: int | requests.Response
     """
 
-    # В качестве констант время отклика и код ошибки
-    timeout: int = 5
-    success: int = 200
+    def pause(seconds: float) -> bool:
+        # Истина - ожидание прервано остановкой
+        if stop is None:
+            time.sleep(seconds)
+            return False
+        return stop.wait(seconds)
 
-    # Запрашиваем ресурс в сети
-    response = requests.request('GET', url, headers=headers,
-                                params=params, timeout=timeout)
+    # В качестве константы код успешного ответа
+    success: int = 200
 
-    # Проверяем код ответа и возвращаем результат или код ответа
-    status_code = response.status_code
-    if status_code == success:
-        return response
-    return status_code
+    if guard is None:
+        # Запрашиваем ресурс в сети
+        response = requests.request('GET', url, headers=headers,
+                                    params=params, timeout=timeout)
+
+        # Проверяем код ответа и возвращаем результат или код ответа
+        status_code = response.status_code
+        if status_code == success:
+            return response
+        return status_code
+
+    attempt = 0
+    waited = 0.0
+    # Пробный запрос размыкателя освобождается, если результат не учтён
+    owner = object()
+    while True:
+        status_code = guard.check(owner)
+        if status_code:
+            return status_code
+        try:
+            if pause(guard.wait_time()):
+                return status_code
+
+            retry_after = None
+            try:
+                response = requests.request('GET', url, headers=headers,
+                                            params=params, timeout=timeout)
+                status_code = response.status_code
+                if status_code == success:
+                    guard.retry_delay(attempt, status_code)
+                    return response
+                retry_after = parse_retry_after(
+                    response.headers.get('Retry-After')
+                )
+            except requests.RequestException as err:
+                log.exception('Ошибка запроса к сайту {}: {}'.
+                              format(url, err), exc_info=True)
+                status_code = 0
+
+            delay = guard.retry_delay(attempt, status_code, retry_after,
+                                      waited)
+        finally:
+            guard.release(owner)
+        if delay is None or pause(delay):
+            return status_code
+        waited += delay
+        attempt += 1
 
 
 class SiteApiInterface:
@@ -44,9 +168,12 @@ class SiteApiInterface:
     Интерфейс для работы с API сайта.
     """
 
-    def __init__(self, param_url: str, param_headers: Dict) -> None:
+    def __init__(self, param_url: str, param_headers: Dict,
+                 guard: RequestGuard = None, timeout: int = 5) -> None:
         self.__base_url: str = param_url
         self.__headers: Dict = param_headers
+        self.__guard: RequestGuard | None = guard
+        self.__timeout: int = timeout
 
     @classmethod
     def get_film_by_name(cls, base_url: str, headers: Dict, params: str,
@@ -90,7 +217,8 @@ class SiteApiInterface:
         query_string: Dict = {}
 
         # Получить данные с ресурса в сети и вернуть их
-        response = _make_response(url, self.__headers, query_string)
+        response = _make_response(url, self.__headers, query_string,
+                                  self.__guard, self.__timeout)
 
         return response
 
@@ -105,7 +233,8 @@ class SiteApiInterface:
         query_string: Dict = {}
 
         # Получить данные с ресурса в сети и вернуть их
-        response = _make_response(url, self.__headers, query_string)
+        response = _make_response(url, self.__headers, query_string,
+                                  self.__guard, self.__timeout)
 
         return response
 
@@ -122,51 +251,34 @@ class SiteApiInterface:
         query_string: Dict = {}
 
         # Получить данные с ресурса в сети и вернуть их
-        response = _make_response(url, self.__headers, query_string)
+        response = _make_response(url, self.__headers, query_string,
+                                  self.__guard, self.__timeout)
 
         return response
 
-    def get_film_by_filter(self, param_filter: Dict[str, str | List]):
+    def get_film_by_filter(self, param_filter: Dict[str, str | List],
+                           limit: int = FILM_FILTER_LIMIT):
         """
         Получить фильм по фильтру.
 
         :param param_filter: Словарь для фильтрации значений.
+        :param limit: Сколько фильмов запросить.
 
         :return: response
         """
         # Формируем полный адрес для получения данных и словарь запроса
         full_filter: List = [self.__base_url, 'v1.3',
-                             'movie?page=1&limit=10&selectFields=id%20type'
-                             '%20name%20shortDescription%20description'
-                             '%20distributors%20premiere%20year%20rating'
-                             '%20votes%20movieLength%20images'
-                             '%20productionCompanies%20budget%20poster'
-                             '%20facts%20genres%20countries%20videos'
-                             '%20persons%20enName%20ageRating%20logo%20'
-                             'names&sortField=year%20rating.kp%20name&'
-                             'sortType=-1%20-1%201&']
-
-        # Формируем список параметров запроса
-        query_filter: List = []
-        for i_key in param_filter:
-            value = param_filter.get(i_key, None)
-            if value:
-                if isinstance(value, list):
-                    for i_value in value:
-                        i_value = quote(i_value)
-                        query_filter.append(f'{i_key}={i_value}')
-                else:
-                    value = quote(value)
-                    query_filter.append(f'{i_key}={value}')
+                             FILM_FILTER_PATH.format(limit=int(limit))]
 
         # Объединяем в одну строку (url) для запроса
-        url: str = "/".join(full_filter) + "&".join(query_filter)
+        url: str = "/".join(full_filter) + make_filter_query(param_filter)
         query_string: Dict = {}
 
         # Получить данные с ресурса в сети и вернуть их
         response = 0
         try:
-            response = _make_response(url, self.__headers, query_string)
+            response = _make_response(url, self.__headers, query_string,
+                                      self.__guard, self.__timeout)
         except BaseException as err:
             log.exception(err, exc_info=True)
 
@@ -181,30 +293,60 @@ class SiteApiInterface:
         :return: response
         """
         # Формируем полный адрес для получения данных и словарь запроса
-        full_filter: List = [self.__base_url, 'v1',
-                             'person?page=1&limit=50&']
-
-        # Формируем список параметров запроса
-        query_filter: List = []
-        for i_key in param_filter:
-            value = param_filter.get(i_key, None)
-            if value:
-                if isinstance(value, list):
-                    for i_value in value:
-                        i_value = quote(i_value)
-                        query_filter.append(f'{i_key}={i_value}')
-                else:
-                    value = quote(value)
-                    query_filter.append(f'{i_key}={value}')
+        full_filter: List = [self.__base_url, 'v1', PERSON_FILTER_PATH]
 
         # Объединяем в одну строку (url) для запроса
-        url: str = "/".join(full_filter) + "&".join(query_filter)
+        url: str = "/".join(full_filter) + make_filter_query(param_filter)
         query_string: Dict = {}
 
         # Получить данные с ресурса в сети и вернуть их
         response = 0
         try:
-            response = _make_response(url, self.__headers, query_string)
+            response = _make_response(url, self.__headers, query_string,
+                                      self.__guard, self.__timeout)
+        except BaseException as err:
+            log.exception(err, exc_info=True)
+
+        return response
+
+    def get_catalog_page(self, kind: str, after_id: int, limit: int,
+                         stop: threading.Event = None) \
+            -> int | requests.Response:
+        """
+        Получить страницу каталога сайта: записи с кодом больше after_id
+        по возрастанию кода (для обхода всего каталога). Фильмы - с теми же
+        полями, что и в поиске по фильтру (CATALOG_FIELDS).
+
+        :param kind: Вид записей ("film" или "person", см. CATALOG_PATHS)
+        :type kind: str
+        :param after_id: Код последней полученной записи (0 - с начала)
+        :type after_id: int
+        :param limit: Сколько записей запросить (не больше 250)
+        :type limit: int
+        :param stop: Событие остановки: прерывает ожидание перед запросом и
+            повтором (для фонового обхода каталога)
+        :type stop: threading.Event
+
+        :return: Код ошибки (если код <> OK) или ответ от сервера
+        :rtype: int | requests.Response
+        """
+        # Формируем полный адрес для получения данных и словарь запроса
+        url: str = "/".join((self.__base_url, *CATALOG_PATHS[kind]))
+        query_string: Dict = {
+            'page': 1,
+            'limit': int(limit),
+            'sortField': 'id',
+            'sortType': 1,
+            'id': '{}-{}'.format(int(after_id) + 1, CATALOG_MAX_ID)
+        }
+        if kind in CATALOG_FIELDS:
+            query_string['selectFields'] = ' '.join(CATALOG_FIELDS[kind])
+
+        # Получить данные с ресурса в сети и вернуть их
+        response = 0
+        try:
+            response = _make_response(url, self.__headers, query_string,
+                                      self.__guard, self.__timeout, stop)
         except BaseException as err:
             log.exception(err, exc_info=True)
 
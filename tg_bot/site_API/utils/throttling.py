@@ -0,0 +1,400 @@
+"""
+Модуль ограничения частоты запросов к API сайта.
+
+TokenBucket - ограничение количества запросов в секунду (ведро токенов).
+
+DailyQuota - суточная квота запросов по ключу API.
+
+CircuitBreaker - размыкатель: после серии ошибок сайта запросы временно
+    не отправляются, чтобы не тратить квоту и не ждать таймаутов.
+
+RetryPolicy - повтор запросов с экспоненциальной задержкой и случайным
+    разбросом (не раньше, чем просит заголовок Retry-After).
+
+RequestGuard - всё перечисленное вместе для одного ключа API. Один
+    экземпляр используется и синхронным, и асинхронным интерфейсом.
+"""
+
+from settings import logger
+import random
+import threading
+import time
+from datetime import date
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any
+
+
+# Коды ответа, при которых запрос имеет смысл повторить (0 - сетевая ошибка)
+RETRY_STATUSES = (0, 429, 500, 502, 503, 504)
+
+# Коды, которые возвращаются без запроса к сайту
+QUOTA_EXCEEDED: int = 429
+SERVICE_UNAVAILABLE: int = 503
+
+
+class TokenBucket:
+    """
+    Ведро токенов: не больше rate запросов в секунду в среднем и не
+    больше capacity запросов подряд.
+    """
+
+    def __init__(self, rate: float, capacity: float = None) -> None:
+        self.__rate: float = rate
+        self.__capacity: float = capacity or max(1.0, rate)
+        self.__tokens: float = self.__capacity
+        self.__updated: float = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Занять токен для одного запроса.
+
+        :return: Сколько секунд нужно подождать перед запросом
+        :rtype: float
+        """
+        if self.__rate <= 0:
+            return 0.0
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.__capacity, self.__tokens +
+                                (now - self.__updated) * self.__rate)
+            self.__updated = now
+            self.__tokens -= 1
+            if self.__tokens >= 0:
+                return 0.0
+            return -self.__tokens / self.__rate
+
+
+class DailyQuota:
+    """
+    Суточная квота запросов (счётчик сбрасывается с наступлением нового дня).
+    Лимит 0 означает отсутствие ограничения.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.__limit: int = limit
+        self.__day: date = date.today()
+        self.used: int = 0
+        self.__lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        """
+        Учесть один запрос в квоте.
+
+        :return: Истина, если квота ещё не исчерпана
+        :rtype: bool
+        """
+        with self.__lock:
+            today = date.today()
+            if today != self.__day:
+                self.__day = today
+                self.used = 0
+            if self.__limit and self.used >= self.__limit:
+                return False
+            self.used += 1
+            return True
+
+    @property
+    def exhausted(self) -> bool:
+        """
+        Квота на сегодня исчерпана (без учёта запроса).
+        """
+        with self.__lock:
+            return bool(self.__limit) and self.__day == date.today() and \
+                self.used >= self.__limit
+
+    @property
+    def day(self) -> date:
+        """
+        День, за который учтены запросы (used).
+        """
+        return self.__day
+
+    def restore(self, day: date, used: int) -> None:
+        """
+        Учесть запросы, записанные до перезапуска (если они за сегодня).
+
+        :param day: День записанного расхода квоты
+        :type day: date
+        :param used: Запросов за этот день
+        :type used: int
+
+        :return: None
+        """
+        with self.__lock:
+            today = date.today()
+            if today != self.__day:
+                self.__day = today
+                self.used = 0
+            if day == today:
+                self.used = max(self.used, used)
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи. После failure_threshold ошибок подряд запросы не
+    пропускаются reset_timeout секунд, затем пропускается один пробный
+    запрос: при успехе цепь замыкается, при ошибке снова размыкается.
+    Пробный запрос, который не дошёл до сайта (отменён, не хватило
+    квоты), освобождается release_probe, а забытый пробный запрос
+    истекает через reset_timeout секунд.
+    """
+
+    def __init__(self, failure_threshold: int = 5,
+                 reset_timeout: float = 60) -> None:
+        self.__threshold: int = failure_threshold
+        self.__reset_timeout: float = reset_timeout
+        self.__failures: int = 0
+        self.__opened_at: float | None = None
+        # Пробный запрос: кто его выполняет и когда пропущен
+        self.__probe: object | None = None
+        self.__probe_at: float = 0.0
+        self.__lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """
+        Цепь разомкнута (запросы не пропускаются).
+        """
+        return self.__opened_at is not None
+
+    def allow(self, owner: object = None) -> bool:
+        """
+        Можно ли отправить запрос.
+
+        :param owner: Кто отправляет запрос (для освобождения пробного
+            запроса)
+        :type owner: object
+
+        :return: Истина, если запрос можно отправить
+        :rtype: bool
+        """
+        with self.__lock:
+            if self.__opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.__opened_at < self.__reset_timeout:
+                return False
+            if self.__probe is not None and \
+                    now - self.__probe_at < self.__reset_timeout:
+                return False
+            # Пропускаем один пробный запрос
+            self.__probe = owner if owner is not None else object()
+            self.__probe_at = now
+            return True
+
+    def release_probe(self, owner: object) -> None:
+        """
+        Освободить пробный запрос, который не дошёл до сайта (результат не
+        учтён): следующий запрос снова может стать пробным.
+
+        :param owner: Кто отправлял запрос
+        :type owner: object
+
+        :return: None
+        """
+        with self.__lock:
+            if owner is not None and self.__probe is owner:
+                self.__probe = None
+
+    def record_success(self) -> None:
+        """
+        Учесть успешный запрос.
+        """
+        with self.__lock:
+            if self.__opened_at is not None:
+                log.info('Связь с сайтом восстановлена')
+            self.__failures = 0
+            self.__opened_at = None
+            self.__probe = None
+
+    def record_failure(self) -> None:
+        """
+        Учесть ошибку сайта.
+        """
+        with self.__lock:
+            self.__failures += 1
+            probe = self.__probe is not None
+            if probe or self.__failures >= self.__threshold:
+                if not probe:
+                    log.warning('Запросы к сайту приостановлены на {} сек '
+                                'после {} ошибок подряд'.
+                                format(self.__reset_timeout, self.__failures))
+                self.__opened_at = time.monotonic()
+                self.__probe = None
+
+
+class RetryPolicy:
+    """
+    Политика повторов: экспоненциальная задержка с полным случайным
+    разбросом, не больше max_delay секунд. Задержку, запрошенную сайтом
+    (Retry-After), политика не сокращает: повтор раньше снова получит
+    отказ. Если ожидание превысит бюджет max_wait секунд на запрос,
+    запрос не повторяется.
+    """
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 30, max_wait: float = 120) -> None:
+        self.max_retries: int = max_retries
+        self.__base_delay: float = base_delay
+        self.__max_delay: float = max_delay
+        self.__max_wait: float = max_wait
+
+    def delay(self, attempt: int, retry_after: float | None = None,
+              waited: float = 0) -> float | None:
+        """
+        Задержка перед повтором.
+
+        :param attempt: Номер неудачной попытки (с нуля)
+        :type attempt: int
+        :param retry_after: Задержка, запрошенная сайтом (Retry-After)
+        :type retry_after: float | None
+        :param waited: Сколько секунд запрос уже ждал повторов
+        :type waited: float
+
+        :return: Задержка в секундах или None, если ждать дольше бюджета
+        :rtype: float | None
+        """
+        delay = random.uniform(0, min(self.__max_delay,
+                                      self.__base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if self.__max_wait and waited + delay > self.__max_wait:
+            return None
+        return delay
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Разобрать заголовок Retry-After (секунды или дата HTTP).
+
+    :param value: Значение заголовка
+    :type value: str | None
+
+    :return: Задержка в секундах или None, если заголовка нет
+    :rtype: float | None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestGuard:
+    """
+    Ограничения для всех запросов с одним ключом API: частота, суточная
+    квота, размыкатель и политика повторов.
+    """
+
+    def __init__(self, per_second: float = 0, daily_quota: int = 0,
+                 max_retries: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 30, failure_threshold: int = 5,
+                 reset_timeout: float = 60, max_wait: float = 120) -> None:
+        self.bucket = TokenBucket(per_second)
+        self.quota = DailyQuota(daily_quota)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.policy = RetryPolicy(max_retries, base_delay, max_delay,
+                                  max_wait)
+
+    def check(self, owner: object = None) -> int:
+        """
+        Проверить, можно ли отправить запрос на сайт. Квота проверяется до
+        размыкателя: запрос сверх квоты не занимает пробный запрос.
+
+        :param owner: Кто отправляет запрос (см. release)
+        :type owner: object
+
+        :return: 0 - можно, иначе код ответа без запроса к сайту
+        :rtype: int
+        """
+        if self.quota.exhausted:
+            log.warning('Суточная квота запросов к сайту исчерпана')
+            return QUOTA_EXCEEDED
+        if not self.breaker.allow(owner):
+            return SERVICE_UNAVAILABLE
+        if not self.quota.try_acquire():
+            # Квоту заняли другие запросы после проверки
+            self.breaker.release_probe(owner)
+            log.warning('Суточная квота запросов к сайту исчерпана')
+            return QUOTA_EXCEEDED
+        return 0
+
+    def release(self, owner: object) -> None:
+        """
+        Запрос завершён без учёта результата (отменён, ошибка до ответа
+        сайта): освободить пробный запрос размыкателя, если он у owner.
+
+        :param owner: Кто отправлял запрос (тот же, что в check)
+        :type owner: object
+
+        :return: None
+        """
+        self.breaker.release_probe(owner)
+
+    def wait_time(self) -> float:
+        """
+        Занять место в очереди запросов.
+
+        :return: Сколько секунд подождать перед запросом
+        :rtype: float
+        """
+        return self.bucket.reserve()
+
+    def retry_delay(self, attempt: int, status_code: int,
+                    retry_after: float | None = None,
+                    waited: float = 0) -> float | None:
+        """
+        Учесть результат запроса и решить, нужен ли повтор.
+
+        :param attempt: Номер попытки (с нуля)
+        :type attempt: int
+        :param status_code: Код ответа (0 - сетевая ошибка)
+        :type status_code: int
+        :param retry_after: Задержка, запрошенная сайтом (Retry-After)
+        :type retry_after: float | None
+        :param waited: Сколько секунд запрос уже ждал повторов
+        :type waited: float
+
+        :return: Задержка перед повтором или None, если повтор не нужен
+        :rtype: float | None
+        """
+        if status_code not in RETRY_STATUSES:
+            # Ответ получен (в том числе 4xx) - сайт доступен
+            self.breaker.record_success()
+            return None
+
+        self.breaker.record_failure()
+        if attempt >= self.policy.max_retries:
+            return None
+        delay = self.policy.delay(attempt, retry_after, waited)
+        if delay is None:
+            log.warning('Сайт просит подождать {} сек - больше бюджета '
+                        'повторов, запрос не повторяется'.format(retry_after))
+            return None
+        log.debug('Повтор запроса к сайту через {:.2f} сек (код {})'.
+                  format(delay, status_code))
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Вернуть состояние ограничений.
+
+        :return: Использовано квоты и состояние размыкателя
+        :rtype: Dict[str, Any]
+        """
+        return {'quota_used': self.quota.used,
+                'circuit_open': self.breaker.is_open}
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    RequestGuard()
@@ -1,9 +1,60 @@
 """
 Набор шаблонов для формирования ответов пользователю.
+
+Шаблоны (файлы *.txt из каталога пакета) загружаются один раз при импорте
+модуля и заранее разбираются: подстановки проверяются по списку полей
+шаблона (TEMPLATE_FIELDS), а текст раскладывается на части, которые при
+выводе только склеиваются с подставленными значениями. Файл шаблона
+перечитывается, только если изменилось время его изменения (проверяется не
+чаще раза в CHECK_INTERVAL сек), поэтому вывод карточки фильма не читает
+файлов. Шаблон с ошибкой при перезагрузке не заменяет прежний.
+
+
+:Functions
+    load_template - Загрузить шаблон из файла (текст без разбора).
+
+    compile_template - Разобрать текст шаблона.
+
+    render_template - Вывести шаблон со значениями подстановок.
+
+
+:Classes
+    Template - Разобранный шаблон.
+
+    TemplateRegistry - Набор разобранных шаблонов с перезагрузкой.
+
+
+:var
+    TEMPLATE_FIELDS - Допустимые подстановки шаблонов {имя: поля}.
+
+    CHECK_INTERVAL - Как часто проверять изменение файлов шаблонов (сек).
+
+    _templates - Шаблоны ответов пользователю.
 """
 
 from settings import logger
 from os import path
+import os
+import re
+import string
+import time
+from typing import Callable, Dict, FrozenSet, Iterable, List, Tuple
+
+
+TEMPLATE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    'film_info': ('name', 'length', 'description', 'year', 'genres',
+                  'countries', 'id', 'type', 'budget', 'age_rating'),
+    'rating_info': ('name', 'rating_kp', 'votes_kp', 'rating_imdb',
+                    'votes_imdb', 'rating_tmdb', 'votes_tmdb',
+                    'rating_filmCritics', 'votes_filmCritics',
+                    'rating_russianFilmCritics', 'votes_russianFilmCritics',
+                    'rating_await', 'votes_await'),
+    'person_info': ('film_name', 'name', 'en_name', 'description'),
+}
+
+CHECK_INTERVAL: float = 2.0
+
+_formatter = string.Formatter()
 
 
 def load_template(name: str) -> str:
@@ -28,9 +79,253 @@ def load_template(name: str) -> str:
     return result
 
 
+def compile_template(text: str) -> Tuple[FrozenSet[str],
+                                         Callable[..., str]]:
+    """
+    Разобрать текст шаблона: найти подстановки и подготовить функцию
+    вывода. Шаблон только с простыми подстановками ({name}) выводится
+    склейкой готовых частей, остальные - через str.format.
+
+    :param text: Текст шаблона
+    :type text: str
+
+    :return: Имена подстановок и функция вывода (значения - по именам)
+    :rtype: Tuple[FrozenSet[str], Callable[..., str]]
+
+    :exception ValueError: Ошибка в скобках или позиционная подстановка
+    """
+    fields = set()
+    parts: List[Tuple[str, str | None]] = []
+    simple = True
+    for i_literal, i_field, i_spec, i_conversion in _formatter.parse(text):
+        if i_field is not None:
+            name = re.split(r'[.\[]', i_field, 1)[0]
+            if not name or name.isdigit():
+                raise ValueError('Позиционная подстановка {{{}}}'.
+                                 format(i_field))
+            fields.add(name)
+            simple = simple and not i_spec and not i_conversion and \
+                name == i_field
+        parts.append((i_literal, i_field))
+
+    if not simple:
+        return frozenset(fields), text.format
+
+    def render(**values) -> str:
+        out = []
+        for i_literal, i_field in parts:
+            out.append(i_literal)
+            if i_field is not None:
+                out.append(str(values[i_field]))
+        return ''.join(out)
+
+    return frozenset(fields), render
+
+
+class Template:
+    """
+    Разобранный шаблон.
+
+    Attributes:
+        name (str): Имя шаблона (имя файла без .txt)
+        text (str): Текст шаблона
+        fields (FrozenSet[str]): Имена подстановок
+        mtime (int): Время изменения последнего прочитанного файла (нс)
+        render (Callable[..., str]): Вывести шаблон со значениями
+    """
+
+    def __init__(self, name: str, text: str, mtime: int = 0) -> None:
+        self.name: str = name
+        self.text: str = text
+        self.fields, self.render = compile_template(text)
+        self.mtime: int = mtime
+
+
+class TemplateRegistry:
+    """
+    Набор разобранных шаблонов из каталога с перезагрузкой изменённых.
+
+    Attributes:
+        __directory (str): Каталог файлов шаблонов
+        __fields (Dict[str, FrozenSet[str]]): Допустимые подстановки
+            шаблонов (для шаблона не из списка - любые)
+        __check_interval (float): Как часто проверять изменение файла (сек)
+        __templates (Dict[str, Template]): Шаблоны по имени
+        __checked (Dict[str, float]): Время последней проверки файла
+        renders, reloads, errors (int): Выведено шаблонов, перезагружено,
+            ошибок загрузки
+    """
+
+    def __init__(self, directory: str,
+                 fields: Dict[str, Iterable[str]] = None,
+                 check_interval: float = 2.0) -> None:
+        self.__directory: str = directory
+        self.__fields: Dict[str, FrozenSet[str]] = {
+            i_name: frozenset(i_fields)
+            for i_name, i_fields in (fields or dict()).items()
+        }
+        self.__check_interval: float = check_interval
+        self.__templates: Dict[str, Template] = dict()
+        self.__checked: Dict[str, float] = dict()
+        self.renders: int = 0
+        self.reloads: int = 0
+        self.errors: int = 0
+
+    def __path(self, name: str) -> str:
+        """
+        Файл шаблона.
+
+        :param name: Имя шаблона
+        :type name: str
+
+        :return: Полный путь к файлу
+        :rtype: str
+        """
+        return path.join(self.__directory, name + '.txt')
+
+    def __read(self, name: str) -> Template:
+        """
+        Прочитать и разобрать файл шаблона.
+
+        :param name: Имя шаблона
+        :type name: str
+
+        :return: Шаблон
+        :rtype: Template
+
+        :exception OSError: Файл не прочитан
+        :exception ValueError: Ошибка в шаблоне или недопустимая подстановка
+        """
+        file_name = self.__path(name)
+        mtime = os.stat(file_name).st_mtime_ns
+        with open(file_name, 'rt', encoding='utf-8') as text:
+            template = Template(name, text.read(), mtime)
+        allowed = self.__fields.get(name)
+        if allowed is not None and not template.fields <= allowed:
+            raise ValueError('Шаблон {}: недопустимые подстановки {}'.format(
+                name, ', '.join(sorted(template.fields - allowed))
+            ))
+        self.__checked[name] = time.monotonic()
+        return template
+
+    def load(self) -> None:
+        """
+        Загрузить все шаблоны каталога.
+
+        :return: None
+
+        :exception OSError: Файл шаблона не прочитан
+        :exception ValueError: Ошибка в шаблоне или недопустимая подстановка
+        """
+        names = sorted(i_file[:-4] for i_file in os.listdir(self.__directory)
+                       if i_file.endswith('.txt'))
+        self.__templates = {i_name: self.__read(i_name) for i_name in names}
+        log.info('Загружено шаблонов: {}'.format(len(self.__templates)))
+
+    def get(self, name: str) -> Template:
+        """
+        Шаблон по имени. Файл перечитывается, если изменилось время его
+        изменения (проверяется не чаще раза в check_interval сек). Если
+        новый файл не прочитан или содержит ошибку, остаётся прежний
+        шаблон.
+
+        :param name: Имя шаблона (имя файла без .txt)
+        :type name: str
+
+        :return: Шаблон
+        :rtype: Template
+
+        :exception KeyError: Шаблона нет
+        """
+        template = self.__templates.get(name)
+        if template is not None:
+            now = time.monotonic()
+            if now - self.__checked.get(name, 0.0) < self.__check_interval:
+                return template
+            self.__checked[name] = now
+            try:
+                mtime = os.stat(self.__path(name)).st_mtime_ns
+            except OSError:
+                # Файл удалён - работаем с прежним шаблоном
+                return template
+            if mtime == template.mtime:
+                return template
+            # Файл с ошибкой не перечитываем, пока он не изменится снова
+            template.mtime = mtime
+
+        try:
+            new_template = self.__read(name)
+        except (OSError, ValueError) as err:
+            self.errors += 1
+            if template is None:
+                raise KeyError(name) from err
+            log.error('Шаблон {} не перезагружен: {}'.format(name, err))
+            return template
+        if template is not None:
+            self.reloads += 1
+            log.info('Шаблон {} перезагружен'.format(name))
+        self.__templates[name] = new_template
+        return new_template
+
+    def render(self, name: str, /, **values) -> str:
+        """
+        Вывести шаблон со значениями подстановок.
+
+        :param name: Имя шаблона (имя файла без .txt)
+        :type name: str
+        :param values: Значения подстановок
+        :type values: Any
+
+        :return: Текст
+        :rtype: str
+
+        :exception KeyError: Шаблона нет или не задано значение подстановки
+        """
+        text = self.get(name).render(**values)
+        self.renders += 1
+        return text
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Вернуть счётчики шаблонов.
+
+        :return: Шаблонов, выведено, перезагружено, ошибок загрузки
+        :rtype: Dict[str, int]
+        """
+        return {'size': len(self.__templates), 'renders': self.renders,
+                'reloads': self.reloads, 'errors': self.errors}
+
+
+def render_template(name: str, /, **values) -> str:
+    """
+    Вывести шаблон ответа пользователю со значениями подстановок.
+
+    :param name: Имя шаблона (имя файла без .txt, например "film_info")
+    :type name: str
+    :param values: Значения подстановок
+    :type values: Any
+
+    :return: Текст
+    :rtype: str
+
+    :exception KeyError: Шаблона нет или не задано значение подстановки
+    """
+    return _templates.render(name, **values)
+
+
 # Начинаем работу с определения логирования и сообщение в протокол
 log = logger.getLogger(__name__)
 
+# Шаблоны загружаются из каталога пакета (а не текущего каталога) при
+# импорте: ошибка в шаблоне останавливает запуск бота
+_templates = TemplateRegistry(path.dirname(path.abspath(__file__)),
+                              TEMPLATE_FIELDS, CHECK_INTERVAL)
+_templates.load()
+
 
 if __name__ == '__main__':
     load_template()
+    compile_template()
+    Template()
+    TemplateRegistry()
+    render_template()
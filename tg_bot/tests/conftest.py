@@ -0,0 +1,45 @@
+"""
+Общие настройки тестов бота: модули бота импортируются от каталога tg_bot
+(как при запуске python main.py), база данных - временный файл SQLite.
+
+Запуск (из каталога tg_bot):
+    python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BOT_DIR not in sys.path:
+    sys.path.insert(0, BOT_DIR)
+
+# Пакет tg_API создаёт бота при импорте: нужен токен правильного вида
+os.environ.setdefault('TG_TOKEN', '123456:TEST-token')
+os.environ.setdefault('TG_HOST', 'https://api.telegram.org')
+# Файл состояний FSM бота - во временном каталоге, а не в каталоге бота
+os.environ.setdefault('TG_FSM_FILE',
+                      os.path.join(tempfile.mkdtemp(), 'fsm.db'))
+
+
+@pytest.fixture
+def temp_db(tmp_path):
+    """
+    База данных бота во временном файле с актуальной схемой (миграции).
+    После теста база данных снова указывает на прежний файл.
+    """
+    from database.common.models import db, tables_list
+    from database.migrations import migrate
+
+    database = db.database
+    if not db.is_closed():
+        db.close()
+    db.init(str(tmp_path / 'test.db'))
+    db.connect()
+    migrate(db, tables_list)
+    yield db
+    if not db.is_closed():
+        db.close()
+    db.init(database)
@@ -0,0 +1,108 @@
+"""
+Тесты выполнения действий вне цикла событий (tg_API.utils.commands:
+OnAnythingDoSomething.do_action_async).
+"""
+
+import asyncio
+import threading
+import time
+
+from tg_API.utils.commands import OnAnythingDoSomething
+
+
+def test_sync_action_runs_in_pool_thread():
+    bus = OnAnythingDoSomething(workers=2, queue_size=4)
+    initialized = []
+    bus.register_worker_init(lambda: initialized.append(
+        threading.current_thread().name))
+    bus.register_action('where', lambda: threading.current_thread().name)
+    bus.register_action('memory', lambda: threading.current_thread().name,
+                        inline=True)
+
+    async def run():
+        return (await bus.do_action_async('where'),
+                await bus.do_action_async('memory'),
+                threading.current_thread().name)
+
+    try:
+        pool_thread, inline_thread, loop_thread = asyncio.run(run())
+    finally:
+        asyncio.run(bus.close())
+    assert pool_thread.startswith('action')
+    assert pool_thread in initialized
+    assert inline_thread == loop_thread
+
+
+def test_blocking_action_does_not_stall_loop():
+    bus = OnAnythingDoSomething(workers=1)
+    bus.register_action('slow', lambda: time.sleep(0.3) or 'done')
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        result = await bus.do_action_async('slow')
+        task.cancel()
+        return result, ticks
+
+    try:
+        result, ticks = asyncio.run(run())
+    finally:
+        asyncio.run(bus.close())
+    assert result == 'done'
+    # Цикл событий продолжал работу, пока действие ждало
+    assert ticks >= 10
+
+
+def test_async_action_awaited_and_errors_counted():
+    bus = OnAnythingDoSomething()
+
+    async def double(value):
+        return value * 2
+
+    def broken():
+        raise ValueError('ошибка')
+
+    bus.register_action('double', double)
+    bus.register_action('broken', broken)
+
+    async def run():
+        result = (await bus.do_action_async('double', value=21),
+                  await bus.do_action_async('broken'))
+        await bus.close()
+        return result
+
+    assert asyncio.run(run()) == (42, None)
+    stats = bus.action_stats()['actions']
+    assert stats['double']['mode'] == 'async'
+    assert stats['broken']['errors'] == 1
+
+
+def test_close_does_not_block_loop_while_actions_finish():
+    bus = OnAnythingDoSomething(workers=1)
+    bus.register_action('slow', lambda: time.sleep(0.3))
+
+    async def run():
+        pending = asyncio.create_task(bus.do_action_async('slow'))
+        await asyncio.sleep(0.05)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await bus.close()
+        task.cancel()
+        await pending
+        return ticks
+
+    assert asyncio.run(run()) >= 10
@@ -0,0 +1,83 @@
+"""
+Тесты ограничения частоты сообщений (tg_API.utils.sender.RateLimiter) и
+массовой рассылки (tg_API.utils.broadcast): паузы после TelegramRetryAfter
+не складываются, а повторы отправки одному пользователю ограничены.
+"""
+
+import asyncio
+import time
+
+import aiogram.exceptions as aexc
+from aiogram.methods import SendMessage
+
+from tg_API.utils.broadcast import Broadcaster
+from tg_API.utils.commands import _on_event as on_event
+from tg_API.utils.sender import MessageSender, RateLimiter
+
+
+def test_concurrent_pauses_do_not_add_up():
+    limiter = RateLimiter(rate=100, burst=100)
+
+    async def run():
+        # Несколько исполнителей получили одну и ту же ошибку
+        for _ in range(5):
+            limiter.pause(0.2)
+        start = time.monotonic()
+        await asyncio.gather(*(limiter.wait() for _ in range(5)))
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(run())
+    assert 0.15 <= elapsed < 0.5
+
+
+def test_pause_stops_waiters_already_queued():
+    limiter = RateLimiter(rate=10, burst=1)
+    calls = []
+
+    async def call():
+        await limiter.wait()
+        calls.append(time.monotonic())
+
+    async def run():
+        start = time.monotonic()
+        tasks = [asyncio.create_task(call()) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        limiter.pause(0.3)
+        await asyncio.gather(*tasks)
+        return [i_call - start for i_call in calls]
+
+    first, *rest = asyncio.run(run())
+    # Первый вызов - до паузы, остальные - после неё, по одному за 0.1 сек
+    assert first < 0.05
+    assert all(i_time >= 0.3 for i_time in rest)
+    assert rest[1] - rest[0] >= 0.08
+
+
+class RetryBot:
+    """
+    Бот, которому телеграм на каждое сообщение отвечает RetryAfter.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def send_message(self, chat_id: int, text: str) -> None:
+        self.calls += 1
+        raise aexc.TelegramRetryAfter(
+            SendMessage(chat_id=chat_id, text=text), 'Flood control', 0)
+
+
+def test_broadcast_gives_up_after_max_retries(tmp_path):
+    async def users_batch(after_id: int, limit: int):
+        return [(1, 100), (2, 200)] if after_id == 0 else []
+
+    on_event.register_action('retrieve_users_batch', users_batch)
+    bot = RetryBot()
+    broadcaster = Broadcaster(MessageSender(global_rate=0), concurrency=2,
+                              state_file=str(tmp_path / 'broadcast.json'),
+                              max_retries=2)
+
+    stats = asyncio.run(broadcaster.run(bot, 'текст', timeout=5))
+
+    assert stats == {'sent': 0, 'blocked': 0, 'failed': 2, 'retried': 4}
+    assert bot.calls == 6
@@ -0,0 +1,112 @@
+"""
+Тесты обхода каталога сайта (site_API.utils.catalog_crawler) с тестовым
+сервером API сайта: курсор и расход суточной квоты сохраняются в БД и
+после перезапуска не начинаются заново, страница каталога не затирает
+имеющиеся записи, остановка прерывает ожидания обходчика.
+"""
+
+import asyncio
+import json
+import socket
+import time
+from datetime import date
+
+import pytest
+
+from database.common.models import FilmInfo
+from database.utils.catalog_store import save_catalog_page, save_films, \
+    load_catalog_cursors, load_crawler_quota
+from database.utils.film_store import film_columns
+from site_API.mock_server import MockServer, MockCatalog, SchemaFaker, \
+    SPEC_FILE
+from site_API.utils.catalog_crawler import CatalogCrawler
+from site_API.utils.site_api_handler import SiteApiInterface, \
+    FILM_SELECT_FIELDS
+from site_API.utils.throttling import RequestGuard
+
+
+@pytest.fixture(scope='module')
+def site_url():
+    with open(SPEC_FILE, 'rt', encoding='utf-8') as text:
+        spec = json.load(text)
+    server = MockServer(MockCatalog(SchemaFaker(spec), films=30, persons=0),
+                        spec)
+    yield server.start_thread()
+    server.stop_thread()
+
+
+def make_crawler(url: str, daily_quota: int) -> CatalogCrawler:
+    api = SiteApiInterface(url, {'X-API-KEY': 'test'})
+    crawler = CatalogCrawler(api, share=1.0, daily_quota=daily_quota,
+                             page_size=10, error_pause=0)
+    crawler.register_storage(save_catalog_page, load_catalog_cursors,
+                             load_crawler_quota)
+    return crawler
+
+
+def test_cursor_and_quota_survive_restart(temp_db, site_url):
+    assert make_crawler(site_url, 3).crawl(max_pages=2) == 2
+    assert load_catalog_cursors()['film'][0] == 20
+    assert load_crawler_quota() == (date.today(), 2)
+
+    # После перезапуска: курсор - с записанного, квоты осталось на 1 запрос
+    restarted = make_crawler(site_url, 3)
+    assert restarted.crawl(max_pages=1) == 1
+    assert load_catalog_cursors()['film'][0] == 30
+    assert load_crawler_quota() == (date.today(), 3)
+
+    # Квота дня исчерпана: новый обходчик ждёт следующих суток
+    exhausted = make_crawler(site_url, 3)
+    exhausted.start()
+    time.sleep(0.3)
+    exhausted.stop()
+    assert exhausted.pages == 0
+    assert load_catalog_cursors()['film'][0] == 30
+
+
+def test_catalog_films_have_filter_fields(temp_db, site_url):
+    make_crawler(site_url, 0).crawl(max_pages=1)
+
+    films = [i_film.data_json for i_film in FilmInfo.select()]
+    assert len(films) == 10
+    assert all(set(i_data) <= set(FILM_SELECT_FIELDS) for i_data in films)
+    assert all(i_data.get('name') for i_data in films)
+
+
+def test_catalog_page_does_not_overwrite_richer_rows(temp_db):
+    rich = {'id': 5, 'name': 'Полный', 'type': 'movie',
+            'facts': [{'value': 'факт'}]}
+    FilmInfo.create(data_key='5', data_json=rich, film_type='movie',
+                    film_name='Полный', **film_columns(rich))
+
+    save_films([{'id': 5, 'name': 'Краткий', 'type': 'movie', 'year': 2001},
+                {'id': 6, 'name': 'Новый', 'type': 'movie'}])
+
+    film = FilmInfo.get(FilmInfo.data_key == '5')
+    assert film.film_name == 'Полный'
+    assert film.data_json == rich
+    assert film.facts is not None
+    # Пустая колонка заполняется по странице каталога
+    assert film.year == 2001
+    assert FilmInfo.get(FilmInfo.data_key == '6').film_name == 'Новый'
+
+
+def test_stop_interrupts_retry_delay(temp_db):
+    # Сайт недоступен, а повтор запроса - через минуту
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        url = 'http://127.0.0.1:{}'.format(sock.getsockname()[1])
+    guard = RequestGuard(max_retries=5, base_delay=60, max_delay=60,
+                         max_wait=600)
+    crawler = CatalogCrawler(SiteApiInterface(url, {}, guard), share=1.0,
+                             page_size=10, error_pause=600)
+    crawler.register_storage(save_catalog_page, load_catalog_cursors)
+    crawler.start()
+    time.sleep(0.3)
+
+    start = time.monotonic()
+    asyncio.run(crawler.close())
+
+    assert time.monotonic() - start < 2
+    assert crawler.pages == 0
+    assert load_catalog_cursors() == {}
@@ -0,0 +1,80 @@
+"""
+Тесты реестра ID файлов телеграм (database.utils.file_registry) и ключа
+ссылки на файл в таблице FilesForBot.
+"""
+
+import peewee as pw
+
+from database.common.models import FilesForBot
+from database.migrations import migrate, get_version, MIGRATIONS
+from database.utils.crud import file_url_key, get_file_ids, save_file_ids
+from database.utils.file_registry import FileIdRegistry
+from database.utils.write_behind import WriteBehind
+
+URL = 'https://Example.COM/posters/1.jpg'
+SAME_URL = ' https://example.com/posters/1.jpg#poster '
+
+
+def test_url_key_ignores_spelling():
+    assert file_url_key(URL) == file_url_key(SAME_URL)
+    assert file_url_key(URL) != file_url_key(URL.replace('1.jpg', '2.jpg'))
+
+
+def test_two_spellings_share_one_row(temp_db):
+    writer = WriteBehind(FilesForBot, flush_interval=3600, upsert=True)
+    registry = FileIdRegistry(writer)
+    registry.load()
+    try:
+        registry.put(URL, 'file-1')
+        assert registry.get(SAME_URL) == 'file-1'
+        registry.put(SAME_URL, 'file-2')
+        writer.flush()
+    finally:
+        writer.stop()
+
+    assert [(i_row.url_key, i_row.file_code) for i_row in
+            FilesForBot.select()] == [(file_url_key(URL), 'file-2')]
+
+    # Прямая запись и поиск в БД - по тому же ключу
+    save_file_ids({URL: 'file-3'})
+    assert FilesForBot.select().count() == 1
+    assert get_file_ids([SAME_URL]) == {SAME_URL: 'file-3'}
+
+    reloaded = FileIdRegistry(writer)
+    reloaded.load()
+    assert reloaded.get(URL) == 'file-3'
+
+
+def test_migration_deduplicates_on_url_key(tmp_path):
+    database = pw.SqliteDatabase(str(tmp_path / 'old.db'))
+    # Таблица файлов схемы 7: уникальность по самой ссылке
+    database.execute_sql(
+        'CREATE TABLE "files_for_bot" ("id" INTEGER NOT NULL PRIMARY KEY, '
+        '"created_at" DATETIME NOT NULL, "file_type" VARCHAR(10) NOT NULL, '
+        '"file_name" TEXT NOT NULL, "file_code" TEXT NOT NULL)'
+    )
+    database.execute_sql('CREATE UNIQUE INDEX "filesforbot_file_name" '
+                         'ON "files_for_bot" ("file_name")')
+    for i_url, i_code in ((URL, 'old'), (SAME_URL, 'new')):
+        database.execute_sql(
+            'INSERT INTO "files_for_bot" (created_at, file_type, file_name, '
+            'file_code) VALUES (?, ?, ?, ?)',
+            ('2023-01-01', 'image', i_url, i_code)
+        )
+    database.execute_sql('PRAGMA user_version = 7')
+
+    with FilesForBot.bind_ctx(database):
+        migrate(database, [FilesForBot])
+        assert get_version(database) == MIGRATIONS[-1][0]
+        assert [(i_row.url_key, i_row.file_code) for i_row in
+                FilesForBot.select()] == [(file_url_key(URL), 'new')]
+    indexes = {i_index.name for i_index in
+               database.get_indexes('files_for_bot')}
+    assert indexes == {'filesforbot_url_key'}
+    database.close()
+
+
+def test_new_database_has_url_key_index(temp_db):
+    indexes = {i_index.name: i_index.unique for i_index in
+               temp_db.get_indexes('files_for_bot')}
+    assert indexes == {'filesforbot_url_key': True}
@@ -0,0 +1,73 @@
+"""
+Тесты плана поиска фильмов по фильтру (database.utils.film_query): фильтр
+выполняется только по БД лишь при покрытии запросом к сайту, иначе к
+сайту уходит запрос без фильмов, найденных в БД.
+"""
+
+from database.common.models import FilmInfo
+from database.utils.film_query import plan_film_filter, merge_film_results
+from database.utils.film_store import film_columns
+from database.utils.search_index import index_films
+
+
+def film(film_id: int, year: int, rating: float) -> dict:
+    return {'id': film_id, 'name': 'Фильм {}'.format(film_id),
+            'type': 'movie', 'year': year, 'rating': {'kp': rating}}
+
+
+def save_films(*films: dict) -> None:
+    for i_data in films:
+        FilmInfo.create(data_key=str(i_data['id']), data_json=i_data,
+                        film_type=i_data['type'], film_name=i_data['name'],
+                        **film_columns(i_data))
+    index_films(films)
+
+
+def test_enough_local_films_still_query_site(temp_db):
+    save_films(film(1, 2005, 7.0), film(2, 2004, 6.0))
+
+    plan = plan_film_filter({'year': '2000-2010'}, 2)
+
+    assert [i_data['id'] for i_data in plan.local] == [1, 2]
+    assert plan.upstream_limit == 2
+    assert plan.upstream_filter == {'year': '2000-2010', 'id': ['!1', '!2']}
+    # Фильм с сайта, которого не было в БД, - первый по порядку сайта
+    merged = merge_film_results(plan, [film(3, 2009, 8.0), film(4, 2001, 5.0)],
+                                total=10)
+    assert [i_data['id'] for i_data in merged] == [3, 1]
+
+
+def test_covered_filter_is_served_locally(temp_db):
+    save_films(film(1, 2005, 7.0))
+    plan = plan_film_filter({'year': '2000-2010'}, 5)
+    # Сайт вернул все найденные фильмы - фильтр покрыт
+    merge_film_results(plan, [film(2, 2002, 6.0)], total=1)
+    save_films(film(2, 2002, 6.0))
+
+    wider = plan_film_filter({'year': '2000-2010'}, 5)
+    narrower = plan_film_filter({'year': '2001-2006', 'type': 'movie'}, 1)
+
+    assert wider.upstream_limit == 0
+    assert [i_data['id'] for i_data in wider.local] == [1, 2]
+    assert narrower.upstream_limit == 0
+    assert [i_data['id'] for i_data in narrower.local] == [1]
+
+
+def test_wider_or_incomplete_filter_is_not_covered(temp_db):
+    save_films(film(1, 2005, 7.0))
+    plan = plan_film_filter({'year': '2004-2006'}, 5)
+    merge_film_results(plan, [], total=0)
+    incomplete = plan_film_filter({'year': '1990-1999'}, 1)
+    merge_film_results(incomplete, [film(5, 1995, 6.0)], total=3)
+
+    assert plan_film_filter({'year': '2000-2010'}, 5).upstream_limit == 5
+    assert plan_film_filter({'year': '1990-1999'}, 1).upstream_limit == 1
+
+
+def test_unparsed_filter_goes_to_site(temp_db):
+    plan = plan_film_filter({'countries.name': 'Франция'}, 3)
+
+    assert plan.conditions is None
+    assert plan.local == []
+    assert plan.upstream_limit == 3
+    assert plan.upstream_filter == {'countries.name': 'Франция'}
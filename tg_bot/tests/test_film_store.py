@@ -0,0 +1,51 @@
+"""
+Тесты хранения сведений о фильмах по разделам (database.utils.film_store):
+колонки разделов хранятся кодеком ответов сайта, а не текстом JSON.
+"""
+
+import json
+
+from database.common.models import FilmInfo
+from database.common.payload import decode_payload
+from database.utils.film_store import film_columns, load_film_section, \
+    encode_film_sections
+
+FILM = {'id': 7, 'name': 'Фильм', 'type': 'movie',
+        'rating': {'kp': 7.5}, 'votes': {'kp': 100},
+        'persons': [{'id': 1, 'name': 'Актёр', 'profession': 'актеры'}] * 20}
+
+
+def raw_column(database, column: str):
+    return database.execute_sql(
+        f'SELECT "{column}" FROM "FilmInfo" WHERE data_key = ?', ('7',)
+    ).fetchone()[0]
+
+
+def test_sections_are_stored_encoded(temp_db):
+    FilmInfo.create(data_key='7', data_json=FILM, film_type='movie',
+                    film_name='Фильм', **film_columns(FILM))
+
+    persons = raw_column(temp_db, 'persons')
+    assert isinstance(persons, bytes)
+    assert len(persons) < len(json.dumps(FILM['persons'], ensure_ascii=False))
+    assert raw_column(temp_db, 'facts') is None
+    assert load_film_section('7', 'rating') == {
+        'name': 'Фильм', 'rating': {'kp': 7.5}, 'votes': {'kp': 100}}
+    assert load_film_section('7', 'persons')['persons'] == FILM['persons']
+
+
+def test_text_sections_are_reencoded(temp_db):
+    # Колонки разделов до миграции 10 - текст JSON
+    FilmInfo.create(data_key='7', data_json=FILM, film_type='movie',
+                    film_name='Фильм')
+    temp_db.execute_sql(
+        'UPDATE "FilmInfo" SET persons = ?, rating = ? WHERE data_key = ?',
+        (json.dumps(FILM['persons']), json.dumps(FILM['rating']), '7')
+    )
+
+    assert encode_film_sections(temp_db) == 1
+    assert encode_film_sections(temp_db) == 0
+
+    assert isinstance(raw_column(temp_db, 'persons'), bytes)
+    assert decode_payload(raw_column(temp_db, 'persons')) == FILM['persons']
+    assert load_film_section('7', 'rating')['rating'] == {'kp': 7.5}
@@ -0,0 +1,87 @@
+"""
+Тесты хранилища состояний FSM (tg_API.utils.fsm_storage): состояние
+переживает перезапуск, сброшенное состояние удаляется из файла, а
+устаревшие состояния - из памяти и из файла.
+"""
+
+import asyncio
+import sqlite3
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+
+from tg_API.utils.fsm_storage import SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+OTHER = StorageKey(bot_id=1, chat_id=11, user_id=11)
+
+
+def rows(path) -> list:
+    with sqlite3.connect(str(path)) as connection:
+        return connection.execute(
+            'SELECT chat_id, state, data FROM fsm_state ORDER BY chat_id'
+        ).fetchall()
+
+
+def test_state_survives_restart(tmp_path):
+    path = str(tmp_path / 'fsm.db')
+
+    async def write():
+        storage = SQLiteStorage(path, flush_interval=3600)
+        context = FSMContext(None, storage, KEY)
+        await context.set_state('Filter:year')
+        await context.update_data(year='2000-2010')
+        await storage.close()
+
+    async def read():
+        storage = SQLiteStorage(path)
+        context = FSMContext(None, storage, KEY)
+        result = await context.get_state(), await context.get_data()
+        await storage.close()
+        return result
+
+    asyncio.run(write())
+    assert asyncio.run(read()) == ('Filter:year', {'year': '2000-2010'})
+
+
+def test_clear_deletes_row(tmp_path):
+    path = tmp_path / 'fsm.db'
+
+    async def run():
+        storage = SQLiteStorage(str(path), flush_interval=3600)
+        context = FSMContext(None, storage, KEY)
+        await context.set_state('Filter:year')
+        await FSMContext(None, storage, OTHER).set_data({'kind': 'film'})
+        await storage.flush()
+        before = rows(path)
+        await context.clear()
+        await storage.close()
+        return before
+
+    before = asyncio.run(run())
+    assert [i_row[0] for i_row in before] == [10, 11]
+    assert rows(path) == [(11, None, '{"kind": "film"}')]
+
+
+def test_expired_states_are_evicted(tmp_path):
+    path = tmp_path / 'fsm.db'
+
+    async def run():
+        storage = SQLiteStorage(str(path), ttl=0.2, flush_interval=0.05)
+        await storage.set_state(None, KEY, 'Filter:year')
+        # Промах кеша: пустое состояние только читается
+        assert await storage.get_state(None, OTHER) is None
+        await asyncio.sleep(0.1)
+        written = rows(path)
+        await asyncio.sleep(0.4)
+        stats = storage.stats()
+        await storage.close()
+        return written, stats
+
+    written, stats = asyncio.run(run())
+    assert [i_row[0] for i_row in written] == [10]
+    # Оба состояния устарели: удалены из памяти без записи, а из файла -
+    # по времени изменения
+    assert stats['size'] == 0
+    assert stats['evicted'] == 2
+    assert rows(path) == []
@@ -0,0 +1,68 @@
+"""
+Тесты тестового сервера API сайта (site_API.mock_server): поля записей
+списка по умолчанию и по selectFields.
+"""
+
+import json
+
+import pytest
+import requests
+
+from site_API.mock_server import MockServer, MockCatalog, SchemaFaker, \
+    SPEC_FILE
+
+HEADERS = {'X-API-KEY': 'test'}
+
+
+@pytest.fixture(scope='module')
+def server():
+    with open(SPEC_FILE, 'rt', encoding='utf-8') as text:
+        spec = json.load(text)
+    mock = MockServer(MockCatalog(SchemaFaker(spec), films=20, persons=20),
+                      spec)
+    url = mock.start_thread()
+    yield url, spec['components']['schemas']
+    mock.stop_thread()
+
+
+def get(url: str, path: str, **params) -> dict:
+    response = requests.get(url + path, params=params, headers=HEADERS,
+                            timeout=5)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_list_without_select_fields_has_default_fields(server):
+    url, schemas = server
+
+    films = get(url, '/v1.3/movie', limit=5)['docs']
+    persons = get(url, '/v1/person', limit=5)['docs']
+
+    assert len(films) == len(persons) == 5
+    film_fields = set(schemas['MeiliMovieEntity']['properties'])
+    person_fields = set(schemas['MeiliPersonEntity']['properties'])
+    assert all(set(i_doc) <= film_fields for i_doc in films)
+    assert all(set(i_doc) <= person_fields for i_doc in persons)
+    assert all(i_doc.get('id') and i_doc.get('name') for i_doc in films)
+    # Поля не по умолчанию - только по selectFields
+    assert not any('persons' in i_doc for i_doc in films)
+    assert not any('movies' in i_doc for i_doc in persons)
+
+
+def test_list_honours_select_fields(server):
+    url, _ = server
+
+    films = get(url, '/v1.3/movie', limit=3,
+                selectFields='id persons similarMovies')['docs']
+
+    assert [set(i_doc) for i_doc in films] == \
+        [{'id', 'persons', 'similarMovies'}] * 3
+
+
+def test_single_record_has_all_fields(server):
+    url, schemas = server
+
+    film = get(url, '/v1.3/movie/1')
+
+    assert film['id'] == 1
+    assert set(film) == set(schemas['MovieDtoV1_3']['properties'])
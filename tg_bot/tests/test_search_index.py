@@ -0,0 +1,60 @@
+"""
+Тесты поиска по каталогу бота (database.utils.search_index): начало
+названия, опечатки, альтернативные названия и персоны.
+"""
+
+from database.utils.search_index import search_catalog, index_films, \
+    index_persons
+
+
+def fill_catalog() -> None:
+    index_films([
+        {'id': 301, 'name': 'Матрица', 'enName': 'The Matrix', 'year': 1999},
+        {'id': 302, 'name': 'Матрица: Перезагрузка', 'year': 2003},
+        {'id': 303, 'name': 'Ёлки', 'year': 2010},
+        {'id': 304, 'name': 'Терминатор', 'year': 1984},
+    ])
+    index_persons([{'id': 7, 'name': 'Киану Ривз', 'enName': 'Keanu Reeves'}])
+
+
+def keys(hits) -> list:
+    return [i_hit.data_key for i_hit in hits]
+
+
+def test_prefix_search(temp_db):
+    fill_catalog()
+
+    hits = search_catalog('матр')
+
+    assert keys(hits)[:2] == ['301', '302']
+    assert all(i_hit.kind == 'film' for i_hit in hits)
+
+
+def test_typo_search(temp_db):
+    fill_catalog()
+
+    # Пропущена и заменена буква
+    assert keys(search_catalog('матрца'))[0] == '301'
+    assert keys(search_catalog('терменатор')) == ['304']
+
+
+def test_exact_match_and_normalization(temp_db):
+    fill_catalog()
+
+    hits = search_catalog('ЕЛКИ')
+    assert keys(hits) == ['303']
+    assert hits[0].score == 1.0
+    assert hits[0].year == '2010'
+    # Поиск по альтернативному названию
+    assert keys(search_catalog('the matrix'))[0] == '301'
+
+
+def test_kind_filter_and_short_query(temp_db):
+    fill_catalog()
+
+    hits = search_catalog('ривз', kind='person')
+    assert [(i_hit.kind, i_hit.data_key) for i_hit in hits] == \
+        [('person', '7')]
+    assert search_catalog('ривз', kind='film') == []
+    assert search_catalog('ма') == []
+    assert search_catalog('совсем другое') == []
@@ -0,0 +1,96 @@
+"""
+Тесты передачи обновлений процессам-обработчикам (tg_API.utils.shards):
+обновления чата попадают в шард по ID чата, заполненная очередь одного
+шарда не задерживает другие, а при перезапуске шарда его обновления
+переносятся в новую очередь по порядку.
+"""
+
+import asyncio
+import functools
+import os
+
+from aiogram.types import Update
+
+from tg_API.mock_server import MockBotApi
+from tg_API.utils.shards import ShardPool
+
+api = MockBotApi()
+
+
+def record_updates(path: str, crash_first: bool, index: int, updates,
+                   stop_request) -> None:
+    """
+    Процесс-обработчик для тестов: записывает тексты обновлений в файл
+    шарда. При crash_first первый запуск шарда завершается сразу, не
+    читая очередь (как при падении).
+    """
+    marker = os.path.join(path, 'started-{}'.format(index))
+    if crash_first and not os.path.exists(marker):
+        open(marker, 'w').close()
+        return
+    with open(os.path.join(path, 'shard-{}.txt'.format(index)), 'a',
+              encoding='utf-8') as file:
+        while True:
+            update = updates.get()
+            if update is None:
+                break
+            file.write(update.message.text + '\n')
+
+
+def received(path, index: int) -> list:
+    with open(os.path.join(path, 'shard-{}.txt'.format(index)), 'rt',
+              encoding='utf-8') as file:
+        return file.read().split()
+
+
+def update(chat_id: int, text: str) -> Update:
+    return Update(**api.message_update(chat_id, text))
+
+
+def test_put_nowait_routes_by_chat(tmp_path):
+    pool = ShardPool(shards=2, queue_size=2)
+    pool.start(functools.partial(record_updates, str(tmp_path), False))
+
+    results = [pool.put_nowait(update(i_chat, 'chat{}'.format(i_chat)))
+               for i_chat in (10, 11, 12, 13)]
+    asyncio.run(pool.stop(10))
+
+    assert results == [True] * 4
+    assert pool.routed == [2, 2]
+    assert received(tmp_path, 0) == ['chat10', 'chat12']
+    assert received(tmp_path, 1) == ['chat11', 'chat13']
+
+
+def test_restart_moves_queued_updates(tmp_path):
+    pool = ShardPool(shards=2, queue_size=2)
+    pool.start(functools.partial(record_updates, str(tmp_path), True))
+
+    async def run():
+        # Шард 0 не читает очередь: его обновления ждут в буфере, а
+        # обновления шарда 1 передаются сразу
+        texts = ['a{}'.format(i_number) for i_number in range(4)]
+        results = [pool.put(update(10, i_text)) for i_text in texts]
+        full = pool.put_nowait(update(10, 'late'))
+        other = pool.put_nowait(update(11, 'other'))
+        pending = pool.stats()['pending']
+        # Запасной буфер тоже заполнен - обновление отбрасывается
+        dropped = pool.put(update(10, 'dropped'))
+
+        supervisor = asyncio.create_task(pool.supervise(lambda: None, 0.1))
+        deadline = asyncio.get_running_loop().time() + 20
+        while pool.restarts != [1, 1]:
+            assert asyncio.get_running_loop().time() < deadline
+            await asyncio.sleep(0.1)
+        await pool.stop(10)
+        await supervisor
+        return results, full, other, pending, dropped
+
+    results, full, other, pending, dropped = asyncio.run(run())
+
+    assert results == [True] * 4
+    assert (full, other, dropped) == (False, True, False)
+    assert pending == [2, 0]
+    assert pool.dropped == [1, 0]
+    # Обновления из старой очереди - раньше обновлений из буфера
+    assert received(tmp_path, 0) == ['a0', 'a1', 'a2', 'a3']
+    assert received(tmp_path, 1) == ['other']
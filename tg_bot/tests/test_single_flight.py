@@ -0,0 +1,71 @@
+"""
+Тесты объединения одинаковых одновременных запросов
+(site_API.utils.single_flight): отмена одного из ожидающих не прерывает
+общий запрос для остальных.
+"""
+
+import asyncio
+
+import pytest
+
+from site_API.utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_request():
+    flight = SingleFlight()
+    started = []
+
+    async def fetch():
+        started.append(1)
+        await asyncio.sleep(0.05)
+        return 'result'
+
+    async def run():
+        return await asyncio.gather(*(flight.do('key', fetch)
+                                      for _ in range(3)))
+
+    assert asyncio.run(run()) == ['result'] * 3
+    assert len(started) == 1
+    assert (flight.calls, flight.shared) == (1, 2)
+
+
+def test_leader_cancellation_does_not_fail_followers():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.1)
+        return 'result'
+
+    async def run():
+        leader = asyncio.create_task(flight.do('key', fetch))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flight.do('key', fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == 'result'
+
+
+def test_request_is_cancelled_when_nobody_waits():
+    flight = SingleFlight()
+    finished = []
+
+    async def fetch():
+        await asyncio.sleep(0.1)
+        finished.append(1)
+        return 'result'
+
+    async def run():
+        caller = asyncio.create_task(flight.do('key', fetch))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.sleep(0.15)
+        # Новый вызов начинает свой запрос
+        return await flight.do('key', fetch), caller.cancelled()
+
+    assert asyncio.run(run()) == ('result', True)
+    assert finished == [1]
+    assert flight.calls == 2
@@ -0,0 +1,48 @@
+"""
+Тесты запуска и завершения работы бота (tg_API.core).
+"""
+
+import asyncio
+import logging
+
+from tg_API.core import TelegramApiInterface
+
+
+def test_shutdown_runs_registry_in_reverse_order():
+    calls = []
+    api = TelegramApiInterface()
+    api.register_startup(lambda: calls.append('start'))
+    api.register_shutdown(lambda: calls.append('first'))
+
+    async def second():
+        calls.append('second')
+
+    def broken():
+        raise RuntimeError('ошибка')
+
+    api.register_shutdown(second)
+    api.register_shutdown(broken)
+
+    async def run():
+        await api.startup()
+        # Ошибка одной функции не мешает остальным
+        await api.shutdown()
+
+    asyncio.run(run())
+    assert calls == ['start', 'second', 'first']
+
+
+def test_package_components_closed_before_action_pool(caplog):
+    from tg_API import tg_api
+    caplog.set_level(logging.INFO)
+
+    asyncio.run(tg_api.shutdown())
+
+    messages = [i_record.getMessage() for i_record in caplog.records]
+    fsm = [i_number for i_number, i_message in enumerate(messages)
+           if i_message.startswith('Состояния FSM')]
+    pool = [i_number for i_number, i_message in enumerate(messages)
+            if i_message.startswith('Очередь действий')]
+    # Пул потоков действий останавливается последним
+    assert len(fsm) == len(pool) == 1
+    assert fsm[0] < pool[0]
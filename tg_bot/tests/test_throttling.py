@@ -0,0 +1,106 @@
+"""
+Тесты ограничений запросов к API сайта (site_API.utils.throttling).
+"""
+
+import asyncio
+import time
+
+from site_API.utils.throttling import RetryPolicy, RequestGuard, \
+    parse_retry_after, QUOTA_EXCEEDED, SERVICE_UNAVAILABLE
+
+
+def test_retry_after_is_minimum_delay():
+    policy = RetryPolicy(max_retries=3, base_delay=0.5, max_delay=2,
+                         max_wait=120)
+    # Сайт просит ждать дольше max_delay - политика не сокращает ожидание
+    assert policy.delay(0, retry_after=45) >= 45
+
+
+def test_backoff_limited_by_max_delay():
+    policy = RetryPolicy(max_retries=10, base_delay=1, max_delay=2)
+    assert all(0 <= policy.delay(8) <= 2 for _ in range(100))
+
+
+def test_retry_after_beyond_budget_gives_up():
+    policy = RetryPolicy(max_wait=60)
+    assert policy.delay(0, retry_after=61) is None
+    # Бюджет общий на все повторы одного запроса
+    assert policy.delay(1, retry_after=30, waited=40) is None
+    assert policy.delay(1, retry_after=30, waited=20) >= 30
+
+
+def test_guard_does_not_retry_past_budget():
+    guard = RequestGuard(max_retries=3, max_wait=10)
+    assert guard.retry_delay(0, 429, retry_after=3600) is None
+    assert guard.retry_delay(0, 429, retry_after=5) >= 5
+    # Ответ 4xx (кроме 429) не повторяется
+    assert guard.retry_delay(0, 404) is None
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('7') == 7.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+
+
+def open_breaker(guard: RequestGuard) -> None:
+    assert guard.check() == 0
+    guard.retry_delay(guard.policy.max_retries, 500)
+    assert guard.breaker.is_open
+
+
+def test_quota_is_checked_before_probe():
+    guard = RequestGuard(daily_quota=1, failure_threshold=1,
+                         reset_timeout=0)
+    open_breaker(guard)
+    # Квота исчерпана: пробный запрос не занимается
+    assert guard.check() == QUOTA_EXCEEDED
+    guard.quota.used = 0
+    assert guard.check() == 0
+
+
+def test_released_probe_lets_next_request_probe():
+    guard = RequestGuard(failure_threshold=1, reset_timeout=0.2)
+    open_breaker(guard)
+    time.sleep(0.25)
+    owner = object()
+    assert guard.check(owner) == 0
+    # Пробный запрос занят - остальные запросы не пропускаются
+    assert guard.check() == SERVICE_UNAVAILABLE
+    # Чужой запрос не освобождает пробный
+    guard.release(object())
+    assert guard.check() == SERVICE_UNAVAILABLE
+    # Пробный запрос отменён до ответа сайта
+    guard.release(owner)
+    assert guard.check() == 0
+
+
+def test_stale_probe_expires():
+    guard = RequestGuard(failure_threshold=1, reset_timeout=0.1)
+    open_breaker(guard)
+    time.sleep(0.15)
+    assert guard.check(object()) == 0
+    assert guard.check() == SERVICE_UNAVAILABLE
+    time.sleep(0.15)
+    # Пробный запрос забыт (не освобождён и не учтён) - истёк
+    assert guard.check() == 0
+
+
+def test_cancelled_probe_is_released():
+    from site_API.utils.site_api_async_handler import AsyncSiteApiInterface
+
+    guard = RequestGuard(per_second=0.5, failure_threshold=1,
+                         reset_timeout=0)
+    open_breaker(guard)
+    guard.wait_time()  # Следующий запрос ждёт места в частоте запросов
+    api = AsyncSiteApiInterface('http://127.0.0.1:9', {}, guard=guard)
+
+    async def run():
+        task = asyncio.create_task(api.get_film_by_filter({'year': '2000'}))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    # Отменённый пробный запрос не оставил размыкатель разомкнутым
+    assert guard.check() == 0
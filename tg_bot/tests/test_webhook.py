@@ -0,0 +1,143 @@
+"""
+Тесты приёма обновлений вебхуком (tg_API.utils.webhook) с тестовым
+сервером API телеграм (tg_API.mock_server): секретный токен, ответ 503 при
+заполненной очереди обработки и обработка принятых обновлений при
+завершении работы.
+"""
+
+import asyncio
+import socket
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message, Update
+
+from tg_API.mock_server import MockBotApi
+from tg_API.utils.update_queue import UpdateQueue
+from tg_API.utils.webhook import WebhookServer
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def run_webhook(scenario, workers: int = 1, queue_size: int = 1):
+    """
+    Запустить вебхук с ботом на тестовом сервере API телеграм и выполнить
+    сценарий. Обработчик сообщений ждёт разрешения (release), поэтому
+    сценарий сам управляет заполнением очереди.
+    """
+    api = MockBotApi()
+    dp = Dispatcher()
+    started = []
+    release = asyncio.Event()
+
+    @dp.message()
+    async def echo(message: Message, bot: Bot):
+        started.append(message.text)
+        await release.wait()
+        await bot.send_message(message.chat.id, 're: ' + message.text)
+
+    async def run():
+        base = await api.start()
+        bot = Bot('123456:TEST-token', session=AiohttpSession(
+            api=TelegramAPIServer.from_base(base)))
+        port = free_port()
+        server = WebhookServer('127.0.0.1', port, '/webhook', 'secret',
+                               workers, queue_size, 5.0)
+        task = asyncio.create_task(server.run(dp, bot))
+        try:
+            await wait_for(lambda: server.is_running)
+            await bot.set_webhook(
+                server.url('http://127.0.0.1:{}'.format(port)),
+                secret_token=server.secret)
+            return await scenario(api, server, task, started, release)
+        finally:
+            release.set()
+            server.stop()
+            await task
+            await bot.session.close()
+            await api.stop()
+
+    return api, asyncio.run(run())
+
+
+def test_wrong_secret_is_rejected():
+    async def scenario(api, server, task, started, release):
+        update = api.message_update(10, 'hi')
+        return (await api.send_update(update, secret='wrong'),
+                await api.send_update(update, secret=''),
+                server.stats()['accepted'])
+
+    api, (wrong, empty, accepted) = run_webhook(scenario)
+    assert wrong == empty == 401
+    assert accepted == 0
+    assert api.methods('sendMessage') == []
+
+
+def test_full_queue_answers_503():
+    async def scenario(api, server, task, started, release):
+        # Первое обновление - у обработчика, второе - в очереди чата
+        first = await api.send_update(api.message_update(10, 'one'))
+        await wait_for(lambda: started)
+        second = await api.send_update(api.message_update(10, 'two'))
+        third = await api.send_update(api.message_update(10, 'three'))
+        return first, second, third, server.stats()
+
+    api, (first, second, third, stats) = run_webhook(scenario)
+    assert (first, second, third) == (200, 200, 503)
+    assert stats['accepted'] == 2
+    assert stats['rejected'] == 1
+    # Отклонённое обновление телеграм повторит - бот его не обработал
+    assert [i_call['text'] for i_call in api.methods('sendMessage')] == \
+        ['re: one', 're: two']
+
+
+def test_accepted_updates_are_drained_on_shutdown():
+    async def scenario(api, server, task, started, release):
+        for i_text in ('one', 'two'):
+            assert await api.send_update(api.message_update(10, i_text)) \
+                == 200
+        await wait_for(lambda: started)
+        # Остановка при занятом обработчике: принятые обновления
+        # обрабатываются до завершения run
+        server.stop()
+        asyncio.get_running_loop().call_later(0.1, release.set)
+        await task
+        return server.stats()
+
+    api, stats = run_webhook(scenario, queue_size=2)
+    assert stats['processed'] == 2
+    assert stats['pending'] == 0
+    assert [i_call['text'] for i_call in api.methods('sendMessage')] == \
+        ['re: one', 're: two']
+
+
+def test_update_queue_back_pressure_is_per_chat():
+    queue = UpdateQueue(workers=2, queue_size=2)
+    api = MockBotApi()
+
+    async def run():
+        # Без переключения цикла обработчики не берут обновления. У каждой
+        # группы чатов (10, 12 и 11, 13) очередь на одно обновление:
+        # заполненная очередь одной группы не мешает другой
+        queue.start(Dispatcher(), None)
+        results = [queue.put_nowait(Update(**api.message_update(i_chat, 'x')))
+                   for i_chat in (10, 12, 11, 13)]
+        pending = queue.pending
+        await queue.close(0)
+        return results, pending
+
+    results, pending = asyncio.run(run())
+    assert results == [True, False, True, False]
+    assert pending == 2
@@ -0,0 +1,78 @@
+"""
+Тесты отложенной записи в БД (database.utils.write_behind).
+"""
+
+import peewee as pw
+import pytest
+
+from database.common.models import History
+from database.utils.write_behind import WriteBehind
+
+
+@pytest.fixture
+def writer(temp_db):
+    writer = WriteBehind(History, flush_size=1000, flush_interval=3600,
+                         max_attempts=3)
+    yield writer
+    writer.stop()
+
+
+def test_flush_returns_ids_and_writes_batch(writer):
+    rows = [writer.add({'id_users': 1, 'query_type': 'message',
+                        'query_string': str(i)}) for i in range(5)]
+    assert [i_row['id'] for i_row in rows] == [1, 2, 3, 4, 5]
+    assert History.select().count() == 0
+
+    writer.flush()
+    assert History.select().count() == 5
+    assert writer.stats() == {'written': 5, 'flushes': 1, 'pending': 0,
+                              'dropped': 0}
+
+
+def test_integrity_error_drops_only_bad_row(writer):
+    writer.add({'id_users': 1, 'query_string': 'до'})
+    bad = writer.add({'id_users': None, 'query_string': 'без пользователя'})
+    writer.add({'id_users': 1, 'query_string': 'после'})
+
+    writer.flush()
+    assert [i_row.query_string for i_row in History.select()] == \
+        ['до', 'после']
+    assert writer.dropped == 1
+    assert list(writer.dead_letters) == [bad]
+
+    # Следующие записи не застревают за отброшенной
+    writer.add({'id_users': 2, 'query_string': 'дальше'})
+    writer.flush()
+    assert History.select().count() == 3
+    assert writer.stats()['pending'] == 0
+
+
+def test_transient_error_retries_then_drops(writer):
+    failures = []
+
+    def locked(rows):
+        failures.append(len(rows))
+        raise pw.OperationalError('database is locked')
+
+    writer.register_flush(locked)
+    writer.add({'id_users': 1, 'query_string': 'x'})
+
+    writer.flush()
+    writer.flush()
+    assert writer.stats()['pending'] == 1
+    assert History.select().count() == 0
+
+    writer.flush()
+    assert failures == [1, 1, 1]
+    assert writer.stats()['pending'] == 0
+    assert writer.dropped == 1
+
+
+def test_on_flush_runs_in_same_transaction(writer):
+    seen = []
+    writer.register_flush(lambda rows: seen.extend(i_row['id']
+                                                   for i_row in rows))
+    writer.add({'id_users': 1, 'query_string': 'a'})
+    writer.add({'id_users': 1, 'query_string': 'b'})
+    writer.flush()
+    assert seen == [1, 2]
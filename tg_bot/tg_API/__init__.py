@@ -10,12 +10,19 @@
 """
 
 from .core import TelegramApiInterface
-from .utils import dp as _dp, on_event as _on_event
+from .utils import dp as _dp, on_event as _on_event, media as _media, \
+    fsm_storage as _fsm_storage
 
 
 # Экземпляр класса для взаимодействия с телеграм-ботом.
 tg_api = TelegramApiInterface()
 
+# Завершение работы компонентов пакета (функции выполняются в обратном
+# порядке регистрации: последним останавливается пул потоков действий)
+tg_api.register_shutdown(_on_event.close)
+tg_api.register_shutdown(_fsm_storage.close)
+tg_api.register_shutdown(_media.close)
+
 # Связующий элемент с диспетчером и обработчиком
 dp = _dp
 on_event = _on_event
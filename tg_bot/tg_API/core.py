@@ -2,15 +2,25 @@
 Модуль для работы с API телеграм (интерфейс).
 
 TelegramApiInterface - класс, содержащий методы для запуска телеграм-бота
+_run_shard - точка входа процесса-обработчика обновлений (шарда)
 """
 
 import asyncio
-from typing import Callable
+import inspect
+from typing import Callable, List
 from aiogram import Bot
-import aiogram.exceptions as aexc
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 
-from .tg_settings import host_api, api_key, logger
-from .utils import dp, on_event
+from .tg_settings import host_api, api_key, logger, broadcast_batch, \
+    broadcast_concurrency, broadcast_state, broadcast_timeout, \
+    api_server, update_mode, webhook_url, global_rate, update_workers, \
+    update_queue, drain_timeout
+from .utils import dp, sender, webhook, shards
+from .utils.broadcast import Broadcaster
+from .utils.commands import stop_polling
+from .utils.sender import RateLimiter
+from .utils.update_queue import UpdateQueue
 
 
 class TelegramApiInterface:
@@ -21,8 +31,98 @@ class TelegramApiInterface:
 
     def __init__(self):
         # Initialize Bot instance with a default parse mode which will
-        # be passed to all API calls
-        self.__bot = Bot(token=api_key, parse_mode="HTML")
+        # be passed to all API calls. Адрес API телеграм берётся из
+        # настроек (например, локальный тестовый сервер)
+        session = AiohttpSession(
+            api=TelegramAPIServer.from_base(api_server.rstrip('/'))
+        ) if api_server else None
+        self.__bot = Bot(token=api_key, session=session, parse_mode="HTML")
+
+        # Функции, которые выполняются при запуске и при завершении работы
+        # бота (открытие пула соединений, сброс буферов и т.п.). Каждый
+        # компонент регистрирует свои функции при подключении к боту
+        self.__on_startup: List[Callable] = []
+        self.__on_shutdown: List[Callable] = []
+        # Функции настройки процесса-обработчика (шарда) с параметрами:
+        # номер шарда и количество шардов (выполняются до __on_startup)
+        self.__on_shard_init: List[Callable[[int, int], None]] = []
+
+        # Массовая рассылка с общим для бота ограничением частоты
+        self.__broadcaster = Broadcaster(sender, broadcast_concurrency,
+                                         broadcast_batch, broadcast_state)
+
+    def register_startup(self, func: Callable) -> None:
+        """
+        Регистрируем функцию, выполняемую при запуске телеграм-бота.
+
+        :param func: Функция (обычная или асинхронная) без параметров
+        :type func: Callable
+
+        :return: None
+        """
+        self.__on_startup.append(func)
+
+    def register_shutdown(self, func: Callable) -> None:
+        """
+        Регистрируем функцию, выполняемую при завершении работы бота.
+        Функции выполняются в обратном порядке регистрации.
+
+        :param func: Функция (обычная или асинхронная) без параметров
+        :type func: Callable
+
+        :return: None
+        """
+        self.__on_shutdown.insert(0, func)
+
+    def register_shard_init(self, func: Callable[[int, int], None]) -> None:
+        """
+        Регистрируем функцию настройки процесса-обработчика (шарда),
+        выполняемую в нём до функций запуска (register_startup).
+
+        :param func: Функция с параметрами: номер шарда, количество шардов
+        :type func: Callable[[int, int], None]
+
+        :return: None
+        """
+        self.__on_shard_init.append(func)
+
+    @classmethod
+    async def __call_functions(cls, functions: List[Callable]) -> None:
+        """
+        Выполнить по очереди список функций. Ошибка в одной функции не
+        мешает выполнению остальных.
+
+        :param functions: Список функций (обычных или асинхронных)
+        :type functions: List[Callable]
+
+        :return: None
+        """
+        for i_func in functions:
+            try:
+                result = i_func()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as err:
+                log.exception('Ошибка при выполнении функции {}: {}'.
+                              format(i_func.__name__, str(err)),
+                              exc_info=True)
+
+    async def startup(self) -> None:
+        """
+        Выполнить функции запуска компонентов (register_startup).
+
+        :return: None
+        """
+        await self.__call_functions(self.__on_startup)
+
+    async def shutdown(self) -> None:
+        """
+        Выполнить функции завершения работы компонентов (register_shutdown)
+        в обратном порядке регистрации.
+
+        :return: None
+        """
+        await self.__call_functions(self.__on_shutdown)
 
     def run(self, func: Callable = None) -> None:
         """
@@ -40,6 +140,11 @@ class TelegramApiInterface:
             raise ValueError('Нет связи с логгером!')
         if not api_key or not host_api:
             raise ValueError('Нет связи с токеном АПИ телеграм!')
+        if update_mode not in ('polling', 'webhook'):
+            raise ValueError('Неизвестный режим работы бота: {}'.
+                             format(update_mode))
+        if update_mode == 'webhook' and not webhook_url:
+            raise ValueError('Не указан внешний адрес вебхука!')
         try:
             if func:
                 asyncio.run(func())
@@ -51,22 +156,118 @@ class TelegramApiInterface:
     async def __main(self) -> None:
         """
         Главный (по умолчанию) обработчик для запуска телеграм-бота.
+        Обновления получаются опросом или через вебхук (TG_MODE).
+
+        :return: None
+        """
+        await self.startup()
+        try:
+            if update_mode == 'webhook':
+                # Накопленные обновления телеграм пришлёт на вебхук
+                await self.__bot.set_webhook(
+                    webhook.url(webhook_url),
+                    allowed_updates=dp.resolve_used_update_types(),
+                    drop_pending_updates=False,
+                    secret_token=webhook.secret
+                )
+            else:
+                # Запускаем бота и пропускаем все накопленные входящие
+                await self.__bot.delete_webhook(drop_pending_updates=True)
+            await self.send_message_for_all_users(
+                "Запуск бота инициирован.\nКеш команд сброшен.\n\nГлавное "
+                "меню - /start\nЗавершить скрипт - /stop\nПолучить помощь - "
+                "/help\nИнформация о боте - /info\nДругих команд нет. "
+                "Работайте через кнопки меню."
+            )
+            await self.__receive()
+            # Завершение работы не должно ждать рассылку слишком долго
+            await self.send_message_for_all_users(
+                "Завершение работы бота. При запуске скрипта вы будете "
+                "проинформированы. До связи!", broadcast_timeout
+            )
+        finally:
+            await self.shutdown()
+            await self.__bot.session.close()
+
+    async def __receive(self) -> None:
+        """
+        Получать и обрабатывать обновления до остановки бота. При
+        TG_SHARDS > 1 обновления обрабатываются процессами-обработчиками,
+        а этот процесс только получает их и передаёт шардам.
+
+        :return: None
+        """
+        if not shards.enabled:
+            if update_mode == 'webhook':
+                await webhook.run(dp, self.__bot)
+            else:
+                await dp.start_polling(self.__bot)
+            return
+
+        shards.start(_run_shard)
+        supervisor = asyncio.create_task(shards.supervise(stop_polling))
+        try:
+            if update_mode == 'webhook':
+                await webhook.run(dp, self.__bot, shards.put_nowait)
+            else:
+                await shards.poll(self.__bot,
+                                  dp.resolve_used_update_types())
+        finally:
+            supervisor.cancel()
+            await asyncio.gather(supervisor, return_exceptions=True)
+            await shards.stop(drain_timeout)
+
+    def run_shard(self, index: int, updates, stop_request) -> None:
+        """
+        Запуск процесса-обработчика (шарда): обработка обновлений, которые
+        передаёт основной процесс.
+
+        :param index: Номер шарда
+        :type index: int
+        :param updates: Очередь обновлений шарда (mp.Queue)
+        :param stop_request: Запрос остановки бота (mp.Event)
+
+        :return: None
+        """
+        shards.attach(index, stop_request)
+        try:
+            asyncio.run(self.__shard_main(index, updates))
+        except BaseException as err:
+            log.exception('Шард {}: обнаружено исключение: {}'.
+                          format(index, str(err)), exc_info=True)
+            raise SystemExit(1)
+
+    async def __shard_main(self, index: int, updates) -> None:
+        """
+        Главный обработчик процесса-обработчика (шарда).
+
+        :param index: Номер шарда
+        :type index: int
+        :param updates: Очередь обновлений шарда (mp.Queue)
 
         :return: None
         """
-        # Запускаем бота и пропускаем все накопленные входящие
-        await self.__bot.delete_webhook(drop_pending_updates=True)
-        await self.send_message_for_all_users(
-            "Запуск бота инициирован.\nКеш команд сброшен.\n\nГлавное "
-            "меню - /start\nЗавершить скрипт - /stop\nПолучить помощь - "
-            "/help\nИнформация о боте - /info\nДругих команд нет. "
-            "Работайте через кнопки меню."
-        )
-        await dp.start_polling(self.__bot)
-        await self.send_message_for_all_users(
-            "Завершение работы бота. При запуске скрипта вы будете "
-            "проинформированы. До связи!"
-        )
+        for i_func in self.__on_shard_init:
+            i_func(index, shards.shards)
+        # Общее ограничение частоты бота делится между процессами
+        rate = global_rate / shards.shards
+        sender.global_limiter = RateLimiter(rate, rate)
+
+        await self.startup()
+        queue = UpdateQueue(update_workers, update_queue)
+        try:
+            queue.start(dp, self.__bot)
+            await dp.emit_startup(bot=self.__bot, bots=[self.__bot],
+                                  dispatcher=dp)
+            log.info('Шард {} запущен'.format(index))
+            await shards.serve(updates, queue)
+            await queue.close(drain_timeout)
+            await dp.emit_shutdown(bot=self.__bot, bots=[self.__bot],
+                                   dispatcher=dp)
+            log.info('Шард {} остановлен {}'.format(index, queue.stats()))
+        finally:
+            await self.shutdown()
+            await self.__bot.session.close()
 
     async def send_message(self, user_id: int, out_message: str):
         """
@@ -79,32 +280,44 @@ class TelegramApiInterface:
         """
         await self.__bot.send_message(user_id, out_message)
 
-    async def send_message_for_all_users(self, message: str) -> None:
+    async def send_message_for_all_users(self, message: str,
+                                         timeout: float = None) -> None:
         """
         Массовая рассылка текста сообщения всем пользователям из базы
         данных, за исключением тех, кто не согласен на информирование.
+        Прерванная рассылка (ошибка, истекло время) того же текста при
+        следующем вызове продолжается с места остановки.
 
         :param message: Текст сообщения для рассылки всем абонентам.
         :type message: str
+        :param timeout: Максимальная длительность рассылки (сек)
+        :type timeout: float
         """
         try:
-            users = on_event.do_action('retrieve_users')
-            for i_user in users:
-                if i_user.id_user and i_user.is_agree:
-                    try:
-                        await self.send_message(i_user.id_user, message)
-                    except aexc.TelegramForbiddenError as err:
-                        log.exception('Блокировка у пользователя {}: {}'.
-                                      format(i_user.username, str(err)),
-                                      exc_info=False)
-                    finally:
-                        # Маленькая пауза перед посылкой сообщения
-                        await asyncio.sleep(1)
+            await self.__broadcaster.run(self.__bot, message, timeout)
         except BaseException as err:
             log.exception('Ошибка при массовом оповещении запуска! {}'.
                           format(str(err)), exc_info=True)
 
 
+def _run_shard(index: int, updates, stop_request) -> None:
+    """
+    Точка входа процесса-обработчика (шарда). Процесс запускается заново
+    (spawn): при этом повторно импортируется основной модуль приложения,
+    поэтому все обработчики и функции запуска уже зарегистрированы в
+    экземпляре tg_api.
+
+    :param index: Номер шарда
+    :type index: int
+    :param updates: Очередь обновлений шарда (mp.Queue)
+    :param stop_request: Запрос остановки бота (mp.Event)
+
+    :return: None
+    """
+    from . import tg_api
+    tg_api.run_shard(index, updates, stop_request)
+
+
 # Начинаем работу с определения логирования и сообщение в протокол
 log = logger.getLogger(__name__)
 
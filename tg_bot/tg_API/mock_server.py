@@ -0,0 +1,211 @@
+"""
+Тестовый сервер вместо API телеграм (Bot API) для проверки бота без сети:
+приём обновлений вебхуком, ответ 503 при заполненной очереди и обработка
+принятых обновлений при завершении работы.
+
+Сервер отвечает на вызовы методов бота (POST /bot<токен>/<метод>) и
+запоминает их: getMe - описание бота, sendMessage - отправленное
+сообщение, остальные методы - True. Адрес и секретный токен вебхука
+запоминаются из setWebhook, а send_update отправляет обновление на вебхук
+бота (как телеграм).
+
+Запуск (бот - с TG_API_SERVER=http://127.0.0.1:8081):
+    python -m tg_API.mock_server
+
+
+:Classes
+    MockBotApi - Тестовый сервер API телеграм.
+
+
+:var
+    SECRET_HEADER - Заголовок с секретным токеном вебхука.
+"""
+
+from settings import logger
+import itertools
+import json
+import time
+from typing import Any, Dict, List, Tuple
+
+import aiohttp
+from aiohttp import web
+
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class MockBotApi:
+    """
+    Тестовый сервер API телеграм.
+
+    Attributes:
+        calls (List[Tuple[str, Dict[str, Any]]]): Вызванные методы бота с
+            параметрами
+        webhook_url, webhook_secret (str): Вебхук бота (из setWebhook)
+    """
+
+    def __init__(self, bot_id: int = 123456) -> None:
+        self.__bot_id: int = bot_id
+        self.__message_id = itertools.count(1)
+        self.__update_id = itertools.count(1)
+        self.__runner: web.AppRunner | None = None
+        self.calls: List[Tuple[str, Dict[str, Any]]] = []
+        self.webhook_url: str = ''
+        self.webhook_secret: str = ''
+
+    def methods(self, name: str) -> List[Dict[str, Any]]:
+        """
+        Параметры вызовов метода бота.
+
+        :param name: Метод (sendMessage и т.п.)
+        :type name: str
+
+        :return: Параметры вызовов по порядку
+        :rtype: List[Dict[str, Any]]
+        """
+        return [i_params for i_method, i_params in self.calls
+                if i_method == name]
+
+    def __result(self, method: str, params: Dict[str, Any]) -> Any:
+        """
+        Результат метода бота.
+
+        :param method: Метод
+        :type method: str
+        :param params: Параметры вызова
+        :type params: Dict[str, Any]
+
+        :return: Результат для поля result ответа
+        :rtype: Any
+        """
+        if method == 'getMe':
+            return {'id': self.__bot_id, 'is_bot': True,
+                    'first_name': 'Mock', 'username': 'mock_bot'}
+        if method == 'setWebhook':
+            self.webhook_url = params.get('url', '')
+            self.webhook_secret = params.get('secret_token', '')
+        elif method == 'deleteWebhook':
+            self.webhook_url = self.webhook_secret = ''
+        elif method == 'sendMessage':
+            return {'message_id': next(self.__message_id),
+                    'date': int(time.time()),
+                    'chat': {'id': int(params.get('chat_id', 0)),
+                             'type': 'private'},
+                    'text': params.get('text', '')}
+        return True
+
+    async def __handle(self, request: web.Request) -> web.Response:
+        """
+        Ответить на вызов метода бота.
+
+        :param request: Запрос бота
+        :type request: web.Request
+
+        :return: Ответ в формате Bot API
+        :rtype: web.Response
+        """
+        method = request.match_info['method']
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        self.calls.append((method, params))
+        return web.json_response({'ok': True,
+                                  'result': self.__result(method, params)})
+
+    def make_app(self) -> web.Application:
+        """
+        Приложение aiohttp сервера.
+
+        :return: Приложение
+        :rtype: web.Application
+        """
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.__handle)
+        return app
+
+    def message_update(self, chat_id: int, text: str) -> Dict[str, Any]:
+        """
+        Обновление с текстовым сообщением пользователя.
+
+        :param chat_id: ID чата (и пользователя)
+        :type chat_id: int
+        :param text: Текст сообщения
+        :type text: str
+
+        :return: Обновление телеграм
+        :rtype: Dict[str, Any]
+        """
+        return {'update_id': next(self.__update_id),
+                'message': {
+                    'message_id': next(self.__message_id),
+                    'date': int(time.time()),
+                    'chat': {'id': chat_id, 'type': 'private'},
+                    'from': {'id': chat_id, 'is_bot': False,
+                             'first_name': 'User{}'.format(chat_id)},
+                    'text': text
+                }}
+
+    async def send_update(self, update: Dict[str, Any],
+                          secret: str = None) -> int:
+        """
+        Отправить обновление на вебхук бота.
+
+        :param update: Обновление телеграм
+        :type update: Dict[str, Any]
+        :param secret: Секретный токен (по умолчанию - из setWebhook)
+        :type secret: str
+
+        :return: Код ответа вебхука
+        :rtype: int
+        """
+        secret = self.webhook_secret if secret is None else secret
+        async with aiohttp.ClientSession() as session:
+            async with session.post(self.webhook_url,
+                                    data=json.dumps(update),
+                                    headers={SECRET_HEADER: secret,
+                                             'Content-Type':
+                                                 'application/json'}
+                                    ) as response:
+                return response.status
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """
+        Запустить сервер в текущем цикле событий.
+
+        :param host: Адрес сервера
+        :type host: str
+        :param port: Порт сервера (0 - любой свободный)
+        :type port: int
+
+        :return: Адрес сервера для TG_API_SERVER (http://адрес:порт)
+        :rtype: str
+        """
+        self.__runner = web.AppRunner(self.make_app(), access_log=None)
+        await self.__runner.setup()
+        await web.TCPSite(self.__runner, host, port).start()
+        host, port = self.__runner.addresses[0][:2]
+        log.info('Тестовый сервер API телеграм запущен на {}:{}'.
+                 format(host, port))
+        return 'http://{}:{}'.format(host, port)
+
+    async def stop(self) -> None:
+        """
+        Остановить сервер.
+
+        :return: None
+        """
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+            self.__runner = None
+            log.info('Тестовый сервер API телеграм остановлен (вызовов: {})'.
+                     format(len(self.calls)))
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    web.run_app(MockBotApi().make_app(), host='127.0.0.1', port=8081,
+                access_log=None)
@@ -9,6 +9,25 @@ logger - доступ к менеджеру логирования. В кажд
 api_key - ключ доступа к телеграм-боту (получить ключ нужно через
     https://t.me/BotFather).
 host_api - url для доступа к телеграм API
+global_rate, chat_rate - ограничения частоты сообщений (в секунду) для
+    бота в целом и для одного чата
+broadcast_* - настройки массовой рассылки (одновременных отправок, размер
+    порции, файл прогресса, предельная длительность при завершении работы)
+media_workers, media_timeout - одновременных загрузок картинок и время
+    ожидания загрузки
+action_workers, action_queue - потоков для действий с БД и сколько
+    действий может ждать свободный поток
+fsm_file, fsm_ttl, fsm_flush_interval - файл состояний FSM, время жизни
+    брошенного состояния и период записи изменений
+api_server - адрес сервера API телеграм (пусто - api.telegram.org)
+update_mode - режим получения обновлений (polling или webhook)
+webhook_* - настройки вебхука (внешний адрес и путь, адрес и порт сервера,
+    секретный токен)
+update_workers, update_queue, drain_timeout - обработчиков и размер
+    очереди обновлений, время обработки очереди при завершении работы
+keyboard_cache - сколько клавиатур держать в кеше
+shards, shard_queue - процессов-обработчиков обновлений и размер очереди
+    передачи обновлений одному процессу
 """
 
 import settings
@@ -21,6 +40,48 @@ logger = settings.logger
 api_key = settings.TelegramSettings().api_key
 host_api = settings.TelegramSettings().host_api
 
+# Ограничения частоты отправки сообщений
+global_rate = settings.TelegramSettings().global_rate
+chat_rate = settings.TelegramSettings().chat_rate
+
+# Массовая рассылка
+broadcast_concurrency = settings.TelegramSettings().broadcast_concurrency
+broadcast_batch = settings.TelegramSettings().broadcast_batch
+broadcast_state = settings.TelegramSettings().broadcast_state
+broadcast_timeout = settings.TelegramSettings().broadcast_timeout
+
+# Загрузка картинок для альбомов
+media_workers = settings.TelegramSettings().media_workers
+media_timeout = settings.TelegramSettings().media_timeout
+
+# Пул потоков для действий с БД
+action_workers = settings.TelegramSettings().action_workers
+action_queue = settings.TelegramSettings().action_queue
+
+# Хранение состояний FSM
+fsm_file = settings.TelegramSettings().fsm_file
+fsm_ttl = settings.TelegramSettings().fsm_ttl
+fsm_flush_interval = settings.TelegramSettings().fsm_flush_interval
+
+# Сервер API, режим получения обновлений и вебхук
+api_server = settings.TelegramSettings().api_server
+update_mode = settings.TelegramSettings().update_mode
+webhook_url = settings.TelegramSettings().webhook_url
+webhook_path = settings.TelegramSettings().webhook_path
+webhook_host = settings.TelegramSettings().webhook_host
+webhook_port = settings.TelegramSettings().webhook_port
+webhook_secret = settings.TelegramSettings().webhook_secret
+
+# Кеш клавиатур
+keyboard_cache = settings.TelegramSettings().keyboard_cache
+
+# Обработка обновлений и процессы-обработчики (шарды)
+update_workers = settings.TelegramSettings().update_workers
+update_queue = settings.TelegramSettings().update_queue
+drain_timeout = settings.TelegramSettings().drain_timeout
+shards = settings.TelegramSettings().shards
+shard_queue = settings.TelegramSettings().shard_queue
+
 
 if __name__ == "__main__":
     pass
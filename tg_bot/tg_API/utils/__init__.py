@@ -7,17 +7,45 @@
 
     on_event - обработчик событий и действий (связь с функциями в других пакетах).
 
+    sender - очереди исходящих сообщений с ограничением частоты.
+
+    media - загрузка картинок и отправка их альбомами.
+
+    fsm_storage - хранилище состояний FSM (фильтров поиска).
+
+    webhook - сервер вебхука (режим получения обновлений webhook).
+
+    shards - процессы-обработчики обновлений (шарды).
+
 
 :module
     commands - Набор общих функций бота (отправка сообщений, файлов и т.п.)
 
+    broadcast - Массовая рассылка сообщений всем пользователям
+
+    fsm_storage - Хранение состояний FSM в SQLite
+
+    media - Отправка наборов картинок альбомами
+
+    sender - Отправка сообщений с учётом ограничений телеграм
+
+    webhook - Получение обновлений через вебхук (сервер aiohttp)
+
+    update_queue - Очередь обработки обновлений по чатам
+
+    shards - Обработка обновлений в нескольких процессах
+
     keys - Наборы ключей для формирования меню и наборов кнопок для всех
     возможных ситуаций
 
     tg_api_handlers - Обработчики событий от телеграм-бота
 """
 
-from .commands import _dp as dp, _on_event as on_event
+from .commands import _dp as dp, _on_event as on_event, _sender as sender
+from .commands import _fsm_storage as fsm_storage
+from .media import _media as media
+from .webhook import _webhook as webhook
+from .shards import _shards as shards
 from .tg_api_handler import router_callback, router_filter, router_command
 
 
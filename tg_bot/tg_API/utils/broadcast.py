@@ -0,0 +1,216 @@
+"""
+Модуль массовой рассылки сообщений всем пользователям бота.
+
+Пользователи читаются из базы данных порциями (обработчик действия
+"retrieve_users_batch"), сообщения отправляются одновременно несколькими
+исполнителями с общим ограничением частоты бота. При TelegramRetryAfter
+пауза делается для всей рассылки (одна, сколько бы исполнителей ни
+получили ошибку), а после max_retries повторов пользователь
+пропускается как неудачный. После каждой порции прогресс
+записывается в файл, поэтому прерванная рассылка того же текста
+продолжается с места остановки (повторно может уйти не больше одной
+порции).
+
+
+:Classes
+    Broadcaster - Рассылка сообщения всем согласным пользователям.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from typing import Dict, List, Tuple
+
+from aiogram import Bot
+import aiogram.exceptions as aexc
+
+from ..tg_settings import logger
+from .commands import _on_event as on_event
+from .sender import MessageSender
+
+
+class Broadcaster:
+    """
+    Рассылка сообщения всем пользователям с ограничением частоты.
+
+    Attributes:
+        __sender (MessageSender): Общие ограничения частоты сообщений бота
+        __concurrency (int): Количество одновременных отправок
+        __batch_size (int): Размер порции пользователей из БД
+        __state_file (str): Файл с прогрессом рассылки
+        __max_retries (int): Повторов отправки одному пользователю после
+            TelegramRetryAfter
+    """
+
+    def __init__(self, sender: MessageSender, concurrency: int = 10,
+                 batch_size: int = 500,
+                 state_file: str = 'broadcast.json',
+                 max_retries: int = 3) -> None:
+        self.__sender: MessageSender = sender
+        self.__concurrency: int = max(1, concurrency)
+        self.__batch_size: int = max(1, batch_size)
+        self.__state_file: str = os.path.abspath(state_file)
+        self.__max_retries: int = max(0, max_retries)
+
+    def __load_state(self, message_hash: str) -> int:
+        """
+        Прочитать прогресс рассылки этого же текста.
+
+        :param message_hash: Хеш текста рассылки
+        :type message_hash: str
+
+        :return: Код записи пользователя, после которого продолжить (0 -
+            с начала)
+        :rtype: int
+        """
+        try:
+            with open(self.__state_file, 'rt', encoding='utf-8') as file:
+                state = json.load(file)
+            if state.get('message_hash') == message_hash:
+                return int(state.get('last_id', 0))
+        except FileNotFoundError:
+            pass
+        except (ValueError, TypeError) as err:
+            log.exception('Ошибка чтения прогресса рассылки: ' + str(err),
+                          exc_info=False)
+        return 0
+
+    def __save_state(self, message_hash: str, last_id: int | None) -> None:
+        """
+        Записать прогресс рассылки (None - рассылка закончена).
+
+        :param message_hash: Хеш текста рассылки
+        :type message_hash: str
+        :param last_id: Код последней обработанной записи пользователя
+        :type last_id: int | None
+        """
+        if last_id is None:
+            if os.path.exists(self.__state_file):
+                os.remove(self.__state_file)
+            return
+        temp_file = self.__state_file + '.tmp'
+        with open(temp_file, 'wt', encoding='utf-8') as file:
+            json.dump({'message_hash': message_hash, 'last_id': last_id},
+                      file)
+        os.replace(temp_file, self.__state_file)
+
+    async def __send_one(self, bot: Bot, user_id: int, text: str,
+                         stats: Dict[str, int]) -> None:
+        """
+        Отправить сообщение одному пользователю.
+
+        :param bot: Экземпляр бота
+        :type bot: Bot
+        :param user_id: ID пользователя в телеграм
+        :type user_id: int
+        :param text: Текст сообщения
+        :type text: str
+        :param stats: Счётчики рассылки
+        :type stats: Dict[str, int]
+        """
+        attempt = 0
+        while True:
+            await self.__sender.global_limiter.wait()
+            try:
+                await bot.send_message(user_id, text)
+                stats['sent'] += 1
+                return
+            except aexc.TelegramRetryAfter as err:
+                attempt += 1
+                if attempt > self.__max_retries:
+                    log.warning('Рассылка пользователю {} не выполнена: '
+                                'превышено число повторов'.format(user_id))
+                    stats['failed'] += 1
+                    return
+                # Превышено ограничение бота - пауза для всей рассылки
+                log.warning('Рассылка приостановлена на {} сек'.
+                            format(err.retry_after))
+                stats['retried'] += 1
+                self.__sender.global_limiter.pause(err.retry_after)
+            except aexc.TelegramForbiddenError as err:
+                log.exception('Блокировка у пользователя {}: {}'.
+                              format(user_id, str(err)), exc_info=False)
+                stats['blocked'] += 1
+                return
+            except aexc.TelegramAPIError as err:
+                log.exception('Ошибка рассылки пользователю {}: {}'.
+                              format(user_id, str(err)), exc_info=False)
+                stats['failed'] += 1
+                return
+
+    async def __send_batch(self, bot: Bot, users: List[Tuple[int, int]],
+                           text: str, stats: Dict[str, int]) -> None:
+        """
+        Отправить сообщение порции пользователей (не больше concurrency
+        отправок одновременно).
+
+        :param bot: Экземпляр бота
+        :type bot: Bot
+        :param users: Пары (код записи, ID пользователя в телеграм)
+        :type users: List[Tuple[int, int]]
+        :param text: Текст сообщения
+        :type text: str
+        :param stats: Счётчики рассылки
+        :type stats: Dict[str, int]
+        """
+        queue = iter(users)
+
+        async def worker() -> None:
+            for _, i_user in queue:
+                await self.__send_one(bot, i_user, text, stats)
+
+        await asyncio.gather(*(worker() for _ in range(self.__concurrency)))
+
+    async def run(self, bot: Bot, text: str,
+                  timeout: float | None = None) -> Dict[str, int]:
+        """
+        Разослать сообщение всем согласным пользователям. Если задано
+        время ожидания и оно истекло, то рассылка прерывается, а прогресс
+        сохраняется для продолжения в следующий раз.
+
+        :param bot: Экземпляр бота
+        :type bot: Bot
+        :param text: Текст сообщения
+        :type text: str
+        :param timeout: Максимальная длительность рассылки (сек)
+        :type timeout: float | None
+
+        :return: Счётчики рассылки (отправлено, заблокировано и т.п.)
+        :rtype: Dict[str, int]
+        """
+        message_hash = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        stats = {'sent': 0, 'blocked': 0, 'failed': 0, 'retried': 0}
+        last_id = self.__load_state(message_hash)
+        if last_id:
+            log.info('Продолжение рассылки после записи {}'.format(last_id))
+
+        async def send_all() -> None:
+            nonlocal last_id
+            while True:
+                users = await on_event.do_action_async(
+                    'retrieve_users_batch', after_id=last_id,
+                    limit=self.__batch_size
+                )
+                if not users:
+                    break
+                await self.__send_batch(bot, users, text, stats)
+                last_id = users[-1][0]
+                self.__save_state(message_hash, last_id)
+            self.__save_state(message_hash, None)
+
+        try:
+            await asyncio.wait_for(send_all(), timeout)
+        except asyncio.TimeoutError:
+            log.warning('Рассылка прервана по времени, продолжим позже '
+                        '(после записи {})'.format(last_id))
+        log.info('Результат рассылки: {}'.format(stats))
+        return stats
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    Broadcaster()
@@ -13,7 +13,10 @@
 
     get_message - Из объектов типа CallbackQuery или Message вернуть Message.
 
-    stop_polling - Остановить телеграм-бот.
+    stop_polling - Остановить телеграм-бот (опрос, сервер вебхука или
+    процессы-обработчики).
+
+    _make_route - Подготовить обработчик события по сигнатуре функции.
 
     empty_function - Функция-заглушка для событий.
 
@@ -26,6 +29,8 @@
 
 
 :Classes
+    EventRoute - Обработчик события, подготовленный при регистрации.
+
     OnAnythingDoSomething - Хранение и выполнение обработчиков событий.
 
     FilterState, FilterStateFilms, FilterStatePersons - фильтры состояний.
@@ -34,20 +39,77 @@
 :var
     _dp - Диспетчер телеграм-бота.
 
+    _fsm_storage - Хранилище состояний FSM (фильтров поиска).
+
     _on_event - Интерфейс для обработки событий и выполнения действий.
+
+    _sender - Очереди исходящих сообщений (ограничения частоты телеграм).
 """
 
-from typing import List, Callable, Any, Dict
-from time import sleep
-from ..tg_settings import logger
+import asyncio
+import inspect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Callable, Any, Dict, NamedTuple, Tuple
+from ..tg_settings import logger, global_rate, chat_rate, action_workers, \
+    action_queue, fsm_file, fsm_ttl, fsm_flush_interval
 from aiogram import Dispatcher
 from aiogram.types import InlineKeyboardMarkup, ReplyKeyboardMarkup, \
     Message, CallbackQuery, User, URLInputFile
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from aiogram.fsm.storage.memory import MemoryStorage
 import aiogram.exceptions as aexc
 
+from .sender import MessageSender, split_text
+from .fsm_storage import SQLiteStorage
+from .webhook import _webhook
+from .shards import _shards
+
+
+class EventRoute(NamedTuple):
+    """
+    Обработчик события, подготовленный при регистрации.
+
+    Attributes:
+        func (Callable): Функция обработки события (асинхронная)
+        params (Tuple[str, ...]): Какие из параметров data_key, state и
+            history принимает функция (по её сигнатуре)
+        clear_state (bool): Сбросить машину состояний перед вызовом
+            (события основного и дополнительного меню)
+    """
+    func: Callable
+    params: Tuple[str, ...]
+    clear_state: bool
+
+
+# Параметры, которые передаются обработчику события, если он их принимает
+_EVENT_PARAMS: Tuple[str, ...] = ('data_key', 'state', 'history')
+
+# События основного и дополнительного меню (сбрасывают машину состояний)
+_MENU_PREFIXES: Tuple[str, ...] = ('mm', 'af', 'ap')
+
+
+def _make_route(func: Callable, clear_state: bool) -> EventRoute:
+    """
+    Подготовить обработчик события: один раз определить по сигнатуре
+    функции, какие параметры ей передавать.
+
+    :param func: Функция обработки события
+    :type func: Callable
+    :param clear_state: Сбросить машину состояний перед вызовом
+    :type clear_state: bool
+
+    :return: Подготовленный обработчик
+    :rtype: EventRoute
+    """
+    parameters = inspect.signature(func).parameters
+    accepts_any = any(i_param.kind == i_param.VAR_KEYWORD
+                      for i_param in parameters.values())
+    params = tuple(i_name for i_name in _EVENT_PARAMS
+                   if accepts_any or i_name in parameters)
+    return EventRoute(func, params, clear_state)
+
 
 class OnAnythingDoSomething:
     """
@@ -58,28 +120,68 @@ class OnAnythingDoSomething:
     (чтение и запись в таблицу истории, отправка сообщений в
     телеграм-бот, и т.п.)
 
+    Событие по нажатию кнопки определяется по коду из callback.data
+    (часть до первой точки, остальные части - ключи) одним поиском в
+    словаре событий. Для каждого события считается количество вызовов и
+    время выполнения.
+
+    Из асинхронных обработчиков действия вызываются через
+    do_action_async: асинхронные функции выполняются сразу, обычные - в
+    отдельном пуле потоков (у каждого потока своё соединение с БД, см.
+    register_worker_init), чтобы обращения к БД не останавливали цикл
+    событий. Действия, которые работают только с памятью, можно
+    зарегистрировать с inline=True - они выполняются без пула.
+
     Attributes:
         __events (dict): список обработчиков событий, где для
-            каждого ключа назначается своя функция, возвращающая
-            результат ИСТИНА или ЛОЖЬ в зависимости от успешности
-            обработки события. В параметрах указывается экземпляр
-            классов CallbackQuery, User или Message, список ключей (если
-            есть или необходимы ключи, иначе пустой список), экземпляр
+            каждого ключа назначается свой подготовленный обработчик
+            (EventRoute), возвращающий результат ИСТИНА или ЛОЖЬ в
+            зависимости от успешности обработки события. В параметрах
+            указывается экземпляр классов CallbackQuery, User или Message,
+            и, если функция их принимает, список ключей (если есть или
+            необходимы ключи, иначе пустой список), экземпляр
             класса FSMContext (машина состояний для накопления вводимых
-            данных пользователем). Функции событий асинхронные!
+            данных пользователем) и запись истории. Функции событий
+            асинхронные!
         __actions (dict): список обработчиков действий, где для
             каждого ключа назначается своя функция, возвращающая словарь
             с результатом. В параметрах передаются именованные аргументы.
+        __latency (dict): {событие: [вызовов, общее время, наибольшее
+            время]} (время в секундах)
+        __action_modes (dict): Способ вызова действия в do_action_async:
+            "async" - асинхронная функция, "inline" - в цикле событий,
+            "pool" - в пуле потоков
+        __action_stats (dict): {действие: [вызовов, ошибок, общее время
+            выполнения, наибольшее время, общее время ожидания в очереди]}
+        __workers (int): Количество потоков пула действий
+        __queue_size (int): Сколько действий может ждать свободный поток
     """
 
-    def __init__(self):
+    def __init__(self, workers: int = 4, queue_size: int = 100):
         # Обработчики событий сохраним в словаре
-        self.__events = dict()
-        self.__events['default'] = empty_function
+        self.__events: Dict[str, EventRoute] = dict()
+        self.__events['default'] = _make_route(empty_function, False)
+        # Неизвестное событие меню тоже сбрасывает машину состояний
+        self.__menu_default: EventRoute = _make_route(empty_function, True)
         self.__actions = dict()
         self.__actions['default'] = default_action
-
-    def register_action(self, name: str, func: Callable) -> None:
+        self.__latency: Dict[str, List[float]] = dict()
+
+        # Пул потоков для обычных (не асинхронных) действий
+        self.__action_modes: Dict[str, str] = {'default': 'inline'}
+        self.__action_stats: Dict[str, List[float]] = dict()
+        self.__workers: int = max(1, workers)
+        self.__queue_size: int = max(0, queue_size)
+        self.__worker_init: List[Callable] = []
+        self.__executor: ThreadPoolExecutor | None = None
+        self.__slots: asyncio.Semaphore | None = None
+        self.__queue_lock = threading.Lock()
+        self.__pending: int = 0
+        self.__max_pending: int = 0
+        self.__running: int = 0
+
+    def register_action(self, name: str, func: Callable,
+                        inline: bool = False) -> None:
         """
         Регистрируем (добавляем в словарь) функцию для выполнения действия.
 
@@ -87,6 +189,10 @@ class OnAnythingDoSomething:
         :type name: str
         :param func: Функция для выполнения действия
         :type func: Callable
+        :param inline: Функция не обращается к БД и сети (работает только
+            с памятью), поэтому do_action_async выполняет её без пула
+            потоков
+        :type inline: bool
 
         :return: None
         """
@@ -94,26 +200,39 @@ class OnAnythingDoSomething:
         # ИМХО возможно динамическое переопределение функций в
         # процессе работы приложения.
         self.__actions[name] = func
+        if inspect.iscoroutinefunction(func):
+            self.__action_modes[name] = 'async'
+        else:
+            self.__action_modes[name] = 'inline' if inline else 'pool'
         log.debug('Регистрация обработчика "{0}{1}" для события "{2}"'.
                   format(func.__name__, func.__code__.co_varnames, name))
 
-    def register_event(self, name: str, func: Callable) -> None:
+    def register_event(self, name: str, func: Callable,
+                       clear_state: bool = None) -> None:
         """
         Регистрируем (добавляем в словарь) функцию для обработки событий.
+        Параметры, которые принимает функция, определяются здесь же один
+        раз, а не при каждом вызове.
 
-        :param name: Имя ключа для вызова функции
+        :param name: Имя ключа для вызова функции (код события)
         :type name: str
         :param func: Функция для обработки события
         :type func: Callable
+        :param clear_state: Сбросить машину состояний перед вызовом (по
+            умолчанию - для событий меню с кодами mm_*, af_*, ap_*)
+        :type clear_state: bool
 
         :return: None
         """
         # Контроль наличия/отсутствия ключа на разработчике.
         # ИМХО возможно динамическое переопределение функций в
         # процессе работы приложения.
-        self.__events[name] = func
+        if clear_state is None:
+            clear_state = name.startswith(_MENU_PREFIXES)
+        route = _make_route(func, clear_state)
+        self.__events[name] = route
         log.debug('Регистрация обработчика "{0}{1}" для действия "{2}"'.
-                  format(func.__name__, func.__code__.co_varnames, name))
+                  format(func.__name__, route.params, name))
 
     def do_action(self, name: str, **kwargs) -> Any:
         """
@@ -141,6 +260,249 @@ class OnAnythingDoSomething:
                           format(name=name, err=str(err)))
         return result
 
+    def register_worker_init(self, func: Callable) -> None:
+        """
+        Регистрируем функцию, которая выполняется при запуске каждого
+        потока пула действий (например, открыть соединение с БД).
+
+        :param func: Функция без параметров
+        :type func: Callable
+
+        :return: None
+        """
+        self.__worker_init.append(func)
+
+    def __init_worker(self) -> None:
+        """
+        Подготовка потока пула действий.
+
+        :return: None
+        """
+        for i_func in self.__worker_init:
+            try:
+                i_func()
+            except Exception as err:
+                log.exception('Ошибка подготовки потока действий: {}'.
+                              format(str(err)), exc_info=True)
+
+    def __run_in_worker(self, func: Callable, kwargs: Dict,
+                        submitted: float) -> Tuple[Any, float, float]:
+        """
+        Выполнить действие в потоке пула.
+
+        :param func: Функция действия
+        :type func: Callable
+        :param kwargs: Параметры функции
+        :type kwargs: Dict
+        :param submitted: Время постановки в очередь (perf_counter)
+        :type submitted: float
+
+        :return: Результат, время ожидания в очереди и время выполнения
+        :rtype: Tuple[Any, float, float]
+        """
+        start = time.perf_counter()
+        with self.__queue_lock:
+            self.__pending -= 1
+            self.__running += 1
+        try:
+            return func(**kwargs), start - submitted, \
+                time.perf_counter() - start
+        finally:
+            with self.__queue_lock:
+                self.__running -= 1
+
+    async def do_action_async(self, name: str, **kwargs) -> Any:
+        """
+        Выполнить действие, не останавливая цикл событий: асинхронная
+        функция выполняется сразу, обычная - в пуле потоков (если очередь
+        пула заполнена, то ждём свободного места).
+
+        :param name: Имя обработчика
+        :type name: str
+        :param kwargs: Параметры для функции
+
+        :return: Результат работы функции (None при ошибке)
+        :rtype: Any
+        """
+        if name not in self.__actions:
+            log.debug('Выполнение функции по умолчанию (вместо {}) с '
+                      'параметрами {}'.format(name, str(kwargs)))
+            name = 'default'
+        func = self.__actions[name]
+        mode = self.__action_modes.get(name, 'pool')
+
+        result = None
+        wait = 0.0
+        start = time.perf_counter()
+        try:
+            if mode == 'async':
+                result = await func(**kwargs)
+                elapsed = time.perf_counter() - start
+            elif mode == 'inline':
+                result = func(**kwargs)
+                elapsed = time.perf_counter() - start
+            else:
+                result, wait, elapsed = await self.__submit(func, kwargs)
+        except Exception as err:
+            self.__account(name, time.perf_counter() - start, 0.0, True)
+            log.exception('Ошибка при выполнении действия "{name}": {err}'.
+                          format(name=name, err=str(err)))
+            return None
+
+        self.__account(name, elapsed, wait, False)
+        return result
+
+    async def __submit(self, func: Callable,
+                       kwargs: Dict) -> Tuple[Any, float, float]:
+        """
+        Поставить действие в очередь пула потоков и дождаться результата.
+
+        :param func: Функция действия
+        :type func: Callable
+        :param kwargs: Параметры функции
+        :type kwargs: Dict
+
+        :return: Результат, время ожидания в очереди и время выполнения
+        :rtype: Tuple[Any, float, float]
+        """
+        if self.__executor is None:
+            self.__executor = ThreadPoolExecutor(
+                max_workers=self.__workers, thread_name_prefix='action',
+                initializer=self.__init_worker
+            )
+            self.__slots = asyncio.Semaphore(self.__workers +
+                                              self.__queue_size)
+        async with self.__slots:
+            with self.__queue_lock:
+                self.__pending += 1
+                self.__max_pending = max(self.__max_pending, self.__pending)
+            return await asyncio.get_running_loop().run_in_executor(
+                self.__executor, self.__run_in_worker, func, kwargs,
+                time.perf_counter()
+            )
+
+    def __account(self, name: str, elapsed: float, wait: float,
+                  error: bool) -> None:
+        """
+        Учесть выполнение действия в статистике.
+
+        :param name: Имя действия
+        :type name: str
+        :param elapsed: Время выполнения (сек)
+        :type elapsed: float
+        :param wait: Время ожидания в очереди пула (сек)
+        :type wait: float
+        :param error: Действие завершилось ошибкой
+        :type error: bool
+
+        :return: None
+        """
+        stats = self.__action_stats.setdefault(name, [0, 0, 0.0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += int(error)
+        stats[2] += elapsed
+        stats[3] = max(stats[3], elapsed)
+        stats[4] += wait
+
+    def action_stats(self) -> Dict[str, Any]:
+        """
+        Вернуть статистику действий, выполненных через do_action_async, и
+        состояние очереди пула потоков.
+
+        :return: {"queue": {pending, max_pending, running, workers},
+            "actions": {действие: {mode, count, errors, avg_ms, max_ms,
+            avg_wait_ms}}}
+        :rtype: Dict[str, Any]
+        """
+        actions = dict()
+        for i_name, (i_count, i_errors, i_total, i_max, i_wait) in \
+                self.__action_stats.items():
+            actions[i_name] = {
+                'mode': self.__action_modes.get(i_name, 'pool'),
+                'count': i_count,
+                'errors': i_errors,
+                'avg_ms': round(i_total / i_count * 1000, 3),
+                'max_ms': round(i_max * 1000, 3),
+                'avg_wait_ms': round(i_wait / i_count * 1000, 3)
+            }
+        return {
+            'queue': {'pending': self.__pending,
+                      'max_pending': self.__max_pending,
+                      'running': self.__running,
+                      'workers': self.__workers},
+            'actions': actions
+        }
+
+    def log_action_stats(self) -> None:
+        """
+        Записать статистику действий в протокол.
+
+        :return: None
+        """
+        stats = self.action_stats()
+        log.info('Очередь действий: {}'.format(stats['queue']))
+        for i_name, i_stats in stats['actions'].items():
+            log.info('Действие {}: {}'.format(i_name, i_stats))
+
+    async def close(self) -> None:
+        """
+        Дождаться выполнения действий и остановить пул потоков. Ожидание
+        выполняется в отдельном потоке, чтобы не останавливать цикл событий
+        (действия могут сами ждать цикл событий).
+
+        :return: None
+        """
+        executor, self.__executor = self.__executor, None
+        if executor is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, executor.shutdown
+            )
+        self.log_action_stats()
+
+    def resolve(self, data: str) -> Tuple[str, EventRoute, List[str]]:
+        """
+        Определить событие по данным кнопки (callback.data): код события
+        до первой точки, ключи - остальные части.
+
+        :param data: Данные кнопки, например "af_rating.123"
+        :type data: str
+
+        :return: Имя события для статистики, обработчик и ключи
+        :rtype: Tuple[str, EventRoute, List[str]]
+        """
+        name, _, keys = (data or '').partition('.')
+        data_key = keys.split('.') if keys else []
+        route = self.__events.get(name)
+        if route is not None:
+            return name, route, data_key
+        if name.startswith(_MENU_PREFIXES):
+            return 'default', self.__menu_default, data_key
+        return 'default', self.__events['default'], data_key
+
+    async def dispatch(
+            self,
+            callback: CallbackQuery,
+            state: FSMContext = None,
+            history: Dict = None
+    ) -> Any:
+        """
+        Выполнить обработку нажатия кнопки: событие определяется по
+        callback.data (см. resolve).
+
+        :param callback: Связующий объект с последним событием в телеграм
+        :type callback: CallbackQuery
+        :param state: Машина состояний для подготовки фильтров при поиске
+        :type state: FSMContext
+        :param history: Запись истории запросов
+        :type history: Dict
+
+        :return: Результат работы функции (Истина = успешное выполнение)
+        :rtype: Any
+        """
+        name, route, data_key = self.resolve(callback.data)
+        return await self.__call(name, route, route.clear_state, callback,
+                                 data_key, state, history)
+
     async def do_event(
             self,
             name: str,
@@ -166,38 +528,89 @@ class OnAnythingDoSomething:
         :return: Результат работы функции (Истина = успешное выполнение)
         :rtype: bool
         """
-        result = False
+        route = self.__events.get(name)
+        if route is None:
+            log.debug('Выполнение функции по умолчанию (вместо {})'.
+                      format(name))
+            name, route = 'default', self.__events['default']
+        # Машину состояний сбрасывает только обработка нажатия кнопки
+        return await self.__call(name, route, False, callback, data_key,
+                                 state, history)
+
+    async def __call(self, name: str, route: EventRoute, clear_state: bool,
+                     callback: CallbackQuery | Message | User,
+                     data_key: List, state: FSMContext,
+                     history: Dict) -> Any:
+        """
+        Вызвать подготовленный обработчик события и учесть время его
+        выполнения.
 
-        # Выполняем обработчик из словаря
+        :param name: Имя события (для протокола и статистики)
+        :type name: str
+        :param route: Подготовленный обработчик
+        :type route: EventRoute
+        :param clear_state: Сбросить машину состояний перед вызовом
+        :type clear_state: bool
+        :param callback: Связующий объект с последним событием в телеграм
+        :type callback: CallbackQuery | Message | User
+        :param data_key: Набор ключей
+        :type data_key: List
+        :param state: Машина состояний
+        :type state: FSMContext
+        :param history: Запись истории запросов
+        :type history: Dict
+
+        :return: Результат работы функции (Ложь при ошибке)
+        :rtype: Any
+        """
+        values = {'data_key': data_key, 'state': state, 'history': history}
+        kwargs = {i_name: values[i_name] for i_name in route.params}
+        result = False
+        start = time.perf_counter()
         try:
-            if name in self.__events.keys():
-                # result = await self.__events[name](callback, data_key, state, history)
-                func = self.__events[name]
-
-                # Добавим аргументы в словарь
-                args_in_func = func.__code__.co_varnames
-                kwargs: Dict = {}
-                if 'data_key' in args_in_func:
-                    kwargs['data_key'] = data_key
-                if 'state' in args_in_func:
-                    kwargs['state'] = state
-                if 'history' in args_in_func:
-                    kwargs['history'] = history
-
-                # Вызов функции с параметрами, доступными для этой функции
-                result = await func(callback, **kwargs)
-                log.debug('Выполнение функции {} вернуло результат {}'.
-                          format(name, str(result)))
-            else:
-                result = await self.__events['default'](callback, data_key,
-                                                        state, history)
-                log.debug('Выполнение функции по умолчанию (вместо {}) '
-                          'вернуло результат {}'.format(name, str(result)))
+            if clear_state and state is not None:
+                await state.clear()
+            # Вызов функции с параметрами, доступными для этой функции
+            result = await route.func(callback, **kwargs)
+            log.debug('Выполнение функции {} вернуло результат {}'.
+                      format(name, str(result)))
         except BaseException as err:
             log.exception('Ошибка при обработки события "{name}": {err}'.
                           format(name=name, err=str(err)), exc_info=True)
+        finally:
+            elapsed = time.perf_counter() - start
+            latency = self.__latency.setdefault(name, [0, 0.0, 0.0])
+            latency[0] += 1
+            latency[1] += elapsed
+            latency[2] = max(latency[2], elapsed)
         return result
 
+    def event_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Вернуть количество вызовов и время выполнения по событиям.
+
+        :return: {событие: {count, avg_ms, max_ms}}
+        :rtype: Dict[str, Dict[str, float]]
+        """
+        return {
+            i_name: {'count': i_count,
+                     'avg_ms': round(i_total / i_count * 1000, 3),
+                     'max_ms': round(i_max * 1000, 3)}
+            for i_name, (i_count, i_total, i_max) in self.__latency.items()
+        }
+
+    def log_event_stats(self) -> None:
+        """
+        Записать время выполнения событий в протокол (самые долгие в
+        среднем - первыми).
+
+        :return: None
+        """
+        stats = sorted(self.event_stats().items(),
+                       key=lambda i_item: i_item[1]['avg_ms'], reverse=True)
+        for i_name, i_stats in stats:
+            log.info('Событие {}: {}'.format(i_name, i_stats))
+
 
 async def safe_send_message(message: Message, param_text: str = "",
                             param_reply_markup: InlineKeyboardMarkup |
@@ -217,37 +630,25 @@ async def safe_send_message(message: Message, param_text: str = "",
     :return: None
     """
     try:
-        if param_text:
-            # Из-за ограничений на размер сообщения в ТГ делаем деление
-            # по абзацам и вывод порциями
-            paragraphs = param_text.split('\n')
-            counter = 0
-            out_text = paragraphs[0]
-            last_paragraph = len(paragraphs) - 1
-            log.debug('Вывод сообщения. Длина текста {}. Параграфов {}.'.
-                      format(len(param_text), len(paragraphs)))
-            while counter < last_paragraph:
-                counter += 1
-                if (len(out_text) + len(paragraphs[counter]) > 4096) \
-                        or (counter >= last_paragraph):
-                    if counter >= last_paragraph:
-                        # Выводим последние порции текста
-                        out_text = out_text + '\n' + paragraphs[counter]
-                        await message.answer(text=out_text,
-                                             reply_markup=param_reply_markup)
-                        break
-                    else:
-                        await message.answer(text=out_text)
-                    sleep(1)
-                    out_text = ''
-                out_text = out_text + '\n' + paragraphs[counter]
-            else:
-                await message.answer(text=out_text,
-                                     reply_markup=param_reply_markup)
-        else:
-            await message.answer(text='Действие выполнено. '
-                                      'Жду дальнейших действий.',
-                                 reply_markup=param_reply_markup)
+        # Из-за ограничений на размер сообщения в ТГ делаем деление
+        # по абзацам и вывод порциями (кнопки только у последней порции)
+        chunks = split_text(param_text) if param_text else []
+        if not chunks:
+            chunks = ['Действие выполнено. Жду дальнейших действий.']
+        log.debug('Вывод сообщения. Длина текста {}. Порций {}.'.
+                  format(len(param_text), len(chunks)))
+
+        # Порции уходят подряд через очередь чата, паузы между ними не
+        # блокируют обработку других пользователей
+        last_chunk = len(chunks) - 1
+        async with _sender.chat(message.chat.id):
+            for i_number, i_chunk in enumerate(chunks):
+                markup = param_reply_markup \
+                    if i_number == last_chunk else None
+                await _sender.call(
+                    message.chat.id,
+                    lambda: message.answer(text=i_chunk, reply_markup=markup)
+                )
     except BaseException as err:
         log.exception("Ошибка отправки сообщения: " + str(err), exc_info=True)
 
@@ -268,7 +669,11 @@ async def safe_reply_message(message: Message, param_text: str = "",
     :return: None
     """
     try:
-        await message.reply(text=param_text, reply_markup=param_reply_markup)
+        await _sender.send(
+            message.chat.id,
+            lambda: message.reply(text=param_text,
+                                  reply_markup=param_reply_markup)
+        )
     except BaseException as err:
         log.exception("Ошибка ответа на сообщение: " + str(err), exc_info=True)
 
@@ -299,7 +704,15 @@ async def stop_polling() -> None:
     Остановить телеграм-бот
     """
     try:
-        await _dp.stop_polling()
+        if _shards.is_worker:
+            # Бот останавливает основной процесс
+            _shards.request_stop()
+        elif _webhook.is_running:
+            _webhook.stop()
+        elif _shards.is_polling:
+            _shards.stop_polling()
+        else:
+            await _dp.stop_polling()
     except BaseException as err:
         log.exception('Ошибка запроса на прекращение работы телеграм-бота:'
                       ' {}'.format(str(err)), exc_info=True)
@@ -399,15 +812,25 @@ async def send_photo_by_url(url: str, text: str = None,
     if url:
         log.debug(f'Отправка изображения по URL "{url}"')
         try:
-            file_id = _on_event.do_action('func_get_id', file_url=url)
+            file_id = await _on_event.do_action_async(
+                'func_get_id', file_url=url
+            )
             if file_id:
-                await message.answer_photo(photo=file_id, caption=text)
+                await _sender.send(
+                    message.chat.id,
+                    lambda: message.answer_photo(photo=file_id, caption=text)
+                )
             else:
                 image_from_url = URLInputFile(url)
-                result = await message.answer_photo(photo=image_from_url,
-                                                    caption=text)
-                _on_event.do_action('func_save_id', file_url=url,
-                                    file_id=result.photo[-1].file_id)
+                result = await _sender.send(
+                    message.chat.id,
+                    lambda: message.answer_photo(photo=image_from_url,
+                                                 caption=text)
+                )
+                await _on_event.do_action_async(
+                    'func_save_id', file_url=url,
+                    file_id=result.photo[-1].file_id
+                )
 
             # Сбросить текстовое описание, если уже отправили
             # успешно файл с текстом
@@ -457,10 +880,15 @@ class FilterStatePersons(FilterState):
 
 
 # Диспетчер телеграм-бота
-_dp = Dispatcher(storage=MemoryStorage())
+# Состояния фильтров поиска сохраняются в файле и переживают перезапуск
+_fsm_storage = SQLiteStorage(fsm_file, fsm_ttl, fsm_flush_interval)
+_dp = Dispatcher(storage=_fsm_storage)
 
 # Для доступа к обработчику событий и действий
-_on_event = OnAnythingDoSomething()
+_on_event = OnAnythingDoSomething(action_workers, action_queue)
+
+# Очереди исходящих сообщений с учётом ограничений телеграм
+_sender = MessageSender(global_rate, chat_rate)
 
 
 # Начинаем работу с определения логирования и сообщение в протокол
@@ -0,0 +1,370 @@
+"""
+Модуль хранения состояний машины состояний (FSM) телеграм-бота в файле
+SQLite.
+
+Состояния и данные (например, недозаполненные фильтры поиска фильмов и
+персон) читаются из памяти, а в файл записываются пачкой в фоне: все
+изменённые за период записи - одной транзакцией. Поэтому после перезапуска
+бота пользователь продолжает с того же шага, а запись в файл не задерживает
+обработку сообщений. Состояния, которые не менялись дольше времени жизни
+(брошенные фильтры), удаляются из памяти и из файла фоновой задачей, пока
+в памяти есть состояния, - в том числе пустые состояния пользователей,
+которые только читались (промахи кеша).
+
+Одного пользователя должен обслуживать один процесс бота (например, при
+нескольких процессах пользователи распределяются между ними), так как
+состояние, прочитанное в память, из файла повторно не перечитывается.
+
+
+:Classes
+    SQLiteStorage - Хранилище состояний FSM в SQLite с кешем в памяти.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from ..tg_settings import logger
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище состояний FSM: кеш в памяти и отложенная запись в SQLite.
+
+    Attributes:
+        __path (str): Файл базы данных состояний
+        __ttl (float): Время жизни неизменяемого состояния (сек)
+        __flush_interval (float): Период записи изменений в файл (сек)
+        __records (dict): {ключ: [состояние, данные, время изменения]}
+        __dirty (set): Ключи, изменённые после последней записи в файл
+        written, flushes, evicted (int): Записано (и удалено) строк,
+            выполнено записей в файл, удалено устаревших состояний
+    """
+
+    def __init__(self, path: str = 'fsm.db', ttl: float = 86400,
+                 flush_interval: float = 1.0) -> None:
+        self.__path: str = path
+        self.__ttl: float = ttl
+        self.__flush_interval: float = flush_interval
+        self.__records: Dict[StorageKey, List] = dict()
+        self.__dirty: set = set()
+        self.__connection: sqlite3.Connection | None = None
+        # Соединение используется из потоков asyncio.to_thread по очереди
+        self.__db_lock = threading.Lock()
+        self.__flusher: asyncio.Task | None = None
+        self.__last_cleanup: float = 0.0
+        self.written: int = 0
+        self.flushes: int = 0
+        self.evicted: int = 0
+
+    def __connect(self) -> sqlite3.Connection:
+        """
+        Соединение с файлом состояний (таблица создаётся при первом
+        обращении). Вызывается при взятой блокировке __db_lock.
+
+        :return: Соединение с БД
+        :rtype: sqlite3.Connection
+        """
+        if self.__connection is None:
+            connection = sqlite3.connect(self.__path, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS fsm_state ('
+                'bot_id INTEGER NOT NULL, chat_id INTEGER NOT NULL, '
+                'user_id INTEGER NOT NULL, destiny TEXT NOT NULL, '
+                'state TEXT, data TEXT NOT NULL, updated_at REAL NOT NULL, '
+                'PRIMARY KEY (bot_id, chat_id, user_id, destiny))'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS fsm_state_updated_at '
+                'ON fsm_state (updated_at)'
+            )
+            connection.commit()
+            self.__connection = connection
+        return self.__connection
+
+    def __load(self, key: StorageKey) -> Tuple[Optional[str], Dict]:
+        """
+        Прочитать состояние из файла (устаревшее состояние не читается).
+
+        :param key: Ключ состояния
+        :type key: StorageKey
+
+        :return: Состояние и данные
+        :rtype: Tuple[Optional[str], Dict]
+        """
+        with self.__db_lock:
+            row = self.__connect().execute(
+                'SELECT state, data FROM fsm_state WHERE bot_id = ? AND '
+                'chat_id = ? AND user_id = ? AND destiny = ? AND '
+                'updated_at >= ?',
+                (key.bot_id, key.chat_id, key.user_id, key.destiny,
+                 time.time() - self.__ttl)
+            ).fetchone()
+        if row is None:
+            return None, dict()
+        return row[0], json.loads(row[1])
+
+    async def __record(self, key: StorageKey) -> List:
+        """
+        Запись состояния в памяти (при промахе - из файла).
+
+        :param key: Ключ состояния
+        :type key: StorageKey
+
+        :return: [состояние, данные, время изменения]
+        :rtype: List
+        """
+        record = self.__records.get(key)
+        if record is None:
+            state, data = await asyncio.to_thread(self.__load, key)
+            # Пока читали файл, запись могла появиться
+            record = self.__records.get(key)
+            if record is None:
+                record = [state, data, time.time()]
+                self.__records[key] = record
+                # Прочитанное состояние тоже устаревает
+                self.__schedule()
+        return record
+
+    def __schedule(self) -> None:
+        """
+        Запустить фоновую запись и удаление устаревших состояний, если
+        она не запущена.
+
+        :return: None
+        """
+        if self.__flusher is None or self.__flusher.done():
+            self.__flusher = asyncio.create_task(self.__flush_loop())
+
+    def __touch(self, key: StorageKey, record: List) -> None:
+        """
+        Отметить изменение состояния для записи в файл.
+
+        :param key: Ключ состояния
+        :type key: StorageKey
+        :param record: Запись состояния в памяти
+        :type record: List
+
+        :return: None
+        """
+        record[2] = time.time()
+        # Запись могла быть удалена из памяти как устаревшая
+        self.__records[key] = record
+        self.__dirty.add(key)
+        self.__schedule()
+
+    async def set_state(self, bot: Bot, key: StorageKey,
+                        state: StateType = None) -> None:
+        """
+        Установить состояние.
+
+        :param bot: Телеграм-бот
+        :type bot: Bot
+        :param key: Ключ состояния
+        :type key: StorageKey
+        :param state: Новое состояние (None - сбросить)
+        :type state: StateType
+
+        :return: None
+        """
+        record = await self.__record(key)
+        record[0] = state.state if isinstance(state, State) else state
+        self.__touch(key, record)
+
+    async def get_state(self, bot: Bot, key: StorageKey) -> Optional[str]:
+        """
+        Текущее состояние.
+
+        :param bot: Телеграм-бот
+        :type bot: Bot
+        :param key: Ключ состояния
+        :type key: StorageKey
+
+        :return: Состояние или None
+        :rtype: Optional[str]
+        """
+        return (await self.__record(key))[0]
+
+    async def set_data(self, bot: Bot, key: StorageKey,
+                       data: Dict[str, Any]) -> None:
+        """
+        Записать данные состояния (с заменой).
+
+        :param bot: Телеграм-бот
+        :type bot: Bot
+        :param key: Ключ состояния
+        :type key: StorageKey
+        :param data: Данные
+        :type data: Dict[str, Any]
+
+        :return: None
+        """
+        record = await self.__record(key)
+        record[1] = data.copy()
+        self.__touch(key, record)
+
+    async def get_data(self, bot: Bot, key: StorageKey) -> Dict[str, Any]:
+        """
+        Данные состояния.
+
+        :param bot: Телеграм-бот
+        :type bot: Bot
+        :param key: Ключ состояния
+        :type key: StorageKey
+
+        :return: Копия данных
+        :rtype: Dict[str, Any]
+        """
+        return (await self.__record(key))[1].copy()
+
+    async def __flush_loop(self) -> None:
+        """
+        Фоновая запись изменений в файл и удаление устаревших состояний,
+        пока есть изменения или состояния в памяти.
+
+        :return: None
+        """
+        while self.__dirty or self.__records:
+            await asyncio.sleep(self.__flush_interval)
+            await self.flush()
+
+    def __write(self, rows: List[Tuple], deleted: List[Tuple],
+                expired_before: float | None) -> None:
+        """
+        Записать изменения в файл одной транзакцией.
+
+        :param rows: Строки для записи (ключ, состояние, данные, время)
+        :type rows: List[Tuple]
+        :param deleted: Ключи сброшенных состояний (удаляются из файла)
+        :type deleted: List[Tuple]
+        :param expired_before: Удалить состояния, изменённые раньше этого
+            времени (None - не удалять)
+        :type expired_before: float | None
+
+        :return: None
+        """
+        with self.__db_lock:
+            connection = self.__connect()
+            with connection:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO fsm_state (bot_id, chat_id, '
+                    'user_id, destiny, state, data, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', rows
+                )
+                connection.executemany(
+                    'DELETE FROM fsm_state WHERE bot_id = ? AND chat_id = ? '
+                    'AND user_id = ? AND destiny = ?', deleted
+                )
+                if expired_before is not None:
+                    connection.execute(
+                        'DELETE FROM fsm_state WHERE updated_at < ?',
+                        (expired_before,)
+                    )
+
+    async def flush(self) -> None:
+        """
+        Записать изменённые состояния в файл и удалить устаревшие.
+        Пустое состояние (нет состояния и данных) удаляется из файла.
+
+        :return: None
+        """
+        now = time.time()
+        expired_before = None
+        if now - self.__last_cleanup >= min(self.__ttl, 3600):
+            expired_before = now - self.__ttl
+            self.__evict(expired_before)
+            self.__last_cleanup = now
+
+        dirty, self.__dirty = self.__dirty, set()
+        rows: List[Tuple] = []
+        deleted: List[Tuple] = []
+        for i_key in dirty:
+            key = (i_key.bot_id, i_key.chat_id, i_key.user_id,
+                   i_key.destiny)
+            record = self.__records.get(i_key)
+            if record is None or (record[0] is None and not record[1]):
+                deleted.append(key)
+                # Пустое состояние не держим и в памяти
+                self.__records.pop(i_key, None)
+            else:
+                rows.append(key + (record[0],
+                                   json.dumps(record[1], ensure_ascii=False),
+                                   record[2]))
+        if not rows and not deleted and expired_before is None:
+            return
+
+        try:
+            await asyncio.to_thread(self.__write, rows, deleted,
+                                    expired_before)
+        except sqlite3.Error as err:
+            # Изменения запишем в следующий раз
+            self.__dirty |= dirty
+            log.exception('Ошибка записи состояний FSM: {}'.format(err),
+                          exc_info=True)
+            return
+        self.written += len(rows) + len(deleted)
+        self.flushes += 1
+
+    def __evict(self, expired_before: float) -> None:
+        """
+        Удалить из памяти состояния, которые не менялись дольше времени
+        жизни (брошенные фильтры).
+
+        :param expired_before: Время, раньше которого состояние устарело
+        :type expired_before: float
+
+        :return: None
+        """
+        expired = [i_key for i_key, i_record in self.__records.items()
+                   if i_record[2] < expired_before
+                   and i_key not in self.__dirty]
+        for i_key in expired:
+            del self.__records[i_key]
+        self.evicted += len(expired)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Вернуть счётчики хранилища.
+
+        :return: Состояний в памяти, ожидают записи, записано строк,
+            записей в файл, удалено устаревших
+        :rtype: Dict[str, int]
+        """
+        return {'size': len(self.__records), 'pending': len(self.__dirty),
+                'written': self.written, 'flushes': self.flushes,
+                'evicted': self.evicted}
+
+    async def close(self) -> None:
+        """
+        Записать все изменения и закрыть файл состояний.
+
+        :return: None
+        """
+        if self.__flusher is not None and not self.__flusher.done():
+            self.__flusher.cancel()
+            try:
+                await self.__flusher
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        with self.__db_lock:
+            if self.__connection is not None:
+                self.__connection.close()
+                self.__connection = None
+        log.info('Состояния FSM: {}'.format(self.stats()))
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    SQLiteStorage()
@@ -1,6 +1,13 @@
 """
 Модуль с наборами кнопок для чат-бота.
 
+Клавиатуры строятся один раз и берутся из кеша (LRU на TG_KEYBOARD_CACHE
+клавиатур): постоянные наборы (главное меню и т.п.) строятся при импорте,
+наборы с ключом (кнопки фильма с его ID) - при первом запросе с этим
+ключом. Клавиатуры из кеша общие для всех сообщений, поэтому их нельзя
+изменять. Длина callback_data каждой кнопки проверяется при построении
+клавиатуры (телеграм принимает не больше 64 байт).
+
 
 :Functions
     builder_start() - Стартовый набор кнопок (главное меню).
@@ -9,8 +16,12 @@
 
     builder_custom_buttons() - Пользовательский набор кнопок.
 
+    keyboard_stats() - Счётчики кеша клавиатур.
+
 
 :var
+    CALLBACK_DATA_LIMIT - Наибольшая длина callback_data (байт).
+
     buttons_start - Список кнопок главного меню.
 
     buttons_after_films - Список кнопок для уточнения сведений по фильму.
@@ -26,10 +37,17 @@
     buttons_title_types - Список кнопок для выбора вариантов тайтла.
 """
 
-from typing import List, Tuple
+from functools import lru_cache
+from typing import Dict, List, Tuple
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from ..tg_settings import keyboard_cache
+
+
+# Ограничение телеграм на длину callback_data (в байтах)
+CALLBACK_DATA_LIMIT = 64
+
 
 # Клавиатура с 7 кнопками для главного меню (после кнопки старта, Main Menu)
 buttons_start = [
@@ -95,31 +113,85 @@ buttons_title_types = ["movie", "tv-series", "cartoon", "anime",
                        "animated-series", "tv-show"]
 
 
-def _builder_prepare(buttons: List[Tuple[str, str]], text: str = "") \
+class _CachedButton(InlineKeyboardButton):
+    """
+    Кнопка клавиатуры из кеша (атрибуты не изменяются).
+    """
+
+    class Config:
+        allow_mutation = False
+
+
+class _CachedMarkup(InlineKeyboardMarkup):
+    """
+    Inline клавиатура из кеша (атрибуты не изменяются).
+    """
+
+    class Config:
+        allow_mutation = False
+
+
+def _check_callback_data(callback_data: str) -> str:
+    """
+    Проверить длину callback_data кнопки.
+
+    :param callback_data: Код действия кнопки
+    :type callback_data: str
+
+    :return: Тот же код действия
+    :rtype: str
+
+    :exception ValueError: Если код длиннее CALLBACK_DATA_LIMIT байт
+    """
+    size = len(callback_data.encode('utf-8'))
+    if size > CALLBACK_DATA_LIMIT:
+        raise ValueError('callback_data длиннее {} байт ({}): {}'.format(
+            CALLBACK_DATA_LIMIT, size, callback_data
+        ))
+    return callback_data
+
+
+@lru_cache(maxsize=keyboard_cache)
+def _builder_prepare(buttons: Tuple[Tuple[str, str], ...]) \
         -> InlineKeyboardMarkup:
     """
-    Функция подготовки наборов кнопок.
+    Функция подготовки наборов кнопок (результат кешируется). Всплывающий
+    текст у Inline клавиатуры не передаётся в телеграм, поэтому от него
+    клавиатура не зависит.
 
-    :param buttons: Список кнопок в виде кортежей (название, действие).
-    :param text: Всплывающий текст, выводимый над кнопками.
+    :param buttons: Кнопки в виде кортежей (название, действие).
 
-    :return: Экземпляр класса для Inline клавиатуры.
+    :return: Экземпляр класса для Inline клавиатуры (не изменять!).
+
+    :exception ValueError: Если callback_data кнопки длиннее 64 байт
     """
     builder = InlineKeyboardBuilder()
     for i_button in buttons:
-        builder.add(InlineKeyboardButton(
+        builder.add(_CachedButton(
             text=i_button[0],
-            callback_data=i_button[1])
+            callback_data=_check_callback_data(i_button[1]))
         )
 
     # Расположение по 2 кнопки в ряд
     builder.adjust(2)
-    reply_markup = builder.as_markup(
-        resize_keyboard=True,
-        one_time_keyboard=True,
-        input_field_placeholder=text
+    return _CachedMarkup(inline_keyboard=builder.export())
+
+
+def _with_key(buttons: List[Tuple[str, str]] | Tuple,
+              data_key: str) -> Tuple[Tuple[str, str], ...]:
+    """
+    Кнопки с ключом: к кодам событий, которые заканчиваются точкой,
+    добавляется ключ.
+
+    :param buttons: Кнопки в виде кортежей (название, действие).
+    :param data_key: Код (ID) элемента, по которому формируем клавиатуру.
+
+    :return: Кнопки с ключом (кортеж - ключ кеша клавиатур)
+    """
+    return tuple(
+        (i_text, f'{i_data}{data_key}' if i_data.endswith('.') else i_data)
+        for i_text, i_data in buttons
     )
-    return reply_markup
 
 
 def builder_start(text: str = "") -> InlineKeyboardMarkup:
@@ -131,7 +203,7 @@ def builder_start(text: str = "") -> InlineKeyboardMarkup:
     :return: Экземпляр класса для Inline клавиатуры.
     """
     # Набор кнопок для основного меню
-    return _builder_prepare(buttons_start, text)
+    return _builder_prepare(_start)
 
 
 def builder_random_films(text: str = "", data_key: str = "") -> \
@@ -146,8 +218,7 @@ def builder_random_films(text: str = "", data_key: str = "") -> \
     """
     # Набор кнопок после выдачи случайного фильма с добавлением ключа
     # после точек в кодах событий.
-    result = builder_custom_buttons(text, data_key, buttons_after_films)
-    return result
+    return _builder_prepare(_with_key(buttons_after_films, data_key))
 
 
 def builder_custom_buttons(text: str = "", data_key: str = "",
@@ -161,19 +232,40 @@ def builder_custom_buttons(text: str = "", data_key: str = "",
     :param buttons: Список кнопок в виде кортежей (название, действие).
 
     :return: Экземпляр класса для Inline клавиатуры
+
+    :exception ValueError: Если callback_data кнопки длиннее 64 байт
     """
     # Набор кнопок пользователя с добавлением ключа после точек в кодах
     # событий.
-    buttons_with_key = []
-    for i_button in buttons:
-        if i_button[1].endswith('.'):
-            buttons_with_key.append((i_button[0], f'{i_button[1]}{data_key}'))
-        else:
-            buttons_with_key.append((i_button[0], i_button[1]))
-    return _builder_prepare(buttons_with_key, text)
+    return _builder_prepare(_with_key(buttons, data_key))
+
+
+def keyboard_stats() -> Dict[str, int]:
+    """
+    Вернуть счётчики кеша клавиатур.
+
+    :return: Попадания, промахи, размер кеша и его предел
+    :rtype: Dict[str, int]
+    """
+    info = _builder_prepare.cache_info()
+    return {'hits': info.hits, 'misses': info.misses,
+            'size': info.currsize, 'max_size': info.maxsize}
+
+
+# Главное меню (выводится почти на каждом экране) строится один раз
+_start: Tuple[Tuple[str, str], ...] = tuple(buttons_start)
+builder_start()
+
+# Коды событий постоянных наборов проверяются при импорте
+for _i_buttons in (buttons_start, buttons_after_films, buttons_search_films,
+                   buttons_search_persons, buttons_after_film_filter,
+                   buttons_after_person_filter):
+    for _i_text, _i_data in _i_buttons:
+        _check_callback_data(_i_data)
 
 
 if __name__ == "__main__":
     builder_start()
     builder_random_films()
     builder_custom_buttons()
+    keyboard_stats()
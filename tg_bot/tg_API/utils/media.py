@@ -0,0 +1,257 @@
+"""
+Модуль отправки наборов картинок (альбомов) в чат.
+
+ID уже загруженных в телеграм файлов получаются одним запросом (обработчик
+действия "func_get_ids"). Картинки, которых ещё нет в телеграм, скачиваются
+одновременно (не больше workers загрузок), после чего всё отправляется
+альбомами (sendMediaGroup) не больше чем по 10 картинок. Новые ID файлов
+сохраняются одной записью (обработчик действия "func_save_ids").
+
+
+:Functions
+    send_photo_album - Отправить картинки с подписями альбомами.
+
+
+:Classes
+    MediaPipeline - Загрузка картинок и отправка их альбомами.
+
+
+:var
+    _media - Загрузка картинок и отправка альбомов для всего бота.
+"""
+
+import asyncio
+from typing import Dict, List, Tuple
+
+import aiohttp
+from aiogram.types import BufferedInputFile, InputMediaPhoto, Message, \
+    CallbackQuery
+import aiogram.exceptions as aexc
+
+from ..tg_settings import logger, media_workers, media_timeout
+from .commands import _on_event as on_event, _sender as sender, \
+    get_message, safe_send_message, send_photo_by_url
+
+# Больше картинок в одном альбоме телеграм не принимает
+ALBUM_LIMIT: int = 10
+
+
+class MediaPipeline:
+    """
+    Загрузка картинок по ссылкам и отправка их альбомами.
+
+    Attributes:
+        __workers (int): Сколько картинок скачивать одновременно
+        __timeout (float): Время ожидания загрузки одной картинки (сек)
+        __max_size (int): Максимальный размер картинки (байт)
+    """
+
+    def __init__(self, workers: int = 5, timeout: float = 10,
+                 max_size: int = 10 * 1024 * 1024) -> None:
+        self.__workers: int = max(1, workers)
+        self.__timeout: float = timeout
+        self.__max_size: int = max_size
+        self.__session: aiohttp.ClientSession | None = None
+
+    async def close(self) -> None:
+        """
+        Закрыть сессию загрузки картинок.
+
+        :return: None
+        """
+        if self.__session and not self.__session.closed:
+            await self.__session.close()
+        self.__session = None
+
+    def __get_session(self) -> aiohttp.ClientSession:
+        """
+        Сессия загрузки картинок (открывается при первой загрузке).
+
+        :return: Сессия aiohttp
+        :rtype: aiohttp.ClientSession
+        """
+        if self.__session is None or self.__session.closed:
+            self.__session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.__workers),
+                timeout=aiohttp.ClientTimeout(total=self.__timeout)
+            )
+        return self.__session
+
+    async def __download(self, url: str,
+                         semaphore: asyncio.Semaphore) -> bytes | None:
+        """
+        Скачать одну картинку.
+
+        :param url: Ссылка на картинку
+        :type url: str
+        :param semaphore: Ограничение одновременных загрузок
+        :type semaphore: asyncio.Semaphore
+
+        :return: Содержимое файла или None при ошибке
+        :rtype: bytes | None
+        """
+        async with semaphore:
+            try:
+                async with self.__get_session().get(url) as response:
+                    if response.status != 200:
+                        log.warning('Картинка {} не получена: код {}'.
+                                    format(url, response.status))
+                        return None
+                    if (response.content_length or 0) > self.__max_size:
+                        log.warning('Картинка {} слишком большая'.format(url))
+                        return None
+                    return await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                log.exception('Ошибка загрузки картинки {}: {}'.
+                              format(url, err), exc_info=False)
+                return None
+
+    async def __download_all(self, urls: List[str]) -> Dict[str, bytes]:
+        """
+        Скачать картинки одновременно (не больше workers загрузок).
+
+        :param urls: Ссылки на картинки
+        :type urls: List[str]
+
+        :return: {ссылка: содержимое} для успешно скачанных картинок
+        :rtype: Dict[str, bytes]
+        """
+        semaphore = asyncio.Semaphore(self.__workers)
+        contents = await asyncio.gather(
+            *(self.__download(i_url, semaphore) for i_url in urls)
+        )
+        return {i_url: i_content for i_url, i_content in zip(urls, contents)
+                if i_content}
+
+    async def send_photos(self, action: CallbackQuery | Message,
+                          items: List[Tuple[str | None, str]]) -> None:
+        """
+        Отправить картинки с подписями альбомами. Подписи без картинки
+        (нет ссылки или картинку не удалось получить) отправляются одним
+        текстовым сообщением.
+
+        :param action: Связь с сообщениями ТГ-бота.
+        :type action: CallbackQuery | Message
+        :param items: Пары (ссылка на картинку, подпись)
+        :type items: List[Tuple[str | None, str]]
+
+        :return: None
+        """
+        message: Message = get_message(action)
+        if not message or not items:
+            return
+
+        urls = list(dict.fromkeys(i_url for i_url, _ in items if i_url))
+        file_ids: Dict[str, str] = await on_event.do_action_async(
+            'func_get_ids', file_urls=urls
+        ) or {}
+        contents = await self.__download_all(
+            [i_url for i_url in urls if i_url not in file_ids]
+        )
+
+        # Картинки (файл или ID в телеграм) и подписи без картинок
+        photos: List[Tuple[str, str]] = []
+        texts: List[str] = []
+        for i_url, i_text in items:
+            if i_url in file_ids or i_url in contents:
+                photos.append((i_url, i_text))
+            elif i_url:
+                texts.append(f'{i_text}\nURL={i_url}')
+            else:
+                texts.append(i_text)
+
+        new_ids: Dict[str, str] = dict()
+        for i_start in range(0, len(photos), ALBUM_LIMIT):
+            album = photos[i_start:i_start + ALBUM_LIMIT]
+            await self.__send_album(action, message, album, file_ids,
+                                    contents, new_ids)
+
+        if new_ids:
+            await on_event.do_action_async('func_save_ids', files=new_ids)
+        if texts:
+            await safe_send_message(message, '\n'.join(texts))
+
+    async def __send_album(self, action: CallbackQuery | Message,
+                           message: Message, album: List[Tuple[str, str]],
+                           file_ids: Dict[str, str],
+                           contents: Dict[str, bytes],
+                           new_ids: Dict[str, str]) -> None:
+        """
+        Отправить один альбом (одна картинка отправляется отдельно, так как
+        альбом - от 2 до 10 картинок). При ошибке альбома картинки
+        отправляются по одной.
+
+        :param action: Связь с сообщениями ТГ-бота.
+        :type action: CallbackQuery | Message
+        :param message: Сообщение, в чат которого отправляем
+        :type message: Message
+        :param album: Пары (ссылка, подпись)
+        :type album: List[Tuple[str, str]]
+        :param file_ids: Известные ID файлов {ссылка: ID}
+        :type file_ids: Dict[str, str]
+        :param contents: Скачанные картинки {ссылка: содержимое}
+        :type contents: Dict[str, bytes]
+        :param new_ids: Сюда добавляются ID загруженных файлов
+        :type new_ids: Dict[str, str]
+
+        :return: None
+        """
+        media = []
+        for i_url, i_text in album:
+            photo = file_ids.get(i_url) or BufferedInputFile(
+                contents[i_url], filename=i_url.rsplit('/', 1)[-1] or 'image'
+            )
+            media.append(InputMediaPhoto(media=photo, caption=i_text))
+
+        try:
+            if len(media) == 1:
+                results = [await sender.send(
+                    message.chat.id,
+                    lambda: message.answer_photo(photo=media[0].media,
+                                                 caption=media[0].caption)
+                )]
+            else:
+                results = await sender.send(
+                    message.chat.id, lambda: message.answer_media_group(media)
+                )
+        except (aexc.TelegramBadRequest, aexc.TelegramNetworkError) as err:
+            log.exception('Ошибка отправки альбома: ' + str(err),
+                          exc_info=True)
+            for i_url, i_text in album:
+                await send_photo_by_url(url=i_url, text=i_text,
+                                        action=action)
+            return
+
+        for (i_url, _), i_result in zip(album, results):
+            if i_url not in file_ids and i_result.photo:
+                new_ids[i_url] = i_result.photo[-1].file_id
+
+
+async def send_photo_album(items: List[Tuple[str | None, str]],
+                           action: CallbackQuery | Message = None) -> None:
+    """
+    Отправить картинки с подписями в ТГ-чат альбомами.
+
+    Для чтения ID файлов из БД требуется обработчик действия "func_get_ids".
+    Для сохранения в БД требуется обработчик действия "func_save_ids".
+
+    :param items: Пары (ссылка на картинку, подпись)
+    :type items: List[Tuple[str | None, str]]
+    :param action: Связь с сообщениями ТГ-бота.
+    :type action: CallbackQuery | Message
+
+    :return: None
+    """
+    await _media.send_photos(action, items)
+
+
+# Загрузка картинок и отправка альбомов
+_media = MediaPipeline(media_workers, media_timeout)
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    MediaPipeline()
+    send_photo_album()
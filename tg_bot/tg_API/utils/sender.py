@@ -0,0 +1,264 @@
+"""
+Модуль отправки сообщений с учётом ограничений телеграм (flood limits).
+
+Телеграм ограничивает частоту сообщений: около одного сообщения в секунду
+в один чат (короткие серии допускаются) и около 30 сообщений в секунду
+в целом для бота. При превышении приходит ошибка TelegramRetryAfter.
+
+
+:Functions
+    split_text - Деление длинного текста на части по абзацам (за один проход).
+
+
+:Classes
+    RateLimiter - Асинхронное ограничение частоты (ведро токенов).
+
+    MessageSender - Очереди исходящих сообщений по чатам и общая очередь.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+import aiogram.exceptions as aexc
+
+from ..tg_settings import logger
+
+
+# Максимальная длина одного текстового сообщения в телеграм
+MESSAGE_LIMIT: int = 4096
+
+
+def split_text(text: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    """
+    Разделить текст на части не длиннее limit символов по абзацам.
+    Абзац длиннее limit делится на части по limit символов.
+
+    :param text: Текст сообщения
+    :type text: str
+    :param limit: Максимальная длина части
+    :type limit: int
+
+    :return: Список частей текста (пустой, если текста нет)
+    :rtype: List[str]
+    """
+    chunks: List[str] = []
+    parts: List[str] = []
+    length = -1  # Для первого абзаца разделитель не нужен
+
+    for i_paragraph in text.split('\n'):
+        # Слишком длинный абзац режем на куски
+        while len(i_paragraph) > limit:
+            if parts:
+                chunks.append('\n'.join(parts))
+                parts, length = [], -1
+            chunks.append(i_paragraph[:limit])
+            i_paragraph = i_paragraph[limit:]
+
+        if parts and length + 1 + len(i_paragraph) > limit:
+            chunks.append('\n'.join(parts))
+            parts, length = [], -1
+        parts.append(i_paragraph)
+        length += 1 + len(i_paragraph)
+
+    if parts and any(parts):
+        chunks.append('\n'.join(parts))
+    return chunks
+
+
+class RateLimiter:
+    """
+    Асинхронное ограничение частоты: в среднем не больше rate вызовов
+    в секунду и не больше burst вызовов подряд. Пауза (pause) - срок,
+    до которого вызовы не разрешаются: паузы от нескольких вызовов не
+    складываются, действует самая поздняя.
+    """
+
+    def __init__(self, rate: float, burst: float = 1) -> None:
+        self.__rate: float = rate
+        self.__burst: float = max(1.0, burst)
+        self.__tokens: float = self.__burst
+        self.__updated: float = time.monotonic()
+        self.__paused_until: float = 0.0
+
+    def __refill(self, now: float) -> None:
+        """
+        Пополнить токены за время с прошлого пополнения (время паузы не
+        учитывается).
+
+        :param now: Текущее время (time.monotonic)
+        :type now: float
+        """
+        elapsed = now - max(self.__updated, self.__paused_until)
+        if elapsed > 0:
+            self.__tokens = min(self.__burst,
+                                self.__tokens + elapsed * self.__rate)
+        self.__updated = now
+
+    def pause(self, seconds: float) -> None:
+        """
+        Не выдавать токены ближайшие seconds секунд (после RetryAfter).
+        После паузы вызовы продолжаются с частотой rate, без серии.
+
+        :param seconds: Длительность паузы
+        :type seconds: float
+        """
+        now = time.monotonic()
+        if self.__rate > 0:
+            self.__refill(now)
+            self.__tokens = min(self.__tokens, 0)
+        self.__paused_until = max(self.__paused_until, now + seconds)
+
+    async def wait(self) -> None:
+        """
+        Дождаться разрешения на один вызов.
+        """
+        while True:
+            now = time.monotonic()
+            if now < self.__paused_until:
+                await asyncio.sleep(self.__paused_until - now)
+                continue
+            if self.__rate <= 0:
+                return
+            self.__refill(now)
+            self.__tokens -= 1
+            if self.__tokens >= 0:
+                return
+            await asyncio.sleep(-self.__tokens / self.__rate)
+            if time.monotonic() >= self.__paused_until:
+                return
+            # Пока ждали своей очереди, началась пауза: токен возвращается,
+            # а очередь занимается заново после паузы
+            self.__tokens += 1
+
+
+class _ChatQueue:
+    """
+    Очередь сообщений одного чата: блокировка (FIFO) и ограничение частоты.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.lock = asyncio.Lock()
+        self.limiter = RateLimiter(rate, burst)
+        self.users: int = 0  # Сколько вызовов ждут или держат очередь
+        self.released_at: float = 0  # Когда очередь освободилась
+
+
+class MessageSender:
+    """
+    Отправка сообщений через очереди чатов с общим ограничением частоты.
+    Сообщения одного чата уходят строго по очереди, а задержки между ними
+    не блокируют цикл событий (обработку других пользователей).
+
+    Attributes:
+        global_limiter (RateLimiter): Общее ограничение для бота
+        retried (int): Количество повторов после TelegramRetryAfter
+    """
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1,
+                 chat_burst: float = 3, max_retries: int = 3) -> None:
+        self.global_limiter = RateLimiter(global_rate, global_rate)
+        self.__chat_rate: float = chat_rate
+        self.__chat_burst: float = chat_burst
+        self.__max_retries: int = max_retries
+        self.__chats: Dict[int, _ChatQueue] = dict()
+        self.__pruned_at: float = time.monotonic()
+        self.retried: int = 0
+
+    def __prune(self) -> None:
+        """
+        Удалить очереди чатов, которые давно свободны (их ограничение
+        частоты уже полностью восстановилось).
+        """
+        now = time.monotonic()
+        if now - self.__pruned_at < 60:
+            return
+        self.__pruned_at = now
+        idle = self.__chat_burst / self.__chat_rate if self.__chat_rate else 0
+        for i_chat, i_queue in list(self.__chats.items()):
+            if not i_queue.users and now - i_queue.released_at > idle:
+                del self.__chats[i_chat]
+
+    @asynccontextmanager
+    async def chat(self, chat_id: int) -> AsyncIterator[None]:
+        """
+        Занять очередь чата (другие сообщения этого чата ждут).
+
+        :param chat_id: ID чата
+        :type chat_id: int
+        """
+        queue = self.__chats.get(chat_id)
+        if queue is None:
+            self.__prune()
+            queue = _ChatQueue(self.__chat_rate, self.__chat_burst)
+            self.__chats[chat_id] = queue
+        queue.users += 1
+        try:
+            async with queue.lock:
+                yield
+        finally:
+            queue.users -= 1
+            queue.released_at = time.monotonic()
+
+    async def call(self, chat_id: int,
+                   func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Выполнить вызов API телеграм с учётом ограничений частоты.
+        При TelegramRetryAfter ждём указанное время и повторяем.
+        Очередь чата должна быть занята вызывающим (см. chat и send).
+
+        :param chat_id: ID чата
+        :type chat_id: int
+        :param func: Асинхронная функция отправки без параметров
+        :type func: Callable[[], Awaitable[Any]]
+
+        :return: Результат функции отправки
+        :rtype: Any
+        """
+        queue = self.__chats.get(chat_id)
+        attempt = 0
+        while True:
+            if queue:
+                await queue.limiter.wait()
+            await self.global_limiter.wait()
+            try:
+                return await func()
+            except aexc.TelegramRetryAfter as err:
+                attempt += 1
+                if attempt > self.__max_retries:
+                    raise
+                self.retried += 1
+                log.warning('Ограничение телеграм для чата {}: пауза {} '
+                            'сек'.format(chat_id, err.retry_after))
+                if queue:
+                    # Пауза очереди чата: её соблюдает limiter.wait
+                    queue.limiter.pause(err.retry_after)
+                else:
+                    await asyncio.sleep(err.retry_after)
+
+    async def send(self, chat_id: int,
+                   func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Отправить одно сообщение через очередь чата.
+
+        :param chat_id: ID чата
+        :type chat_id: int
+        :param func: Асинхронная функция отправки без параметров
+        :type func: Callable[[], Awaitable[Any]]
+
+        :return: Результат функции отправки
+        :rtype: Any
+        """
+        async with self.chat(chat_id):
+            return await self.call(chat_id, func)
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    split_text()
+    RateLimiter()
+    MessageSender()
@@ -0,0 +1,532 @@
+"""
+Модуль обработки обновлений в нескольких процессах (шардах).
+
+Основной процесс получает обновления (опросом или через вебхук) и
+передаёт их процессам-обработчикам: обновления одного чата всегда
+попадают в один и тот же процесс (номер шарда - ID чата по модулю
+количества шардов) через его очередь, поэтому обрабатываются по порядку,
+а состояние чата (FSM, фильтры) живёт в памяти одного процесса. Каждый
+процесс-обработчик выполняет те же роутеры, что и бот в одном процессе.
+
+Если очередь шарда заполнена (процесс упал или не успевает), обновления
+его чатов при опросе ждут в буфере шарда в основном процессе и передаются
+по мере освобождения очереди, а опрос и обновления других шардов не
+ждут. Обновления сверх заполненного буфера шарда отбрасываются (счётчик
+dropped).
+
+Основной процесс следит за процессами-обработчиками и перезапускает
+завершившиеся аварийно (при частых падениях - с нарастающей паузой).
+Команда /stop в процессе-обработчике передаётся основному процессу.
+
+
+:Classes
+    ShardPool - Процессы-обработчики обновлений и их очереди.
+
+
+:var
+    _shards - Процессы-обработчики телеграм-бота.
+"""
+
+import asyncio
+from collections import deque
+import inspect
+import multiprocessing as mp
+import queue as queue_module
+import signal
+import threading
+import time
+from typing import Callable, Deque, Dict, List
+
+from aiogram import Bot
+from aiogram.types import Update
+from aiogram.utils.backoff import Backoff, BackoffConfig
+
+from ..tg_settings import logger, shards, shard_queue
+from .update_queue import UpdateQueue, update_chat_id
+
+
+class ShardPool:
+    """
+    Процессы-обработчики обновлений (шарды).
+
+    Attributes:
+        __shards (int): Количество процессов-обработчиков
+        __queue_size (int): Сколько обновлений может ждать передачи шарду
+        __queues (List[mp.Queue]): Очереди обновлений шардов
+        __pending (List[Deque[Update]]): Буферы обновлений, которые ждут
+            места в очередях шардов (не больше queue_size на шард)
+        __processes (List[mp.Process]): Процессы-обработчики
+        __stop_request (mp.Event): Запрос остановки бота от шарда (/stop)
+        index (int | None): Номер шарда в процессе-обработчике (None -
+            основной процесс)
+        routed, restarts, dropped (List[int]): Передано обновлений,
+            перезапусков и отброшено обновлений по шардам
+    """
+
+    def __init__(self, shards: int = 1, queue_size: int = 1000) -> None:
+        self.__shards: int = max(1, shards)
+        self.__queue_size: int = max(1, queue_size)
+        self.__context = mp.get_context('spawn')
+        self.__target: Callable | None = None
+        self.__queues: List[mp.Queue] = []
+        self.__pending: List[Deque[Update]] = \
+            [deque() for _ in range(self.__shards)]
+        self.__processes: List[mp.Process] = []
+        self.__started_at: List[float] = []
+        self.__backoff: List[float] = []
+        self.__restart_at: List[float | None] = []
+        self.__stop_request = None
+        self.__polling: asyncio.Event | None = None
+        self.__closing: bool = False
+        self.index: int | None = None
+        self.routed: List[int] = [0] * self.__shards
+        self.restarts: List[int] = [0] * self.__shards
+        self.dropped: List[int] = [0] * self.__shards
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Обновления обрабатываются в нескольких процессах.
+
+        :return: Истина, если шардов больше одного
+        :rtype: bool
+        """
+        return self.__shards > 1
+
+    @property
+    def shards(self) -> int:
+        """
+        Количество процессов-обработчиков.
+
+        :return: Количество шардов
+        :rtype: int
+        """
+        return self.__shards
+
+    @property
+    def is_worker(self) -> bool:
+        """
+        Текущий процесс - процесс-обработчик.
+
+        :return: Истина в процессе-обработчике
+        :rtype: bool
+        """
+        return self.index is not None
+
+    @property
+    def is_polling(self) -> bool:
+        """
+        Основной процесс получает обновления опросом.
+
+        :return: Истина, если опрос запущен и не остановлен
+        :rtype: bool
+        """
+        return self.__polling is not None and not self.__polling.is_set()
+
+    # ---------------------------------------------------------------
+    # Основной процесс
+    # ---------------------------------------------------------------
+    def start(self, target: Callable) -> None:
+        """
+        Запустить процессы-обработчики.
+
+        :param target: Функция процесса-обработчика (уровня модуля) с
+            параметрами: номер шарда, очередь обновлений, запрос остановки
+        :type target: Callable
+
+        :return: None
+        """
+        self.__target = target
+        self.__closing = False
+        self.__stop_request = self.__context.Event()
+        self.__queues = [None] * self.__shards
+        self.__processes = [None] * self.__shards
+        self.__started_at = [0.0] * self.__shards
+        self.__backoff = [0.0] * self.__shards
+        self.__restart_at = [None] * self.__shards
+        for i_index in range(self.__shards):
+            self.__spawn(i_index)
+        log.info('Запущено процессов-обработчиков: {}'.format(self.__shards))
+
+    def __spawn(self, index: int) -> None:
+        """
+        Запустить процесс-обработчик с новой очередью обновлений. Если
+        прежний процесс оставил обновления в очереди, они переносятся в
+        новую очередь раньше обновлений из буфера шарда.
+
+        :param index: Номер шарда
+        :type index: int
+
+        :return: None
+        """
+        updates = self.__context.Queue(self.__queue_size)
+        old = self.__queues[index]
+        if old is not None:
+            # Упавший процесс мог оставить очередь заблокированной,
+            # поэтому читаем без ожидания
+            moved = []
+            try:
+                while True:
+                    moved.append(old.get_nowait())
+            except queue_module.Empty:
+                pass
+            old.cancel_join_thread()
+            old.close()
+            self.__pending[index].extendleft(reversed(moved))
+            self.routed[index] -= len(moved)
+            log.info('Шард {}: перенесено обновлений {}'.
+                     format(index, len(moved)))
+        self.__queues[index] = updates
+        process = self.__context.Process(
+            target=self.__target, name='shard-{}'.format(index), daemon=True,
+            args=(index, updates, self.__stop_request)
+        )
+        process.start()
+        self.__processes[index] = process
+        self.__started_at[index] = time.monotonic()
+        self.__flush(index)
+
+    def __flush(self, index: int) -> bool:
+        """
+        Передать шарду обновления из его буфера без ожидания.
+
+        :param index: Номер шарда
+        :type index: int
+
+        :return: Истина - буфер пуст, Ложь - очередь шарда заполнена
+        :rtype: bool
+        """
+        pending = self.__pending[index]
+        while pending:
+            try:
+                self.__queues[index].put_nowait(pending[0])
+            except queue_module.Full:
+                return False
+            pending.popleft()
+            self.routed[index] += 1
+        return True
+
+    def __flush_all(self) -> None:
+        """
+        Передать шардам обновления из буферов без ожидания.
+
+        :return: None
+        """
+        for i_index in range(self.__shards):
+            self.__flush(i_index)
+
+    def put_nowait(self, update: Update) -> bool:
+        """
+        Передать обновление шарду его чата без ожидания (после обновлений
+        из буфера шарда).
+
+        :param update: Обновление телеграм
+        :type update: Update
+
+        :return: Истина - передано, Ложь - очередь шарда заполнена
+        :rtype: bool
+        """
+        index = update_chat_id(update) % self.__shards
+        if not self.__flush(index):
+            return False
+        try:
+            self.__queues[index].put_nowait(update)
+        except queue_module.Full:
+            return False
+        self.routed[index] += 1
+        return True
+
+    def put(self, update: Update) -> bool:
+        """
+        Передать обновление шарду его чата, не дожидаясь места в очереди:
+        если очередь шарда заполнена, обновление ждёт в буфере шарда.
+
+        :param update: Обновление телеграм
+        :type update: Update
+
+        :return: Истина - передано или в буфере, Ложь - буфер шарда
+            заполнен, обновление отброшено
+        :rtype: bool
+        """
+        if self.put_nowait(update):
+            return True
+        index = update_chat_id(update) % self.__shards
+        pending = self.__pending[index]
+        if len(pending) >= self.__queue_size:
+            self.dropped[index] += 1
+            log.error('Шард {} не принимает обновления, обновление {} '
+                      'отброшено'.format(index, update.update_id))
+            return False
+        pending.append(update)
+        return True
+
+    async def __drain(self, interval: float = 0.05) -> None:
+        """
+        Передавать шардам обновления из буферов по мере освобождения их
+        очередей.
+
+        :param interval: Период проверки очередей (сек)
+        :type interval: float
+
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(interval)
+            self.__flush_all()
+
+    async def supervise(self, on_stop: Callable,
+                        interval: float = 1.0) -> None:
+        """
+        Следить за процессами-обработчиками: перезапускать завершившиеся
+        и передавать запрос остановки бота (/stop в шарде).
+
+        :param on_stop: Функция остановки получения обновлений (обычная
+            или асинхронная)
+        :type on_stop: Callable
+        :param interval: Период проверки (сек)
+        :type interval: float
+
+        :return: None
+        """
+        while not self.__closing:
+            await asyncio.sleep(interval)
+            if self.__stop_request.is_set():
+                self.__stop_request.clear()
+                result = on_stop()
+                if inspect.isawaitable(result):
+                    await result
+            now = time.monotonic()
+            for i_index, i_process in enumerate(self.__processes):
+                if self.__closing or i_process.is_alive():
+                    continue
+                if self.__restart_at[i_index] is None:
+                    # Быстрое падение - пауза перед перезапуском растёт
+                    uptime = now - self.__started_at[i_index]
+                    self.__backoff[i_index] = min(
+                        60.0, max(1.0, self.__backoff[i_index] * 2)
+                    ) if uptime < 10 else 0.0
+                    self.__restart_at[i_index] = \
+                        now + self.__backoff[i_index]
+                    log.error('Шард {} завершился (код {}), перезапуск '
+                              'через {:.0f} сек'.format(
+                                  i_index, i_process.exitcode,
+                                  self.__backoff[i_index]))
+                if now >= self.__restart_at[i_index]:
+                    self.__restart_at[i_index] = None
+                    self.restarts[i_index] += 1
+                    self.__spawn(i_index)
+
+    async def poll(self, bot: Bot, allowed_updates: List[str] = None,
+                   polling_timeout: int = 10) -> None:
+        """
+        Получать обновления опросом и передавать их шардам до остановки
+        (stop_polling или сигнал SIGINT/SIGTERM).
+
+        :param bot: Телеграм-бот
+        :type bot: Bot
+        :param allowed_updates: Типы получаемых обновлений
+        :type allowed_updates: List[str]
+        :param polling_timeout: Время ожидания обновлений (сек)
+        :type polling_timeout: int
+
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        self.__polling = asyncio.Event()
+        signals = []
+        for i_signal in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(i_signal, self.stop_polling)
+                signals.append(i_signal)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows: остановка через /stop
+        backoff = Backoff(BackoffConfig(min_delay=1.0, max_delay=5.0,
+                                        factor=1.3, jitter=0.1))
+        request_timeout = int(bot.session.timeout + polling_timeout) \
+            if bot.session.timeout else None
+        stopped = asyncio.create_task(self.__polling.wait())
+        drain = asyncio.create_task(self.__drain())
+        offset = None
+        try:
+            while not self.__polling.is_set():
+                request = asyncio.create_task(bot.get_updates(
+                    offset=offset, timeout=polling_timeout,
+                    allowed_updates=allowed_updates,
+                    request_timeout=request_timeout
+                ))
+                await asyncio.wait({request, stopped},
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if not request.done():
+                    request.cancel()
+                    break
+                try:
+                    updates = request.result()
+                except Exception as err:
+                    log.error('Ошибка получения обновлений: {}'.format(err))
+                    await backoff.asleep()
+                    continue
+                backoff.reset()
+                for i_update in updates:
+                    # Заполненная очередь шарда не задерживает опрос:
+                    # обновление ждёт в буфере шарда
+                    self.put(i_update)
+                    # Подтверждается следующим запросом
+                    offset = i_update.update_id + 1
+        finally:
+            stopped.cancel()
+            drain.cancel()
+            for i_signal in signals:
+                loop.remove_signal_handler(i_signal)
+            self.__polling.set()
+
+    def stop_polling(self) -> None:
+        """
+        Остановить получение обновлений опросом.
+
+        :return: None
+        """
+        if self.__polling is not None:
+            self.__polling.set()
+
+    async def stop(self, timeout: float) -> None:
+        """
+        Остановить процессы-обработчики: каждый обрабатывает уже
+        переданные обновления (не дольше timeout) и завершается.
+
+        :param timeout: Предельное время завершения (сек)
+        :type timeout: float
+
+        :return: None
+        """
+        self.__closing = True
+        for i_index, i_queue in enumerate(self.__queues):
+            pending = self.__pending[i_index]
+            # Признак конца очереди - после всех переданных обновлений и
+            # обновлений из буфера шарда
+            try:
+                while pending:
+                    await asyncio.to_thread(i_queue.put, pending[0], True,
+                                            timeout)
+                    pending.popleft()
+                    self.routed[i_index] += 1
+                await asyncio.to_thread(i_queue.put, None, True, timeout)
+            except queue_module.Full:
+                # Процесс не читает очередь - будет остановлен
+                if pending:
+                    log.warning('Шард {}: не передано обновлений {}'.
+                                format(i_index, len(pending)))
+                    self.dropped[i_index] += len(pending)
+                    pending.clear()
+        deadline = time.monotonic() + timeout
+        for i_index, i_process in enumerate(self.__processes):
+            await asyncio.to_thread(i_process.join,
+                                    max(0.0, deadline - time.monotonic()))
+            if i_process.is_alive():
+                log.warning('Шард {} не завершился вовремя'.format(i_index))
+                i_process.kill()
+                i_process.join()
+        for i_queue in self.__queues:
+            i_queue.cancel_join_thread()
+            i_queue.close()
+        log.info('Процессы-обработчики остановлены {}'.format(self.stats()))
+
+    def stats(self) -> Dict[str, List[int]]:
+        """
+        Вернуть счётчики по шардам.
+
+        :return: Передано обновлений, ждут в буфере, отброшено,
+            перезапусков, процесс работает
+        :rtype: Dict[str, List[int]]
+        """
+        return {'routed': list(self.routed),
+                'pending': [len(i_pending) for i_pending in self.__pending],
+                'dropped': list(self.dropped),
+                'restarts': list(self.restarts),
+                'alive': [int(i_process.is_alive())
+                          for i_process in self.__processes]}
+
+    # ---------------------------------------------------------------
+    # Процесс-обработчик
+    # ---------------------------------------------------------------
+    def attach(self, index: int, stop_request) -> None:
+        """
+        Отметить текущий процесс как процесс-обработчик. Сигналы SIGINT и
+        SIGTERM игнорируются: процесс останавливает основной процесс.
+
+        :param index: Номер шарда
+        :type index: int
+        :param stop_request: Запрос остановки бота (mp.Event)
+
+        :return: None
+        """
+        self.index = index
+        self.__stop_request = stop_request
+        for i_signal in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(i_signal, signal.SIG_IGN)
+
+    def request_stop(self) -> None:
+        """
+        Попросить основной процесс остановить бота (команда /stop).
+
+        :return: None
+        """
+        if self.__stop_request is not None:
+            self.__stop_request.set()
+
+    async def serve(self, updates: mp.Queue, update_queue: UpdateQueue,
+                    interval: float = 1.0) -> None:
+        """
+        Передавать обновления из очереди шарда в очередь обработки, пока
+        не придёт признак конца очереди или не завершится основной процесс.
+        Очередь шарда читает отдельный поток: пока очередь обработки
+        заполнена, он ждёт, и новые обновления копятся в очереди шарда.
+
+        :param updates: Очередь обновлений шарда
+        :type updates: mp.Queue
+        :param update_queue: Очередь обработки обновлений
+        :type update_queue: UpdateQueue
+        :param interval: Период проверки основного процесса (сек)
+        :type interval: float
+
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        finished = asyncio.Event()
+
+        def read() -> None:
+            try:
+                while True:
+                    update = updates.get()
+                    if update is None:
+                        break
+                    asyncio.run_coroutine_threadsafe(
+                        update_queue.put(update), loop
+                    ).result()
+            except Exception as err:
+                log.exception('Шард {}: ошибка чтения очереди: {}'.
+                              format(self.index, err), exc_info=True)
+            finally:
+                loop.call_soon_threadsafe(finished.set)
+
+        threading.Thread(target=read, daemon=True,
+                         name='shard-{}-reader'.format(self.index)).start()
+        parent = mp.parent_process()
+        while not finished.is_set():
+            try:
+                await asyncio.wait_for(finished.wait(), interval)
+            except asyncio.TimeoutError:
+                if parent is not None and not parent.is_alive():
+                    log.error('Шард {}: основной процесс завершился'.
+                              format(self.index))
+                    break
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+# Процессы-обработчики обновлений (TG_SHARDS > 1)
+_shards = ShardPool(shards, shard_queue)
+
+
+if __name__ == "__main__":
+    ShardPool()
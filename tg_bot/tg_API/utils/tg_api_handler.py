@@ -2,6 +2,10 @@
 Модуль обработчиков событий от телеграм-бота.
 
 :Functions
+    _filter_prompt - Обработчик кнопки фильтра поиска (ввод значения).
+
+    _filter_command - Обработчик кнопки сброса фильтров или запуска поиска.
+
     process_all_callback - Обработчик CallBack событий от телеграм-бота.
 
     process_stop_command - Обработчик события по команде `/stop` в телеграм.
@@ -65,12 +69,13 @@
 """
 
 from ..tg_settings import logger
-from typing import List, Dict
+from typing import Callable, List, Dict, Tuple
 from aiogram import Router, F
 from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, \
     CallbackQuery, ReplyKeyboardRemove, User
 from aiogram.filters import Command, Text, StateFilter
 from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
 from .commands import _on_event as on_event, safe_send_message, \
     safe_reply_message, FilterStateFilms, FilterStatePersons, \
     stop_polling, get_message
@@ -83,6 +88,114 @@ router_callback = Router()
 router_command = Router()
 router_filter = Router()
 
+# Строки экрана статистики: вид действия (см. обработчик действия
+# "get_statistic_data") и текст для общего количества
+_STATISTIC_LINES = (
+    ('films', 'Предложено фильмов: {}.'),
+    ('search_films', 'Поиск фильмов запущен: {} раз.'),
+    ('persons', 'Загружено в БД персон: {}.'),
+    ('search_persons', 'Поиск персон запущен: {} раз.'),
+)
+
+
+def _filter_prompt(text: str, new_state: State,
+                   markup: ReplyKeyboardMarkup = None) -> Callable:
+    """
+    Обработчик кнопки фильтра поиска: приглашение ввести значение и
+    ожидание его ввода (состояние машины).
+
+    :param text: Текст приглашения
+    :type text: str
+    :param new_state: Ожидаемое состояние машины
+    :type new_state: State
+    :param markup: Кнопки для выбора значения
+    :type markup: ReplyKeyboardMarkup
+
+    :return: Асинхронная функция обработки события
+    :rtype: Callable
+    """
+    async def prompt(callback: CallbackQuery,
+                     state: FSMContext = None) -> bool:
+        await safe_send_message(get_message(callback), text, markup)
+        await state.set_state(new_state.state)
+        return True
+
+    return prompt
+
+
+def _filter_command(event: str, new_state: State | None) -> Callable:
+    """
+    Обработчик кнопки сброса фильтров или запуска поиска: установить
+    состояние машины (None - сброс фильтров) и вызвать событие поиска.
+
+    :param event: Событие поиска (фильмов или персон)
+    :type event: str
+    :param new_state: Состояние машины или None для сброса фильтров
+    :type new_state: State | None
+
+    :return: Асинхронная функция обработки события
+    :rtype: Callable
+    """
+    async def command(callback: CallbackQuery, data_key: List = None,
+                      state: FSMContext = None, history: Dict = None) -> bool:
+        if new_state is None:
+            await state.clear()
+        else:
+            await state.set_state(new_state.state)
+        return await on_event.do_event(event, callback, data_key, state,
+                                       history)
+
+    return command
+
+
+# Кнопки фильтров поиска: код кнопки - (приглашение, ожидаемое состояние)
+_FILTER_PROMPTS: Dict[str, Tuple[str, State]] = {
+    'bf_name': ('Введите название фильма:', FilterStateFilms.filter_name),
+    'bf_enName': ('Введите англоязычное название фильма:',
+                  FilterStateFilms.filter_en_name),
+    'bf_type': ('Введите тип тайтла:', FilterStateFilms.filter_type),
+    'bf_year': ('Введите год премьеры:', FilterStateFilms.filter_year),
+    'bf_ratingKp': ('Введите рейтинг кинопоиска:',
+                    FilterStateFilms.filter_rating_kp),
+    'bf_ratingImdb': ('Введите рейтинг IMDB:',
+                      FilterStateFilms.filter_rating_imdb),
+    'bf_ageRating': ('Введите возрастной рейтинг:',
+                     FilterStateFilms.filter_age_rating),
+    'bf_genres': ('Введите жанр:', FilterStateFilms.filter_genres),
+    'bp_name': ('Введите имя актёра:', FilterStatePersons.person_name),
+    'bp_enName': ('Введите имя актёра по английски:',
+                  FilterStatePersons.person_en_name),
+    'bp_birthday': ('Введите дату рождения актёра:',
+                    FilterStatePersons.person_birthday),
+    'bp_age': ('Введите возраст актёра:', FilterStatePersons.person_age),
+}
+
+# Выбор типа тайтла: показ вариантов в виде набора кнопок (или ввод с
+# клавиатуры)
+_FILTER_MARKUPS: Dict[str, ReplyKeyboardMarkup] = {
+    'bf_type': ReplyKeyboardMarkup(
+        resize_keyboard=True,
+        one_time_keyboard=True,
+        keyboard=[[KeyboardButton(text=item) for item in buttons_title_types]]
+    ),
+}
+
+# Сброс фильтров и запуск поиска: код кнопки - (событие поиска, состояние
+# машины или None для сброса фильтров)
+_FILTER_COMMANDS: Dict[str, Tuple[str, State | None]] = {
+    'bf_reset': ('mm_search_film', None),
+    'bf_doit': ('mm_search_film', FilterStateFilms.command_doit),
+    'bp_reset': ('mm_search_person', None),
+    'bp_doit': ('mm_search_person', FilterStatePersons.command_doit),
+}
+
+for i_code, (i_text, i_state) in _FILTER_PROMPTS.items():
+    on_event.register_event(
+        i_code, _filter_prompt(i_text, i_state, _FILTER_MARKUPS.get(i_code))
+    )
+for i_code, (i_event, i_state) in _FILTER_COMMANDS.items():
+    on_event.register_event(i_code, _filter_command(i_event, i_state))
+
 
 @router_callback.callback_query()
 async def process_all_callback(callback: CallbackQuery | Message | User,
@@ -106,133 +219,22 @@ async def process_all_callback(callback: CallbackQuery | Message | User,
     """
     # Запишем в БД сведения о событии
     if history is None:
-        history: Dict = on_event.do_action('register_user_action_query',
-                                           action=callback)
+        history: Dict = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     log.debug('Обратный вызов (ID пользователя {}; ID истории {}): "{}"'.
               format(str(callback.from_user.id),
                      history.get('id', 'n/a'),
                      callback.data))
     message = get_message(callback)
 
-    # Разделим "callback.data" на части для извлечения кодов для точного
-    # определения принадлежности меню для разных сведений.
-    data_event, *data_key = callback.data.split('.')
-
-    # Выполнение действий в зависимости от назначенных функций, которые
-    # возвращают Истина при успешном вызове или Ложь при ошибках
-    result = False
-    if data_event.startswith(('mm', 'af', 'ap')):
-        # Группа событий основного или дополнительного меню.
-        # Сбрасываем машины состояний и вызываем обработчик
-        await state.clear()
-        result = await on_event.do_event(data_event, callback, data_key,
-                                         state, history)
-    elif data_event.startswith('bf'):
-        # Группа для формирования фильтра поиска фильмов.
-        # Через ключи передаём состояние для ожидаемого запроса
-        if data_event == 'bf_name':
-            # Ждём имя для поиска
-            await safe_send_message(message,
-                                    "Введите название фильма:")
-            await state.set_state(FilterStateFilms.filter_name.state)
-        elif data_event == 'bf_enName':
-            # Ждём имя по-английски для поиска
-            await safe_send_message(message,
-                                    "Введите англоязычное название фильма:")
-            await state.set_state(FilterStateFilms.filter_en_name.state)
-        elif data_event == 'bf_type':
-            # Ждём выбор тайтла для поиска (показ вариантов в виде
-            # набора кнопок или ввод с клавиатуры)
-            button = ReplyKeyboardMarkup(
-                resize_keyboard=True,
-                one_time_keyboard=True,
-                keyboard=[
-                    [KeyboardButton(text=item) for item in buttons_title_types]
-                ]
-            )
-            await safe_send_message(message, "Введите тип тайтла:",
-                                    button)
-            await state.set_state(FilterStateFilms.filter_type.state)
-        elif data_event == 'bf_year':
-            # Ждём год для поиска
-            await safe_send_message(message,
-                                    "Введите год премьеры:")
-            await state.set_state(FilterStateFilms.filter_year.state)
-        elif data_event == 'bf_ratingKp':
-            # Ждём рейтинг кинопоиска для поиска
-            await safe_send_message(message,
-                                    "Введите рейтинг кинопоиска:")
-            await state.set_state(FilterStateFilms.filter_rating_kp.state)
-        elif data_event == 'bf_ratingImdb':
-            # Ждём рейтинг IMDB для поиска
-            await safe_send_message(message,
-                                    "Введите рейтинг IMDB:")
-            await state.set_state(FilterStateFilms.filter_rating_imdb.state)
-        elif data_event == 'bf_ageRating':
-            # Ждём возрастной рейтинг для поиска
-            await safe_send_message(message,
-                                    "Введите возрастной рейтинг:")
-            await state.set_state(FilterStateFilms.filter_age_rating.state)
-        elif data_event == 'bf_genres':
-            # Ждём жанр для поиска
-            await safe_send_message(message,
-                                    "Введите жанр:")
-            await state.set_state(FilterStateFilms.filter_genres.state)
-        elif data_event == 'bf_reset':
-            # Сброс фильтров поиска
-            await state.clear()
-            result = await on_event.do_event('mm_search_film', callback,
-                                             data_key, state, history)
-        elif data_event == 'bf_doit':
-            # Запуск поиска фильма по указанным параметрам
-            await state.set_state(FilterStateFilms.command_doit.state)
-            result = await on_event.do_event('mm_search_film', callback,
-                                             data_key, state, history)
-        else:
-            # Не найден обработчик вовсе
-            result = await on_event.do_event(data_event, callback,
-                                             data_key, state, history)
-    elif data_event.startswith('bp'):
-        # Группа для формирования фильтра поиска актёров.
-        # Через ключи передаём состояние для ожидаемого запроса
-        if data_event == 'bp_name':
-            # Ждём имя для поиска
-            await safe_send_message(message,
-                                    "Введите имя актёра:")
-            await state.set_state(FilterStatePersons.person_name.state)
-        elif data_event == 'bp_enName':
-            # Ждём англоязычное имя для поиска
-            await safe_send_message(message,
-                                    "Введите имя актёра по английски:")
-            await state.set_state(FilterStatePersons.person_en_name.state)
-        elif data_event == 'bp_birthday':
-            # Ждём дату рождения для поиска
-            await safe_send_message(message,
-                                    "Введите дату рождения актёра:")
-            await state.set_state(FilterStatePersons.person_birthday.state)
-        elif data_event == 'bp_age':
-            # Ждём англоязычное имя для поиска
-            await safe_send_message(message,
-                                    "Введите возраст актёра:")
-            await state.set_state(FilterStatePersons.person_age.state)
-        elif data_event == 'bp_reset':
-            # Сброс фильтров поиска
-            await state.clear()
-            result = await on_event.do_event('mm_search_person', callback,
-                                             data_key, state, history)
-        elif data_event == 'bp_doit':
-            # Запуск поиска персоны по указанным параметрам
-            await state.set_state(FilterStatePersons.command_doit.state)
-            result = await on_event.do_event('mm_search_person', callback,
-                                             data_key, state, history)
-        else:
-            # Не найден обработчик вовсе
-            result = await on_event.do_event(data_event, callback, data_key,
-                                             state, history)
-    else:
-        # Не найдена группа событий
-        result = await on_event.do_event('default', callback, data_key,
-                                         state, history)
+    # Событие определяется по коду из "callback.data" (до первой точки,
+    # остальные части - ключи) одним поиском в словаре событий. Функции
+    # возвращают Истина при успешном вызове или Ложь при ошибках.
+    # События меню (mm_*, af_*, ap_*) сбрасывают машину состояний,
+    # кнопки фильтров поиска (bf_*, bp_*) зарегистрированы ниже
+    # (_FILTER_PROMPTS и _FILTER_COMMANDS)
+    result = await on_event.dispatch(callback, state, history)
 
     if result and isinstance(result, tuple) and (len(result) >= 2):
         await safe_send_message(message, result[0], result[1])
@@ -259,8 +261,9 @@ async def process_stop_command(callback: CallbackQuery | Message | User,
     """
 
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     await process_stop_handler(message, history=history)
@@ -284,8 +287,9 @@ async def process_start_command(callback: CallbackQuery | Message | User,
     :rtype: bool
     """
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     # Most event objects have aliases for API methods that can be called
@@ -320,8 +324,9 @@ async def process_start_command(callback: CallbackQuery | Message | User,
         )
         main_keyboard = [[KeyboardButton(text="Главное меню")]]
         main_text = ""
-        if on_event.do_action('check_admin_rights',
-                              from_user=message.from_user):
+        if await on_event.do_action_async(
+            'check_admin_rights', from_user=message.from_user
+        ):
             main_keyboard.append([KeyboardButton(text="Завершить скрипт")])
             main_text = "Админ!"
         button = ReplyKeyboardMarkup(
@@ -354,8 +359,9 @@ async def process_start_handler(callback: CallbackQuery | Message | User,
     :rtype: bool
     """
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     await process_start_command(message, history=history)
@@ -379,7 +385,9 @@ async def process_help_command(callback: CallbackQuery | Message | User,
     :rtype: bool
     """
     if history is None:
-        history = on_event.do_action('register_user_action_query', action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     text = "Внимание! Этот учебный бот ограничен по количеству функций" \
@@ -412,8 +420,9 @@ async def process_info_command(callback: CallbackQuery | Message | User,
     :rtype: bool
     """
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     text = "Бот выполнен в рамках итоговой работы по основам Python " \
@@ -523,8 +532,9 @@ async def set_filter_name(callback: CallbackQuery | Message | User,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
     if await _check_not_text_type(message):
         return False
@@ -555,8 +565,9 @@ async def set_filter_en_name(callback: CallbackQuery | Message | User,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     if await _check_not_text_type(message):
@@ -588,8 +599,9 @@ async def set_filter_type(callback: CallbackQuery | Message | User,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     if await _check_not_text_type(message):
@@ -621,8 +633,9 @@ async def set_filter_year(callback: CallbackQuery | Message | User,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     if await _check_not_text_type(message):
@@ -654,8 +667,9 @@ async def set_filter_genres(callback: CallbackQuery | Message | User,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     if await _check_not_text_type(message):
@@ -687,8 +701,9 @@ async def set_filter_age_rating(callback: CallbackQuery | Message | User,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     if await _check_not_text_type(message):
@@ -720,8 +735,9 @@ async def set_filter_rating_imdb(callback: CallbackQuery | Message | User,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     if await _check_not_text_type(message):
@@ -753,8 +769,9 @@ async def set_filter_rating_kp(callback: CallbackQuery | Message | User,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     if await _check_not_text_type(message):
@@ -831,8 +848,9 @@ async def set_filter_person_name(callback: CallbackQuery | Message | User,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     if await _check_not_text_type(message):
@@ -864,8 +882,9 @@ async def set_filter_person_enname(callback: CallbackQuery | Message | User,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     if await _check_not_text_type(message):
@@ -897,8 +916,9 @@ async def set_filter_person_age(callback: CallbackQuery | Message | User,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     if await _check_not_text_type(message):
@@ -930,8 +950,9 @@ async def set_filter_person_birthday(callback: CallbackQuery | Message | User,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     if await _check_not_text_type(message):
@@ -963,14 +984,16 @@ async def process_stop_handler(callback: CallbackQuery | Message | User,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     await safe_reply_message(message,
                              "Больше не хочу работать с ботом!")
-    if on_event.do_action('check_admin_rights',
-                          from_user=message.from_user):
+    if await on_event.do_action_async(
+        'check_admin_rights', from_user=message.from_user
+    ):
         await safe_send_message(message, "Возможно позже",
                                 ReplyKeyboardRemove())
         await stop_polling()
@@ -1004,21 +1027,16 @@ async def process_all_handler(callback: CallbackQuery | Message | User,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     try:
-        # Получаем название кнопки
-        button_name = message.text
-
-        # Отправляем сообщение с названием кнопки
-        await safe_reply_message(message, f'Ввели текст {button_name}')
-        await safe_send_message(message, 'Не назначен парсер обычного текста')
-
-        # Возможный вариант развития поиска по названию фильма, если введённый
-        # текст содержит слово фильм (кино, смотреть, и т.п.) или это слово
-        # не найдено среди ранее найденных актёров
+        # Текст - название фильма или имя персоны: ищем в каталоге бота,
+        # а если там нет - на сайте
+        await on_event.do_action_async('search_text', action=message,
+                                       text=message.text, history=history)
 
     except TypeError as err:
         log.exception(err, exc_info=True)
@@ -1046,8 +1064,9 @@ async def message_with_sticker(callback: CallbackQuery | Message | User,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     await safe_send_message(message, "Это стикер!")
@@ -1072,8 +1091,9 @@ async def message_with_gif(callback: CallbackQuery | Message | User,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        history = on_event.do_action('register_user_action_query',
-                                     action=callback)
+        history = await on_event.do_action_async(
+            'register_user_action_query', action=callback
+        )
     message: Message = get_message(callback)
 
     await safe_send_message(message, "Это GIF!")
@@ -1096,65 +1116,14 @@ async def get_statistic(callback: CallbackQuery | Message) -> bool:
     out_text_lines = ['Статистика Ваших запросов:', '']
     user_id = str(message.chat.id)
 
-    # Подсчитать сколько запросил пользователь фильмов (st.want_film)
-    total_films = on_event.do_action('calculation_of_statistical_data',
-                                     query_string='st_want_film%',
-                                     user_id=user_id)
-    temp_text = 'Предложено фильмов: {}.'.format(total_films)
-    out_text_lines.append(temp_text)
-
-    # Подсчитать сколько запросил пользователь фильмов сегодня
-    total_films = on_event.do_action('calculation_of_statistical_data',
-                                     query_string='st_want_film%',
-                                     user_id=user_id,
-                                     use_today=True)
-    temp_text = '{}из них сегодня: {}.'.format(' ' * 4, total_films)
-    out_text_lines.append(temp_text)
-
-    # Подсчитать сколько искал пользователь фильмов (bf.doit)
-    total_films = on_event.do_action('calculation_of_statistical_data',
-                                     query_string='bf_doit%',
-                                     user_id=user_id)
-    temp_text = 'Поиск фильмов запущен: {} раз.'.format(total_films)
-    out_text_lines.append(temp_text)
-
-    # Подсчитать сколько искал пользователь фильмов сегодня
-    total_films = on_event.do_action('calculation_of_statistical_data',
-                                     query_string='bf_doit%',
-                                     user_id=user_id,
-                                     use_today=True)
-    temp_text = '{}из них сегодня: {}.'.format(' ' * 4, total_films)
-    out_text_lines.append(temp_text)
-
-    # Подсчитать сколько загружено в БД персон (__.persons.%)
-    total_persons = on_event.do_action('calculation_of_statistical_data',
-                                       query_string='___persons.%',
-                                       user_id=user_id)
-    temp_text = 'Загружено в БД персон: {}.'.format(total_persons)
-    out_text_lines.append(temp_text)
-
-    # Подсчитать сколько запросил пользователь персон сегодня
-    total_persons = on_event.do_action('calculation_of_statistical_data',
-                                       query_string='___persons.%',
-                                       user_id=user_id,
-                                       use_today=True)
-    temp_text = '{}из них сегодня: {}.'.format(' ' * 4, total_persons)
-    out_text_lines.append(temp_text)
-
-    # Подсчитать сколько искал пользователь персон (bp.doit)
-    total_persons = on_event.do_action('calculation_of_statistical_data',
-                                       query_string='bp_doit%',
-                                       user_id=user_id)
-    temp_text = 'Поиск персон запущен: {} раз.'.format(total_persons)
-    out_text_lines.append(temp_text)
-
-    # Подсчитать сколько искал пользователь фильмов сегодня
-    total_persons = on_event.do_action('calculation_of_statistical_data',
-                                       query_string='bp_doit%',
-                                       user_id=user_id,
-                                       use_today=True)
-    temp_text = '{}из них сегодня: {}.'.format(' ' * 4, total_persons)
-    out_text_lines.append(temp_text)
+    # Все счётчики пользователя: {вид действия: (всего, сегодня)}
+    counters = await on_event.do_action_async(
+        'get_statistic_data', user_id=user_id
+    ) or {}
+    for i_action, i_text in _STATISTIC_LINES:
+        total, today = counters.get(i_action, (0, 0))
+        out_text_lines.append(i_text.format(total))
+        out_text_lines.append('{}из них сегодня: {}.'.format(' ' * 4, today))
 
     # Вернуть результат для вывода пользователю
     out_text = '\n'.join(out_text_lines)
@@ -1185,8 +1154,9 @@ async def get_history(callback: CallbackQuery | Message,
     :rtype: bool
     """
 
-    result = await on_event.do_action('get_history_info', callback=callback,
-                                      data_key=data_key, state=state)
+    result = await on_event.do_action_async(
+        'get_history_info', callback=callback, data_key=data_key, state=state
+    )
     return result
 
 
@@ -0,0 +1,199 @@
+"""
+Модуль очереди обработки обновлений телеграм.
+
+Очередь разделена по чатам: обновления одного чата обрабатываются по
+порядку одним обработчиком, разных чатов - одновременно. Используется
+сервером вебхука и процессами-обработчиками (шардами).
+
+
+:Functions
+    update_chat_id - ID чата обновления.
+
+
+:Classes
+    UpdateQueue - Очередь обновлений с обработчиками по чатам.
+"""
+
+import asyncio
+from typing import Dict, List
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.types import Update
+
+from ..tg_settings import logger
+
+
+def update_chat_id(update: Update) -> int:
+    """
+    ID чата обновления (для обновлений без чата - ID пользователя).
+
+    :param update: Обновление телеграм
+    :type update: Update
+
+    :return: ID чата (0, если в обновлении нет ни чата, ни пользователя)
+    :rtype: int
+    """
+    event = update.event
+    chat = getattr(event, 'chat', None) or \
+        getattr(getattr(event, 'message', None), 'chat', None)
+    if chat is not None:
+        return chat.id
+    user = getattr(event, 'from_user', None) or getattr(event, 'user', None)
+    return user.id if user is not None else 0
+
+
+class UpdateQueue:
+    """
+    Очередь обновлений: по очереди и обработчику на группу чатов.
+
+    Attributes:
+        __workers (int): Обработчиков обновлений (очередей по чатам)
+        __queue_size (int): Сколько обновлений может ждать обработки
+        processed, errors (int): Обработано обновлений, с ошибкой
+    """
+
+    def __init__(self, workers: int = 8, queue_size: int = 1000) -> None:
+        self.__workers: int = max(1, workers)
+        self.__queue_size: int = max(self.__workers, queue_size)
+        self.__queues: List[asyncio.Queue] = []
+        self.__tasks: List[asyncio.Task] = []
+        self.processed: int = 0
+        self.errors: int = 0
+
+    def start(self, dispatcher: Dispatcher, bot: Bot) -> None:
+        """
+        Запустить обработчики обновлений.
+
+        :param dispatcher: Диспетчер телеграм-бота
+        :type dispatcher: Dispatcher
+        :param bot: Телеграм-бот
+        :type bot: Bot
+
+        :return: None
+        """
+        size = -(-self.__queue_size // self.__workers)
+        self.__queues = [asyncio.Queue(size) for _ in range(self.__workers)]
+        self.__tasks = [
+            asyncio.create_task(self.__worker(i_queue, dispatcher, bot))
+            for i_queue in self.__queues
+        ]
+
+    def __queue(self, update: Update) -> asyncio.Queue:
+        """
+        Очередь чата обновления.
+
+        :param update: Обновление телеграм
+        :type update: Update
+
+        :return: Очередь
+        :rtype: asyncio.Queue
+        """
+        return self.__queues[update_chat_id(update) % self.__workers]
+
+    def put_nowait(self, update: Update) -> bool:
+        """
+        Поставить обновление в очередь без ожидания.
+
+        :param update: Обновление телеграм
+        :type update: Update
+
+        :return: Истина - поставлено, Ложь - очередь чата заполнена
+        :rtype: bool
+        """
+        try:
+            self.__queue(update).put_nowait(update)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def put(self, update: Update) -> None:
+        """
+        Поставить обновление в очередь (ждать, если очередь заполнена).
+
+        :param update: Обновление телеграм
+        :type update: Update
+
+        :return: None
+        """
+        await self.__queue(update).put(update)
+
+    async def __worker(self, queue: asyncio.Queue, dispatcher: Dispatcher,
+                       bot: Bot) -> None:
+        """
+        Обработка обновлений из своей очереди по порядку.
+
+        :param queue: Очередь обновлений
+        :type queue: asyncio.Queue
+        :param dispatcher: Диспетчер телеграм-бота
+        :type dispatcher: Dispatcher
+        :param bot: Телеграм-бот
+        :type bot: Bot
+
+        :return: None
+        """
+        while True:
+            update = await queue.get()
+            try:
+                result = await dispatcher.feed_update(bot, update)
+                if isinstance(result, TelegramMethod):
+                    await dispatcher.silent_call_request(bot, result)
+                self.processed += 1
+            except Exception as err:
+                self.errors += 1
+                log.exception('Ошибка обработки обновления {}: {}'.
+                              format(update.update_id, err), exc_info=True)
+            finally:
+                queue.task_done()
+
+    async def close(self, timeout: float) -> None:
+        """
+        Дождаться обработки обновлений из очереди (не дольше timeout) и
+        остановить обработчики.
+
+        :param timeout: Предельное время обработки очереди (сек)
+        :type timeout: float
+
+        :return: None
+        """
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(i_queue.join() for i_queue in self.__queues)),
+                timeout
+            )
+        except asyncio.TimeoutError:
+            log.warning('Не обработано обновлений при завершении: {}'.
+                        format(self.pending))
+        for i_task in self.__tasks:
+            i_task.cancel()
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
+        self.__tasks = []
+
+    @property
+    def pending(self) -> int:
+        """
+        Обновлений в очереди (ещё не обработаны).
+
+        :return: Количество обновлений
+        :rtype: int
+        """
+        return sum(i_queue.qsize() for i_queue in self.__queues)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Вернуть счётчики очереди.
+
+        :return: Обработано, с ошибкой, в очереди
+        :rtype: Dict[str, int]
+        """
+        return {'processed': self.processed, 'errors': self.errors,
+                'pending': self.pending}
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    update_chat_id()
+    UpdateQueue()
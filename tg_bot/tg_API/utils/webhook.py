@@ -0,0 +1,229 @@
+"""
+Модуль получения обновлений телеграм через вебхук (альтернатива опросу).
+
+Встроенный сервер aiohttp принимает обновления от телеграм, проверяет
+секретный токен (заголовок X-Telegram-Bot-Api-Secret-Token) и сразу
+отвечает, а обновление ставит в очередь (UpdateQueue: обновления одного
+чата - по порядку, разных чатов - одновременно) или передаёт процессу-
+обработчику (шарду). Если очередь заполнена, телеграм получает ответ 503
+и повторяет обновление позже (обновление не теряется).
+
+При завершении работы сервер перестаёт принимать обновления, а уже
+принятые обрабатываются (не дольше TG_DRAIN_TIMEOUT сек).
+
+
+:Classes
+    WebhookServer - Сервер вебхука с очередью обработки обновлений.
+
+
+:var
+    SECRET_HEADER - Заголовок с секретным токеном вебхука.
+
+    _webhook - Сервер вебхука телеграм-бота.
+"""
+
+import asyncio
+import secrets
+import signal
+from typing import Callable, Dict
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from ..tg_settings import logger, webhook_host, webhook_port, webhook_path, \
+    webhook_secret, update_workers, update_queue, drain_timeout
+from .update_queue import UpdateQueue
+
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """
+    Сервер вебхука: приём обновлений и очередь их обработки.
+
+    Attributes:
+        __host, __port (str, int): Адрес и порт встроенного сервера
+        __path (str): Путь, на который телеграм присылает обновления
+        __secret (str): Секретный токен вебхука
+        __queue (UpdateQueue): Очередь обработки обновлений
+        __drain_timeout (float): Время обработки очереди при завершении
+        accepted, rejected (int): Принято обновлений, отклонено из-за
+            заполненной очереди
+    """
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 8080,
+                 path: str = '/webhook', secret: str = '',
+                 workers: int = 8, queue_size: int = 1000,
+                 drain_timeout: float = 10.0) -> None:
+        self.__host: str = host
+        self.__port: int = port
+        self.__path: str = path
+        # Без токена в настройках - новый при каждом запуске
+        self.__secret: str = secret or secrets.token_urlsafe(32)
+        self.__queue: UpdateQueue = UpdateQueue(workers, queue_size)
+        self.__drain_timeout: float = drain_timeout
+        self.__put: Callable[[Update], bool] = self.__queue.put_nowait
+        self.__stop_event: asyncio.Event | None = None
+        self.__closing: bool = False
+        self.accepted: int = 0
+        self.rejected: int = 0
+
+    @property
+    def secret(self) -> str:
+        """
+        Секретный токен, который передаётся телеграм в set_webhook.
+
+        :return: Секретный токен
+        :rtype: str
+        """
+        return self.__secret
+
+    @property
+    def is_running(self) -> bool:
+        """
+        Сервер запущен и ещё не остановлен.
+
+        :return: Истина, если сервер работает
+        :rtype: bool
+        """
+        return self.__stop_event is not None and \
+            not self.__stop_event.is_set()
+
+    def url(self, base_url: str) -> str:
+        """
+        Адрес вебхука для телеграм.
+
+        :param base_url: Внешний адрес бота (https://...)
+        :type base_url: str
+
+        :return: Внешний адрес с путём вебхука
+        :rtype: str
+        """
+        return base_url.rstrip('/') + self.__path
+
+    async def __handle(self, request: web.Request) -> web.Response:
+        """
+        Принять обновление от телеграм и поставить его в очередь.
+
+        :param request: Запрос от телеграм
+        :type request: web.Request
+
+        :return: 200 - принято, 401 - неверный токен, 400 - не обновление,
+            503 - очередь заполнена или сервер останавливается (телеграм
+            повторит обновление позже)
+        :rtype: web.Response
+        """
+        token = request.headers.get(SECRET_HEADER, '')
+        if not secrets.compare_digest(token.encode('utf-8'),
+                                      self.__secret.encode('utf-8')):
+            log.warning('Вебхук: неверный секретный токен от {}'.
+                        format(request.remote))
+            return web.Response(status=401)
+        if self.__closing:
+            return web.Response(status=503)
+
+        try:
+            update = Update(**await request.json())
+        except (ValueError, TypeError) as err:
+            log.warning('Вебхук: не удалось разобрать обновление: {}'.
+                        format(err))
+            return web.Response(status=400)
+
+        if not self.__put(update):
+            self.rejected += 1
+            return web.Response(status=503, headers={'Retry-After': '1'})
+        self.accepted += 1
+        return web.Response()
+
+    def stop(self) -> None:
+        """
+        Остановить сервер (принятые обновления будут обработаны).
+
+        :return: None
+        """
+        if self.__stop_event is not None:
+            self.__stop_event.set()
+
+    async def run(self, dispatcher: Dispatcher, bot: Bot,
+                  put: Callable[[Update], bool] = None) -> None:
+        """
+        Запустить сервер и обрабатывать обновления до остановки (stop или
+        сигнал SIGINT/SIGTERM). Вебхук в телеграм устанавливается
+        отдельно (set_webhook с адресом url() и токеном secret).
+
+        :param dispatcher: Диспетчер телеграм-бота
+        :type dispatcher: Dispatcher
+        :param bot: Телеграм-бот
+        :type bot: Bot
+        :param put: Передать обновление на обработку (Ложь - не принято),
+            по умолчанию - в свою очередь обработки
+        :type put: Callable[[Update], bool]
+
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        self.__stop_event = asyncio.Event()
+        self.__closing = False
+        local = put is None
+        self.__put = self.__queue.put_nowait if local else put
+        if local:
+            self.__queue.start(dispatcher, bot)
+
+        app = web.Application()
+        app.router.add_post(self.__path, self.__handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        signals = []
+        try:
+            await web.TCPSite(runner, self.__host, self.__port).start()
+            log.info('Вебхук: сервер запущен на {}:{}{}'.format(
+                self.__host, self.__port, self.__path
+            ))
+            if local:
+                await dispatcher.emit_startup(bot=bot, bots=[bot],
+                                              dispatcher=dispatcher)
+            for i_signal in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(i_signal, self.stop)
+                    signals.append(i_signal)
+                except (NotImplementedError, RuntimeError):
+                    pass  # Windows: остановка через /stop
+            await self.__stop_event.wait()
+        finally:
+            for i_signal in signals:
+                loop.remove_signal_handler(i_signal)
+            self.__stop_event.set()
+            # Новые обновления не принимаем, принятые - обрабатываем
+            self.__closing = True
+            await runner.cleanup()
+            if local:
+                await self.__queue.close(self.__drain_timeout)
+                await dispatcher.emit_shutdown(bot=bot, bots=[bot],
+                                               dispatcher=dispatcher)
+            log.info('Вебхук: сервер остановлен {}'.format(self.stats()))
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Вернуть счётчики сервера.
+
+        :return: Принято, отклонено (очередь заполнена), обработано,
+            с ошибкой, в очереди
+        :rtype: Dict[str, int]
+        """
+        return {'accepted': self.accepted, 'rejected': self.rejected,
+                **self.__queue.stats()}
+
+
+# Начинаем работу с определения логирования и сообщение в протокол
+log = logger.getLogger(__name__)
+
+# Сервер вебхука (запускается в режиме TG_MODE=webhook)
+_webhook = WebhookServer(webhook_host, webhook_port, webhook_path,
+                         webhook_secret, update_workers, update_queue,
+                         drain_timeout)
+
+
+if __name__ == "__main__":
+    WebhookServer()
@@ -2,6 +2,11 @@
 Модуль для работы с таблицами и словарями пользователей. 
 Использует объекты из пакетов (телеграм, сайт, база данных) для
 формирования информации в телеграм.
+
+Асинхронные обработчики не обращаются к БД сами: чтение и запись в БД
+выполняют обычные функции этого модуля (и пакета database), которые
+зарегистрированы действиями (main.py) и вызываются через
+on_event.do_action_async в пуле потоков действий.
 """
 
 from settings import logger
@@ -10,6 +15,7 @@ from time import strftime
 from typing import Dict, List, Tuple
 import re
 import json
+import html
 
 from aiogram.types import User, Message, CallbackQuery, InlineKeyboardMarkup
 from aiogram.fsm.context import FSMContext
@@ -18,18 +24,55 @@ import aiogram.exceptions
 import peewee
 from peewee import IntegrityError
 
-from database.core import crud
+from database.core import crud, history_writer
 from database.utils.crud import TGUsersInterface
+from database.utils.statistics import get_user_statistics
+from database.utils.history_report import get_history_page, \
+    get_history_days, get_film_names_by_history, get_film_names_by_keys, \
+    get_actor_names_by_keys
+from database.utils.film_store import film_columns
+from database.utils.search_index import index_films
+from database.utils.film_query import FilterPlan, index_film_genres
 import database.common.models as models
 
+from tg_API.utils import on_event
 from tg_API.utils.commands import get_message, send_photo_by_url
 from tg_API.utils.keys import builder_random_films, builder_start, \
     builder_custom_buttons, buttons_search_films, buttons_search_persons
 from tg_API.utils.commands import safe_send_message
+from tg_API.utils.media import send_photo_album
+
+from templates import render_template
 
-from templates import load_template
+from site_API.core import site_api_async, film_cache
+from site_API.utils.site_api_handler import FILM_FILTER_LIMIT
+from site_API.utils.single_flight import SingleFlight
+from site_API.utils.throttling import QUOTA_EXCEEDED, SERVICE_UNAVAILABLE
 
-from site_API.core import site_api
+
+# Сколько записей истории запросов выводить в одном сообщении
+HISTORY_PAGE: int = 30
+
+
+def site_error_text(status_code: int, subject: str) -> str:
+    """
+    Текст для пользователя об ошибке получения сведений с сайта.
+
+    :param status_code: Код ответа сайта (0 - сайт недоступен)
+    :type status_code: int
+    :param subject: О чём запрашивались сведения ("о фильме" и т.п.)
+    :type subject: str
+
+    :return: Текст сообщения об ошибке
+    :rtype: str
+    """
+    if status_code == QUOTA_EXCEEDED:
+        return 'Сайт сейчас перегружен запросами. Не удалось получить ' \
+               f'сведения {subject}, повторите запрос немного позже.'
+    if status_code in (0, SERVICE_UNAVAILABLE):
+        return 'Сайт временно недоступен. Не удалось получить сведения ' \
+               f'{subject}, повторите запрос немного позже.'
+    return 'Ошибка {} получения сведений {}'.format(status_code, subject)
 
 
 def check_admin_rights_in_db(from_user: User) -> bool:
@@ -103,10 +146,15 @@ def register_user_action_query(action: CallbackQuery | Message) -> Dict:
     else:
         data['query_type'] = 'message'
         data['query_string'] = action.text
-    crud.create(models.History, data)
-
-    # Получить ID записи в истории для последнего события
-    result = TGUsersInterface.get_last_record_from_history(user_id)
+    # Запись в БД отложенная, код записи выделяется сразу
+    record = history_writer.add(data)
+    result = {
+        'id': record['id'],
+        'created_at': record['created_at'],
+        'users_id': record['id_users'],
+        'query_type': record['query_type'],
+        'query_string': record['query_string']
+    }
 
     return result
 
@@ -173,22 +221,43 @@ async def search_film(action: CallbackQuery | Message,
             our_filter['genres.name'] = data.get('filter_genres')
         log.debug('Фильтр для запроса: {}'.format(our_filter))
 
-        response = 0
-        try:
-            response = site_api.get_film_by_filter(our_filter)
-        except BaseException as err:
-            log.exception(err, exc_info=True)
-        log.debug('После запроса. Контроль. {0}'.format(type(response)))
-
-        if isinstance(response, int):
-            await safe_send_message(message,
-                                    'Ошибка {} получения сведений о фильме'.
-                                    format(response))
-            return False
-        data: Dict = json.loads(response.text)
-        log.debug('Получено фильмов {} шт.'.format(len(data)))
-
-        for i_item in data.get('docs', []):
+        # Сначала ищем в БД, с сайта - только то, чего в БД нет
+        plan: FilterPlan = await on_event.do_action_async(
+            'plan_film_filter', param_filter=our_filter,
+            limit=FILM_FILTER_LIMIT
+        ) or FilterPlan(None, [], our_filter, FILM_FILTER_LIMIT,
+                        FILM_FILTER_LIMIT)
+        films: List[Dict] = plan.local
+        log.debug('Найдено фильмов в БД {} шт., запросить с сайта {} шт.'.
+                  format(len(films), plan.upstream_limit))
+        if plan.upstream_limit:
+            response = 0
+            try:
+                response = await site_api_async.get_film_by_filter(
+                    plan.upstream_filter, plan.upstream_limit
+                )
+            except BaseException as err:
+                log.exception(err, exc_info=True)
+            log.debug('После запроса. Контроль. {0}'.format(type(response)))
+
+            if isinstance(response, int):
+                if not films:
+                    await safe_send_message(
+                        message, site_error_text(response, 'о фильмах')
+                    )
+                    return False
+                # Сайт не ответил - выводим найденное в БД
+            else:
+                data: Dict = json.loads(response.text)
+                log.debug('Получено фильмов {} шт.'.
+                          format(len(data.get('docs', []))))
+                docs = data.get('docs', [])
+                films = await on_event.do_action_async(
+                    'merge_film_results', plan=plan, docs=docs,
+                    total=data.get('total')
+                ) or (films + docs)[:plan.limit]
+
+        for i_item in films:
             await send_film_info(message, i_item, history_id)
 
         await state.clear()
@@ -203,38 +272,20 @@ async def search_film(action: CallbackQuery | Message,
     return True
 
 
-def calculation_of_statistical_data(query_string: str,
-                                    user_id: str,
-                                    use_today: bool = False) -> str:
+def get_statistic_data(user_id: int | str) -> Dict[str, Tuple[int, int]]:
     """
-    Расчёт статистики запросов.
+    Статистика запросов пользователя (по счётчикам, одним запросом).
 
-    :param query_string: Строка, по которой делаем подсчёт записей
-    :type query_string: str
+    :param user_id: ID пользователя в телеграм
+    :type user_id: int | str
 
-    :param user_id: ID пользователя в базе данных
-    :type user_id: str
-
-    :param use_today: Подсчёт за сегодня (истина) или в целом (ложь)
-    :type use_today: bool
-
-    :return: Числовое значение строкового типа (для удобства добавления
-    к выводимому тексту)
+    :return: {вид действия: (всего, сегодня)}, виды действий см.
+        database.utils.statistics.STAT_ACTIONS
+    :rtype: Dict[str, Tuple[int, int]]
     """
-    # Общая часть всех запросов
-    query_text = 'SELECT count(h.id) quantity FROM History h ' \
-                 'WHERE h.query_string like "{string}" AND ' \
-                 'h.id_users = {user}'.format(string=query_string,
-                                              user=user_id)
-
-    # Учитывать сегодняшний день в запросах
-    if use_today:
-        query_text += ' AND h.created_at like CAST(date("NOW") AS VARCHAR) ' \
-                      '|| " %"'
-
-    # Выполнить запрос и вернуть его результат
-    total = crud.execute_sql(query_text, is_one=True)
-    return total
+    # Счётчики обновляются при записи истории - дописываем отложенное
+    history_writer.flush()
+    return get_user_statistics(user_id)
 
 
 async def get_history_info(callback: CallbackQuery | Message,
@@ -243,12 +294,14 @@ async def get_history_info(callback: CallbackQuery | Message,
                            ) -> bool:
     """
     Получить историю действий пользователя за дату, которую выбирает
-    пользователь. По умолчанию сегодня. Возвращает текст и набор кнопок
+    пользователь. По умолчанию сегодня. Возвращает текст и набор кнопок.
+    История выводится страницами по HISTORY_PAGE записей.
 
     :param callback: Связующий объект с чат-ботом
     :type callback: CallbackQuery | Message
 
     :param data_key: Список уточняющих ключей, передаваемых в callback-функции
+        (дата и код последней записи предыдущей страницы)
     :type data_key: List
 
     :param state: Экземпляр машины состояний для фильтрации в запросах
@@ -260,116 +313,36 @@ async def get_history_info(callback: CallbackQuery | Message,
     # Определяем тип параметра (в зависимости от источника получения
     # сообщения из телеграм)
     message: Message = get_message(callback)
+    user_id = str(message.chat.id)
 
-    query_date = 'сегодня'
-    if len(data_key):
-        query_date = data_key[0]
+    # Ключи: дата и код последней показанной записи (следующая страница)
+    query_date = data_key[0] if data_key else strftime('%Y-%m-%d')
+    cursor = data_key[1] if len(data_key or []) > 1 else '0'
     out_text_lines = [f'История Ваших запросов за <b>{query_date}</b>:', '']
-    user_id = str(message.chat.id)
 
-    # Есть ли дата в запросе. Если нет, то рекурсивный вызов с текущей датой
-    if len(data_key):
-        query_text = 'SELECT id, substr(created_at, 12, 8) only_time, ' \
-                     'query_string FROM History WHERE id_users = ' \
-                     f'"{user_id}" AND created_at like "{query_date}%"'
-        records = crud.execute_sql(query_text)
-        if records:
-            # Данные получены из базы данных. Формируем отчёт
-            log.debug('Получено {} записей из истории запросов пользователя'.
-                      format(len(records)))
-            # print(records)
-            for i_record in records:
-                # print(i_record)
-                temp_text = '{time} {event}.'
-                string_time = i_record[1]
-                event_code = i_record[2]
-
-                # Анализ событий из истории запросов
-                event_list = event_code.split('.')
-                if event_list[0] in ('st', 'ap', 'af', 'bp', 'bf'):
-                    # Для совместимости со старой версией БД
-                    event_list[0] += '_' + event_list.pop(1)
-
-                if event_list[0].startswith('st'):
-                    if event_list[0].endswith('want_film'):
-                        event_code = 'Предложен случайный фильм'
-                        try:
-                            film_list = models.FilmInfo.select().where(
-                                models.FilmInfo.id_history == i_record[0]
-                            )
-                            if film_list:
-                                films_list = []
-                                for i_film in film_list:
-                                    films_list.append(i_film.film_name)
-                                event_code += ' (' + ', '.join(films_list) + ')'
-                        except peewee.PeeweeException as err:
-                            log.exception('Ошибка в запросе {}: {}'.
-                                          format(type(err), str(err)),
-                                          exc_info=True)
-                    elif event_list[1] == 'search_film':
-                        event_code = 'Поиск фильмов по фильтру'
-                    elif event_list[1] == 'search_person':
-                        event_code = 'Поиск актёров по фильтру'
-                elif event_list[0] == 'bf_doit':
-                    event_code = 'Выполнен поиск фильмов по фильтру'
-                elif event_list[0] == 'bp_doit':
-                    event_code = 'Выполнен поиск персон по фильтру'
-                elif event_list[0] == 'af_persons':
-                    event_code = 'Просмотр списка актёров фильма'
-                    try:
-                        film_list = models.FilmInfo.select().where(
-                            models.FilmInfo.data_key == event_list[1]
-                        )
-                        if film_list:
-                            films_list = []
-                            for i_film in film_list:
-                                films_list.append(i_film.film_name)
-                            event_code += ' (' + ', '.join(films_list) + ')'
-                    except peewee.PeeweeException as err:
-                        log.exception('Ошибка в запросе {}: {}'.
-                                      format(type(err), str(err)),
-                                      exc_info=True)
-                elif event_list[0] in ('ap_persons', 'ap_one_person'):
-                    event_code = 'Просмотр информации об актёре'
-                    try:
-                        item_list = models.ActorFilms.select().where(
-                            models.ActorFilms.data_key == event_list[2]
-                        )
-                        if item_list:
-                            items_list = []
-                            for i_item in item_list:
-                                items_list.append(i_item.actor_name)
-                            event_code += ' (' + ', '.join(items_list) + ')'
-                    except peewee.PeeweeException as err:
-                        log.exception('Ошибка в запросе {}: {}'.
-                                      format(type(err), str(err)),
-                                      exc_info=True)
-
-                temp_text = temp_text.format(time=string_time,
-                                             event=event_code)
-                out_text_lines.append(temp_text)
-        else:
-            # Данные не получены из базы данных
-            out_text_lines.append('Нет данных за дату ' + data_key[0])
+    # Отчёт читается из БД в пуле потоков действий
+    lines, next_cursor, days = await on_event.do_action_async(
+        'load_history_report', user_id=user_id, query_date=query_date,
+        cursor=cursor
+    ) or ([], None, [])
+
+    if lines:
+        out_text_lines.extend(lines)
     else:
-        # Рекурсивный вызов с текущей датой
-        query_date = strftime('%Y-%m-%d')
-        await get_history_info(callback, [query_date], state)
-        return True
+        # Данные не получены из базы данных
+        out_text_lines.append('Нет данных за дату ' + query_date)
 
-    query_text = 'SELECT DISTINCT substr(created_at, 1, 10) only_date ' \
-                 f'FROM History WHERE id_users = "{user_id}" ORDER BY ' \
-                 f'only_date DESC'
-    query_data = crud.execute_sql(query_text)
     buttons_list = []
-    for i_data in query_data:
-        buttons_list.append((str(i_data[0]), f'mm_history.{i_data[0]}'))
-        if len(buttons_list) > 15:
-            break  # Ограничимся 16ю последними событиями
+    if next_cursor is not None:
+        buttons_list.append(('Дальше', f'mm_history.{query_date}.'
+                                       f'{next_cursor}'))
+    for i_day in days:
+        buttons_list.append((i_day, f'mm_history.{i_day}'))
 
     # Вернуть результат для вывода пользователю
     out_text = '\n'.join(out_text_lines)
-    out_text += '\n\nКонец списка истории запросов'
+    if next_cursor is None:
+        out_text += '\n\nКонец списка истории запросов'
 
     buttons = builder_custom_buttons(text=out_text, buttons=buttons_list)
 
@@ -377,6 +350,166 @@ async def get_history_info(callback: CallbackQuery | Message,
     return True
 
 
+def load_history_report(user_id: str, query_date: str, cursor: str) \
+        -> Tuple[List[str], int | None, List[str]]:
+    """
+    Прочитать из БД страницу истории запросов пользователя за дату и даты,
+    за которые есть история (действие для пула потоков).
+
+    :param user_id: ID пользователя в телеграм
+    :type user_id: str
+    :param query_date: Дата в виде ГГГГ-ММ-ДД
+    :type query_date: str
+    :param cursor: Код последней записи предыдущей страницы
+    :type cursor: str
+
+    :return: Строки отчёта, код для следующей страницы (None - страница
+        последняя) и даты истории
+    :rtype: Tuple[List[str], int | None, List[str]]
+    """
+    # В истории должны быть все действия пользователя
+    history_writer.flush()
+
+    try:
+        records, next_cursor = get_history_page(user_id, query_date,
+                                                int(cursor), HISTORY_PAGE)
+    except ValueError:
+        log.warning('Неверные ключи истории запросов: {} {}'.
+                    format(query_date, cursor))
+        records, next_cursor = [], None
+
+    lines = []
+    if records:
+        # Данные получены из базы данных. Формируем отчёт
+        log.debug('Получено {} записей из истории запросов пользователя'.
+                  format(len(records)))
+        lines = _history_lines(records)
+    return lines, next_cursor, get_history_days(user_id)
+
+
+def _history_lines(records: List[Tuple[int, str, str]]) -> List[str]:
+    """
+    Строки отчёта по записям истории. Названия фильмов и имена персон
+    для всех записей получаются одним запросом на каждую таблицу.
+
+    :param records: Записи истории (код, время, строка запроса)
+    :type records: List[Tuple[int, str, str]]
+
+    :return: Строки отчёта
+    :rtype: List[str]
+    """
+    # Разбор событий и сбор ключей, по которым нужны названия
+    events = []
+    history_ids, film_keys, actor_keys = [], [], []
+    for i_id, i_time, i_event in records:
+        event_list = (i_event or '').split('.')
+        if event_list[0] in ('st', 'ap', 'af', 'bp', 'bf') and \
+                len(event_list) > 1:
+            # Для совместимости со старой версией БД
+            event_list[0] += '_' + event_list.pop(1)
+        events.append((i_id, i_time, i_event, event_list))
+
+        if event_list[0].startswith('st') and \
+                event_list[0].endswith('want_film'):
+            history_ids.append(i_id)
+        elif event_list[0] == 'af_persons' and len(event_list) > 1:
+            film_keys.append(event_list[1])
+        elif event_list[0] in ('ap_persons', 'ap_one_person') and \
+                len(event_list) > 2:
+            actor_keys.append(event_list[2])
+
+    try:
+        films_by_history = get_film_names_by_history(history_ids)
+        films_by_key = get_film_names_by_keys(film_keys)
+        actors_by_key = get_actor_names_by_keys(actor_keys)
+    except peewee.PeeweeException as err:
+        log.exception('Ошибка в запросе {}: {}'.format(type(err), str(err)),
+                      exc_info=True)
+        films_by_history, films_by_key, actors_by_key = {}, {}, {}
+
+    result = []
+    for i_id, i_time, i_event, event_list in events:
+        names = []
+        event_code = i_event
+        if event_list[0].startswith('st'):
+            if event_list[0].endswith('want_film'):
+                event_code = 'Предложен случайный фильм'
+                names = films_by_history.get(str(i_id), [])
+            elif len(event_list) > 1 and event_list[1] == 'search_film':
+                event_code = 'Поиск фильмов по фильтру'
+            elif len(event_list) > 1 and event_list[1] == 'search_person':
+                event_code = 'Поиск актёров по фильтру'
+        elif event_list[0] == 'bf_doit':
+            event_code = 'Выполнен поиск фильмов по фильтру'
+        elif event_list[0] == 'bp_doit':
+            event_code = 'Выполнен поиск персон по фильтру'
+        elif event_list[0] == 'af_persons':
+            event_code = 'Просмотр списка актёров фильма'
+            if len(event_list) > 1:
+                names = films_by_key.get(event_list[1], [])
+        elif event_list[0] in ('ap_persons', 'ap_one_person'):
+            event_code = 'Просмотр информации об актёре'
+            if len(event_list) > 2:
+                names = actors_by_key.get(event_list[2], [])
+
+        if names:
+            event_code += ' (' + ', '.join(names) + ')'
+        result.append('{time} {event}.'.format(time=i_time, event=event_code))
+    return result
+
+
+def save_film_info(data: Dict, history_id: str) -> None:
+    """
+    Записать сведения о фильме в БД (если фильма нет в кеше и в БД) и
+    актёров фильма (действие для пула потоков).
+
+    :param data: Ответ сайта о фильме
+    :type data: Dict
+    :param history_id: Данные из таблицы истории запросов (только id)
+    :type history_id: str
+
+    :return: None
+    """
+    film_key = str(data.get('id'))
+    if film_cache.get(film_key) is None:
+        data_for_save: Dict = {
+            'id_history': history_id,
+            'data_key': data.get('id'),
+            'data_json': data,
+            'film_type': data.get('type', ''),
+            'film_name': data.get('name', data.get('alternativeName', '')),
+            # Разделы для экранов рейтинга, персон, фактов и т.д.
+            **film_columns(data)
+        }
+        crud.create(models.FilmInfo, data_for_save, ignore=True)
+        index_films([data])
+        index_film_genres([data])
+        film_cache.put(film_key, data)
+
+    save_actors(data.get('persons') or [], history_id)
+
+
+def save_actors(persons: List[Dict], history_id: str) -> None:
+    """
+    Записать в БД персон, которых там ещё нет (действие для пула потоков).
+
+    :param persons: Сведения о персонах (из ответа сайта о фильме)
+    :type persons: List[Dict]
+    :param history_id: Данные из таблицы истории запросов (только id)
+    :type history_id: str
+
+    :return: None
+    """
+    try:
+        for i_actor in persons:
+            TGUsersInterface().save_actor_if_absent(i_actor, history_id)
+    except TypeError as err:
+        log.exception('Ошибка получения актёров: ' + str(err), exc_info=True)
+    except (peewee.PeeweeException, IntegrityError) as err:
+        log.exception('{0}: Ошибка сохранения актёров: {1}'.
+                      format(type(err), str(err)), exc_info=True)
+
+
 async def send_film_info(action: Message,
                          response_text: str | Dict,
                          history_id: str
@@ -407,19 +540,10 @@ async def send_film_info(action: Message,
     # сообщения из телеграм)
     message: Message = get_message(action)
 
-    # Записать полученный ответ для этого пользователя,
-    # если такого фильма нет в БД
-    if not models.FilmInfo.get_or_none(
-            models.FilmInfo.data_key == str(data.get('id'))
-    ):
-        data_for_save: Dict = {
-            'id_history': history_id,
-            'data_key': data.get('id'),
-            'data_json': json.dumps(data, ensure_ascii=False, indent=4),
-            'film_type': data.get('type', ''),
-            'film_name': data.get('name', data.get('alternativeName', ''))
-        }
-        crud.create(models.FilmInfo, data_for_save)
+    # Записать полученный ответ для этого пользователя, если такого
+    # фильма нет в кеше и в БД, и актёров фильма (в пуле потоков)
+    await on_event.do_action_async('save_film_info', data=data,
+                                   history_id=history_id)
 
     # Грузим постеры в телеграм для доступа по ID
     try:
@@ -432,16 +556,6 @@ async def send_film_info(action: Message,
         log.exception('Ошибка получения или отправки постера: ' + str(err),
                       exc_info=True)
 
-    # Сохраняем актёров в базу данных
-    try:
-        for i_actor in data.get('persons', {}):
-            TGUsersInterface().save_actor_if_absent(i_actor, history_id)
-    except TypeError as err:
-        log.exception('Ошибка получения актёров: ' + str(err), exc_info=True)
-    except (peewee.PeeweeException, IntegrityError) as err:
-        log.exception('{0}: Ошибка сохранения актёров: {1}'.
-                      format(type(err), str(err)), exc_info=True)
-
     # Получаем имя фильма, если вдруг нет "основного", то берём из
     # списка альтернативных имён
     film_name = data.get(
@@ -476,9 +590,10 @@ async def send_film_info(action: Message,
                   str(dict_budget.get('currency', ''))
 
     # Формируем полный текст на основе шаблона
-    out_text: str = load_template('templates/film_info.txt')
+    out_text: str = ''
     try:
-        out_text = out_text.format(
+        out_text = render_template(
+            'film_info',
             name=film_name,
             length=movie_length_time,
             description=data.get('description', 'Нет описания'),
@@ -532,11 +647,11 @@ async def get_random_films(action: CallbackQuery | Message,
     message: Message = get_message(action)
 
     # Получаем информацию о фильме, а затем парсим результат
-    response = site_api.get_random_films()
+    response = await site_api_async.get_random_films()
     if isinstance(response, int):
         await safe_send_message(
             message,
-            'Ошибка {} получения сведений о фильме'.format(response)
+            site_error_text(response, 'о фильме')
         )
         return None
 
@@ -570,18 +685,20 @@ async def get_rating_films(action: CallbackQuery | Message,
     # сообщения из телеграм)
     message: Message = get_message(action)
 
-    # Получить сведения о фильме из БД
+    # Получить сведения о фильме из кеша (или из БД)
     buttons = None
     str_key = ''
     if data_key:
         str_key = data_key[0]
-    info = models.FilmInfo.get_or_none(models.FilmInfo.data_key == str_key)
-    if info:
-        data = json.loads(info.data_json)
+    data = await on_event.do_action_async('film_section', key=str_key,
+                                          section='rating')
+    if data:
         # Формируем полный текст на основе шаблона
-        out_text: str = load_template('templates/rating_info.txt')
+        out_text: str = 'Внимание! Что-то пошло не по плану. ' \
+                        'Повторите запрос'
         try:
-            out_text = out_text.format(
+            out_text = render_template(
+                'rating_info',
                 name=data.get(
                     'name',
                     data.get('names', [{'name': None}])[0].get("name", None)
@@ -649,15 +766,15 @@ async def get_companies_films(action: CallbackQuery | Message,
     # сообщения из телеграм)
     message: Message = get_message(action)
 
-    # Получить сведения о фильме из БД
+    # Получить сведения о фильме из кеша (или из БД)
     out_text = ''
     str_key = ''
     if data_key:
         str_key = data_key[0]
 
-    info = models.FilmInfo.get_or_none(models.FilmInfo.data_key == str_key)
-    if info:
-        data = json.loads(info.data_json)
+    data = await on_event.do_action_async('film_section', key=str_key,
+                                          section='companies')
+    if data:
         name = data.get(
             'name',
             data.get('names', [{'name': None}])[0].get("name", None)
@@ -669,6 +786,7 @@ async def get_companies_films(action: CallbackQuery | Message,
 
             # Извлекаем список компаний, участвующих в создании фильма
             companies: List[Dict] = data.get('productionCompanies', [])
+            items = []
             for i_company in companies:
                 # Название компании
                 name_item = i_company.get('name')
@@ -679,13 +797,10 @@ async def get_companies_films(action: CallbackQuery | Message,
                 url_item = i_company.get('url')
                 if not url_item:
                     url_item = i_company.get('previewUrl')
+                items.append((url_item, f'Компания: <b>{name_item}</b>.'))
 
-                # Отправить абоненту информацию
-                await send_photo_by_url(
-                    url=url_item,
-                    text=f'Компания: <b>{name_item}</b>.',
-                    action=action
-                )
+            # Отправить абоненту логотипы альбомами
+            await send_photo_album(items, action)
 
             await safe_send_message(message,
                                     '\nВсего было указано компаний: '
@@ -728,13 +843,14 @@ async def get_persons_films(action: CallbackQuery | Message,
     """
     # Записать сведения о пользователе, если их ещё нет
     if history is None:
-        register_user_action_query(action)
+        history = register_user_action_query(action)
+    history_id = history.get('id')
 
     # Определяем тип параметра (в зависимости от источника получения
     # сообщения из телеграм)
     message: Message = get_message(action)
 
-    # Получить сведения о фильме из БД
+    # Получить сведения о фильме из кеша (или из БД)
     buttons = None
     buttons_persons = []
     out_text = ''
@@ -742,9 +858,9 @@ async def get_persons_films(action: CallbackQuery | Message,
     if data_key:
         str_key = data_key[0]
 
-    info = models.FilmInfo.get_or_none(models.FilmInfo.data_key == str_key)
-    if info:
-        data = json.loads(info.data_json)
+    data = await on_event.do_action_async('film_section', key=str_key,
+                                          section='persons')
+    if data:
         name = data.get(
             'name',
             data.get('names', [{'name': None}])[0].get("name", None)
@@ -754,8 +870,11 @@ async def get_persons_films(action: CallbackQuery | Message,
             await safe_send_message(message,
                                     f'В фильме <b>{name}</b> снимались:')
 
-            # Извлекаем список актёров фильма
+            # Извлекаем список актёров фильма и сохраняем их в базу данных
+            # (на случай отсутствия в БД)
             persons: List[Dict] = data.get('persons', [])
+            await on_event.do_action_async('save_actors', persons=persons,
+                                           history_id=history_id)
             persons_count = 0
             for i_persons in persons:
                 # Имя актёра
@@ -763,17 +882,6 @@ async def get_persons_films(action: CallbackQuery | Message,
                 if not name_item:
                     continue
 
-                # Сохраняем актёров в базу данных (на случай отсутствия в БД)
-                try:
-                    TGUsersInterface().save_actor_if_absent(i_persons,
-                                                            info.id_history)
-                except TypeError as err:
-                    log.exception('Ошибка получения актёров: ' +
-                                      str(err), exc_info=True)
-                except (peewee.PeeweeException, IntegrityError) as err:
-                    log.exception('{0}: Ошибка сохранения актёров: {1}'.
-                                      format(type(err), str(err)))
-
                 # Формируем список актёров в виде набора кнопок
                 id_person = str(i_persons.get('id', ''))
                 if id_person:
@@ -813,6 +921,88 @@ async def get_persons_films(action: CallbackQuery | Message,
     return None
 
 
+async def _refresh_person(person_id: str,
+                          info: models.ActorFilms | None,
+                          data: Dict,
+                          history_id: str
+                          ) -> Dict | int:
+    """
+    Получить сведения о персоне с сайта и сохранить их в базу данных.
+
+    :param person_id: Код (ID) персоны на сайте
+    :type person_id: str
+
+    :param info: Запись о персоне из БД (если есть)
+    :type info: models.ActorFilms | None
+
+    :param data: Имеющиеся сведения о персоне (дополняются с сайта)
+    :type data: Dict
+
+    :param history_id: Данные из таблицы истории запросов (id)
+    :type history_id: str
+
+    :return: Обновлённые сведения о персоне или код ошибки
+    :rtype: Dict | int
+    """
+    response = await site_api_async.get_person_by_id(person_id)
+    if isinstance(response, int):
+        return response
+
+    # Переносим полученные данные в словарь data и дополняем текущей датой
+    response = json.loads(response.text)
+    data = dict(data)
+    data['last_update_date'] = '{:%Y-%m-%d}'.format(datetime.now())
+    for i_data in response:
+        data[i_data] = response.get(i_data)
+
+    # Сохраняем актёра в базу данных (в пуле потоков)
+    await on_event.do_action_async('save_person', info=info, data=data,
+                                   history_id=history_id)
+    return data
+
+
+def load_person(person_id: str) -> models.ActorFilms | None:
+    """
+    Запись о персоне из БД (действие для пула потоков).
+
+    :param person_id: Код (ID) персоны на сайте
+    :type person_id: str
+
+    :return: Запись о персоне или None, если её нет
+    :rtype: models.ActorFilms | None
+    """
+    return models.ActorFilms.get_or_none(
+        models.ActorFilms.data_key == person_id
+    )
+
+
+def save_person(info: models.ActorFilms | None, data: Dict,
+                history_id: str) -> None:
+    """
+    Записать сведения о персоне в БД (действие для пула потоков).
+
+    :param info: Запись о персоне из БД (None - персоны в БД нет)
+    :type info: models.ActorFilms | None
+    :param data: Сведения о персоне
+    :type data: Dict
+    :param history_id: Данные из таблицы истории запросов (id)
+    :type history_id: str
+
+    :return: None
+    """
+    try:
+        if info:
+            # Запишем в БД обновлённую информацию
+            info.data_json = data
+            info.save()
+        else:
+            # Добавим в базу данных актёра
+            TGUsersInterface().save_actor_if_absent(data, history_id)
+    except (peewee.PeeweeException, IntegrityError) as err:
+        log.exception('{0}: Ошибка сохранения актёра: {1}'.
+                      format(type(err), str(err)), exc_info=True)
+
+
 async def _show_one_person(message: Message,
                            data_keys: List,
                            history_id: str
@@ -840,9 +1030,8 @@ async def _show_one_person(message: Message,
     data = dict()
 
     # Сведения об актёре получить по ID персоны
-    info = models.ActorFilms.get_or_none(
-        models.ActorFilms.data_key == data_keys[1]
-    )
+    info = await on_event.do_action_async('load_person',
+                                          person_id=data_keys[1])
     out_lines = []
 
     if info:
@@ -850,7 +1039,7 @@ async def _show_one_person(message: Message,
                   f'id = {data_keys[1]}')
 
         # Есть данные в базе - проверить их давность
-        data = json.loads(info.data_json)
+        data = info.data_json
 
         # Узнать дату последнего обновления, если данные обновлялись
         last_update_date = data.get('last_update_date')
@@ -874,36 +1063,21 @@ async def _show_one_person(message: Message,
         last_update_date = None
 
     if last_update_date is None:
-        # Получаем данные с сайта
+        # Получаем данные с сайта (одновременные нажатия на одну и ту же
+        # персону ждут один общий запрос и одну запись в БД)
         out_lines.append(f"Нет сведений о персоне с ID {data_keys[1]} "
                          "или они устаревшие!\n")
-        response = site_api.get_person_by_id(data_keys[1])
-        if isinstance(response, int):
+        data = await _person_flight.do(
+            ('person', data_keys[1]),
+            lambda: _refresh_person(data_keys[1], info, data, history_id)
+        )
+        if isinstance(data, int):
             await safe_send_message(
                 message,
-                'Ошибка {} получения сведений о персоне'.format(response)
+                site_error_text(data, 'о персоне')
             )
             return None
 
-        # Переносим полученные данные в словарь data и дополняем текущей датой
-        response = json.loads(response.text)
-        data['last_update_date'] = '{:%Y-%m-%d}'.format(datetime.now())
-        for i_data in response:
-            data[i_data] = response.get(i_data)
-
-        # Сохраняем актёра в базу данных
-        try:
-            if info:
-                # Запишем в БД обновлённую информацию
-                info.data_json = json.dumps(data, ensure_ascii=False)
-                info.save()
-            else:
-                # Добавим в базу данных актёра
-                TGUsersInterface().save_actor_if_absent(data, history_id)
-        except (peewee.PeeweeException, IntegrityError) as err:
-            log.exception('{0}: Ошибка сохранения актёра: {1}'.
-                          format(type(err), str(err)), exc_info=True)
-
     # Формируем данные для вывода пользователю
 
     # Изображение актёра
@@ -1057,15 +1231,15 @@ async def get_facts_films(action: CallbackQuery | Message,
     # сообщения из телеграм)
     message: Message = get_message(action)
 
-    # Получить сведения о фильме из БД
+    # Получить сведения о фильме из кеша (или из БД)
     out_text = ''
     str_key = ''
     if data_key:
         str_key = data_key[0]
 
-    info = models.FilmInfo.get_or_none(models.FilmInfo.data_key == str_key)
-    if info:
-        data = json.loads(info.data_json)
+    data = await on_event.do_action_async('film_section', key=str_key,
+                                          section='facts')
+    if data:
         name = data.get(
             'name',
             data.get('names', [{'name': None}])[0].get("name", None)
@@ -1136,15 +1310,15 @@ async def get_trailers_films(action: CallbackQuery | Message,
     # сообщения из телеграм)
     message: Message = get_message(action)
 
-    # Получить сведения о фильме из БД
+    # Получить сведения о фильме из кеша (или из БД)
     out_text = ''
     str_key = ''
     if data_key:
         str_key = data_key[0]
 
-    info = models.FilmInfo.get_or_none(models.FilmInfo.data_key == str_key)
-    if info:
-        data = json.loads(info.data_json)
+    data = await on_event.do_action_async('film_section', key=str_key,
+                                          section='trailers')
+    if data:
         name = data.get(
             'name',
             data.get('names', [{'name': None}])[0].get("name", None)
@@ -1215,7 +1389,7 @@ async def get_similar_films(action: CallbackQuery | Message,
     # сообщения из телеграм)
     message: Message = get_message(action)
 
-    # Получить сведения о фильме из БД
+    # Получить сведения о фильме из кеша (или из БД)
     buttons = None
     buttons_films = []
     out_text = ''
@@ -1223,9 +1397,9 @@ async def get_similar_films(action: CallbackQuery | Message,
     if data_key:
         str_key = data_key[0]
 
-    info = models.FilmInfo.get_or_none(models.FilmInfo.data_key == str_key)
-    if info:
-        data = json.loads(info.data_json)
+    data = await on_event.do_action_async('film_section', key=str_key,
+                                          section='similar')
+    if data:
         name = data.get(
             'name',
             data.get('names', [{'name': None}])[0].get("name", None)
@@ -1299,7 +1473,7 @@ async def get_one_film(action: CallbackQuery | Message,
     # сообщения из телеграм)
     message: Message = get_message(action)
 
-    # Получить сведения о фильме из БД
+    # Получить сведения о фильме из кеша (или из БД)
     film_key = ''
     similar_key = ''
     if len(data_key) >= 2:
@@ -1307,20 +1481,16 @@ async def get_one_film(action: CallbackQuery | Message,
         film_key = data_key[0]
         similar_key = data_key[1]
 
-    # Сведения о фильме получить по ID похожего фильма из БД
-    data: models.FilmInfo = models.FilmInfo.get_or_none(
-        models.FilmInfo.data_key == similar_key
-    )
-    if data:
-        response = data.data_json
-    else:
+    # Сведения о фильме получить по ID похожего фильма из кеша (или из БД)
+    response = await on_event.do_action_async('film_info', key=similar_key)
+    if response is None:
         # Нет фильма в БД. Значит требуется запрос с сайта
         # и затем парсим результат
-        response = site_api.get_one_film(param_id=similar_key)
+        response = await site_api_async.get_one_film(param_id=similar_key)
         if isinstance(response, int):
             await safe_send_message(
                 message,
-                'Ошибка {} получения сведений о фильме'.format(response)
+                site_error_text(response, 'о фильме')
             )
             return
         response = response.text
@@ -1329,6 +1499,99 @@ async def get_one_film(action: CallbackQuery | Message,
     return None
 
 
+def _hit_button(kind: str, data_key: str, title: str,
+                year: str = '') -> Tuple[str, str]:
+    """
+    Кнопка найденного фильма или персоны.
+
+    :param kind: "film" или "person"
+    :type kind: str
+    :param data_key: Код (ID) фильма или персоны на сайте
+    :type data_key: str
+    :param title: Название фильма или имя персоны
+    :type title: str
+    :param year: Год выхода фильма
+    :type year: str
+
+    :return: (название кнопки, действие)
+    :rtype: Tuple[str, str]
+    """
+    if kind == 'person':
+        return title, f'ap_one_person.info.{data_key}'
+    if year:
+        title = f'{title} ({year})'
+    return title, f'ap_films.{data_key}.{data_key}'
+
+
+async def search_text(action: CallbackQuery | Message, text: str,
+                      history: Dict = None) -> bool:
+    """
+    Поиск фильмов и персон по тексту в произвольной форме. Сначала ищем
+    в каталоге бота (фильмы и персоны, сохранённые в БД), а если там
+    ничего не найдено - на сайте: фильмы по названию, затем персоны по
+    имени.
+
+    :param action: Связующий объект с чат-ботом
+    :type action: CallbackQuery | Message
+    :param text: Текст запроса
+    :type text: str
+    :param history: Данные из таблицы истории запросов (в основном нужен id)
+    :type history: Dict
+
+    :return: Истина - что-то найдено, Ложь - в иных случаях
+    :rtype: bool
+    """
+    message: Message = get_message(action)
+
+    hits = await on_event.do_action_async('search_catalog', text=text)
+    if hits:
+        buttons = [_hit_button(i_hit.kind, i_hit.data_key, i_hit.title,
+                               i_hit.year) for i_hit in hits]
+        out_text = f'Найдено по запросу "{html.escape(text)}":'
+        await safe_send_message(message, out_text,
+                                builder_custom_buttons(out_text,
+                                                       buttons=buttons))
+        return True
+
+    # В каталоге бота нет - спрашиваем сайт
+    buttons = []
+    for i_kind, i_request in (
+            ('film', site_api_async.get_film_by_filter),
+            ('person', site_api_async.get_person_by_filter)
+    ):
+        response = 0
+        try:
+            response = await i_request({'name': text})
+        except BaseException as err:
+            log.exception(err, exc_info=True)
+        if isinstance(response, int):
+            await safe_send_message(message,
+                                    site_error_text(response, 'по запросу'))
+            return False
+        for i_item in json.loads(response.text).get('docs', []):
+            title = i_item.get('name') or i_item.get('enName') or \
+                i_item.get('alternativeName')
+            if title and i_item.get('id'):
+                buttons.append(_hit_button(i_kind, str(i_item.get('id')),
+                                           title, str(i_item.get('year')
+                                                      or '')))
+        if buttons:
+            break
+
+    if not buttons:
+        await safe_send_message(message,
+                                f'По запросу "{html.escape(text)}" '
+                                f'ничего не найдено',
+                                builder_start('Начнём сначала...'))
+        return False
+
+    out_text = f'Найдено на сайте по запросу "{html.escape(text)}":'
+    await safe_send_message(message, out_text,
+                            builder_custom_buttons(out_text,
+                                                   buttons=buttons))
+    return True
+
+
 async def search_persons_filter(action: CallbackQuery | Message,
                                 state: FSMContext = None,
                                 history: Dict = None
@@ -1380,7 +1643,7 @@ async def search_persons_filter(action: CallbackQuery | Message,
 
         response = 0
         try:
-            response = site_api.get_person_by_filter(our_filter)
+            response = await site_api_async.get_person_by_filter(our_filter)
         except BaseException as err:
             log.exception(err, exc_info=True)
         log.debug("После запроса. Контроль. {0}".format(type(response)))
@@ -1389,7 +1652,7 @@ async def search_persons_filter(action: CallbackQuery | Message,
         if isinstance(response, int):
             await safe_send_message(
                 message,
-                'Ошибка {} получения сведений о фильме'.format(response)
+                site_error_text(response, 'о персонах')
             )
             return
         data: Dict = json.loads(response.text)
@@ -1423,6 +1686,22 @@ async def search_persons_filter(action: CallbackQuery | Message,
     return None
 
 
+def load_film_from_db(film_key: str) -> Dict | None:
+    """
+    Загрузить сведения о фильме из БД (второй уровень кеша фильмов).
+
+    :param film_key: Код (ID) фильма на сайте
+    :type film_key: str
+
+    :return: Разобранные сведения о фильме или None, если фильма нет в БД
+    :rtype: Dict | None
+    """
+    info = models.FilmInfo.get_or_none(models.FilmInfo.data_key == film_key)
+    if info and info.data_json:
+        return info.data_json
+    return None
+
+
 def retrieve_users() -> models.UserList:
     """
     Вернуть список пользователей из базы данных.
@@ -1433,12 +1712,42 @@ def retrieve_users() -> models.UserList:
     return result
 
 
+def retrieve_users_batch(after_id: int = 0, limit: int = 500) \
+        -> List[Tuple[int, int]]:
+    """
+    Вернуть порцию пользователей, согласных на информирование, для
+    рассылки. Порции читаются по возрастанию кода записи (следующая порция
+    начинается после последнего кода предыдущей), без чтения всей таблицы.
+
+    :param after_id: Код записи, после которого читать
+    :type after_id: int
+    :param limit: Размер порции
+    :type limit: int
+
+    :return: Пары (код записи, ID пользователя в телеграм)
+    :rtype: List[Tuple[int, int]]
+    """
+    query = models.UserList.select(models.UserList.id,
+                                   models.UserList.id_user). \
+        where((models.UserList.id > after_id) & models.UserList.is_agree). \
+        order_by(models.UserList.id).limit(limit).tuples()
+    return list(query)
+
+
+# Одновременные обновления сведений об одной персоне выполняются один раз
+_person_flight = SingleFlight()
+
 # Начинаем работу с определения логирования и сообщение в протокол
 log = logger.getLogger(__name__)
 
 if __name__ == "__main__":
     check_admin_rights_in_db()
     register_user_action_query()
+    load_history_report()
+    save_film_info()
+    save_actors()
+    load_person()
+    save_person()
     get_random_films()
     get_rating_films()
     get_companies_films()
@@ -1447,5 +1756,6 @@ if __name__ == "__main__":
     get_trailers_films()
     get_similar_films()
     get_one_film()
+    search_text()
     search_film()
     search_persons_filter()